@@ -3,13 +3,37 @@
 # This file is part of cloud-init. See LICENSE file for license information.
 
 import argparse
+import os
 import re
 import sys
 from datetime import datetime
 
+from cloudinit import profiler
 from cloudinit.util import json_dumps
 
-from . import dump, show
+from . import dump, show, trace
+
+
+def _add_boot_selection_args(parser, last_boot=True):
+    if last_boot:
+        parser.add_argument(
+            "--last-boot",
+            action="store_true",
+            default=False,
+            dest="last_boot",
+            help="only analyze the most recent boot.",
+        )
+    parser.add_argument(
+        "--index",
+        action="store_true",
+        default=False,
+        dest="use_index",
+        help=(
+            "keep the offset of each boot in a sidecar index file next to"
+            " the log so that analyzing the last boot only reads what was"
+            " logged since."
+        ),
+    )
 
 
 def get_parser(parser=None):
@@ -40,6 +64,7 @@ def get_parser(parser=None):
         default="-",
         help="specify where to write output. ",
     )
+    _add_boot_selection_args(parser_blame)
     parser_blame.set_defaults(action=("blame", analyze_blame))
 
     parser_show = subparsers.add_parser(
@@ -69,6 +94,7 @@ def get_parser(parser=None):
         default="-",
         help="specify where to write output.",
     )
+    _add_boot_selection_args(parser_show)
     parser_show.set_defaults(action=("show", analyze_show))
     parser_dump = subparsers.add_parser(
         "dump", help="Dump cloud-init events in JSON format"
@@ -89,6 +115,7 @@ def get_parser(parser=None):
         default="-",
         help="specify where to write output. ",
     )
+    _add_boot_selection_args(parser_dump)
     parser_dump.set_defaults(action=("dump", analyze_dump))
     parser_boot = subparsers.add_parser(
         "boot", help="Print list of boot times for kernel and cloud-init"
@@ -109,7 +136,45 @@ def get_parser(parser=None):
         default="-",
         help="specify where to write output.",
     )
+    _add_boot_selection_args(parser_boot, last_boot=False)
     parser_boot.set_defaults(action=("boot", analyze_boot))
+    parser_trace = subparsers.add_parser(
+        "trace",
+        help="Summarize the boot trace written by each stage, or compare it",
+    )
+    parser_trace.add_argument(
+        "-i",
+        "--infile",
+        action="store",
+        dest="infile",
+        default=profiler.TRACE_FILE,
+        help="specify where to read the trace from.",
+    )
+    parser_trace.add_argument(
+        "-o",
+        "--outfile",
+        action="store",
+        dest="outfile",
+        default="-",
+        help="specify where to write output.",
+    )
+    parser_trace.add_argument(
+        "-b",
+        "--baseline",
+        action="store",
+        dest="baseline",
+        default=None,
+        help="compare the trace with this earlier trace.",
+    )
+    parser_trace.add_argument(
+        "--top",
+        action="store",
+        dest="top",
+        type=int,
+        default=20,
+        help="number of events reported per category.",
+    )
+    parser_trace.set_defaults(action=("trace", analyze_trace))
     return parser
 
 
@@ -134,7 +199,9 @@ def analyze_boot(name, args):
     try:
         last_init_local = [
             e
-            for e in _get_events(infh)
+            for e in _get_events(
+                infh, last_boot=True, use_index=args.use_index
+            )
             if e["name"] == "init-local"
             and "starting search" in e["description"]
         ][-1]
@@ -210,9 +277,12 @@ def analyze_blame(name, args):
     (infh, outfh) = configure_io(args)
     blame_format = "     %ds (%n)"
     r = re.compile(r"(^\s+\d+\.\d+)", re.MULTILINE)
-    for idx, record in enumerate(
-        show.show_events(_get_events(infh), blame_format)
-    ):
+    records = show.show_events(
+        _get_events(infh, args.last_boot, args.use_index), blame_format
+    )
+    if args.last_boot:
+        records = records[-1:]
+    for idx, record in enumerate(records):
         srecs = sorted(filter(r.match, record), reverse=True)
         outfh.write("-- Boot Record %02d --\n" % (idx + 1))
         outfh.write("\n".join(srecs) + "\n")
@@ -241,9 +311,12 @@ def analyze_show(name, args):
         Finished stage: (modules-final) 0.NNN seconds
     """
     (infh, outfh) = configure_io(args)
-    for idx, record in enumerate(
-        show.show_events(_get_events(infh), args.print_format)
-    ):
+    records = show.show_events(
+        _get_events(infh, args.last_boot, args.use_index), args.print_format
+    )
+    if args.last_boot:
+        records = records[-1:]
+    for idx, record in enumerate(records):
         outfh.write("-- Boot Record %02d --\n" % (idx + 1))
         outfh.write(
             "The total time elapsed since completing an event is"
@@ -259,14 +332,63 @@ def analyze_show(name, args):
 def analyze_dump(name, args):
     """Dump cloud-init events in json format"""
     (infh, outfh) = configure_io(args)
-    outfh.write(json_dumps(_get_events(infh)) + "\n")
+    events = _get_events(infh, args.last_boot, args.use_index)
+    outfh.write(json_dumps(events) + "\n")
+
 
+def analyze_trace(name, args):
+    """Report the slowest events of a boot trace, or how they changed.
 
-def _get_events(infile):
-    rawdata = None
+    Boot traces are written by every stage as Chrome trace events, see
+    cloudinit.profiler. Events are totalled by category and name, so that
+    traces of different boots or images can be compared with --baseline.
+    """
+    (infh, outfh) = configure_io(args)
+    events = _load_trace(infh, args.infile)
+    if args.baseline:
+        try:
+            with open(args.baseline) as stream:
+                baseline = _load_trace(stream, args.baseline)
+        except OSError:
+            sys.stderr.write("Cannot open file %s\n" % args.baseline)
+            sys.exit(1)
+        outfh.write(trace.format_diff(baseline, events, args.top))
+    else:
+        outfh.write(trace.format_summary(events, args.top))
+
+
+def _load_trace(stream, name):
+    try:
+        return trace.load_trace(stream)
+    except ValueError:
+        sys.stderr.write("Cannot parse trace %s\n" % name)
+        sys.exit(1)
+
+
+def _is_log_file(infile):
+    """Whether infile is a regular file holding a log rather than json."""
+    name = getattr(infile, "name", None)
+    if infile is sys.stdin or not isinstance(name, str):
+        return False
+    if not os.path.isfile(name):
+        return False
+    head = infile.read(64).lstrip()
+    infile.seek(0)
+    return not head.startswith("[")
+
+
+def _get_events(infile, last_boot=False, use_index=False):
+    if _is_log_file(infile):
+        # Stream the log rather than holding it in memory
+        return dump.load_events(
+            infile.name, last_boot=last_boot, use_index=use_index
+        )
     events, rawdata = show.load_events_infile(infile)
     if not events:
-        events, _ = dump.dump_events(rawdata=rawdata)
+        lines = rawdata.splitlines()
+        if last_boot:
+            lines = dump.last_boot_lines(lines)
+        events = list(dump.iter_events(lines))
     return events
 
 
@@ -1,10 +1,14 @@
 # This file is part of cloud-init. See LICENSE file for license information.
 
 import calendar
+import json
+import mmap
+import os
+import re
 import sys
 from datetime import datetime
 
-from cloudinit import subp, util
+from cloudinit import atomic_helper, subp, util
 
 stage_to_description = {
     "finished": "finished running cloud-init",
@@ -26,6 +30,21 @@ CLOUD_INIT_JOURNALCTL_FMT = "%b %d %H:%M:%S.%f %Y"
 # other
 DEFAULT_FMT = "%b %d %H:%M:%S %Y"
 
+CI_EVENT_MATCHES = ["start:", "finish:", "Cloud-init v."]
+
+# Banner logged as each stage starts:
+#   Cloud-init v. 0.7.7 running 'init-local' at ...
+BOOT_MARKER = "Cloud-init v. "
+STAGE_BANNER = r"Cloud-init v\. \S+ running '(?P<stage>[^']+)'"
+STAGE_BANNER_RE = re.compile(STAGE_BANNER)
+STAGE_BANNER_BYTES_RE = re.compile(STAGE_BANNER.encode())
+
+# Sidecar file, next to the log, caching the offset of each boot
+INDEX_SUFFIX = ".analyze-index"
+INDEX_VERSION = 1
+# Leading log bytes recorded in the index to notice the log being rotated
+INDEX_HEAD_SIZE = 512
+
 
 def parse_timestamp(timestampstr):
     # default syslog time does not include the current year
@@ -142,11 +161,155 @@ def parse_ci_logline(line):
     return event
 
 
-def dump_events(cisource=None, rawdata=None):
-    events = []
-    event = None
-    CI_EVENT_MATCHES = ["start:", "finish:", "Cloud-init v."]
+def _starts_boot(stage, prev_stage):
+    """Whether the banner of stage, after that of prev_stage, starts a boot.
+
+    Every boot starts with init-local, except on platforms only running the
+    network stage. Manual runs of later stages belong to the current boot.
+    """
+    if stage == "init-local":
+        return True
+    return stage == "init" and prev_stage != "init-local"
+
+
+def iter_events(lines):
+    """Yield the event recorded by each of lines logging one, in order."""
+    for line in lines:
+        if not any(match in line for match in CI_EVENT_MATCHES):
+            continue
+        try:
+            event = parse_ci_logline(line)
+        except ValueError:
+            sys.stderr.write("Skipping invalid entry\n")
+            continue
+        if event:
+            yield event
+
+
+def iter_log_lines(logfile, offset=0):
+    """Yield the lines of logfile from byte offset, without reading it all."""
+    with open(logfile, "rb") as stream:
+        stream.seek(offset)
+        for line in stream:
+            yield line.decode("utf-8", "replace")
+
+
+def last_boot_lines(lines):
+    """Return the lines logged since the last boot started."""
+    start = 0
+    prev_stage = None
+    for (num, line) in enumerate(lines):
+        if BOOT_MARKER not in line:
+            continue
+        match = STAGE_BANNER_RE.search(line)
+        if match:
+            stage = match.group("stage")
+            if _starts_boot(stage, prev_stage):
+                start = num
+            prev_stage = stage
+    return lines[start:]
+
+
+def _scan_boot_offsets(log, start, prev_stage):
+    """Find the boots starting in the mmapped log from offset start.
+
+    :return: tuple of the offsets of the lines starting each boot, the offset
+        following the last complete line scanned and the last stage seen.
+    """
+    offsets = []
+    marker = BOOT_MARKER.encode()
+    end = log.rfind(b"\n", start) + 1
+    pos = log.find(marker, start, end)
+    while pos != -1:
+        line_start = log.rfind(b"\n", 0, pos) + 1
+        line_end = log.find(b"\n", pos, end)
+        match = STAGE_BANNER_BYTES_RE.search(log, pos, line_end)
+        if match:
+            stage = match.group("stage").decode()
+            if _starts_boot(stage, prev_stage):
+                offsets.append(line_start)
+            prev_stage = stage
+        pos = log.find(marker, line_end, end)
+    return offsets, max(end, start), prev_stage
 
+
+def _load_index(index_file, log, stat):
+    try:
+        with open(index_file) as stream:
+            index = json.load(stream)
+    except (OSError, ValueError):
+        return None
+    try:
+        head = index["head"].encode("latin-1")
+        if (
+            index["version"] != INDEX_VERSION
+            or index["inode"] != stat.st_ino
+            or index["scanned"] > len(log)
+            or log[: len(head)] != head
+        ):
+            return None
+        index["boots"] = [int(offset) for offset in index["boots"]]
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+    return index
+
+
+def get_boot_offsets(logfile, use_index=True):
+    """Return the byte offset of the line starting each boot in logfile.
+
+    The log is mmapped and only searched for stage banners. Unless use_index
+    is False, the offsets are kept in a sidecar index file so that later
+    calls only scan what was logged since. The index is best effort: it is
+    not written where the log's directory is read-only.
+    """
+    with open(logfile, "rb") as stream:
+        stat = os.fstat(stream.fileno())
+        if not stat.st_size:
+            return []
+        with mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ) as log:
+            index_file = logfile + INDEX_SUFFIX
+            index = _load_index(index_file, log, stat) if use_index else None
+            if index is None:
+                index = {
+                    "version": INDEX_VERSION,
+                    "inode": stat.st_ino,
+                    "head": log[:INDEX_HEAD_SIZE].decode("latin-1"),
+                    "boots": [],
+                    "scanned": 0,
+                    "stage": None,
+                }
+            elif index["scanned"] == len(log):
+                return index["boots"]
+            offsets, index["scanned"], index["stage"] = _scan_boot_offsets(
+                log, index["scanned"], index["stage"]
+            )
+            index["boots"].extend(offsets)
+            if len(index["head"]) < INDEX_HEAD_SIZE:
+                index["head"] = log[:INDEX_HEAD_SIZE].decode("latin-1")
+    if use_index:
+        try:
+            atomic_helper.write_json(index_file, index)
+        except OSError:
+            pass
+    return index["boots"]
+
+
+def load_events(logfile, last_boot=False, use_index=True):
+    """Return the events parsed from logfile, streaming it line by line.
+
+    :param last_boot: Only parse what was logged since the last boot
+        started, seeking past the rest of the log.
+    :param use_index: Whether to keep boot offsets in a sidecar index.
+    """
+    offset = 0
+    if last_boot:
+        boots = get_boot_offsets(logfile, use_index=use_index)
+        if boots:
+            offset = boots[-1]
+    return list(iter_events(iter_log_lines(logfile, offset)))
+
+
+def dump_events(cisource=None, rawdata=None):
     if not any([cisource, rawdata]):
         raise ValueError("Either cisource or rawdata parameters are required")
 
@@ -155,17 +318,7 @@ def dump_events(cisource=None, rawdata=None):
     else:
         data = cisource.readlines()
 
-    for line in data:
-        for match in CI_EVENT_MATCHES:
-            if match in line:
-                try:
-                    event = parse_ci_logline(line)
-                except ValueError:
-                    sys.stderr.write("Skipping invalid entry\n")
-                if event:
-                    events.append(event)
-
-    return events, data
+    return list(iter_events(data)), data
 
 
 def main():
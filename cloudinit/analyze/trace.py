@@ -0,0 +1,136 @@
+# This file is part of cloud-init. See LICENSE file for license information.
+"""Summarize and compare the boot traces written by cloudinit.profiler."""
+
+import json
+
+from cloudinit import profiler
+
+# Order in which categories are reported
+CATEGORIES = (
+    profiler.CATEGORY_STAGE,
+    profiler.CATEGORY_DATASOURCE,
+    profiler.CATEGORY_MODULE,
+    profiler.CATEGORY_SUBP,
+    profiler.CATEGORY_URL,
+    profiler.CATEGORY_EVENT,
+)
+
+
+def load_trace(stream):
+    """Return the list of trace events read from stream.
+
+    Both the JSON array format, which may lack its closing bracket, and the
+    JSON object format with a traceEvents list are accepted.
+
+    :raises: ValueError if stream does not hold a trace.
+    """
+    data = stream.read().strip()
+    if data.startswith("["):
+        data = data.rstrip(",")
+        if not data.endswith("]"):
+            data += "]"
+        events = json.loads(data)
+    else:
+        events = json.loads(data).get("traceEvents")
+    if not isinstance(events, list):
+        raise ValueError("No trace events found")
+    return events
+
+
+def summarize(events):
+    """Aggregate the complete events of a trace by category and name.
+
+    :return: dict keyed by (category, name) of [count, wall, cpu] totals, in
+        seconds. The CPU time includes that of the subprocesses run, except
+        for events recorded with children_cpu_unattributed.
+    """
+    totals = {}
+    for event in events:
+        if not isinstance(event, dict) or event.get("ph") != "X":
+            continue
+        key = (event.get("cat", profiler.CATEGORY_EVENT), event.get("name"))
+        total = totals.setdefault(key, [0, 0.0, 0.0])
+        total[0] += 1
+        total[1] += event.get("dur", 0) / 1e6
+        total[2] += event.get("tdur", 0) / 1e6
+        args = event.get("args") or {}
+        total[2] += args.get("children_cpu_ms", 0) / 1e3
+    return totals
+
+
+def _by_category(totals):
+    categories = {}
+    for ((category, name), total) in totals.items():
+        categories.setdefault(category, {})[name] = total
+    ordered = [c for c in CATEGORIES if c in categories]
+    ordered += sorted(c for c in categories if c not in CATEGORIES)
+    return [(c, categories[c]) for c in ordered]
+
+
+def format_summary(events, top=20):
+    """Render the slowest events of each category of a trace.
+
+    For example:
+      -- stage --
+           wall       cpu  count  name
+        4.60100s  1.20300s      1  init-network
+    """
+    lines = []
+    for (category, totals) in _by_category(summarize(events)):
+        lines.append("-- %s --" % category)
+        lines.append("%10s %10s %6s  %s" % ("wall", "cpu", "count", "name"))
+        ranked = sorted(totals.items(), key=lambda t: t[1][1], reverse=True)
+        for (name, (count, wall, cpu)) in ranked[:top]:
+            lines.append("%9.5fs %9.5fs %6d  %s" % (wall, cpu, count, name))
+        if len(ranked) > top:
+            lines.append("  ... %d more" % (len(ranked) - top))
+        lines.append("")
+    return "\n".join(lines)
+
+
+def format_diff(baseline, events, top=20):
+    """Render how the wall time of each category of events changed.
+
+    Events are matched by category and name. Within each category the events
+    whose total wall time changed most come first, events only found in one
+    of the traces showing as "-" in the other.
+    """
+    base_totals = summarize(baseline)
+    new_totals = summarize(events)
+    lines = []
+    for (category, totals) in _by_category(
+        dict(list(base_totals.items()) + list(new_totals.items()))
+    ):
+        rows = []
+        for name in totals:
+            base = base_totals.get((category, name))
+            new = new_totals.get((category, name))
+            delta = (new[1] if new else 0.0) - (base[1] if base else 0.0)
+            rows.append((name, base, new, delta))
+        rows.sort(key=lambda r: abs(r[3]), reverse=True)
+        base_sum = sum(r[1][1] for r in rows if r[1])
+        new_sum = sum(r[2][1] for r in rows if r[2])
+        lines.append(
+            "-- %s: %.5fs -> %.5fs (%+.5fs) --"
+            % (category, base_sum, new_sum, new_sum - base_sum)
+        )
+        lines.append(
+            "%10s %10s %11s  %s" % ("baseline", "trace", "delta", "name")
+        )
+        for (name, base, new, delta) in rows[:top]:
+            lines.append(
+                "%10s %10s %+10.5fs  %s"
+                % (
+                    "%.5fs" % base[1] if base else "-",
+                    "%.5fs" % new[1] if new else "-",
+                    delta,
+                    name,
+                )
+            )
+        if len(rows) > top:
+            lines.append("  ... %d more" % (len(rows) - top))
+        lines.append("")
+    return "\n".join(lines)
+
+
+# vi: ts=4 expandtab
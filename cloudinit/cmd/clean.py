@@ -9,6 +9,7 @@ import glob
 import os
 import sys
 
+from cloudinit import facts, helpers
 from cloudinit.stages import Init
 from cloudinit.subp import ProcessExecutionError, subp
 from cloudinit.util import (
@@ -74,6 +75,8 @@ def remove_artifacts(remove_logs, remove_seed=False):
     """
     init = Init(ds_deps=[])
     init.read_cfg()
+    facts.invalidate()
+    del_file(helpers.CONFIG_CACHE_FILE)
     if remove_logs:
         for log_file in get_config_logfiles(init.cfg):
             del_file(log_file)
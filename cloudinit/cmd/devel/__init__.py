@@ -5,8 +5,10 @@
 
 import logging
 
-from cloudinit import log
-from cloudinit.stages import Init
+from cloudinit import helpers, importer, log, util
+from cloudinit.settings import CLOUD_CONFIG
+
+stages = importer.lazy_import("cloudinit.stages")
 
 
 def addLogHandlerCLI(logger, log_level):
@@ -18,9 +20,30 @@ def addLogHandlerCLI(logger, log_level):
 
 def read_cfg_paths():
     """Return a Paths object based on the system configuration on disk."""
-    init = Init(ds_deps=[])
+    init = stages.Init(ds_deps=[])
     init.read_cfg()
     return init.paths
 
 
+def read_system_cfg_paths():
+    """Return a Paths object based on the system config files alone.
+
+    A cheaper read_cfg_paths for commands run many times a boot: no Init is
+    built. Paths come from the builtin config, /etc/cloud/cloud.cfg{,.d} and
+    the kernel commandline, which is where system_info paths are set.
+    """
+    cfg = util.mergemanydict(
+        [
+            util.get_builtin_cfg(),
+            util.read_conf_with_confd(CLOUD_CONFIG),
+            util.read_conf_from_cmdline(),
+        ],
+        reverse=True,
+    )
+    path_cfgs = util.get_cfg_by_path(cfg, ("system_info", "paths"), {})
+    if not isinstance(path_cfgs, dict):
+        path_cfgs = {}
+    return helpers.Paths(path_cfgs)
+
+
 # vi: ts=4 expandtab
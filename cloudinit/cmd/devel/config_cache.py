@@ -0,0 +1,108 @@
+# This file is part of cloud-init. See LICENSE file for license information.
+
+"""Show the merged configs cached this boot and where their keys come from."""
+
+import argparse
+import datetime
+import sys
+
+from cloudinit import helpers
+
+NAME = "config-cache"
+
+
+def get_parser(parser=None):
+    """Build or extend an arg parser for the config cache utility.
+
+    @param parser: Optional existing ArgumentParser instance representing the
+        subcommand which will be extended to support the args of this utility.
+
+    @returns: ArgumentParser with proper argument configuration.
+    """
+    if not parser:
+        parser = argparse.ArgumentParser(prog=NAME, description=__doc__)
+    parser.add_argument(
+        "-c",
+        "--cache-file",
+        type=str,
+        default=helpers.CONFIG_CACHE_FILE,
+        help=(
+            "Path of the merged config cache. Default: %s"
+            % helpers.CONFIG_CACHE_FILE
+        ),
+    )
+    parser.add_argument(
+        "-k",
+        "--key",
+        action="append",
+        dest="keys",
+        help="Only show where this config key comes from. May be repeated.",
+    )
+    return parser
+
+
+def _format_file_state(state):
+    (path, mtime_ns, size, inode) = state
+    if mtime_ns is None:
+        return "%s (absent)" % path
+    mtime = datetime.datetime.utcfromtimestamp(mtime_ns / 1e9)
+    return "%s (mtime %sZ, size %d, inode %d)" % (
+        path,
+        mtime.isoformat(),
+        size,
+        inode,
+    )
+
+
+def format_entry(key, entry, cfg_keys=None):
+    """Render the inputs and provenance of a cached merged config."""
+    fingerprint = entry.get("fingerprint", {})
+    stored = datetime.datetime.utcfromtimestamp(entry.get("stored", 0))
+    lines = [
+        "Merged config %s" % key,
+        "  stored: %sZ" % stored.isoformat(),
+        "  cloud-init: %s" % fingerprint.get("version"),
+        "  files:",
+    ]
+    for state in fingerprint.get("files", []):
+        lines.append("    %s" % _format_file_state(state))
+    for name in ("datasource_cfg", "base_cfg"):
+        if fingerprint.get(name):
+            lines.append("  %s sha256: %s" % (name, fingerprint[name]))
+    lines.append("  sources: %s" % ", ".join(entry.get("sources", [])))
+    lines.append("  keys:")
+    provenance = entry.get("provenance", {})
+    for cfg_key in sorted(provenance):
+        if cfg_keys and cfg_key not in cfg_keys:
+            continue
+        lines.append("    %s: %s" % (cfg_key, ", ".join(provenance[cfg_key])))
+    return "\n".join(lines)
+
+
+def handle_args(name, args):
+    """Print each merged config cached, the most recently stored last.
+
+    @return 0 on success, 1 when nothing is cached.
+    """
+    entries = helpers.read_config_cache(args.cache_file)
+    if not entries:
+        sys.stderr.write("No merged config cached in %s\n" % args.cache_file)
+        return 1
+    ranked = sorted(entries, key=lambda k: entries[k].get("stored", 0))
+    sys.stdout.write(
+        "\n\n".join(format_entry(k, entries[k], args.keys) for k in ranked)
+    )
+    sys.stdout.write("\n")
+    return 0
+
+
+def main():
+    args = get_parser().parse_args()
+    return handle_args(NAME, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+
+# vi: ts=4 expandtab
@@ -6,9 +6,14 @@ import os
 import sys
 import time
 
-from cloudinit import log, reporting, stages
+from cloudinit import facts, log, reporting, stages
 from cloudinit.event import EventScope, EventType
-from cloudinit.net import activators, read_sys_net_safe
+from cloudinit.net import (
+    activators,
+    read_sys_net_safe,
+    refresh_sysfs_snapshot,
+    sysfs_snapshot,
+)
 from cloudinit.net.network_state import parse_net_config_data
 from cloudinit.reporting import events
 from cloudinit.sources import DataSource  # noqa: F401
@@ -195,7 +200,11 @@ def initialize_datasource(hotplug_init, subsystem):
     return datasource
 
 
+@sysfs_snapshot()
 def handle_hotplug(hotplug_init: Init, devpath, subsystem, udevaction):
+    # The hotplugged device may change what the platform reports, so don't
+    # trust facts gathered earlier in this boot.
+    facts.invalidate()
     datasource = initialize_datasource(hotplug_init, subsystem)
     if not datasource:
         return
@@ -228,6 +237,8 @@ def handle_hotplug(hotplug_init: Init, devpath, subsystem, udevaction):
         except Exception as e:
             LOG.debug("Exception while processing hotplug event. %s", e)
             time.sleep(wait)
+            # Devices may have settled while we waited
+            refresh_sysfs_snapshot()
             last_exception = e
     else:
         raise last_exception  # type: ignore
@@ -8,7 +8,7 @@ import argparse
 
 from cloudinit.config import schema
 
-from . import hotplug_hook, make_mime, net_convert, render
+from . import config_cache, hotplug_hook, make_mime, net_convert, render
 
 
 def get_parser(parser=None):
@@ -46,6 +46,12 @@ def get_parser(parser=None):
             make_mime.get_parser,
             make_mime.handle_args,
         ),
+        (
+            config_cache.NAME,
+            config_cache.__doc__,
+            config_cache.get_parser,
+            config_cache.handle_args,
+        ),
     ]
     for (subcmd, helpmsg, get_parser, handler) in subcmds:
         parser = subparsers.add_parser(subcmd, help=helpmsg)
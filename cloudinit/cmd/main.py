@@ -22,12 +22,11 @@ from cloudinit import patcher
 
 patcher.patch_logging()
 
+from cloudinit import importer
 from cloudinit import log as logging
-from cloudinit import netinfo
+from cloudinit import profiler
 from cloudinit import signal_handler
-from cloudinit import sources
-from cloudinit import stages
-from cloudinit import url_helper
+from cloudinit import subp
 from cloudinit import util
 from cloudinit import version
 from cloudinit import warnings
@@ -42,6 +41,11 @@ from cloudinit import atomic_helper
 from cloudinit.config import cc_set_hostname
 from cloudinit import dhclient_hook
 
+# Only the boot stages need these; keep `cloud-init status` and friends fast.
+netinfo = importer.lazy_import("cloudinit.netinfo")
+sources = importer.lazy_import("cloudinit.sources")
+stages = importer.lazy_import("cloudinit.stages")
+url_helper = importer.lazy_import("cloudinit.url_helper")
 
 # Welcome message template
 WELCOME_MSG_TPL = (
@@ -685,6 +689,8 @@ def status_wrapper(name, args, data_d=None, link_d=None):
     status_link = os.path.join(link_d, "status.json")
     result_path = os.path.join(data_d, "result.json")
     result_link = os.path.join(link_d, "result.json")
+    subp_stats_path = os.path.join(data_d, "subp-stats.json")
+    subp_stats_link = os.path.join(link_d, "subp-stats.json")
 
     util.ensure_dirs(
         (
@@ -719,7 +725,14 @@ def status_wrapper(name, args, data_d=None, link_d=None):
 
     status = None
     if mode == "init-local":
-        for f in (status_link, result_link, status_path, result_path):
+        for f in (
+            status_link,
+            result_link,
+            subp_stats_link,
+            status_path,
+            result_path,
+            subp_stats_path,
+        ):
             util.del_file(f)
     else:
         try:
@@ -770,6 +783,7 @@ def status_wrapper(name, args, data_d=None, link_d=None):
     v1["stage"] = None
 
     atomic_helper.write_json(status_path, status)
+    _write_subp_stats(mode, subp_stats_path, subp_stats_link, args)
 
     if mode == "modules-final":
         # write the 'finished' file
@@ -789,6 +803,48 @@ def status_wrapper(name, args, data_d=None, link_d=None):
     return len(v1[mode]["errors"])
 
 
+def _write_subp_stats(mode, stats_path, stats_link, args):
+    """Add the commands run by subp during this stage to stats_path.
+
+    The file is attached to the stage's finish event when reporting.
+    """
+    commands = subp.get_command_stats()
+    stats = None
+    if mode != "init-local":
+        try:
+            stats = json.loads(util.load_file(stats_path))
+        except Exception:
+            pass
+    if stats is None:
+        stats = {"v1": {}}
+    stats["v1"][mode] = {
+        "count": sum(c["count"] for c in commands),
+        "seconds": sum(c["seconds"] for c in commands),
+        "failures": sum(c["failures"] for c in commands),
+        "commands": commands,
+    }
+    LOG.debug(
+        "Stage %s ran %d commands in %.3f seconds, %d failed",
+        mode,
+        stats["v1"][mode]["count"],
+        stats["v1"][mode]["seconds"],
+        stats["v1"][mode]["failures"],
+    )
+    try:
+        atomic_helper.write_json(stats_path, stats)
+        util.sym_link(
+            os.path.relpath(stats_path, os.path.dirname(stats_link)),
+            stats_link,
+            force=True,
+        )
+    except OSError as e:
+        LOG.debug("Failed to write %s: %s", stats_path, e)
+        return
+    reporter = getattr(args, "reporter", None)
+    if reporter is not None:
+        reporter.post_files.append(stats_path)
+
+
 def _maybe_persist_instance_data(init):
     """Write instance-data.json file if absent and datasource is restored."""
     if init.ds_restored:
@@ -1052,6 +1108,10 @@ def main(sysv_args=None):
         rdesc = "running 'cloud-init %s'" % name
         report_on = False
 
+    if name in ("init", "modules"):
+        # Trace each boot stage, see `cloud-init analyze trace`
+        profiler.enable(rname)
+
     args.reporter = events.ReportEventStack(
         rname, rdesc, reporting_enabled=report_on
     )
@@ -1064,8 +1124,11 @@ def main(sysv_args=None):
             func=functor,
             args=(name, args),
         )
-        reporting.flush_events()
-        return retval
+    # after the stage's own finish event is reported
+    reporting.flush_events()
+    if "cloudinit.url_helper" in sys.modules:
+        url_helper.SESSION_POOL.close()
+    return retval
 
 
 if __name__ == "__main__":
@@ -18,22 +18,23 @@ import os
 import sys
 from errno import EACCES
 
-from cloudinit import log, util
-from cloudinit.cmd.devel import addLogHandlerCLI, read_cfg_paths
-from cloudinit.handlers.jinja_template import (
-    convert_jinja_instance_data,
-    get_jinja_variable_alias,
-    render_jinja_payload,
-)
+from cloudinit import importer, log, util
+from cloudinit.cmd.devel import addLogHandlerCLI, read_system_cfg_paths
 from cloudinit.sources import (
     INSTANCE_JSON_FILE,
     INSTANCE_JSON_SENSITIVE_FILE,
     REDACT_SENSITIVE_VALUE,
+    read_instance_data_index,
 )
 
+jinja_template = importer.lazy_import("cloudinit.handlers.jinja_template")
+
 NAME = "query"
 LOG = log.getLogger(NAME)
 
+# Top-level keys sourced from user-data and vendor-data files
+USER_DATA_KEYS = ("userdata", "vendordata")
+
 
 def get_parser(parser=None):
     """Build or extend an arg parser for query utility.
@@ -91,12 +92,14 @@ def get_parser(parser=None):
     parser.add_argument(
         "varname",
         type=str,
-        nargs="?",
+        nargs="*",
         help=(
             "A dot-delimited specific variable to query from"
             " instance-data. For example: v1.local_hostname. If the"
             " value is not JSON serializable, it will be base64-encoded and"
-            ' will contain the prefix "ci-b64:". '
+            ' will contain the prefix "ci-b64:". When more than one'
+            " varname is given, a JSON object of each varname and its value"
+            " is reported."
         ),
     )
     parser.add_argument(
@@ -136,11 +139,35 @@ def load_userdata(ud_file_path):
         return util.decomp_gzip(bdata, quiet=False, decode=True)
 
 
-def _read_instance_data(instance_data, user_data, vendor_data) -> dict:
+def _get_instance_data_fn(paths):
+    """Return the instance-data file in paths.run_dir readable by the user.
+
+    Root reads the unredacted INSTANCE_JSON_SENSITIVE_FILE when present.
+    """
+    redacted_data_fn = os.path.join(paths.run_dir, INSTANCE_JSON_FILE)
+    if os.getuid() != 0:
+        return redacted_data_fn
+    sensitive_data_fn = os.path.join(
+        paths.run_dir, INSTANCE_JSON_SENSITIVE_FILE
+    )
+    if os.path.exists(sensitive_data_fn):
+        return sensitive_data_fn
+    LOG.warning(
+        "Missing root-readable %s. Using redacted %s instead.",
+        sensitive_data_fn,
+        redacted_data_fn,
+    )
+    return redacted_data_fn
+
+
+def _read_instance_data(
+    instance_data, user_data, vendor_data, paths=None, include_user_data=True
+) -> dict:
     """Return a dict of merged instance-data, vendordata and userdata.
 
     The dict will contain supplemental userdata and vendordata keys sourced
-    from default user-data and vendor-data files.
+    from default user-data and vendor-data files, unless include_user_data is
+    False.
 
     Non-root users will have redacted INSTANCE_JSON_FILE content and redacted
     vendordata and userdata values.
@@ -148,37 +175,13 @@ def _read_instance_data(instance_data, user_data, vendor_data) -> dict:
     :raise: IOError/OSError on absence of instance-data.json file or invalid
         access perms.
     """
-    paths = None
     uid = os.getuid()
-    if not all([instance_data, user_data, vendor_data]):
-        paths = read_cfg_paths()
     if instance_data:
         instance_data_fn = instance_data
     else:
-        redacted_data_fn = os.path.join(paths.run_dir, INSTANCE_JSON_FILE)
-        if uid == 0:
-            sensitive_data_fn = os.path.join(
-                paths.run_dir, INSTANCE_JSON_SENSITIVE_FILE
-            )
-            if os.path.exists(sensitive_data_fn):
-                instance_data_fn = sensitive_data_fn
-            else:
-                LOG.warning(
-                    "Missing root-readable %s. Using redacted %s instead.",
-                    sensitive_data_fn,
-                    redacted_data_fn,
-                )
-                instance_data_fn = redacted_data_fn
-        else:
-            instance_data_fn = redacted_data_fn
-    if user_data:
-        user_data_fn = user_data
-    else:
-        user_data_fn = os.path.join(paths.instance_link, "user-data.txt")
-    if vendor_data:
-        vendor_data_fn = vendor_data
-    else:
-        vendor_data_fn = os.path.join(paths.instance_link, "vendor-data.txt")
+        if not paths:
+            paths = read_system_cfg_paths()
+        instance_data_fn = _get_instance_data_fn(paths)
 
     try:
         instance_json = util.load_file(instance_data_fn)
@@ -190,6 +193,18 @@ def _read_instance_data(instance_data, user_data, vendor_data) -> dict:
         raise
 
     instance_data = util.load_json(instance_json)
+    if not include_user_data:
+        return instance_data
+    if not paths and not all([user_data, vendor_data]):
+        paths = read_system_cfg_paths()
+    if user_data:
+        user_data_fn = user_data
+    else:
+        user_data_fn = os.path.join(paths.instance_link, "user-data.txt")
+    if vendor_data:
+        vendor_data_fn = vendor_data
+    else:
+        vendor_data_fn = os.path.join(paths.instance_link, "vendor-data.txt")
     if uid != 0:
         instance_data["userdata"] = "<%s> file:%s" % (
             REDACT_SENSITIVE_VALUE,
@@ -205,6 +220,27 @@ def _read_instance_data(instance_data, user_data, vendor_data) -> dict:
     return instance_data
 
 
+def _read_instance_data_index_values(instance_data_fn, varnames):
+    """Return the values of varnames from the key index of instance_data_fn.
+
+    Leaf values are looked up in the flat key index written next to the
+    instance-data file, without loading or converting the instance-data.
+
+    @return: List of values in varnames order, or None when the index is
+        unusable or any varname is not a leaf in it.
+    """
+    index = read_instance_data_index(instance_data_fn)
+    if index is None:
+        return None
+    try:
+        return [
+            jinja_template.get_flattened_jinja_variable(index, varname)
+            for varname in varnames
+        ]
+    except KeyError:
+        return None
+
+
 def _find_instance_data_leaf_by_varname_path(
     jinja_vars_without_aliases: dict,
     jinja_vars_with_aliases: dict,
@@ -239,7 +275,10 @@ def _find_instance_data_leaf_by_varname_path(
             response = response[key_path_part]
         else:  # We are an underscore_delimited key alias
             for key in response:
-                if get_jinja_variable_alias(key) == key_path_part:
+                if (
+                    jinja_template.get_jinja_variable_alias(key)
+                    == key_path_part
+                ):
                     response = response[key]
                     break
         if walked_key_path:
@@ -251,55 +290,90 @@ def _find_instance_data_leaf_by_varname_path(
 def handle_args(name, args):
     """Handle calls to 'cloud-init query' as a subcommand."""
     addLogHandlerCLI(LOG, log.DEBUG if args.debug else log.WARNING)
-    if not any([args.list_keys, args.varname, args.format, args.dump_all]):
+    varnames = args.varname or []
+    if not any([args.list_keys, varnames, args.format, args.dump_all]):
         LOG.error(
             "Expected one of the options: --all, --format,"
             " --list-keys or varname"
         )
         get_parser().print_help()
         return 1
-    try:
-        instance_data = _read_instance_data(
-            args.instance_data, args.user_data, args.vendor_data
-        )
-    except (IOError, OSError):
+    if args.list_keys and len(varnames) > 1:
+        LOG.error("--list-keys accepts at most one varname")
         return 1
-    if args.format:
-        payload = "## template: jinja\n{fmt}".format(fmt=args.format)
-        rendered_payload = render_jinja_payload(
-            payload=payload,
-            payload_fn="query commandline",
-            instance_data=instance_data,
-            debug=True if args.debug else False,
+    paths = None
+    instance_data_fn = args.instance_data
+    responses = None
+    if varnames and not any([args.list_keys, args.format]):
+        # Plain lookups are answered from the key index when possible
+        if not instance_data_fn:
+            paths = read_system_cfg_paths()
+            instance_data_fn = _get_instance_data_fn(paths)
+        responses = _read_instance_data_index_values(
+            instance_data_fn, varnames
         )
-        if rendered_payload:
-            print(rendered_payload)
-            return 0
-        return 1
-
-    # If not rendering a structured format above, query output will be either:
-    #  - JSON dump of all instance-data/jinja variables
-    #  - JSON dump of a value at an dict path into the instance-data dict.
-    #  - a list of keys for a specific dict path into the instance-data dict.
-    response = convert_jinja_instance_data(instance_data)
-    if args.varname:
-        jinja_vars_with_aliases = convert_jinja_instance_data(
-            instance_data, include_key_aliases=True
+    if responses is None:
+        include_user_data = bool(
+            args.format
+            or not varnames
+            or any(v.split(".")[0] in USER_DATA_KEYS for v in varnames)
         )
         try:
-            response = _find_instance_data_leaf_by_varname_path(
-                jinja_vars_without_aliases=response,
-                jinja_vars_with_aliases=jinja_vars_with_aliases,
-                varname=args.varname,
-                list_keys=args.list_keys,
+            instance_data = _read_instance_data(
+                instance_data_fn,
+                args.user_data,
+                args.vendor_data,
+                paths=paths,
+                include_user_data=include_user_data,
             )
-        except (KeyError, ValueError) as e:
-            LOG.error(e)
+        except (IOError, OSError):
             return 1
+        if args.format:
+            payload = "## template: jinja\n{fmt}".format(fmt=args.format)
+            rendered_payload = jinja_template.render_jinja_payload(
+                payload=payload,
+                payload_fn="query commandline",
+                instance_data=instance_data,
+                debug=True if args.debug else False,
+            )
+            if rendered_payload:
+                print(rendered_payload)
+                return 0
+            return 1
+
+        # If not rendering a structured format above, query output will be:
+        #  - JSON dump of all instance-data/jinja variables
+        #  - JSON dump of a value at an dict path into the instance-data dict.
+        #  - a list of keys for a specific dict path into the instance-data.
+        response = jinja_template.convert_jinja_instance_data(instance_data)
+        responses = [response]
+        if varnames:
+            jinja_vars_with_aliases = (
+                jinja_template.convert_jinja_instance_data(
+                    instance_data, include_key_aliases=True
+                )
+            )
+            try:
+                responses = [
+                    _find_instance_data_leaf_by_varname_path(
+                        jinja_vars_without_aliases=response,
+                        jinja_vars_with_aliases=jinja_vars_with_aliases,
+                        varname=varname,
+                        list_keys=args.list_keys,
+                    )
+                    for varname in varnames
+                ]
+            except (KeyError, ValueError) as e:
+                LOG.error(e)
+                return 1
+    if len(varnames) > 1:
+        response = dict(zip(varnames, responses))
+    else:
+        response = responses[0]
     if args.list_keys:
         if not isinstance(response, dict):
             LOG.error(
-                "--list-keys provided but '%s' is not a dict", args.varname
+                "--list-keys provided but '%s' is not a dict", varnames[0]
             )
             return 1
         response = "\n".join(sorted(response.keys()))
@@ -5,13 +5,17 @@
 """Define 'status' utility and handler as part of cloud-init commandline."""
 
 import argparse
+import ctypes
+import ctypes.util
+import json
 import os
+import select
+import struct
 import sys
-from time import gmtime, sleep, strftime
+from time import gmtime, monotonic, sleep, strftime
 
-from cloudinit.distros import uses_systemd
-from cloudinit.stages import Init
-from cloudinit.util import get_cmdline, load_file, load_json
+from cloudinit.cmd.devel import read_system_cfg_paths
+from cloudinit.util import get_cmdline, load_file, load_json, uses_systemd
 
 CLOUDINIT_DISABLED_FILE = "/etc/cloud/cloud-init.disabled"
 
@@ -22,6 +26,18 @@ STATUS_DONE = "done"
 STATUS_ERROR = "error"
 STATUS_DISABLED = "disabled"
 
+# cloud-init updates these in the run dir, or in the directory they link to
+STATUS_FILES = ("status.json", "result.json")
+# Seconds --wait rechecks the status without any change reported by inotify
+WAIT_RECHECK = 5
+# inotify(7) events marking a file in a watched directory as written
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_Q_OVERFLOW = 0x00004000
+_IN_EVENT = struct.Struct("iIII")
+
 
 def get_parser(parser=None):
     """Build or extend an arg parser for status utility.
@@ -53,23 +69,139 @@ def get_parser(parser=None):
         default=False,
         help="Block waiting on cloud-init to complete",
     )
+    parser.add_argument(
+        "--json-lines",
+        action="store_true",
+        default=False,
+        help=(
+            "Report the status and the progress of each stage as a json"
+            " object per line. With --wait, a line is written each time the"
+            " status changes"
+        ),
+    )
     return parser
 
 
+class StatusWatch(object):
+    """Wait on inotify for cloud-init to update its status files.
+
+    The run dir is watched, along with the directories that status.json
+    and result.json link to once cloud-init has created them.
+    """
+
+    def __init__(self, run_dir):
+        self.run_dir = run_dir
+        self._watched = set()
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self._update()
+
+    def _update(self):
+        """Watch the directories status files are in, return if any is new.
+
+        Directories that do not exist yet are tried again at the next call.
+        """
+        added = False
+        dirs = {self.run_dir}
+        for name in STATUS_FILES:
+            path = os.path.realpath(os.path.join(self.run_dir, name))
+            dirs.add(os.path.dirname(path))
+        for path in dirs - self._watched:
+            mask = _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+            if self._add_watch(self.fd, os.fsencode(path), mask) >= 0:
+                self._watched.add(path)
+                added = True
+        return added
+
+    def _status_changed(self):
+        """Drain pending events, return whether any touched STATUS_FILES."""
+        changed = False
+        while True:
+            try:
+                buf = os.read(self.fd, 4096)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset + _IN_EVENT.size <= len(buf):
+                _wd, mask, _cookie, length = _IN_EVENT.unpack_from(buf, offset)
+                offset += _IN_EVENT.size
+                name = buf[offset : offset + length].split(b"\x00", 1)[0]
+                name = name.decode(errors="replace")
+                offset += length
+                if mask & _IN_Q_OVERFLOW or name in STATUS_FILES:
+                    changed = True
+
+    def wait(self, timeout=WAIT_RECHECK):
+        """Block until a status file changes or timeout seconds passed.
+
+        @return: True if a status file changed, or may have changed before
+            its directory was watched.
+        """
+        if self._update():
+            return True
+        deadline = monotonic() + timeout
+        remaining = timeout
+        while remaining > 0:
+            readable, _, _ = select.select([self.fd], [], [], remaining)
+            if not readable:
+                break
+            changed = self._status_changed()
+            if self._update() or changed:
+                return True
+            remaining = deadline - monotonic()
+        return False
+
+    def close(self):
+        os.close(self.fd)
+
+
+def _get_status_watch(run_dir):
+    """Return a StatusWatch for run_dir, None when inotify is unavailable."""
+    try:
+        return StatusWatch(run_dir)
+    except (AttributeError, OSError):
+        return None
+
+
 def handle_status_args(name, args):
     """Handle calls to 'cloud-init status' as a subcommand."""
     # Read configured paths
-    init = Init(ds_deps=[])
-    init.read_cfg()
+    paths = read_system_cfg_paths()
+    json_lines = getattr(args, "json_lines", False)
+    # cloud-init is not disabled while it runs, check it once
+    disabled = _is_cloudinit_disabled(CLOUDINIT_DISABLED_FILE, paths)
 
-    status, status_detail, time = _get_status_details(init.paths)
+    details = _get_status(paths, disabled)
+    if json_lines:
+        _write_json_line(*details)
     if args.wait:
-        while status in (STATUS_ENABLED_NOT_RUN, STATUS_RUNNING):
-            sys.stdout.write(".")
-            sys.stdout.flush()
-            status, status_detail, time = _get_status_details(init.paths)
-            sleep(0.25)
-        sys.stdout.write("\n")
+        watch = _get_status_watch(paths.run_dir)
+        try:
+            while details[0] in (STATUS_ENABLED_NOT_RUN, STATUS_RUNNING):
+                if not json_lines:
+                    sys.stdout.write(".")
+                    sys.stdout.flush()
+                previous = details
+                if watch:
+                    watch.wait()
+                    details = _get_status(paths, disabled)
+                else:
+                    details = _get_status(paths, disabled)
+                    sleep(0.25)
+                if json_lines and details != previous:
+                    _write_json_line(*details)
+        finally:
+            if watch:
+                watch.close()
+        if not json_lines:
+            sys.stdout.write("\n")
+    status, status_detail, time, _ = details
+    if json_lines:
+        return 1 if status == STATUS_ERROR else 0
     if args.long:
         print("status: {0}".format(status))
         if time:
@@ -80,6 +212,27 @@ def handle_status_args(name, args):
     return 1 if status == STATUS_ERROR else 0
 
 
+def _write_json_line(status, status_detail, time, status_v1):
+    """Write the status and the progress of each stage as a line of json."""
+    stages_v1 = {}
+    for key, value in status_v1.items():
+        if isinstance(value, dict):
+            stages_v1[key] = {
+                "start": value.get("start"),
+                "finished": value.get("finished"),
+                "errors": value.get("errors", []),
+            }
+    line = {
+        "status": status,
+        "detail": status_detail,
+        "time": time,
+        "stage": status_v1.get("stage"),
+        "stages": stages_v1,
+    }
+    sys.stdout.write(json.dumps(line, sort_keys=True) + "\n")
+    sys.stdout.flush()
+
+
 def _is_cloudinit_disabled(disable_file, paths):
     """Report whether cloud-init is disabled.
 
@@ -115,6 +268,15 @@ def _get_status_details(paths):
 
     Values are obtained from parsing paths.run_dir/status.json.
     """
+    return _get_status(paths)[:3]
+
+
+def _get_status(paths, disabled=None):
+    """Return the status, status_details, time of last event and status.json.
+
+    @param disabled: Optional (bool, reason) from _is_cloudinit_disabled,
+        which is checked when not given.
+    """
     status = STATUS_ENABLED_NOT_RUN
     status_detail = ""
     status_v1 = {}
@@ -122,9 +284,9 @@ def _get_status_details(paths):
     status_file = os.path.join(paths.run_dir, "status.json")
     result_file = os.path.join(paths.run_dir, "result.json")
 
-    (is_disabled, reason) = _is_cloudinit_disabled(
-        CLOUDINIT_DISABLED_FILE, paths
-    )
+    if disabled is None:
+        disabled = _is_cloudinit_disabled(CLOUDINIT_DISABLED_FILE, paths)
+    (is_disabled, reason) = disabled
     if is_disabled:
         status = STATUS_DISABLED
         status_detail = reason
@@ -159,7 +321,7 @@ def _get_status_details(paths):
         time = strftime("%a, %d %b %Y %H:%M:%S %z", gmtime(latest_event))
     else:
         time = ""
-    return status, status_detail, time
+    return status, status_detail, time, status_v1
 
 
 def main():
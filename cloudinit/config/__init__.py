@@ -17,6 +17,13 @@ LOG = logging.getLogger(__name__)
 # name in the lookup path...
 MOD_PREFIX = "cc_"
 
+# Shared resources a module may list in its ``reads`` and ``writes``
+# attributes, alongside absolute paths of the files or directories it touches.
+# Modules declaring neither attribute are assumed to touch everything.
+RESOURCE_NETWORK = "network"
+RESOURCE_PACKAGES = "packages"
+RESOURCE_USERS = "users"
+
 
 def form_module_name(name):
     canon_name = name.replace("-", "_")
@@ -41,7 +48,41 @@ def fixup_module(mod, def_freq=PER_INSTANCE):
         setattr(mod, "distros", [])
     if not hasattr(mod, "osfamilies"):
         setattr(mod, "osfamilies", [])
+    if hasattr(mod, "reads") or hasattr(mod, "writes"):
+        for attr in ("reads", "writes"):
+            if not hasattr(mod, attr):
+                setattr(mod, attr, [])
+    else:
+        setattr(mod, "reads", None)
+        setattr(mod, "writes", None)
     return mod
 
 
+def _resources_overlap(first, second):
+    for res_a in first:
+        for res_b in second:
+            if res_a == res_b:
+                return True
+            if res_a.startswith("/") and res_b.startswith("/"):
+                # A directory overlaps with everything beneath it
+                dir_a = res_a.rstrip("/") + "/"
+                dir_b = res_b.rstrip("/") + "/"
+                if dir_a.startswith(dir_b) or dir_b.startswith(dir_a):
+                    return True
+    return False
+
+
+def modules_conflict(mod_a, mod_b):
+    """Return True when two fixed up modules must not run concurrently.
+
+    Modules conflict when one writes a resource the other reads or writes, or
+    when either of them does not declare its resources.
+    """
+    if mod_a.writes is None or mod_b.writes is None:
+        return True
+    return _resources_overlap(
+        mod_a.writes, mod_b.reads + mod_b.writes
+    ) or _resources_overlap(mod_b.writes, mod_a.reads)
+
+
 # vi: ts=4 expandtab
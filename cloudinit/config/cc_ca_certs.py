@@ -42,6 +42,7 @@ can be removed from the system with the configuration option
 import os
 
 from cloudinit import subp, util
+from cloudinit.config import RESOURCE_PACKAGES
 
 DEFAULT_CONFIG = {
     "ca_cert_path": "/usr/share/ca-certificates/",
@@ -62,6 +63,15 @@ DISTRO_OVERRIDES = {
 
 
 distros = ["alpine", "debian", "ubuntu", "rhel"]
+# debconf-set-selections takes the same lock as package installs
+writes = [
+    RESOURCE_PACKAGES,
+    "/etc/ca-certificates.conf",
+    "/etc/pki/ca-trust",
+    "/etc/ssl/certs",
+    "/usr/share/ca-certificates",
+    "/usr/share/pki/ca-trust-source",
+]
 
 
 def _distro_ca_certs_configs(distro_name):
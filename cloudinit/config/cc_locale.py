@@ -16,6 +16,13 @@ from cloudinit.settings import PER_INSTANCE
 
 frequency = PER_INSTANCE
 distros = ["all"]
+writes = [
+    "/etc/default/locale",
+    "/etc/locale.conf",
+    "/etc/locale.gen",
+    "/etc/sysconfig/i18n",
+    "/usr/lib/locale",
+]
 meta = {
     "id": "cc_locale",
     "name": "Locale",
@@ -12,6 +12,7 @@ from textwrap import dedent
 
 from cloudinit import log as logging
 from cloudinit import subp, temp_utils, templater, type_utils, util
+from cloudinit.config import RESOURCE_NETWORK, RESOURCE_PACKAGES
 from cloudinit.config.schema import get_meta_doc, validate_cloudconfig_schema
 from cloudinit.settings import PER_INSTANCE
 
@@ -38,6 +39,16 @@ distros = [
     "ubuntu",
     "virtuozzo",
 ]
+reads = [RESOURCE_NETWORK]
+writes = [
+    RESOURCE_PACKAGES,
+    "/etc/chrony",
+    "/etc/chrony.conf",
+    "/etc/ntp.conf",
+    "/etc/ntpd.conf",
+    "/etc/systemd/timesyncd.conf",
+    "/etc/systemd/timesyncd.conf.d",
+]
 
 NTP_CLIENT_CONFIG = {
     "chrony": {
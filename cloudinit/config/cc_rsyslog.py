@@ -189,6 +189,8 @@ DEF_DIR = "/etc/rsyslog.d"
 DEF_RELOAD = "auto"
 DEF_REMOTES = {}
 
+writes = [DEF_DIR]
+
 KEYNAME_CONFIGS = "configs"
 KEYNAME_FILENAME = "config_filename"
 KEYNAME_DIR = "config_dir"
@@ -107,8 +107,11 @@ def handle_random_seed_command(command, required, env=None):
     subp.subp(command, env=env, capture=False)
 
 
-def handle(name, cfg, cloud, log, _args):
-    mycfg = cfg.get("random_seed", {})
+def write_seed_data(name, mycfg, metadata, log):
+    """Append seed data from config and metadata to the seed file.
+
+    @return: The path of the seed file.
+    """
     seed_path = mycfg.get("file", "/dev/urandom")
     seed_data = mycfg.get("data", b"")
 
@@ -118,7 +121,6 @@ def handle(name, cfg, cloud, log, _args):
 
     # 'random_seed' is set up by Azure datasource, and comes already in
     # openstack meta_data.json
-    metadata = cloud.datasource.metadata
     if metadata and "random_seed" in metadata:
         seed_buf.write(util.encode_text(metadata["random_seed"]))
 
@@ -131,6 +133,12 @@ def handle(name, cfg, cloud, log, _args):
             seed_path,
         )
         util.append_file(seed_path, seed_data)
+    return seed_path
+
+
+def handle(name, cfg, cloud, log, _args):
+    mycfg = cfg.get("random_seed", {})
+    seed_path = write_seed_data(name, mycfg, cloud.datasource.metadata, log)
 
     command = mycfg.get("command", None)
     req = mycfg.get("command_required", False)
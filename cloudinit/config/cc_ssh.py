@@ -109,6 +109,13 @@ using the ``ssh_genkeytypes`` config flag, which accepts a list of host key
 types to use. For each host key type for which this module has been instructed
 to create a keypair, if a key of the same type is already present on the
 system (i.e. if ``ssh_deletekeys`` was false), no key will be generated.
+Keys of all types are generated concurrently, and the time taken for each
+type is reported in a ``ssh-keygen-<key type>`` reporting event.
+
+Setting ``ssh_seed_random`` to true first adds the entropy configured for the
+``seed_random`` module (the ``random_seed`` config key and any ``random_seed``
+provided by the datasource) to the seed file, so freshly booted instances
+with little entropy do not stall ``ssh-keygen``. This defaults to false.
 
 Supported host key types for the ``ssh_keys`` and the ``ssh_genkeytypes``
 config flags are:
@@ -156,14 +163,19 @@ config flags are:
         enabled: <true/false> (Defaults to true)
         blacklist: <list of key types> (Defaults to [dsa])
     ssh_quiet_keygen: <true/false>
+    ssh_seed_random: <true/false>
 """
 
 import glob
 import os
 import sys
+import time
+from concurrent import futures
 
 from cloudinit import ssh_util, subp, util
+from cloudinit.config import cc_seed_random
 from cloudinit.distros import ug_util
+from cloudinit.reporting import events
 
 GENERATE_KEY_NAMES = ["rsa", "dsa", "ecdsa", "ed25519"]
 KEY_FILE_TPL = "/etc/ssh/ssh_host_%s_key"
@@ -187,6 +199,79 @@ for k in GENERATE_KEY_NAMES:
 KEY_GEN_TPL = 'o=$(ssh-keygen -yf "%s") && echo "$o" root@localhost > "%s"'
 
 
+def _generate_host_key(keytype, env, reporter):
+    """Run ssh-keygen for a single key type.
+
+    @return: ssh-keygen's output, or None for key types it does not know.
+    """
+    keyfile = KEY_FILE_TPL % (keytype)
+    cmd = ["ssh-keygen", "-t", keytype, "-N", "", "-f", keyfile]
+    with events.ReportEventStack(
+        name="ssh-keygen-%s" % keytype,
+        description="generating %s host key" % keytype,
+        parent=reporter,
+    ) as myrep:
+        start = time.time()
+        # TODO(harlowja): Is this guard needed?
+        with util.SeLinuxGuard("/etc/ssh", recursive=True):
+            try:
+                out, _err = subp.subp(cmd, capture=True, env=env)
+            except subp.ProcessExecutionError as e:
+                err = util.decode_binary(e.stderr).lower()
+                if e.exit_code == 1 and err.startswith("unknown key"):
+                    myrep.result = events.status.WARN
+                    myrep.message = "unknown key type %s" % keytype
+                    return None
+                raise
+            gid = util.get_group_id("ssh_keys")
+            if gid != -1:
+                # perform same "sanitize permissions" as sshd-keygen
+                os.chown(keyfile, -1, gid)
+                os.chmod(keyfile, 0o640)
+                os.chmod(keyfile + ".pub", 0o644)
+        myrep.message = "generated %s host key in %.3f seconds" % (
+            keytype,
+            time.time() - start,
+        )
+    return out
+
+
+def generate_host_keys(keytypes, log, quiet=False, reporter=None):
+    """Generate missing host keys of each type in keytypes concurrently.
+
+    Output and errors are reported per key type, in the order given.
+    """
+    lang_c = os.environ.copy()
+    lang_c["LANG"] = "C"
+    keytypes = [k for k in keytypes if not os.path.exists(KEY_FILE_TPL % k)]
+    if not keytypes:
+        return
+    util.ensure_dir(os.path.dirname(KEY_FILE_TPL))
+    with futures.ThreadPoolExecutor(max_workers=len(keytypes)) as executor:
+        results = [
+            (
+                keytype,
+                executor.submit(_generate_host_key, keytype, lang_c, reporter),
+            )
+            for keytype in keytypes
+        ]
+        for keytype, future in results:
+            try:
+                out = future.result()
+            except subp.ProcessExecutionError:
+                util.logexc(
+                    log,
+                    "Failed generating key type %s to file %s",
+                    keytype,
+                    KEY_FILE_TPL % keytype,
+                )
+                continue
+            if out is None:
+                log.debug("ssh-keygen: unknown key type '%s'", keytype)
+            elif not quiet:
+                sys.stdout.write(util.decode_binary(out))
+
+
 def handle(_name, cfg, cloud, log, _args):
 
     # remove the static keys from the pristine image
@@ -234,43 +319,19 @@ def handle(_name, cfg, cloud, log, _args):
         genkeys = util.get_cfg_option_list(
             cfg, "ssh_genkeytypes", GENERATE_KEY_NAMES
         )
-        lang_c = os.environ.copy()
-        lang_c["LANG"] = "C"
-        for keytype in genkeys:
-            keyfile = KEY_FILE_TPL % (keytype)
-            if os.path.exists(keyfile):
-                continue
-            util.ensure_dir(os.path.dirname(keyfile))
-            cmd = ["ssh-keygen", "-t", keytype, "-N", "", "-f", keyfile]
-
-            # TODO(harlowja): Is this guard needed?
-            with util.SeLinuxGuard("/etc/ssh", recursive=True):
-                try:
-                    out, err = subp.subp(cmd, capture=True, env=lang_c)
-                    if not util.get_cfg_option_bool(
-                        cfg, "ssh_quiet_keygen", False
-                    ):
-                        sys.stdout.write(util.decode_binary(out))
-
-                    gid = util.get_group_id("ssh_keys")
-                    if gid != -1:
-                        # perform same "sanitize permissions" as sshd-keygen
-                        os.chown(keyfile, -1, gid)
-                        os.chmod(keyfile, 0o640)
-                        os.chmod(keyfile + ".pub", 0o644)
-                except subp.ProcessExecutionError as e:
-                    err = util.decode_binary(e.stderr).lower()
-                    if e.exit_code == 1 and err.lower().startswith(
-                        "unknown key"
-                    ):
-                        log.debug("ssh-keygen: unknown key type '%s'", keytype)
-                    else:
-                        util.logexc(
-                            log,
-                            "Failed generating key type %s to file %s",
-                            keytype,
-                            keyfile,
-                        )
+        if util.get_cfg_option_bool(cfg, "ssh_seed_random", False):
+            cc_seed_random.write_seed_data(
+                _name,
+                cfg.get("random_seed", {}),
+                cloud.datasource.metadata,
+                log,
+            )
+        generate_host_keys(
+            genkeys,
+            log,
+            quiet=util.get_cfg_option_bool(cfg, "ssh_quiet_keygen", False),
+            reporter=cloud.reporter,
+        )
 
     if "ssh_publish_hostkeys" in cfg:
         host_key_blacklist = util.get_cfg_option_list(
@@ -29,9 +29,12 @@ import base64
 import hashlib
 
 from cloudinit import ssh_util, util
+from cloudinit.config import RESOURCE_USERS
 from cloudinit.distros import ug_util
 from cloudinit.simpletable import SimpleTable
 
+reads = [RESOURCE_USERS, "/etc/ssh"]
+
 
 def _split_hash(bin_hash):
     split_up = []
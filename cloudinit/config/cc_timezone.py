@@ -30,6 +30,7 @@ from cloudinit import util
 from cloudinit.settings import PER_INSTANCE
 
 frequency = PER_INSTANCE
+writes = ["/etc/localtime", "/etc/sysconfig/clock", "/etc/timezone"]
 
 
 def handle(name, cfg, cloud, log, args):
@@ -144,36 +144,42 @@ def handle(name, cfg, cloud, _log, _args):
     (users, groups) = ug_util.normalize_users_groups(cfg, cloud.distro)
     (default_user, _user_config) = ug_util.extract_default(users)
     cloud_keys = cloud.get_public_ssh_keys() or []
-    for (name, members) in groups.items():
-        cloud.distro.create_group(name, members)
-    for (user, config) in users.items():
-        ssh_redirect_user = config.pop("ssh_redirect_user", False)
-        if ssh_redirect_user:
-            if "ssh_authorized_keys" in config or "ssh_import_id" in config:
-                raise ValueError(
-                    "Not creating user %s. ssh_redirect_user cannot be"
-                    " provided with ssh_import_id or ssh_authorized_keys"
-                    % user
-                )
-            if ssh_redirect_user not in (True, "default"):
-                raise ValueError(
-                    "Not creating user %s. Invalid value of"
-                    " ssh_redirect_user: %s. Expected values: true, default"
-                    " or false." % (user, ssh_redirect_user)
-                )
-            if default_user is None:
-                LOG.warning(
-                    "Ignoring ssh_redirect_user: %s for %s."
-                    " No default_user defined."
-                    " Perhaps missing cloud configuration users: "
-                    " [default, ..].",
-                    ssh_redirect_user,
-                    user,
-                )
-            else:
-                config["ssh_redirect_user"] = default_user
-                config["cloud_public_ssh_keys"] = cloud_keys
-        cloud.distro.create_user(user, **config)
+    # Apply passwords, locks and group memberships in as few tool calls as
+    # possible once all users and groups exist.
+    with cloud.distro.batch_user_changes():
+        for (name, members) in groups.items():
+            cloud.distro.create_group(name, members)
+        for (user, config) in users.items():
+            ssh_redirect_user = config.pop("ssh_redirect_user", False)
+            if ssh_redirect_user:
+                if (
+                    "ssh_authorized_keys" in config
+                    or "ssh_import_id" in config
+                ):
+                    raise ValueError(
+                        "Not creating user %s. ssh_redirect_user cannot be"
+                        " provided with ssh_import_id or ssh_authorized_keys"
+                        % user
+                    )
+                if ssh_redirect_user not in (True, "default"):
+                    raise ValueError(
+                        "Not creating user %s. Invalid value of"
+                        " ssh_redirect_user: %s. Expected values: true,"
+                        " default or false." % (user, ssh_redirect_user)
+                    )
+                if default_user is None:
+                    LOG.warning(
+                        "Ignoring ssh_redirect_user: %s for %s."
+                        " No default_user defined."
+                        " Perhaps missing cloud configuration users: "
+                        " [default, ..].",
+                        ssh_redirect_user,
+                        user,
+                    )
+                else:
+                    config["ssh_redirect_user"] = default_user
+                    config["cloud_public_ssh_keys"] = cloud_keys
+            cloud.distro.create_user(user, **config)
 
 
 # vi: ts=4 expandtab
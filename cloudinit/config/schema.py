@@ -2,6 +2,9 @@
 """schema.py: Set of module functions for processing cloud-config schema."""
 
 import argparse
+import functools
+import hashlib
+import json
 import logging
 import os
 import re
@@ -12,7 +15,7 @@ from functools import partial
 
 import yaml
 
-from cloudinit import importer
+from cloudinit import atomic_helper, importer, safeyaml, version
 from cloudinit.cmd.devel import read_cfg_paths
 from cloudinit.importer import MetaSchema
 from cloudinit.util import error, find_modules, load_file
@@ -46,6 +49,9 @@ SCHEMA_LIST_ITEM_TMPL = (
 SCHEMA_EXAMPLES_HEADER = "\n**Examples**::\n\n"
 SCHEMA_EXAMPLES_SPACER_TEMPLATE = "\n    # --- Example{0} ---"
 
+# The schema coalesced by get_schema, keyed on the cc_* modules it came from
+SCHEMA_CACHE_FILE = "/run/cloud-init/cloud-config-schema.json"
+
 
 class SchemaValidationError(ValueError):
     """Raised when validating a cloud-config file against a schema."""
@@ -84,12 +90,20 @@ def is_schema_byte_string(checker, instance):
 def get_jsonschema_validator():
     """Get metaschema validator and format checker
 
-    Older versions of jsonschema require some compatibility changes.
+    Older versions of jsonschema require some compatibility changes. The
+    validator class is only created once per process.
 
     @returns: Tuple: (jsonschema.Validator, FormatChecker)
     @raises: ImportError when jsonschema is not present
     """
-    from jsonschema import Draft4Validator, FormatChecker
+    from jsonschema import FormatChecker
+
+    return (_create_validator(), FormatChecker)
+
+
+@functools.lru_cache(maxsize=None)
+def _create_validator():
+    from jsonschema import Draft4Validator
     from jsonschema.validators import create
 
     # Allow for bytes to be presented as an acceptable valid value for string
@@ -129,7 +143,7 @@ def get_jsonschema_validator():
             version="draft4",
             default_types=types,
         )
-    return (cloudinitValidator, FormatChecker)
+    return cloudinitValidator
 
 
 def validate_cloudconfig_metaschema(validator, schema: dict, throw=True):
@@ -297,7 +311,7 @@ def validate_cloudconfig_file(config_path, schema, annotate=False):
             print(annotated_cloudconfig_file({}, content, error.schema_errors))
         raise error
     try:
-        cloudconfig = yaml.safe_load(content)
+        cloudconfig = safeyaml.load(content)
     except (yaml.YAMLError) as e:
         line = column = 1
         mark = None
@@ -590,21 +604,69 @@ def load_doc(requested_modules: list) -> str:
     return docs
 
 
+def _get_schema_key(modules: dict) -> str:
+    """Return a key changing with cloud-init's version or its cc_* modules."""
+    files = []
+    for mod_path in sorted(modules):
+        try:
+            st = os.stat(mod_path)
+        except OSError:
+            continue
+        files.append([mod_path, st.st_mtime_ns, st.st_size, st.st_ino])
+    key = json.dumps([version.version_string(), files])
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def _load_cached_schema(key: str):
+    try:
+        with open(SCHEMA_CACHE_FILE) as stream:
+            cached = json.load(stream)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(cached, dict) or cached.get("key") != key:
+        return None
+    return cached.get("schema")
+
+
+def _store_cached_schema(key: str, schema: dict):
+    if not os.access(os.path.dirname(SCHEMA_CACHE_FILE), os.W_OK):
+        return
+    try:
+        if json.loads(json.dumps(schema)) != schema:
+            return
+        atomic_helper.write_json(
+            SCHEMA_CACHE_FILE, {"key": key, "schema": schema}
+        )
+    except (OSError, TypeError, ValueError) as e:
+        LOG.debug("Failed to cache schema in %s: %s", SCHEMA_CACHE_FILE, e)
+
+
 def get_schema() -> dict:
-    """Return jsonschema coalesced from all cc_* cloud-config module."""
+    """Return jsonschema coalesced from all cc_* cloud-config module.
+
+    The coalesced schema is cached in SCHEMA_CACHE_FILE until cloud-init's
+    version or any cc_* module changes, sparing the import of every module.
+    """
+    modules = get_modules()
+    key = _get_schema_key(modules)
+    full_schema = _load_cached_schema(key)
+    if full_schema is not None:
+        return full_schema
+
     full_schema = {
         "$schema": "http://json-schema.org/draft-04/schema#",
         "id": "cloud-config-schema",
         "allOf": [],
     }
 
-    for (_, mod_name) in get_modules().items():
+    for (_, mod_name) in modules.items():
         (mod_locs, _) = importer.find_module(
             mod_name, ["cloudinit.config"], ["schema"]
         )
         if mod_locs:
             mod = importer.import_module(mod_locs[0])
             full_schema["allOf"].append(mod.schema)
+    _store_cached_schema(key, full_schema)
     return full_schema
 
 
@@ -631,7 +693,11 @@ def get_parser(parser=None):
     parser.add_argument(
         "-c",
         "--config-file",
-        help="Path of the cloud-config yaml file to validate",
+        nargs="+",
+        help=(
+            "Path of the cloud-config yaml file to validate. Many files may"
+            " be given to validate them all in one run."
+        ),
     )
     parser.add_argument(
         "--system",
@@ -657,6 +723,36 @@ def get_parser(parser=None):
     return parser
 
 
+def validate_cloudconfig_files(config_paths, schema, annotate=False):
+    """Validate each cloud-config file, reporting which ones are valid.
+
+    Errors are printed to stderr, prefixed by the file's path when many files
+    are validated. Annotated schema errors don't count as errors.
+
+    @param config_paths: List of paths as for validate_cloudconfig_file.
+    @returns: The number of files failing validation.
+    """
+    invalid = 0
+    for config_path in config_paths:
+        try:
+            validate_cloudconfig_file(config_path, schema, annotate)
+        except (SchemaValidationError, RuntimeError) as e:
+            if annotate and isinstance(e, SchemaValidationError):
+                continue
+            invalid += 1
+            if len(config_paths) > 1:
+                error("{0}: {1}".format(config_path, e), sys_exit=False)
+            else:
+                error(str(e), sys_exit=False)
+        else:
+            if config_path is None:
+                cfg_name = "system userdata"
+            else:
+                cfg_name = config_path
+            print("Valid cloud-config:", cfg_name)
+    return invalid
+
+
 def handle_schema_args(name, args):
     """Handle provided schema args and perform the appropriate actions."""
     exclusive_args = [args.config_file, args.docs, args.system]
@@ -664,21 +760,12 @@ def handle_schema_args(name, args):
         error("Expected one of --config-file, --system or --docs arguments")
     full_schema = get_schema()
     if args.config_file or args.system:
-        try:
-            validate_cloudconfig_file(
-                args.config_file, full_schema, args.annotate
-            )
-        except SchemaValidationError as e:
-            if not args.annotate:
-                error(str(e))
-        except RuntimeError as e:
-            error(str(e))
-        else:
-            if args.config_file is None:
-                cfg_name = "system userdata"
-            else:
-                cfg_name = args.config_file
-            print("Valid cloud-config:", cfg_name)
+        invalid = validate_cloudconfig_files(
+            args.config_file or [None], full_schema, args.annotate
+        )
+        if invalid:
+            # as error() here does for a single file
+            sys.exit(1)
     elif args.docs:
         print(load_doc(args.docs))
 
@@ -5,9 +5,10 @@
 import argparse
 import os
 
-from cloudinit import atomic_helper
+from cloudinit import atomic_helper, importer
 from cloudinit import log as logging
-from cloudinit import stages
+
+stages = importer.lazy_import("cloudinit.stages")
 
 LOG = logging.getLogger(__name__)
 
@@ -10,21 +10,34 @@
 # This file is part of cloud-init. See LICENSE file for license information.
 
 import abc
+import contextlib
+import functools
+import grp
+import hashlib
+import json
 import os
 import re
-import stat
 import string
 import urllib.parse
 from io import StringIO
 from typing import Any, Mapping  # noqa: F401
 
-from cloudinit import importer
+from cloudinit import atomic_helper, importer
 from cloudinit import log as logging
-from cloudinit import net, persistence, ssh_util, subp, type_utils, util
+from cloudinit import (
+    net,
+    persistence,
+    ssh_util,
+    subp,
+    type_utils,
+    util,
+    version,
+)
 from cloudinit.distros.parsers import hosts
 from cloudinit.features import ALLOW_EC2_MIRRORS_ON_NON_AWS_INSTANCE_TYPES
 from cloudinit.net import activators, eni, network_state, renderers
 from cloudinit.net.network_state import parse_net_config_data
+from cloudinit.util import uses_systemd
 
 from .networking import LinuxNetworking
 
@@ -67,6 +80,9 @@ PREFERRED_NTP_CLIENTS = ["chrony", "systemd-timesyncd", "ntp", "ntpdate"]
 # Letters/Digits/Hyphen characters, for use in domain name validation
 LDH_ASCII_CHARS = string.ascii_letters + string.digits + "-"
 
+# Digest of the last network config rendered, kept in the cloud data dir
+NETWORK_RENDER_FILE = "network-render.json"
+
 
 class Distro(persistence.CloudInitPickleMixin, metaclass=abc.ABCMeta):
 
@@ -86,6 +102,8 @@ class Distro(persistence.CloudInitPickleMixin, metaclass=abc.ABCMeta):
     _ci_pkl_version = 1
     prefer_fqdn = False
     resolve_conf_fn = "/etc/resolv.conf"
+    # Changes queued by batch_user_changes(), None outside of a batch
+    _user_batch = None
 
     def __init__(self, name, cfg, paths):
         self._paths = paths
@@ -125,8 +143,70 @@ class Distro(persistence.CloudInitPickleMixin, metaclass=abc.ABCMeta):
         LOG.debug(
             "Selected renderer '%s' from priority list: %s", name, priority
         )
-        renderer = render_cls(config=self.renderer_configs.get(name))
+        renderer_cfg = self.renderer_configs.get(name)
+        digest = self._network_render_digest(name, renderer_cfg, network_state)
+        render_file = self._network_render_file()
+        if render_file and self._network_render_unchanged(render_file, digest):
+            LOG.debug(
+                "Network config and '%s' output are unchanged, not rendering",
+                name,
+            )
+            return
+        renderer = render_cls(config=renderer_cfg)
         renderer.render_network_state(network_state)
+        if render_file and renderer.rendered_files:
+            self._store_network_render(
+                render_file, digest, renderer.rendered_files
+            )
+
+    def _network_render_file(self):
+        """Return the path of the network render digest, None if unknown."""
+        try:
+            return os.path.join(
+                self._paths.get_cpath("data"), NETWORK_RENDER_FILE
+            )
+        except (AttributeError, TypeError):
+            return None
+
+    @staticmethod
+    def _network_render_digest(name, renderer_cfg, network_state):
+        blob = json.dumps(
+            [name, renderer_cfg, version.version_string()],
+            sort_keys=True,
+            default=repr,
+        )
+        return hashlib.sha256(
+            (blob + network_state.digest()).encode("utf-8")
+        ).hexdigest()
+
+    @staticmethod
+    def _network_render_unchanged(render_file, digest):
+        """Whether digest was rendered last and its files are untouched."""
+        try:
+            record = json.loads(util.load_file(render_file))
+        except (OSError, ValueError):
+            return False
+        if not isinstance(record, dict) or record.get("digest") != digest:
+            return False
+        files = record.get("files")
+        if not files or not isinstance(files, dict):
+            return False
+        for path, sha in files.items():
+            try:
+                content = util.load_file(path, decode=False)
+            except OSError:
+                return False
+            if hashlib.sha256(content).hexdigest() != sha:
+                return False
+        return True
+
+    @staticmethod
+    def _store_network_render(render_file, digest, files):
+        if not os.access(os.path.dirname(render_file), os.W_OK):
+            return
+        atomic_helper.write_json(
+            render_file, {"digest": digest, "files": files}
+        )
 
     def _find_tz_file(self, tz):
         tz_file = os.path.join(self.tz_zone_dir, str(tz))
@@ -677,6 +757,9 @@ class Distro(persistence.CloudInitPickleMixin, metaclass=abc.ABCMeta):
         """
         Lock the password of a user, i.e., disable password logins
         """
+        if self._user_batch is not None:
+            self._user_batch["lock"].append(name)
+            return
         # passwd must use short '-l' due to SLES11 lacking long form '--lock'
         lock_tools = (["passwd", "-l", name], ["usermod", "--lock", name])
         try:
@@ -700,7 +783,18 @@ class Distro(persistence.CloudInitPickleMixin, metaclass=abc.ABCMeta):
             raise e
 
     def set_passwd(self, user, passwd, hashed=False):
-        pass_string = "%s:%s" % (user, passwd)
+        if self._user_batch is not None:
+            key = "hashed_passwd" if hashed else "passwd"
+            self._user_batch[key].append((user, passwd))
+            return True
+        return self._chpasswd([(user, passwd)], hashed=hashed)
+
+    def _chpasswd(self, user_passwds, hashed=False):
+        """Set the passwords of all (user, passwd) pairs with one chpasswd."""
+        users = [user for (user, _passwd) in user_passwds]
+        pass_string = "".join(
+            "%s:%s\n" % (user, passwd) for (user, passwd) in user_passwds
+        )
         cmd = ["chpasswd"]
 
         if hashed:
@@ -710,13 +804,80 @@ class Distro(persistence.CloudInitPickleMixin, metaclass=abc.ABCMeta):
             cmd.append("-e")
 
         try:
-            subp.subp(cmd, pass_string, logstring="chpasswd for %s" % user)
+            subp.subp(
+                cmd,
+                pass_string,
+                logstring="chpasswd for %s" % ", ".join(users),
+            )
         except Exception as e:
-            util.logexc(LOG, "Failed to set password for %s", user)
+            util.logexc(LOG, "Failed to set password for %s", ", ".join(users))
             raise e
 
         return True
 
+    @contextlib.contextmanager
+    def batch_user_changes(self):
+        """Queue password, lock and group membership changes.
+
+        Within this context create_user and create_group still create users
+        and groups immediately, but the changes which follow are applied on
+        exit with as few tool invocations as possible: one chpasswd per
+        password kind and one membership update per group. Group members
+        created within the batch are therefore found too.
+        """
+        if self._user_batch is not None:
+            # Already batching, the outermost context applies the changes
+            yield
+            return
+        batch = {"passwd": [], "hashed_passwd": [], "lock": [], "members": {}}
+        self._user_batch = batch
+        body_failed = True
+        try:
+            yield
+            body_failed = False
+        finally:
+            self._user_batch = None
+            try:
+                self._apply_user_batch(batch)
+            except Exception:
+                if not body_failed:
+                    raise
+                # Leave the exception raised within the context to propagate
+                util.logexc(LOG, "Failed to apply batched user changes")
+
+    def _apply_user_batch(self, batch):
+        """Apply every queued change, then raise the first failure if any.
+
+        chpasswd sets the passwords it can even when it fails for others, so
+        a failure must not leave the accounts which follow unlocked or out of
+        their groups.
+        """
+        steps = []
+        if batch["passwd"]:
+            steps.append(functools.partial(self._chpasswd, batch["passwd"]))
+        if batch["hashed_passwd"]:
+            steps.append(
+                functools.partial(
+                    self._chpasswd, batch["hashed_passwd"], hashed=True
+                )
+            )
+        # Locking has no multi-user form, but must follow any password change
+        for name in batch["lock"]:
+            steps.append(functools.partial(self.lock_passwd, name))
+        for (name, members) in batch["members"].items():
+            steps.append(
+                functools.partial(self._add_group_members, name, members)
+            )
+        error = None
+        for step in steps:
+            try:
+                step()
+            except Exception as e:
+                if error is None:
+                    error = e
+        if error is not None:
+            raise error
+
     def ensure_sudo_dir(self, path, sudo_base="/etc/sudoers"):
         # Ensure the dir is included and that
         # it actually exists as a directory
@@ -807,8 +968,6 @@ class Distro(persistence.CloudInitPickleMixin, metaclass=abc.ABCMeta):
         group_add_cmd = ["groupadd", name]
         if util.system_is_snappy():
             group_add_cmd.append("--extrausers")
-        if not members:
-            members = []
 
         # Check if group exists, and then add it doesn't
         if util.is_group(name):
@@ -820,20 +979,55 @@ class Distro(persistence.CloudInitPickleMixin, metaclass=abc.ABCMeta):
             except Exception:
                 util.logexc(LOG, "Failed to create group %s", name)
 
-        # Add members to the group, if so defined
-        if len(members) > 0:
+        if not members:
+            return
+        if self._user_batch is not None:
+            queued = self._user_batch["members"].setdefault(name, [])
             for member in members:
-                if not util.is_user(member):
-                    LOG.warning(
-                        "Unable to add group member '%s' to group '%s'"
-                        "; user does not exist.",
-                        member,
-                        name,
-                    )
-                    continue
+                if member not in queued:
+                    queued.append(member)
+        else:
+            self._add_group_members(name, members)
+
+    def _add_group_members(self, name, members):
+        """Add existing users in members to group name.
+
+        gpasswd sets the whole member list in one call, so the members are
+        merged with the current ones. usermod is used one member at a time
+        where gpasswd is unavailable or users live in extrausers.
+        """
+        valid = []
+        for member in members:
+            if not util.is_user(member):
+                LOG.warning(
+                    "Unable to add group member '%s' to group '%s'"
+                    "; user does not exist.",
+                    member,
+                    name,
+                )
+                continue
+            valid.append(member)
+        if not valid:
+            return
 
+        if util.system_is_snappy() or not subp.which("gpasswd"):
+            for member in valid:
                 subp.subp(["usermod", "-a", "-G", name, member])
                 LOG.info("Added user '%s' to group '%s'", member, name)
+            return
+
+        try:
+            current = list(grp.getgrnam(name).gr_mem)
+        except KeyError:
+            LOG.warning(
+                "Unable to add members to group '%s'; group does not exist.",
+                name,
+            )
+            return
+        added = [member for member in valid if member not in current]
+        if added:
+            subp.subp(["gpasswd", "-M", ",".join(current + added), name])
+            LOG.info("Added users '%s' to group '%s'", ",".join(added), name)
 
     def shutdown_command(self, *, mode, delay, message):
         # called from cc_power_state_change.load_power_state
@@ -1076,12 +1270,4 @@ def set_etc_timezone(
     return
 
 
-def uses_systemd():
-    try:
-        res = os.lstat("/run/systemd/system")
-        return stat.S_ISDIR(res.st_mode)
-    except Exception:
-        return False
-
-
 # vi: ts=4 expandtab
@@ -2,6 +2,7 @@
 import os
 from collections import namedtuple
 
+from cloudinit import facts
 from cloudinit import log as logging
 from cloudinit import subp
 from cloudinit.util import is_container, is_FreeBSD
@@ -134,9 +135,13 @@ def read_dmi_data(key):
         2) Use `key` as a sysfs key directly and look in /sys/class/dmi/...
         3) Fall-back to passing `key` to `dmidecode --string`.
 
-    If all of the above fail to find a value, None will be returned.
+    If all of the above fail to find a value, None will be returned. Values
+    are platform facts, so each key is only looked up once per boot.
     """
+    return facts.get("dmi:%s" % key, lambda: _read_dmi_data(key))
 
+
+def _read_dmi_data(key):
     if is_container():
         return None
 
@@ -151,7 +156,7 @@ def read_dmi_data(key):
         return arch == "x86_64" or (arch[0] == "i" and arch[2:] == "86")
 
     # running dmidecode can be problematic on some arches (LP: #1243287)
-    uname_arch = os.uname()[4]
+    uname_arch = facts.get("arch", lambda: os.uname()[4])
     if not (is_x86(uname_arch) or uname_arch in ("aarch64", "amd64")):
         LOG.debug("dmidata is not supported on %s", uname_arch)
         return None
@@ -8,6 +8,9 @@
 
 import functools
 import json
+import threading
+import time
+from concurrent import futures
 
 from cloudinit import log as logging
 from cloudinit import url_helper, util
@@ -52,7 +55,9 @@ class MetadataLeafDecoder(object):
 # See: http://docs.aws.amazon.com/AWSEC2/latest/UserGuide/
 #         ec2-instance-metadata.html
 class MetadataMaterializer(object):
-    def __init__(self, blob, base_url, caller, leaf_decoder=None):
+    def __init__(
+        self, blob, base_url, caller, leaf_decoder=None, max_workers=1
+    ):
         self._blob = blob
         self._md = None
         self._base_url = base_url
@@ -61,6 +66,11 @@ class MetadataMaterializer(object):
             self._leaf_decoder = MetadataLeafDecoder()
         else:
             self._leaf_decoder = leaf_decoder
+        self._max_workers = max(1, max_workers or 1)
+        self._stats_lock = threading.Lock()
+        self.request_count = 0
+        self.request_seconds = 0.0
+        self.request_max_seconds = 0.0
 
     def _parse(self, blob):
         leaves = {}
@@ -108,9 +118,45 @@ class MetadataMaterializer(object):
     def materialize(self):
         if self._md is not None:
             return self._md
-        self._md = self._materialize(self._blob, self._base_url)
+        if self._max_workers > 1:
+            self._md = self._materialize_concurrently(
+                self._blob, self._base_url
+            )
+        else:
+            self._md = self._materialize(self._blob, self._base_url)
         return self._md
 
+    def summary(self):
+        """Return a one-line summary of the requests made by materialize."""
+        avg = 0.0
+        if self.request_count:
+            avg = self.request_seconds / self.request_count
+        return (
+            "%d requests with %d workers from %s in %.3fs (avg %.3fs, max"
+            " %.3fs)"
+            % (
+                self.request_count,
+                self._max_workers,
+                self._base_url,
+                self.request_seconds,
+                avg,
+                self.request_max_seconds,
+            )
+        )
+
+    def _timed_caller(self, url):
+        start = time.monotonic()
+        try:
+            return self._caller(url)
+        finally:
+            elapsed = time.monotonic() - start
+            with self._stats_lock:
+                self.request_count += 1
+                self.request_seconds += elapsed
+                self.request_max_seconds = max(
+                    self.request_max_seconds, elapsed
+                )
+
     def _materialize(self, blob, base_url):
         (leaves, children) = self._parse(blob)
         child_contents = {}
@@ -118,12 +164,12 @@ class MetadataMaterializer(object):
             child_url = url_helper.combine_url(base_url, c)
             if not child_url.endswith("/"):
                 child_url += "/"
-            child_blob = self._caller(child_url)
+            child_blob = self._timed_caller(child_url)
             child_contents[c] = self._materialize(child_blob, child_url)
         leaf_contents = {}
         for (field, resource) in leaves.items():
             leaf_url = url_helper.combine_url(base_url, resource)
-            leaf_blob = self._caller(leaf_url)
+            leaf_blob = self._timed_caller(leaf_url)
             leaf_contents[field] = self._leaf_decoder(field, leaf_blob)
         joined = {}
         joined.update(child_contents)
@@ -134,6 +180,48 @@ class MetadataMaterializer(object):
                 joined[field] = leaf_contents[field]
         return joined
 
+    def _materialize_concurrently(self, blob, base_url):
+        """Materialize the tree one depth at a time on a bounded pool.
+
+        All child directories and leaves found at one depth are fetched
+        together, producing the same result as _materialize.
+        """
+        md = {}
+        level = [(md, blob, base_url)]
+        with futures.ThreadPoolExecutor(self._max_workers) as executor:
+            while level:
+                fetches = []
+                for (joined, level_blob, level_url) in level:
+                    (leaves, children) = self._parse(level_blob)
+                    # Children are listed before leaves so that duplicate
+                    # keys are resolved as they are by _materialize
+                    for c in children:
+                        child_url = url_helper.combine_url(level_url, c)
+                        if not child_url.endswith("/"):
+                            child_url += "/"
+                        fetches.append((joined, level_url, c, child_url, True))
+                    for (field, resource) in leaves.items():
+                        leaf_url = url_helper.combine_url(level_url, resource)
+                        fetches.append(
+                            (joined, level_url, field, leaf_url, False)
+                        )
+                blobs = executor.map(
+                    self._timed_caller, [fetch[3] for fetch in fetches]
+                )
+                level = []
+                for fetch, fetched_blob in zip(fetches, blobs):
+                    (joined, level_url, field, url, is_child) = fetch
+                    if is_child:
+                        joined[field] = {}
+                        level.append((joined[field], fetched_blob, url))
+                    elif field in joined:
+                        LOG.warning(
+                            "Duplicate key found in results from %s", level_url
+                        )
+                    else:
+                        joined[field] = self._leaf_decoder(field, fetched_blob)
+        return md
+
 
 def skip_retry_on_codes(status_codes, _request_args, cause):
     """Returns False if cause.code is in status_codes."""
@@ -190,6 +278,7 @@ def _get_instance_metadata(
     headers_cb=None,
     headers_redact=None,
     exception_cb=None,
+    max_workers=1,
 ):
     md_url = url_helper.combine_url(metadata_address, api_version, tree)
     caller = functools.partial(
@@ -208,9 +297,14 @@ def _get_instance_metadata(
     try:
         response = caller(md_url)
         materializer = MetadataMaterializer(
-            response.contents, md_url, mcaller, leaf_decoder=leaf_decoder
+            response.contents,
+            md_url,
+            mcaller,
+            leaf_decoder=leaf_decoder,
+            max_workers=max_workers,
         )
         md = materializer.materialize()
+        LOG.debug("Crawled %s: %s", tree, materializer.summary())
         if not isinstance(md, (dict)):
             md = {}
         return md
@@ -229,6 +323,7 @@ def get_instance_metadata(
     headers_cb=None,
     headers_redact=None,
     exception_cb=None,
+    max_workers=1,
 ):
     # Note, 'meta-data' explicitly has trailing /.
     # this is required for CloudStack (LP: #1356855)
@@ -243,6 +338,7 @@ def get_instance_metadata(
         headers_redact=headers_redact,
         headers_cb=headers_cb,
         exception_cb=exception_cb,
+        max_workers=max_workers,
     )
 
 
@@ -256,6 +352,7 @@ def get_instance_identity(
     headers_cb=None,
     headers_redact=None,
     exception_cb=None,
+    max_workers=1,
 ):
     return _get_instance_metadata(
         tree="dynamic/instance-identity",
@@ -268,6 +365,7 @@ def get_instance_identity(
         headers_redact=headers_redact,
         headers_cb=headers_cb,
         exception_cb=exception_cb,
+        max_workers=max_workers,
     )
 
 
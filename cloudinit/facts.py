@@ -0,0 +1,94 @@
+# This file is part of cloud-init. See LICENSE file for license information.
+"""Boot-scoped cache of platform facts.
+
+DMI values, virtualization type, container status, kernel command line and
+architecture cannot change while the system is up, yet datasource detection
+and config modules look them up many times in every stage. Each fact is
+computed at most once per boot: it is then served from memory and persisted
+to FACTS_FILE so that later stages and tools reuse it.
+
+The persisted facts are tagged with the kernel's boot id and ignored once it
+changes. Call invalidate() when the platform may have changed underneath us,
+such as on hotplug or ``cloud-init clean``.
+"""
+
+import json
+import os
+import threading
+
+from cloudinit import atomic_helper
+from cloudinit import log as logging
+
+LOG = logging.getLogger(__name__)
+
+FACTS_FILE = "/run/cloud-init/platform-facts.json"
+BOOT_ID_FILE = "/proc/sys/kernel/random/boot_id"
+
+# Facts include DMI serial numbers and uuids which are only readable by root
+FACTS_FILE_MODE = 0o600
+
+_lock = threading.RLock()
+_facts = None
+
+
+def _read_boot_id():
+    try:
+        with open(BOOT_ID_FILE) as stream:
+            return stream.read().strip()
+    except OSError:
+        return None
+
+
+def _load():
+    """Return the facts persisted during this boot, if any."""
+    try:
+        with open(FACTS_FILE) as stream:
+            data = json.load(stream)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict) or not isinstance(data.get("facts"), dict):
+        return {}
+    if data.get("boot_id") != _read_boot_id():
+        LOG.debug("Ignoring platform facts from a previous boot")
+        return {}
+    return data["facts"]
+
+
+def _store(facts):
+    facts_dir = os.path.dirname(FACTS_FILE)
+    if not os.access(facts_dir, os.W_OK):
+        return
+    data = {"boot_id": _read_boot_id(), "facts": facts}
+    try:
+        atomic_helper.write_json(FACTS_FILE, data, mode=FACTS_FILE_MODE)
+    except OSError as e:
+        LOG.debug("Failed to persist platform facts: %s", e)
+
+
+def get(name, compute):
+    """Return the fact name, calling compute() if not yet known this boot.
+
+    The value returned by compute must be serializable as json.
+    """
+    global _facts
+    with _lock:
+        if _facts is None:
+            _facts = _load()
+        if name not in _facts:
+            _facts[name] = compute()
+            _store(_facts)
+        return _facts[name]
+
+
+def invalidate():
+    """Forget every fact, both in memory and persisted for this boot."""
+    global _facts
+    with _lock:
+        _facts = None
+        try:
+            os.unlink(FACTS_FILE)
+        except FileNotFoundError:
+            pass
+
+
+# vi: ts=4 expandtab
@@ -49,6 +49,17 @@ mirrors via :py:mod:`apt: <cloudinit.config.cc_apt_configure>`
 directives in cloud-config.
 """
 
+SUBP_FAST_SPAWN = False
+"""
+If ``SUBP_FAST_SPAWN`` is ``True``, ``subp.subp`` runs commands whose output
+it captures through ``posix_spawn`` where python supports it. The command is
+resolved to an absolute path and the file descriptors of cloud-init are not
+closed in the child, both being required by python to avoid ``fork``. This
+avoids copying cloud-init's page tables for each of the many commands run
+during boot, at the cost of children inheriting its open files. It is off by
+default until every command run is known to cope with that.
+"""
+
 try:
     # pylint: disable=wildcard-import
     from cloudinit.feature_overrides import *  # noqa
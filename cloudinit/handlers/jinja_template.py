@@ -1,5 +1,6 @@
 # This file is part of cloud-init. See LICENSE file for license information.
 
+import collections
 import copy
 import os
 import re
@@ -193,4 +194,71 @@ def convert_jinja_instance_data(
     return result
 
 
+def _varname_part(key):
+    """Return the name key is addressed by in a varname, its alias if any."""
+    return get_jinja_variable_alias(key) or key
+
+
+def _join_varname(varname, name):
+    return varname + "." + name if varname else name
+
+
+def _flatten_jinja_variables(jinja_vars, key_path, varname, result):
+    names = collections.Counter(_varname_part(key) for key in jinja_vars)
+    dict_names = set(
+        _varname_part(key)
+        for key, value in jinja_vars.items()
+        if isinstance(value, dict)
+    )
+    for key, value in jinja_vars.items():
+        name = _varname_part(key)
+        path = _join_varname(varname, name)
+        if name not in dict_names:
+            result.setdefault(path, []).append([key_path + [key], value])
+        elif names[name] == 1:
+            _flatten_jinja_variables(value, key_path + [key], path, result)
+        # Otherwise keys sharing their alias with a dict are only resolved by
+        # walking the instance-data
+
+
+def flatten_jinja_instance_data(data):
+    """Return a dict of the leaves of the converted instance-data.
+
+    Leaves are listed under their dot-delimited varname path with every key
+    replaced by its underscore-delimited alias, as a list of the path of
+    keys to each leaf and its value. Only leaves whose keys share an alias
+    share a path. Use get_flattened_jinja_variable to look varnames up.
+    Paths to dicts are not included.
+    """
+    result = {}
+    _flatten_jinja_variables(convert_jinja_instance_data(data), [], "", result)
+    return result
+
+
+def get_flattened_jinja_variable(flattened_vars, varname):
+    """Return the leaf value of varname in flatten_jinja_instance_data.
+
+    Each part of varname may be either a key or its alias, as accepted when
+    walking the instance-data converted with key aliases. A key is preferred
+    over the other keys with it as their alias.
+
+    :raises: KeyError when varname is not the path to a leaf.
+    """
+    parts = varname.split(".")
+    leaves = flattened_vars[".".join(_varname_part(part) for part in parts)]
+    aliased = []
+    for key_path, value in leaves:
+        if not all(
+            part == key or part == get_jinja_variable_alias(key)
+            for part, key in zip(parts, key_path)
+        ):
+            continue
+        if key_path[-1] == parts[-1]:
+            return value
+        aliased.append(value)
+    if not aliased:
+        raise KeyError(varname)
+    return aliased[0]
+
+
 # vi: ts=4 expandtab
@@ -9,17 +9,28 @@
 # This file is part of cloud-init. See LICENSE file for license information.
 
 import contextlib
+import hashlib
+import json
 import os
 from configparser import NoOptionError, NoSectionError, RawConfigParser
 from io import StringIO
 from time import time
 
+from cloudinit import atomic_helper
 from cloudinit import log as logging
-from cloudinit import persistence, type_utils, util
+from cloudinit import persistence, type_utils, util, version
 from cloudinit.settings import CFG_ENV_NAME, PER_ALWAYS, PER_INSTANCE, PER_ONCE
 
 LOG = logging.getLogger(__name__)
 
+# Merged configs cached for the boot by ConfigMerger, see read_config_cache()
+CONFIG_CACHE_FILE = "/run/cloud-init/merged-cfg.json"
+CONFIG_CACHE_VERSION = 1
+# The merged configs hold user-data, which may include secrets
+CONFIG_CACHE_MODE = 0o600
+# Number of merged configs kept, the least recently stored are dropped
+CONFIG_CACHE_ENTRIES = 8
+
 
 class LockFailure(Exception):
     pass
@@ -187,6 +198,17 @@ class Runners(object):
 
 
 class ConfigMerger(object):
+    """Merge the config of cloud-init from all of its sources.
+
+    When given a cache_file, the merged config is cached there keyed on the
+    path, mtime, size and inode of every config file merged and on a hash of
+    the datasource and base configs. Later mergers of unchanged inputs, such
+    as those of the next boot stages, then skip reading and merging them.
+
+    The base config may be a callable only called when not cached, in which
+    case base_cfg_fns must name the files and directories it is read from.
+    """
+
     def __init__(
         self,
         paths=None,
@@ -194,12 +216,16 @@ class ConfigMerger(object):
         additional_fns=None,
         base_cfg=None,
         include_vendor=True,
+        base_cfg_fns=None,
+        cache_file=None,
     ):
         self._paths = paths
         self._ds = datasource
         self._fns = additional_fns
         self._base_cfg = base_cfg
         self._include_vendor = include_vendor
+        self._base_cfg_fns = base_cfg_fns
+        self._cache_file = cache_file
         # Created on first use
         self._cfg = None
 
@@ -223,17 +249,16 @@ class ConfigMerger(object):
         if CFG_ENV_NAME in os.environ:
             e_fn = os.environ[CFG_ENV_NAME]
             try:
-                e_cfgs.append(util.read_conf(e_fn))
+                e_cfgs.append((e_fn, util.read_conf(e_fn)))
             except Exception:
                 util.logexc(LOG, "Failed loading of env. config from %s", e_fn)
         return e_cfgs
 
-    def _get_instance_configs(self):
-        i_cfgs = []
+    def _get_instance_config_files(self):
         # If cloud-config was written, pick it up as
         # a configuration file to use when running...
         if not self._paths:
-            return i_cfgs
+            return []
 
         cc_paths = ["cloud_config"]
         if self._include_vendor:
@@ -243,11 +268,15 @@ class ConfigMerger(object):
             cc_paths.append("vendor2_cloud_config")
             cc_paths.append("vendor_cloud_config")
 
-        for cc_p in cc_paths:
-            cc_fn = self._paths.get_ipath_cur(cc_p)
-            if cc_fn and os.path.isfile(cc_fn):
+        cc_fns = [self._paths.get_ipath_cur(cc_p) for cc_p in cc_paths]
+        return [cc_fn for cc_fn in cc_fns if cc_fn]
+
+    def _get_instance_configs(self):
+        i_cfgs = []
+        for cc_fn in self._get_instance_config_files():
+            if os.path.isfile(cc_fn):
                 try:
-                    i_cfgs.append(util.read_conf(cc_fn))
+                    i_cfgs.append((cc_fn, util.read_conf(cc_fn)))
                 except PermissionError:
                     LOG.debug(
                         "Skipped loading cloud-config from %s due to"
@@ -260,7 +289,8 @@ class ConfigMerger(object):
                     )
         return i_cfgs
 
-    def _read_cfg(self):
+    def _read_sources(self, ds_cfgs):
+        """Return the (source, config) merged, highest priority first."""
         # Input config files override
         # env config files which
         # override instance configs
@@ -271,7 +301,7 @@ class ConfigMerger(object):
         if self._fns:
             for c_fn in self._fns:
                 try:
-                    cfgs.append(util.read_conf(c_fn))
+                    cfgs.append((c_fn, util.read_conf(c_fn)))
                 except Exception:
                     util.logexc(
                         LOG, "Failed loading of configuration from %s", c_fn
@@ -279,10 +309,55 @@ class ConfigMerger(object):
 
         cfgs.extend(self._get_env_configs())
         cfgs.extend(self._get_instance_configs())
-        cfgs.extend(self._get_datasource_configs())
-        if self._base_cfg:
-            cfgs.append(self._base_cfg)
-        return util.mergemanydict(cfgs)
+        cfgs.extend(("datasource", ds_cfg) for ds_cfg in ds_cfgs)
+        base_cfg = self._base_cfg
+        if callable(base_cfg):
+            base_cfg = base_cfg()
+        if base_cfg:
+            cfgs.append(("base", base_cfg))
+        return cfgs
+
+    def _fingerprint(self, ds_cfgs):
+        """Return what the merged config depends on, as cache key."""
+        fns = list(self._fns or [])
+        if CFG_ENV_NAME in os.environ:
+            fns.append(os.environ[CFG_ENV_NAME])
+        fns.extend(self._get_instance_config_files())
+        base_hash = None
+        if callable(self._base_cfg):
+            fns.extend(self._base_cfg_fns)
+        elif self._base_cfg:
+            base_hash = _config_hash(self._base_cfg)
+        return {
+            "version": version.version_string(),
+            "include_vendor": self._include_vendor,
+            "files": [_file_state(fn) for fn in fns],
+            "datasource_cfg": _config_hash(ds_cfgs) if ds_cfgs else None,
+            "base_cfg": base_hash,
+        }
+
+    def _read_cfg(self):
+        ds_cfgs = self._get_datasource_configs()
+        if not self._cache_file or (
+            callable(self._base_cfg) and self._base_cfg_fns is None
+        ):
+            return util.mergemanydict(
+                [cfg for (_source, cfg) in self._read_sources(ds_cfgs)]
+            )
+
+        fingerprint = self._fingerprint(ds_cfgs)
+        key = _config_hash(fingerprint)
+        entries = read_config_cache(self._cache_file)
+        if key in entries:
+            LOG.debug("Using merged config cached in %s", self._cache_file)
+            return entries[key]["cfg"]
+
+        sources = self._read_sources(ds_cfgs)
+        merged = util.mergemanydict([cfg for (_source, cfg) in sources])
+        _store_config_cache(
+            self._cache_file, entries, key, fingerprint, sources, merged
+        )
+        return merged
 
     @property
     def cfg(self):
@@ -292,6 +367,81 @@ class ConfigMerger(object):
         return self._cfg
 
 
+def _file_state(path):
+    """Return the path, mtime, size and inode telling whether it changed."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return [path, None, None, None]
+    return [path, st.st_mtime_ns, st.st_size, st.st_ino]
+
+
+def _config_hash(cfg):
+    try:
+        content = json.dumps(cfg, sort_keys=True, default=repr)
+    except TypeError:
+        # Keys of mixed types can't be sorted
+        content = json.dumps(cfg, default=repr)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def read_config_cache(cache_file=None):
+    """Return the merged configs cached in cache_file, keyed by fingerprint.
+
+    Each entry holds the merged config as cfg, the fingerprint of its inputs,
+    the sources merged, highest priority first, and for each top level key
+    the sources defining it as provenance.
+    """
+    if cache_file is None:
+        cache_file = CONFIG_CACHE_FILE
+    try:
+        with open(cache_file) as stream:
+            data = json.load(stream)
+    except (OSError, ValueError):
+        return {}
+    if (
+        not isinstance(data, dict)
+        or data.get("version") != CONFIG_CACHE_VERSION
+        or not isinstance(data.get("entries"), dict)
+    ):
+        return {}
+    return data["entries"]
+
+
+def _store_config_cache(cache_file, entries, key, fingerprint, sources, cfg):
+    if not os.access(os.path.dirname(cache_file), os.W_OK):
+        return
+    try:
+        cacheable = json.loads(json.dumps(cfg)) == cfg
+    except (TypeError, ValueError):
+        cacheable = False
+    if not cacheable:
+        LOG.debug("Not caching merged config which json can't represent")
+        return
+    provenance = {}
+    for (source, source_cfg) in sources:
+        for cfg_key in source_cfg:
+            provenance.setdefault(str(cfg_key), []).append(source)
+    entries[key] = {
+        "stored": time(),
+        "fingerprint": fingerprint,
+        "sources": [source for (source, _cfg) in sources],
+        "provenance": provenance,
+        "cfg": cfg,
+    }
+    ranked = sorted(entries, key=lambda k: entries[k].get("stored", 0))
+    for old_key in ranked[:-CONFIG_CACHE_ENTRIES]:
+        del entries[old_key]
+    try:
+        atomic_helper.write_json(
+            cache_file,
+            {"version": CONFIG_CACHE_VERSION, "entries": entries},
+            mode=CONFIG_CACHE_MODE,
+        )
+    except OSError as e:
+        LOG.debug("Failed to cache merged config in %s: %s", cache_file, e)
+
+
 class ContentHandlers(object):
     def __init__(self):
         self.registered = {}
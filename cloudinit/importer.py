@@ -9,6 +9,7 @@
 # This file is part of cloud-init. See LICENSE file for license information.
 
 import sys
+import types
 import typing
 
 # annotations add value for development, but don't break old versions
@@ -37,6 +38,41 @@ def import_module(module_name):
     return sys.modules[module_name]
 
 
+class LazyModule(types.ModuleType):
+    """Placeholder for a module which is only imported on first use.
+
+    Attribute access is forwarded to the real module, importing it through
+    the normal (thread-safe) import machinery the first time, so setting an
+    attribute on the placeholder (e.g. mock.patch) sets it on the module.
+    """
+
+    def __getattr__(self, name):
+        return getattr(import_module(self.__name__), name)
+
+    def __setattr__(self, name, value):
+        setattr(import_module(self.__name__), name, value)
+
+    def __delattr__(self, name):
+        delattr(import_module(self.__name__), name)
+
+    def __dir__(self):
+        return dir(import_module(self.__name__))
+
+    def __repr__(self):
+        return "<lazy module %r>" % self.__name__
+
+
+def lazy_import(module_name):
+    """Return module_name, deferring its import until an attribute is used.
+
+    Intended for expensive modules which only some code paths need, so that
+    short-lived commands such as `cloud-init status` start quickly.
+    """
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    return LazyModule(module_name)
+
+
 def find_module(base_name: str, search_paths, required_attrs=None) -> tuple:
     """Finds and imports specified modules"""
     if not required_attrs:
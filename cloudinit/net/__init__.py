@@ -5,17 +5,20 @@
 #
 # This file is part of cloud-init. See LICENSE file for license information.
 
+import contextlib
+import copy
 import errno
 import functools
 import ipaddress
 import logging
 import os
 import re
+import threading
 from typing import Any, Dict
 
 from cloudinit import subp, util
 from cloudinit.net.network_state import mask_to_net_prefix
-from cloudinit.url_helper import UrlError, readurl
+from cloudinit.url_helper import SESSION_POOL, UrlError, readurl
 
 LOG = logging.getLogger(__name__)
 SYS_CLASS_NET = "/sys/class/net/"
@@ -57,6 +60,84 @@ def sys_dev_path(devname, path=""):
     return get_sys_class_path() + devname + "/" + path
 
 
+class SysfsSnapshot(object):
+    """A memoized view of the network devices under SYS_CLASS_NET.
+
+    While a snapshot is active (see sysfs_snapshot), the sysfs helpers in
+    this module read each path at most once and answer repeated queries for
+    it from memory. refresh() forgets what was read, either for all devices
+    or for a single device, so that changes such as renames or hotplugged
+    devices are seen.
+    """
+
+    def __init__(self):
+        self._cache = {}
+
+    def call(self, func, path):
+        """Return func(path), calling func only once for each path."""
+        key = (func, path)
+        try:
+            (value, error) = self._cache[key]
+        except KeyError:
+            try:
+                (value, error) = (func(path), None)
+            except OSError as e:
+                (value, error) = (None, e)
+            self._cache[key] = (value, error)
+        if error is not None:
+            raise copy.copy(error)
+        return value
+
+    def refresh(self, devname=None):
+        """Forget what was read for devname, or for every device if None.
+
+        The list of devices is forgotten either way.
+        """
+        if devname is None:
+            self._cache.clear()
+            return
+        prefix = sys_dev_path(devname)
+        for key in list(self._cache):
+            path = key[1]
+            if path.startswith(prefix) or path == get_sys_class_path():
+                del self._cache[key]
+
+
+_sysfs_state = threading.local()
+
+
+@contextlib.contextmanager
+def sysfs_snapshot():
+    """Answer sysfs queries made in this thread from a single snapshot.
+
+    Yields the active SysfsSnapshot. Nested uses share the outermost one.
+    """
+    snapshot = getattr(_sysfs_state, "snapshot", None)
+    if snapshot is not None:
+        yield snapshot
+        return
+    _sysfs_state.snapshot = SysfsSnapshot()
+    try:
+        yield _sysfs_state.snapshot
+    finally:
+        _sysfs_state.snapshot = None
+
+
+def refresh_sysfs_snapshot(devname=None):
+    """Refresh the snapshot active in this thread, if there is one."""
+    snapshot = getattr(_sysfs_state, "snapshot", None)
+    if snapshot is not None:
+        snapshot.refresh(devname)
+
+
+def _sysfs(func, path):
+    """Return func(path), from the active sysfs snapshot if there is one."""
+    snapshot = getattr(_sysfs_state, "snapshot", None)
+    if snapshot is None:
+        return func(path)
+    return snapshot.call(func, path)
+
+
 def read_sys_net(
     devname,
     path,
@@ -67,7 +148,7 @@ def read_sys_net(
 ):
     dev_path = sys_dev_path(devname, path)
     try:
-        contents = util.load_file(dev_path)
+        contents = _sysfs(util.load_file, dev_path)
     except (OSError, IOError) as e:
         e_errno = getattr(e, "errno", None)
         if e_errno in (errno.ENOENT, errno.ENOTDIR):
@@ -127,17 +208,17 @@ def is_up(devname):
 
 
 def is_bridge(devname):
-    return os.path.exists(sys_dev_path(devname, "bridge"))
+    return _sysfs(os.path.exists, sys_dev_path(devname, "bridge"))
 
 
 def is_bond(devname):
-    return os.path.exists(sys_dev_path(devname, "bonding"))
+    return _sysfs(os.path.exists, sys_dev_path(devname, "bonding"))
 
 
 def get_master(devname):
     """Return the master path for devname, or None if no master"""
     path = sys_dev_path(devname, path="master")
-    if os.path.exists(path):
+    if _sysfs(os.path.exists, path):
         return path
     return None
 
@@ -149,7 +230,9 @@ def master_is_bridge_or_bond(devname):
         return False
     bonding_path = os.path.join(master_path, "bonding")
     bridge_path = os.path.join(master_path, "bridge")
-    return os.path.exists(bonding_path) or os.path.exists(bridge_path)
+    return _sysfs(os.path.exists, bonding_path) or _sysfs(
+        os.path.exists, bridge_path
+    )
 
 
 def master_is_openvswitch(devname):
@@ -158,7 +241,7 @@ def master_is_openvswitch(devname):
     if master_path is None:
         return False
     ovs_path = sys_dev_path(devname, path="upper_ovs-system")
-    return os.path.exists(ovs_path)
+    return _sysfs(os.path.exists, ovs_path)
 
 
 @functools.lru_cache(maxsize=None)
@@ -280,7 +363,7 @@ def is_netfail_primary(devname, driver=None):
     """
     # /sys/class/net/<devname>/master -> ../../<master devname>
     master_sysfs_path = sys_dev_path(devname, path="master")
-    if not os.path.exists(master_sysfs_path):
+    if not _sysfs(os.path.exists, master_sysfs_path):
         return False
 
     if driver is None:
@@ -289,7 +372,9 @@ def is_netfail_primary(devname, driver=None):
     if driver == "virtio_net":
         return False
 
-    master_devname = os.path.basename(os.path.realpath(master_sysfs_path))
+    master_devname = os.path.basename(
+        _sysfs(os.path.realpath, master_sysfs_path)
+    )
     master_driver = device_driver(master_devname)
     if master_driver != "virtio_net":
         return False
@@ -350,8 +435,8 @@ def device_driver(devname):
     driver = None
     driver_path = sys_dev_path(devname, "device/driver")
     # driver is a symlink to the driver *dir*
-    if os.path.islink(driver_path):
-        driver = os.path.basename(os.readlink(driver_path))
+    if _sysfs(os.path.islink, driver_path):
+        driver = os.path.basename(_sysfs(os.readlink, driver_path))
 
     return driver
 
@@ -370,7 +455,7 @@ def get_devicelist():
         return list(get_interfaces_by_mac().values())
 
     try:
-        devs = os.listdir(get_sys_class_path())
+        devs = list(_sysfs(os.listdir, get_sys_class_path()))
     except OSError as e:
         if e.errno == errno.ENOENT:
             devs = []
@@ -428,6 +513,7 @@ def find_fallback_nic_on_freebsd(blacklist_drivers=None):
         return values[0]
 
 
+@sysfs_snapshot()
 def find_fallback_nic_on_linux(blacklist_drivers=None):
     """Return the name of the 'fallback' network device on Linux."""
     if not blacklist_drivers:
@@ -448,6 +534,7 @@ def find_fallback_nic_on_linux(blacklist_drivers=None):
             )
             msg = "Waiting for udev events to settle"
             util.log_time(LOG.debug, msg, func=util.udevadm_settle)
+            refresh_sysfs_snapshot()
 
     # get list of interfaces that could have connections
     invalid_interfaces = set(["lo"])
@@ -624,6 +711,7 @@ def interface_has_own_mac(ifname, strict=False):
     return assign_type in (0, 1, 3)
 
 
+@sysfs_snapshot()
 def _get_current_rename_info(check_downable=True):
     """Collect information necessary for rename_interfaces.
 
@@ -824,6 +912,7 @@ def _rename_interfaces(
                     "[unknown] Error performing %s%s for %s, %s: %s"
                     % (op, params, mac, new_name, e)
                 )
+        refresh_sysfs_snapshot()
 
     if len(errors):
         raise Exception("\n".join(errors))
@@ -832,7 +921,7 @@ def _rename_interfaces(
 def get_interface_mac(ifname):
     """Returns the string value of an interface's MAC Address"""
     path = "address"
-    if os.path.isdir(sys_dev_path(ifname, "bonding_slave")):
+    if _sysfs(os.path.isdir, sys_dev_path(ifname, "bonding_slave")):
         # for a bond slave, get the nic's hwaddress, not the address it
         # is using because its part of a bond.
         path = "bonding_slave/perm_hwaddr"
@@ -932,6 +1021,7 @@ def get_interfaces_by_mac_on_openbsd(blacklist_drivers=None) -> dict():
     return ret
 
 
+@sysfs_snapshot()
 def get_interfaces_by_mac_on_linux(blacklist_drivers=None) -> dict:
     """Build a dictionary of tuples {mac: name}.
 
@@ -1002,6 +1092,7 @@ def get_interfaces(blacklist_drivers=None) -> list:
     return ret
 
 
+@sysfs_snapshot()
 def get_ib_hwaddrs_by_interface():
     """Build a dictionary mapping Infiniband interface names to their hardware
     address."""
@@ -1168,6 +1259,8 @@ class EphemeralIPv4Network(object):
 
     def __exit__(self, excp_type, excp_value, excp_traceback):
         """Teardown anything we set up."""
+        # Pooled keep-alive connections are bound to the ephemeral address
+        SESSION_POOL.close()
         for cmd in self.cleanup_cmds:
             subp.subp(cmd, capture=True)
 
@@ -565,12 +565,14 @@ class Renderer(renderer.Renderer):
         fpeni = subp.target_path(target, self.eni_path)
         util.ensure_dir(os.path.dirname(fpeni))
         header = self.eni_header if self.eni_header else ""
-        util.write_file(fpeni, header + self._render_interfaces(network_state))
+        self._write_file(
+            fpeni, header + self._render_interfaces(network_state)
+        )
 
         if self.netrules_path:
             netrules = subp.target_path(target, self.netrules_path)
             util.ensure_dir(os.path.dirname(netrules))
-            util.write_file(
+            self._write_file(
                 netrules, self._render_persistent_net(network_state)
             )
 
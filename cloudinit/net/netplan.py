@@ -178,14 +178,17 @@ def _extract_bond_slaves_by_name(interfaces, entry, bond_master):
 
 
 def _clean_default(target=None):
-    # clean out any known default files and derived files in target
+    """Remove any known default files and derived files in target.
+
+    @return: True if any file was removed.
+    """
     # LP: #1675576
     tpath = subp.target_path(target, "etc/netplan/00-snapd-config.yaml")
     if not os.path.isfile(tpath):
-        return
+        return False
     content = util.load_file(tpath, decode=False)
     if content != KNOWN_SNAPD_CONFIG:
-        return
+        return False
 
     derived = [
         subp.target_path(target, f)
@@ -204,6 +207,7 @@ def _clean_default(target=None):
 
     for f in [tpath] + existing:
         os.unlink(f)
+    return True
 
 
 class Renderer(renderer.Renderer):
@@ -252,10 +256,14 @@ class Renderer(renderer.Renderer):
 
         if not header.endswith("\n"):
             header += "\n"
-        util.write_file(fpnplan, header + content)
+        changed = self._write_file(fpnplan, header + content)
 
         if self.clean_default:
-            _clean_default(target=target)
+            changed = _clean_default(target=target) or changed
+        if not changed:
+            # netplan's generator already rendered this config at boot
+            LOG.debug("netplan config unchanged, skipping netplan generate")
+            return
         self._netplan_generate(run=self._postcmds)
         self._net_setup_link(run=self._postcmds)
 
@@ -6,6 +6,8 @@
 
 import copy
 import functools
+import hashlib
+import json
 import logging
 import socket
 import struct
@@ -146,6 +148,19 @@ class NetworkState(object):
     def version(self):
         return self._version
 
+    def digest(self):
+        """Return a sha256 hex digest identifying this network state."""
+        try:
+            blob = json.dumps(
+                self._network_state, sort_keys=True, default=repr
+            )
+        except TypeError:
+            # keys of mixed types cannot be sorted
+            blob = json.dumps(self._network_state, default=repr)
+        return hashlib.sha256(
+            ("%s:%s" % (self._version, blob)).encode("utf-8")
+        ).hexdigest()
+
     @property
     def dns_nameservers(self):
         try:
@@ -6,8 +6,11 @@
 # This file is part of cloud-init. See LICENSE file for license information.
 
 import abc
+import hashlib
 import io
 
+from cloudinit import log as logging
+from cloudinit import util
 from cloudinit.net.network_state import parse_net_config_data
 from cloudinit.net.udev import generate_udev_rule
 
@@ -26,11 +29,43 @@ def filter_by_attr(match_name):
 
 filter_by_physical = filter_by_type("physical")
 
+LOG = logging.getLogger(__name__)
+
 
 class Renderer(object):
+    _rendered_files = None
+
     def __init__(self, config=None):
         pass
 
+    @property
+    def rendered_files(self):
+        """Dict of the paths rendered to the sha256 digest of their content."""
+        if self._rendered_files is None:
+            self._rendered_files = {}
+        return self._rendered_files
+
+    def _write_file(self, path, content, mode=0o644):
+        """Write content to path unless the file already holds it.
+
+        The path is recorded in rendered_files either way.
+
+        @return: True if the file was written.
+        """
+        data = content.encode("utf-8") if isinstance(content, str) else content
+        self.rendered_files[path] = hashlib.sha256(data).hexdigest()
+        try:
+            with open(path, "rb") as stream:
+                unchanged = stream.read() == data
+        except OSError:
+            unchanged = False
+        if unchanged:
+            LOG.debug("Not rewriting unchanged %s", path)
+            util.chmod(path, mode)
+            return False
+        util.write_file(path, content, mode)
+        return True
+
     @staticmethod
     def _render_persistent_net(network_state):
         """Given state, emit udev rules to map mac to ifname."""
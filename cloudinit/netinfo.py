@@ -9,18 +9,79 @@
 # This file is part of cloud-init. See LICENSE file for license information.
 
 import re
+import socket
 from copy import copy, deepcopy
 
 from cloudinit import log as logging
 from cloudinit import subp, util
 from cloudinit.net.network_state import net_prefix_to_ipv4_mask
 from cloudinit.simpletable import SimpleTable
+from cloudinit.sources.helpers import netlink
 
 LOG = logging.getLogger()
 
 
 DEFAULT_NETDEV_INFO = {"ipv4": [], "ipv6": [], "hwaddr": "", "up": False}
 
+NETLINK_ERRORS = (
+    netlink.NetlinkCreateSocketError,
+    netlink.NetlinkDumpError,
+    OSError,
+)
+
+
+def _scope_name(scope):
+    return netlink.RT_SCOPE_NAMES.get(scope, str(scope))
+
+
+def _netdev_info_netlink():
+    """
+    Get network device dicts from RTNETLINK link and address dumps.
+
+    The dicts match those of _netdev_info_iproute.
+
+    @returns: A dict of device info keyed by network device name containing
+              device configuration values.
+    @raise: NetlinkCreateSocketError, NetlinkDumpError or OSError if the
+            kernel could not be queried.
+    """
+    devs = {}
+    names = {}
+    up_flags = netlink.IFF_UP | netlink.IFF_LOWER_UP
+    for link in netlink.get_links():
+        dev_name = link.ifname.lower()
+        names[link.index] = dev_name
+        devs[dev_name] = {
+            "ipv4": [],
+            "ipv6": [],
+            "hwaddr": (
+                link.hwaddr if link.link_type == netlink.ARPHRD_ETHER else ""
+            ),
+            "up": link.flags & up_flags == up_flags,
+        }
+    for addr in netlink.get_addresses():
+        dev_name = names.get(addr.index)
+        if dev_name is None:
+            # Device appeared between the two dumps
+            continue
+        if addr.family == socket.AF_INET:
+            devs[dev_name]["ipv4"].append(
+                {
+                    "ip": addr.address,
+                    "bcast": addr.broadcast,
+                    "mask": net_prefix_to_ipv4_mask(addr.prefixlen),
+                    "scope": _scope_name(addr.scope),
+                }
+            )
+        else:
+            devs[dev_name]["ipv6"].append(
+                {
+                    "ip": "%s/%d" % (addr.address, addr.prefixlen),
+                    "scope6": _scope_name(addr.scope),
+                }
+            )
+    return devs
+
 
 def _netdev_info_iproute(ipaddr_out):
     """
@@ -202,7 +263,7 @@ def _netdev_info_ifconfig(ifconfig_data):
     return devs
 
 
-def netdev_info(empty=""):
+def _netdev_info_commands():
     devs = {}
     if util.is_NetBSD():
         (ifcfg_out, _err) = subp.subp(["ifconfig", "-a"], rcs=[0, 1])
@@ -219,6 +280,19 @@ def netdev_info(empty=""):
         LOG.warning(
             "Could not print networks: missing 'ip' and 'ifconfig' commands"
         )
+    return devs
+
+
+def netdev_info(empty=""):
+    devs = None
+    if util.is_Linux():
+        # Ask the kernel directly, parsing command output only as a fallback
+        try:
+            devs = _netdev_info_netlink()
+        except NETLINK_ERRORS as e:
+            LOG.debug("Could not query network devices over netlink: %s", e)
+    if devs is None:
+        devs = _netdev_info_commands()
 
     if empty == "":
         return devs
@@ -333,6 +407,72 @@ def _netdev_route_info_iproute(iproute_data):
     return routes
 
 
+def _netdev_route_info_netlink():
+    """
+    Get network route dicts from RTNETLINK route dumps.
+
+    The dicts match those of _netdev_route_info_iproute, covering the main
+    IPv4 routing table and all IPv6 routing tables. Only unicast routes are
+    reported.
+
+    @returns: A dict containing ipv4 and ipv6 route entries as lists.
+    @raise: NetlinkCreateSocketError, NetlinkDumpError or OSError if the
+            kernel could not be queried.
+    """
+    names = {link.index: link.ifname for link in netlink.get_links()}
+    routes = {"ipv4": [], "ipv6": []}
+    for route in netlink.get_routes(socket.AF_INET):
+        if (
+            route.type != netlink.RTN_UNICAST
+            or route.table != netlink.RT_TABLE_MAIN
+        ):
+            continue
+        flags = ["U"]
+        entry = {
+            "destination": "0.0.0.0",
+            "flags": "",
+            "gateway": "",
+            "genmask": "0.0.0.0",
+            "iface": names.get(route.oif, ""),
+            "metric": "",
+        }
+        if route.dst_len:
+            entry["destination"] = route.dst
+            entry["genmask"] = net_prefix_to_ipv4_mask(route.dst_len)
+            entry["gateway"] = "0.0.0.0"
+            if route.dst_len == 32:
+                flags.append("H")
+        if route.gateway:
+            entry["gateway"] = route.gateway
+            flags.insert(1, "G")
+        if route.priority is not None:
+            entry["metric"] = str(route.priority)
+        entry["flags"] = "".join(flags)
+        routes["ipv4"].append(entry)
+    for route in netlink.get_routes(socket.AF_INET6):
+        if route.type != netlink.RTN_UNICAST:
+            continue
+        entry = {"iface": names.get(route.oif, "")}
+        if not route.dst_len:
+            entry["destination"] = "::/0"
+        elif route.dst_len == 128:
+            entry["destination"] = route.dst
+        else:
+            entry["destination"] = "%s/%d" % (route.dst, route.dst_len)
+        if route.gateway:
+            entry["gateway"] = route.gateway
+            entry["flags"] = "UG"
+        else:
+            entry["gateway"] = "::"
+            entry["flags"] = "U"
+        if route.priority is not None:
+            entry["metric"] = str(route.priority)
+        if route.expires:
+            entry["flags"] += "e"
+        routes["ipv6"].append(entry)
+    return routes
+
+
 def _netdev_route_info_netstat(route_data):
     routes = {}
     routes["ipv4"] = []
@@ -418,7 +558,7 @@ def _netdev_route_info_netstat(route_data):
     return routes
 
 
-def route_info():
+def _route_info_commands():
     routes = {}
     if subp.which("ip"):
         # Try iproute first of all
@@ -437,6 +577,19 @@ def route_info():
     return routes
 
 
+def route_info():
+    routes = None
+    if util.is_Linux():
+        # Ask the kernel directly, parsing command output only as a fallback
+        try:
+            routes = _netdev_route_info_netlink()
+        except NETLINK_ERRORS as e:
+            LOG.debug("Could not query routes over netlink: %s", e)
+    if routes is None:
+        routes = _route_info_commands()
+    return routes
+
+
 def netdev_pformat():
     lines = []
     empty = "."
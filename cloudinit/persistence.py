@@ -4,6 +4,23 @@
 #
 # This file is part of cloud-init. See LICENSE file for license information.
 
+import hashlib
+import importlib
+import json
+import mmap
+import pickle
+
+from cloudinit import version
+
+# Leading bytes identifying the object cache format. Plain pickles written by
+# older cloud-init versions start with the pickle protocol opcode instead.
+OBJ_CACHE_MAGIC = b"CIOBJ\n"
+OBJ_CACHE_SCHEMA_VERSION = 2
+
+
+class ObjCacheError(Exception):
+    """Raised when an object cache is unreadable, corrupt or unsupported."""
+
 
 class CloudInitPickleMixin:
     """Scaffolding for versioning of pickles.
@@ -19,9 +36,15 @@ class CloudInitPickleMixin:
     ``self._unpickle`` is called with the version of the stored pickle as the
     only argument: this is where classes should implement any deserialization
     fixes they require.  (If the stored pickle has no version, 0 is passed.)
+
+    Attributes named in ``_ci_pkl_lazy_attrs`` are stored apart by
+    ``dump_obj_cache`` and only unpickled on first access after
+    ``load_obj_cache``. They must be large and independent: an object they
+    share with other attributes comes back as a separate copy.
     """
 
     _ci_pkl_version = 0
+    _ci_pkl_lazy_attrs = ()  # type: tuple
 
     def __getstate__(self):
         """Persist instance state, adding a pickle version attribute.
@@ -32,10 +55,31 @@ class CloudInitPickleMixin:
 
         The value of ``_ci_pkl_version`` is ``type(self)._ci_pkl_version``.
         """
-        state = self.__dict__.copy()
+        state = self._ci_lazy_state()
         state["_ci_pkl_version"] = type(self)._ci_pkl_version
         return state
 
+    def __getattr__(self, name):
+        """Rehydrate an attribute left unloaded by ``load_obj_cache``."""
+        lazy_fields = self.__dict__.get("_ci_lazy_fields")
+        if not lazy_fields or name not in lazy_fields:
+            raise AttributeError(
+                "%r object has no attribute %r" % (type(self).__name__, name)
+            )
+        value = lazy_fields.pop(name)()
+        self.__dict__[name] = value
+        return value
+
+    def _ci_lazy_state(self) -> dict:
+        """Return instance state, loading any lazily rehydrated attributes."""
+        lazy_fields = self.__dict__.get("_ci_lazy_fields", {})
+        for name in list(lazy_fields):
+            if name not in self.__dict__:
+                getattr(self, name)
+        state = self.__dict__.copy()
+        state.pop("_ci_lazy_fields", None)
+        return state
+
     def __setstate__(self, state: dict) -> None:
         """Restore instance state and handle missing attributes on upgrade.
 
@@ -64,4 +108,122 @@ class CloudInitPickleMixin:
         """
 
 
+def _sha256(data) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _header_checksum(header: dict) -> str:
+    unsigned = dict(header)
+    unsigned.pop("checksum", None)
+    return _sha256(json.dumps(unsigned, sort_keys=True).encode())
+
+
+def dump_obj_cache(obj: CloudInitPickleMixin) -> bytes:
+    """Serialize obj into the versioned object cache format.
+
+    The instance state is pickled at once, so attributes sharing objects
+    still share them once loaded, except for the ``_ci_pkl_lazy_attrs`` of
+    the class which are each pickled on their own. A JSON header in front
+    holds the schema version, the cloud-init version and the offset, length
+    and sha256 checksum of each pickle. Lazy attributes are rehydrated by
+    ``load_obj_cache`` on first access, so stages which never touch e.g. raw
+    user-data never unpickle it.
+    """
+    cls = type(obj)
+    state = obj._ci_lazy_state()
+    lazy = {
+        name: state.pop(name)
+        for name in cls._ci_pkl_lazy_attrs
+        if name in state
+    }
+    blobs = [pickle.dumps(state)]
+    blobs.extend(pickle.dumps(value) for value in lazy.values())
+    entries = []
+    offset = 0
+    for data in blobs:
+        entries.append([offset, len(data), _sha256(data)])
+        offset += len(data)
+    header = {
+        "schema_version": OBJ_CACHE_SCHEMA_VERSION,
+        "cloudinit_version": version.version_string(),
+        "class": [cls.__module__, cls.__qualname__],
+        "ci_pkl_version": cls._ci_pkl_version,
+        "state": entries[0],
+        "lazy": dict(zip(lazy, entries[1:])),
+    }
+    header["checksum"] = _header_checksum(header)
+    return b"".join(
+        [OBJ_CACHE_MAGIC, json.dumps(header).encode(), b"\n"] + blobs
+    )
+
+
+def is_obj_cache(data: bytes) -> bool:
+    """Return True if data starts like an object cache and not a pickle."""
+    return data[: len(OBJ_CACHE_MAGIC)] == OBJ_CACHE_MAGIC
+
+
+def load_obj_cache(fname: str):
+    """Load an object written by ``dump_obj_cache`` from fname.
+
+    The file is memory mapped; the state is restored at once while lazy
+    attributes are checksummed and unpickled from the mapping on first
+    access. Callers must replace the file atomically rather than rewriting
+    it in place.
+
+    ``_unpickle`` is only called when the cache was written by a different
+    cloud-init version or class pickle version, as a cache written by this
+    version needs no deserialization fixes.
+
+    :raises ObjCacheError: if the cache is not in a supported format or its
+        header checksum does not match.
+    """
+    with open(fname, "rb") as stream:
+        try:
+            data = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError as e:
+            raise ObjCacheError("Empty object cache %s" % fname) from e
+    if not is_obj_cache(data):
+        raise ObjCacheError("Not an object cache: %s" % fname)
+    header_end = data.find(b"\n", len(OBJ_CACHE_MAGIC))
+    try:
+        header = json.loads(data[len(OBJ_CACHE_MAGIC) : header_end])
+    except ValueError as e:
+        raise ObjCacheError("Invalid object cache header in %s" % fname) from e
+    if header.get("schema_version") != OBJ_CACHE_SCHEMA_VERSION:
+        raise ObjCacheError(
+            "Unsupported object cache schema version %s in %s"
+            % (header.get("schema_version"), fname)
+        )
+    if header.get("checksum") != _header_checksum(header):
+        raise ObjCacheError("Object cache header checksum mismatch: " + fname)
+
+    base = header_end + 1
+
+    def load_entry(entry, name):
+        (offset, length, checksum) = entry
+        entry_data = data[base + offset : base + offset + length]
+        if _sha256(entry_data) != checksum:
+            raise ObjCacheError(
+                "Object cache checksum mismatch for %s in %s" % (name, fname)
+            )
+        return pickle.loads(entry_data)
+
+    (module_name, qualname) = header["class"]
+    cls = importlib.import_module(module_name)
+    for part in qualname.split("."):
+        cls = getattr(cls, part)
+    obj = cls.__new__(cls)
+    obj.__dict__.update(load_entry(header["state"], "state"))
+    obj.__dict__["_ci_lazy_fields"] = {
+        name: (lambda entry=entry, name=name: load_entry(entry, name))
+        for name, entry in header["lazy"].items()
+    }
+    if (
+        header["cloudinit_version"] != version.version_string()
+        or header["ci_pkl_version"] != cls._ci_pkl_version
+    ):
+        obj._unpickle(header["ci_pkl_version"])
+    return obj
+
+
 # vi: ts=4 expandtab
@@ -0,0 +1,224 @@
+# This file is part of cloud-init. See LICENSE file for license information.
+"""Boot performance profile in the Chrome trace event format.
+
+Once a boot stage enables the profiler, the stages, datasource searches and
+config modules run within a ReportEventStack, the commands run by subp and
+the http requests made by url_helper are each recorded as a complete ("X")
+trace event holding their wall clock duration and the CPU time of the
+thread running them. Commands also hold the CPU time of the subprocesses
+they waited for, unless other threads ran commands at the same time.
+
+As each stage exits its events are appended to TRACE_FILE, so that all the
+stages of a boot share one trace. It can be loaded in chrome://tracing or
+https://ui.perfetto.dev, or summarized and compared between boots with
+``cloud-init analyze trace``.
+"""
+
+import atexit
+import contextlib
+import fcntl
+import json
+import logging
+import os
+import resource
+import threading
+import time
+
+LOG = logging.getLogger(__name__)
+
+TRACE_FILE = "/run/cloud-init/boot-trace.json"
+
+CATEGORY_STAGE = "stage"
+CATEGORY_DATASOURCE = "datasource"
+CATEGORY_MODULE = "module"
+CATEGORY_EVENT = "event"
+CATEGORY_SUBP = "subp"
+CATEGORY_URL = "url"
+
+# time.thread_time is only available on python 3.7 and newer
+_cpu_time = getattr(time, "thread_time", time.process_time)
+
+_lock = threading.Lock()
+_events = None
+_atexit_registered = False
+# timed() contexts open in all threads and opened so far in all threads, with
+# the same counts of the current thread in _local, to tell whether other
+# threads ran timed code meanwhile.
+_spans_open = 0
+_spans_opened = 0
+_local = threading.local()
+
+
+def enable(process_name):
+    """Start recording the events of this process, named process_name."""
+    global _events, _atexit_registered
+    with _lock:
+        if _events is None:
+            _events = []
+        _events.append(
+            {
+                "name": "process_name",
+                "ph": "M",
+                "pid": os.getpid(),
+                "args": {"name": "cloud-init %s" % process_name},
+            }
+        )
+        if not _atexit_registered:
+            atexit.register(flush)
+            _atexit_registered = True
+
+
+def disable():
+    """Stop recording, dropping any event not yet flushed."""
+    global _events
+    with _lock:
+        _events = None
+
+
+def is_enabled():
+    return _events is not None
+
+
+def record(name, category, start, duration, cpu, args=None):
+    """Record a complete event.
+
+    :param start: wall clock time the event started, in seconds since epoch.
+    :param duration: wall clock duration in seconds.
+    :param cpu: CPU time in seconds of the thread running the event.
+    """
+    event = {
+        "name": name,
+        "cat": category,
+        "ph": "X",
+        "ts": int(start * 1e6),
+        "dur": int(duration * 1e6),
+        "tdur": int(cpu * 1e6),
+        "pid": os.getpid(),
+        "tid": threading.get_ident(),
+    }
+    if args:
+        event["args"] = args
+    with _lock:
+        if _events is not None:
+            _events.append(event)
+
+
+class Timer(object):
+    """Measure the wall clock and CPU time of an event being recorded."""
+
+    def __init__(self):
+        self.start = time.time()
+        self._wall = time.monotonic()
+        self._cpu = _cpu_time()
+
+    def record(self, name, category, args=None):
+        record(
+            name,
+            category,
+            self.start,
+            time.monotonic() - self._wall,
+            _cpu_time() - self._cpu,
+            args,
+        )
+
+
+def start_timer():
+    """Return a Timer when recording, None otherwise."""
+    if _events is None:
+        return None
+    return Timer()
+
+
+def _enter_span():
+    """Count a timed() context opened, return the state _exit_span needs."""
+    global _spans_open, _spans_opened
+    with _lock:
+        own_open = getattr(_local, "open", 0)
+        own_opened = getattr(_local, "opened", 0)
+        concurrent = _spans_open > own_open
+        _spans_open += 1
+        _spans_opened += 1
+        _local.open = own_open + 1
+        _local.opened = own_opened + 1
+        return (concurrent, _spans_opened, _local.opened)
+
+
+def _exit_span(state):
+    """Count a timed() context closed.
+
+    :return: True if another thread ran timed code while it was open.
+    """
+    global _spans_open
+    (concurrent, spans_opened, own_opened) = state
+    with _lock:
+        _spans_open -= 1
+        _local.open -= 1
+        others_opened = (_spans_opened - spans_opened) - (
+            _local.opened - own_opened
+        )
+        return concurrent or others_opened > 0 or _spans_open > _local.open
+
+
+@contextlib.contextmanager
+def timed(name, category, args=None):
+    """Record the code run within the context as one event.
+
+    :param args: dict of details to record, which may be updated from within
+        the context. A value of children_cpu_ms is set to the CPU time used
+        by the subprocesses waited for meanwhile. RUSAGE_CHILDREN counts the
+        subprocesses of every thread, so when another thread ran timed code
+        meanwhile, e.g. config modules run in parallel, children_cpu_ms is
+        left out and children_cpu_unattributed is set instead.
+    """
+    timer = start_timer()
+    if timer is None:
+        yield args
+        return
+    if args is None:
+        args = {}
+    span = _enter_span()
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    try:
+        yield args
+    finally:
+        after = resource.getrusage(resource.RUSAGE_CHILDREN)
+        children_cpu = (after.ru_utime - children.ru_utime) + (
+            after.ru_stime - children.ru_stime
+        )
+        if _exit_span(span):
+            args["children_cpu_unattributed"] = True
+        elif children_cpu:
+            args["children_cpu_ms"] = round(children_cpu * 1000, 3)
+        timer.record(name, category, args)
+
+
+def flush(trace_file=None):
+    """Append the events recorded so far to the trace file.
+
+    Nothing is written unless the trace file's directory exists.
+    """
+    global _events
+    if trace_file is None:
+        trace_file = TRACE_FILE
+    with _lock:
+        if not _events:
+            return
+        events = _events
+        _events = []
+    if not os.path.isdir(os.path.dirname(trace_file)):
+        return
+    # The JSON array format allows omitting the closing bracket, so each
+    # stage appends its events to those of the earlier ones.
+    content = "".join(json.dumps(e, sort_keys=True) + ",\n" for e in events)
+    try:
+        fd = os.open(trace_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        with open(fd, "w") as stream:
+            fcntl.flock(stream, fcntl.LOCK_EX)
+            if not os.fstat(fd).st_size:
+                content = "[\n" + content
+            stream.write(content)
+    except OSError as e:
+        LOG.debug("Failed to write boot trace %s: %s", trace_file, e)
+
+
+# vi: ts=4 expandtab
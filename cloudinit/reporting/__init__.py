@@ -9,6 +9,8 @@ The reporting framework is intended to allow all parts of cloud-init to
 report events in a structured manner.
 """
 
+import copy
+
 from ..registry import DictRegistry
 from .handlers import available_handlers
 
@@ -24,26 +26,54 @@ def update_configuration(config):
         The dictionary containing changes to apply.  If a key is given
         with a False-ish value, the registered handler matching that name
         will be unregistered.
+
+    A handler whose config did not change is kept as is. A replaced handler
+    is closed and left to publish what it still has queued in the
+    background, flush_events waits for it.
     """
     for handler_name, handler_config in config.items():
+        registered = instantiated_handler_registry.registered_items.get(
+            handler_name
+        )
+        if registered is not None:
+            if handler_config and _handler_configs.get(handler_name) == (
+                registered,
+                handler_config,
+            ):
+                continue
+            registered.close()
+            _replaced_handlers.append(registered)
+        _handler_configs.pop(handler_name, None)
         if not handler_config:
             instantiated_handler_registry.unregister_item(
                 handler_name, force=True
             )
             continue
-        handler_config = handler_config.copy()
-        cls = available_handlers.registered_items[handler_config.pop("type")]
+        kwargs = handler_config.copy()
+        cls = available_handlers.registered_items[kwargs.pop("type")]
         instantiated_handler_registry.unregister_item(handler_name)
-        instance = cls(**handler_config)
+        instance = cls(**kwargs)
         instantiated_handler_registry.register_item(handler_name, instance)
+        _handler_configs[handler_name] = (
+            instance,
+            copy.deepcopy(handler_config),
+        )
 
 
 def flush_events():
-    for _, handler in instantiated_handler_registry.registered_items.items():
+    handlers = _replaced_handlers + list(
+        instantiated_handler_registry.registered_items.values()
+    )
+    del _replaced_handlers[:]
+    for handler in handlers:
         if hasattr(handler, "flush"):
             handler.flush()
 
 
+# The registered handlers and the config each was created from
+_handler_configs = {}
+# Handlers replaced since the last flush_events, maybe still publishing
+_replaced_handlers = []
 instantiated_handler_registry = DictRegistry()
 update_configuration(DEFAULT_CONFIG)
 
@@ -12,6 +12,8 @@ import base64
 import os.path
 import time
 
+from cloudinit import profiler
+
 from . import available_handlers, instantiated_handler_registry
 
 FINISH_EVENT_TYPE = "finish"
@@ -227,6 +229,7 @@ class ReportEventStack(object):
         else:
             self.fullname = self.name
         self.children = {}
+        self._timer = None
 
     def __repr__(self):
         return "ReportEventStack(%s, %s, reporting_enabled=%s)" % (
@@ -237,6 +240,7 @@ class ReportEventStack(object):
 
     def __enter__(self):
         self.result = status.SUCCESS
+        self._timer = profiler.start_timer()
         if self.reporting_enabled:
             report_start_event(self.fullname, self.description)
         if self.parent:
@@ -284,6 +288,19 @@ class ReportEventStack(object):
             report_finish_event(
                 self.fullname, msg, result, post_files=self.post_files
             )
+        if self._timer:
+            self._timer.record(
+                self.fullname, self._profile_category(), {"result": result}
+            )
+
+    def _profile_category(self):
+        if not self.parent:
+            return profiler.CATEGORY_STAGE
+        if self.name.startswith("search-"):
+            return profiler.CATEGORY_DATASOURCE
+        if self.name.startswith("config-"):
+            return profiler.CATEGORY_MODULE
+        return profiler.CATEGORY_EVENT
 
 
 def _collect_file_info(files):
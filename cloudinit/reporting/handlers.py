@@ -1,7 +1,10 @@
 # This file is part of cloud-init. See LICENSE file for license information.
 
 import abc
+import collections
+import contextlib
 import fcntl
+import hashlib
 import json
 import os
 import queue
@@ -11,12 +14,18 @@ import time
 import uuid
 from datetime import datetime
 
+from cloudinit import atomic_helper, importer
 from cloudinit import log as logging
-from cloudinit import url_helper, util
+from cloudinit import util
 from cloudinit.registry import DictRegistry
 
+url_helper = importer.lazy_import("cloudinit.url_helper")
+
 LOG = logging.getLogger(__name__)
 
+# Events a webhook could not post, kept for the stages that follow
+WEBHOOK_SPOOL_DIR = "/run/cloud-init/reporting-spool"
+
 
 class ReportException(Exception):
     pass
@@ -36,6 +45,9 @@ class ReportingHandler(metaclass=abc.ABCMeta):
     def flush(self):
         """Ensure ReportingHandler has published all events"""
 
+    def close(self):
+        """Release what the handler holds once it is no longer used."""
+
 
 class LogHandler(ReportingHandler):
     """Publishes events to the cloud-init log at the ``DEBUG`` log level."""
@@ -68,6 +80,21 @@ class PrintHandler(ReportingHandler):
 
 
 class WebHookHandler(ReportingHandler):
+    """Post events as json to an http endpoint from a background thread.
+
+    publish_event only queues the event, a sender thread posts it so that
+    boot does not wait on the endpoint. Up to batch_size events are posted
+    at once as a json list, waiting at most flush_interval seconds for a
+    batch to fill. With the default batch_size of 1 each event is posted on
+    its own as a json object. Once queue_size events are waiting the oldest
+    are dropped.
+
+    With spool set, events that could not be posted are kept in a file
+    under WEBHOOK_SPOOL_DIR, also by later stages, and are posted again
+    ahead of the next batch. That includes the events still being posted
+    when flush gives up, which may then be posted twice.
+    """
+
     def __init__(
         self,
         endpoint,
@@ -77,6 +104,11 @@ class WebHookHandler(ReportingHandler):
         consumer_secret=None,
         timeout=None,
         retries=None,
+        batch_size=1,
+        flush_interval=1.0,
+        queue_size=1000,
+        flush_timeout=30,
+        spool=False,
     ):
         super(WebHookHandler, self).__init__()
 
@@ -93,22 +125,367 @@ class WebHookHandler(ReportingHandler):
         self.timeout = timeout
         self.retries = retries
         self.ssl_details = util.fetch_ssl_details()
+        self.batch_size = max(int(batch_size), 1)
+        self.flush_interval = float(flush_interval)
+        self.flush_timeout = flush_timeout
+        self.spool = spool
+        self.dropped = 0
+        self._queue = collections.deque(maxlen=max(int(queue_size), 1))
+        self._cond = threading.Condition()
+        # Events being posted, and whether flush spooled them meanwhile
+        self._in_flight = []
+        self._in_flight_spooled = False
+        self._flushing = False
+        self._closed = False
+        self._sender = None
+        self._spool_lock = threading.Lock()
+
+    @property
+    def spool_file(self):
+        """Path of the spool of events not yet posted to this endpoint."""
+        digest = hashlib.sha256(self.endpoint.encode("utf-8")).hexdigest()
+        return os.path.join(WEBHOOK_SPOOL_DIR, "webhook-%s.json" % digest[:16])
 
     def publish_event(self, event):
+        with self._cond:
+            if len(self._queue) == self._queue.maxlen:
+                self.dropped += 1
+                LOG.warning(
+                    "webhook queue for %s is full, dropping oldest event",
+                    self.endpoint,
+                )
+            self._queue.append(event.as_dict())
+            if self._sender is None:
+                self._sender = threading.Thread(
+                    target=self._send_routine, name="webhook-sender"
+                )
+                self._sender.daemon = True
+                self._sender.start()
+            self._cond.notify_all()
+
+    def _next_batch(self):
+        """Return the next events to post, None once closed and drained."""
+        with self._cond:
+            while not self._queue:
+                if self._closed:
+                    self._sender = None
+                    return None
+                self._cond.wait()
+            deadline = time.monotonic() + self.flush_interval
+            while len(self._queue) < self.batch_size and not self._flushing:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            count = min(self.batch_size, len(self._queue))
+            batch = [self._queue.popleft() for _ in range(count)]
+            self._in_flight = batch
+            self._in_flight_spooled = False
+            return batch
+
+    def _send_routine(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                self._send(batch)
+            except Exception:
+                LOG.warning(
+                    "failed posting %d events to %s",
+                    len(batch),
+                    self.endpoint,
+                    exc_info=True,
+                )
+            finally:
+                with self._cond:
+                    self._in_flight = []
+                    self._cond.notify_all()
+
+    def _send(self, batch):
+        """Post the spooled events, if any, and then batch.
+
+        The spool lock is not held while posting, so that flush can spool
+        what is still queued or in flight when its deadline passes.
+        """
+        if not self.spool:
+            self._post_all(batch)
+            return
+        with self._spool_lock:
+            spooled = self._read_spool()
+        unsent = self._post_all(spooled + batch)
+        unsent_batch = unsent[max(len(unsent) - len(batch), 0) :]
+        with self._spool_lock:
+            with self._cond:
+                # From here on flush leaves batch to this thread
+                batch_spooled = self._in_flight_spooled
+                self._in_flight = []
+            # Events spooled by flush since are kept after the unsent ones
+            appended = self._read_spool()[len(spooled) :]
+            if batch_spooled:
+                # flush already spooled batch, drop what got posted after all
+                for event in batch[: len(batch) - len(unsent_batch)]:
+                    if event in appended:
+                        appended.remove(event)
+                unsent = unsent[: len(unsent) - len(unsent_batch)]
+            self._write_spool(unsent + appended)
+
+    def _post_all(self, events):
+        """Post events in batches, stopping at the first failure.
+
+        @return: the list of events not posted.
+        """
+        for start in range(0, len(events), self.batch_size):
+            if not self._post(events[start : start + self.batch_size]):
+                return events[start:]
+        return []
+
+    def _post(self, batch):
         if self.oauth_helper:
             readurl = self.oauth_helper.readurl
         else:
             readurl = url_helper.readurl
+        data = batch if self.batch_size > 1 else batch[0]
         try:
-            return readurl(
+            readurl(
                 self.endpoint,
-                data=json.dumps(event.as_dict()),
+                data=json.dumps(data),
                 timeout=self.timeout,
                 retries=self.retries,
                 ssl_details=self.ssl_details,
             )
         except Exception:
-            LOG.warning("failed posting event: %s", event.as_string())
+            LOG.warning(
+                "failed posting %d events to %s", len(batch), self.endpoint
+            )
+            return False
+        return True
+
+    def _read_spool(self):
+        try:
+            events = json.loads(util.load_file(self.spool_file))
+        except (OSError, ValueError):
+            return []
+        return events if isinstance(events, list) else []
+
+    def _write_spool(self, events):
+        """Replace the spool with the newest queue_size of events."""
+        try:
+            if not events:
+                if os.path.exists(self.spool_file):
+                    util.del_file(self.spool_file)
+                return
+            util.ensure_dir(WEBHOOK_SPOOL_DIR, mode=0o700)
+            atomic_helper.write_json(
+                self.spool_file, events[-self._queue.maxlen :], mode=0o600
+            )
+        except OSError as e:
+            LOG.warning("failed spooling webhook events, %s", e)
+            return
+        if events:
+            LOG.debug(
+                "Spooled %d events for %s in %s",
+                len(events),
+                self.endpoint,
+                self.spool_file,
+            )
+
+    def flush(self, timeout=None):
+        """Wait for queued events to be posted, for at most timeout seconds.
+
+        timeout defaults to flush_timeout, None waits until all are posted.
+        Events still queued or being posted at the deadline are spooled if
+        spool is set.
+        """
+        if timeout is None:
+            timeout = self.flush_timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        LOG.debug("WebHookHandler flushing remaining events")
+        unsent = []
+        with self._cond:
+            self._flushing = True
+            self._cond.notify_all()
+            try:
+                while self._queue or self._in_flight:
+                    if deadline is None:
+                        self._cond.wait()
+                        continue
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                pending = len(self._queue) + len(self._in_flight)
+                if pending and self.spool:
+                    if not self._in_flight_spooled:
+                        unsent.extend(self._in_flight)
+                        self._in_flight_spooled = True
+                    unsent.extend(self._queue)
+                    self._queue.clear()
+            finally:
+                self._flushing = False
+        if not pending:
+            return
+        LOG.warning(
+            "%d events not posted to %s within %ss",
+            pending,
+            self.endpoint,
+            timeout,
+        )
+        if self.spool:
+            with self._spool_lock:
+                self._write_spool(self._read_spool() + unsent)
+
+    def close(self):
+        """Stop the sender thread once the events queued are posted."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class KvpPool(object):
+    """Access to a Hyper-V KVP pool file through a file kept open.
+
+    The pool is an array of fixed size records, each a null padded key
+    followed by a null padded value, as read by hv_kvp_daemon. The file is
+    kept open between writes, along with an index of the slot holding each
+    key, so records are written in place without rescanning or reopening
+    the pool. Records appended by other writers are indexed at the next
+    access. Slots whose key is_stale() are reused before the pool grows.
+    Other writers may rewrite slots in place, so a slot's key is checked
+    again under the lock before it is written over, and the record is
+    appended when the slot no longer holds what was indexed.
+
+    The pool is only accessed with pread and pwrite, never mapped: the
+    daemon truncates pool files under a lock flock does not exclude, and
+    that only shortens what is read here.
+    """
+
+    def __init__(self, path, key_size, value_size, is_stale=None):
+        self.path = path
+        self.key_size = key_size
+        self.record_size = key_size + value_size
+        self._is_stale = is_stale
+        self._fd = None
+        self._inode = None
+        self._slots = 0
+        self._index = {}
+        self._stale = collections.deque()
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        self._slots = 0
+        self._index = {}
+        self._stale.clear()
+
+    def _open(self, create):
+        """Open the pool unless the file open is still the one at path."""
+        try:
+            inode = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            if not create:
+                raise
+            inode = None
+        if self._fd is not None and inode == self._inode:
+            return
+        self.close()
+        flags = os.O_RDWR | os.O_CREAT if create else os.O_RDWR
+        self._fd = os.open(self.path, flags, 0o644)
+        self._inode = os.fstat(self._fd).st_ino
+
+    def _sync(self):
+        """Index the keys of the records added since the last access."""
+        slots = os.fstat(self._fd).st_size // self.record_size
+        if slots == self._slots:
+            return
+        start = self._slots
+        if slots < self._slots:
+            # truncated under us, index it from scratch
+            start = 0
+            self._index = {}
+            self._stale.clear()
+        records = self._read(start * self.record_size, slots)
+        self._slots = start + len(records)
+        for slot, record in enumerate(records, start):
+            key = self._record_key(record)
+            self._index[key] = slot
+            if self._is_stale and self._is_stale(key):
+                self._stale.append(slot)
+
+    def _read(self, offset, end_slot):
+        """Return the whole records from byte offset up to end_slot."""
+        data = os.pread(
+            self._fd, max(end_slot * self.record_size - offset, 0), offset
+        )
+        return [
+            data[pos : pos + self.record_size]
+            for pos in range(
+                0, len(data) - self.record_size + 1, self.record_size
+            )
+        ]
+
+    @contextlib.contextmanager
+    def _locked(self, create=False):
+        self._open(create)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            self._sync()
+            yield
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _key_at(self, slot):
+        key = os.pread(self._fd, self.key_size, slot * self.record_size)
+        return self._record_key(key)
+
+    def _record_key(self, record):
+        key = record[: self.key_size].split(b"\x00", 1)[0]
+        return key.decode("utf-8", "replace")
+
+    def _reuse_stale(self, slot):
+        """Return slot if its key is still stale, otherwise index it."""
+        key = self._key_at(slot)
+        if not self._is_stale(key):
+            # reused by another writer since indexed
+            self._index[key] = slot
+            return None
+        if self._index.get(key) == slot:
+            del self._index[key]
+        return slot
+
+    def records(self, offset=0):
+        """Return the encoded records from byte offset on."""
+        with self._locked():
+            return self._read(offset, self._slots)
+
+    def write(self, records):
+        """Write encoded records over their key, a stale slot or at the end."""
+        with self._locked(create=True):
+            appended = []
+            for record in records:
+                key = self._record_key(record)
+                slot = self._index.get(key)
+                if slot is not None and self._key_at(slot) != key:
+                    # rewritten in place by another writer since indexed
+                    del self._index[key]
+                    slot = None
+                while slot is None and self._stale:
+                    slot = self._reuse_stale(self._stale.popleft())
+                if slot is None:
+                    appended.append(record)
+                    continue
+                os.pwrite(self._fd, record, slot * self.record_size)
+                self._index[key] = slot
+            if appended:
+                # append at the end of the records the pool holds now
+                self._sync()
+                os.pwrite(
+                    self._fd,
+                    b"".join(appended),
+                    self._slots * self.record_size,
+                )
+                self._sync()
 
 
 class HyperVKvpReportingHandler(ReportingHandler):
@@ -148,6 +525,12 @@ class HyperVKvpReportingHandler(ReportingHandler):
         HyperVKvpReportingHandler._truncate_guest_pool_file(
             self._kvp_file_path
         )
+        self._pool = KvpPool(
+            self._kvp_file_path,
+            self.HV_KVP_EXCHANGE_MAX_KEY_SIZE,
+            self.HV_KVP_EXCHANGE_MAX_VALUE_SIZE,
+            is_stale=self._is_stale_key,
+        )
 
         self._event_types = event_types
         self.q = queue.Queue()
@@ -198,17 +581,20 @@ class HyperVKvpReportingHandler(ReportingHandler):
             LOG.warning("uptime '%s' not in correct format.", uptime_str)
             return 0
 
+    def _is_stale_key(self, key):
+        """Whether key is from cloud-init in an earlier incarnation."""
+        parts = key.split("|", 2)
+        return (
+            len(parts) == 3
+            and parts[0] == self.EVENT_PREFIX
+            and parts[1].isdigit()
+            and int(parts[1]) < self.incarnation_no
+        )
+
     def _iterate_kvps(self, offset):
         """iterate the kvp file from the current offset."""
-        with open(self._kvp_file_path, "rb") as f:
-            fcntl.flock(f, fcntl.LOCK_EX)
-            f.seek(offset)
-            record_data = f.read(self.HV_KVP_RECORD_SIZE)
-            while len(record_data) == self.HV_KVP_RECORD_SIZE:
-                kvp_item = self._decode_kvp_item(record_data)
-                yield kvp_item
-                record_data = f.read(self.HV_KVP_RECORD_SIZE)
-            fcntl.flock(f, fcntl.LOCK_UN)
+        for record_data in self._pool.records(offset):
+            yield self._decode_kvp_item(record_data)
 
     def _event_key(self, event):
         """
@@ -256,12 +642,7 @@ class HyperVKvpReportingHandler(ReportingHandler):
         return {"key": k, "value": v}
 
     def _append_kvp_item(self, record_data):
-        with open(self._kvp_file_path, "ab") as f:
-            fcntl.flock(f, fcntl.LOCK_EX)
-            for data in record_data:
-                f.write(data)
-            f.flush()
-            fcntl.flock(f, fcntl.LOCK_UN)
+        self._pool.write(record_data)
 
     def _break_down(self, key, meta_data, description):
         del meta_data[self.MSG_KEY]
@@ -269,22 +650,16 @@ class HyperVKvpReportingHandler(ReportingHandler):
         des_in_json = des_in_json[1 : (len(des_in_json) - 1)]
         i = 0
         result_array = []
-        message_place_holder = '"' + self.MSG_KEY + '":""'
+        # the metadata is the same in every slice, serialize it once
+        head = json.dumps(meta_data, separators=self.JSON_SEPARATORS)[:-1]
+        head += ',"{0}":'.format(self.DESC_IDX_KEY)
+        msg = ',"{0}":"'.format(self.MSG_KEY)
         while True:
-            meta_data[self.DESC_IDX_KEY] = i
-            meta_data[self.MSG_KEY] = ""
-            data_without_desc = json.dumps(
-                meta_data, separators=self.JSON_SEPARATORS
-            )
+            data_without_desc = head + str(i) + msg + '"}'
             room_for_desc = (
                 self.HV_KVP_AZURE_MAX_VALUE_SIZE - len(data_without_desc) - 8
             )
-            value = data_without_desc.replace(
-                message_place_holder,
-                '"{key}":"{desc}"'.format(
-                    key=self.MSG_KEY, desc=des_in_json[:room_for_desc]
-                ),
-            )
+            value = head + str(i) + msg + des_in_json[:room_for_desc] + '"}'
             subkey = "{}|{}".format(key, i)
             result_array.append(self._encode_kvp_item(subkey, value))
             i += 1
@@ -8,6 +8,10 @@ import yaml
 
 YAMLError = yaml.YAMLError
 
+# PyYAML may be built without libyaml, whose C parser and emitter are several
+# times faster than the pure python ones.
+HAS_LIBYAML = getattr(yaml, "__with_libyaml__", False)
+
 
 class _CustomSafeLoader(yaml.SafeLoader):
     def construct_python_unicode(self, node):
@@ -19,8 +23,24 @@ _CustomSafeLoader.add_constructor(
     _CustomSafeLoader.construct_python_unicode,
 )
 
+if HAS_LIBYAML:
+
+    class _CustomCSafeLoader(yaml.CSafeLoader):
+        construct_python_unicode = _CustomSafeLoader.construct_python_unicode
+
+    _CustomCSafeLoader.add_constructor(
+        "tag:yaml.org,2002:python/unicode",
+        _CustomCSafeLoader.construct_python_unicode,
+    )
+    _Dumper = yaml.CDumper
+    _SafeDumper = yaml.CSafeDumper
+else:
+    _CustomCSafeLoader = None
+    _Dumper = yaml.dumper.Dumper
+    _SafeDumper = yaml.dumper.SafeDumper
+
 
-class NoAliasSafeDumper(yaml.dumper.SafeDumper):
+class NoAliasSafeDumper(_SafeDumper):
     """A class which avoids constructing anchors/aliases on yaml dump"""
 
     def ignore_aliases(self, data):
@@ -28,6 +48,16 @@ class NoAliasSafeDumper(yaml.dumper.SafeDumper):
 
 
 def load(blob):
+    """Safely load a yaml document, with libyaml when available.
+
+    A document the C parser rejects is parsed again in python, which then
+    raises the same errors, with the same marks, as without libyaml.
+    """
+    if _CustomCSafeLoader is not None:
+        try:
+            return yaml.load(blob, Loader=_CustomCSafeLoader)
+        except YAMLError:
+            pass
     return yaml.load(blob, Loader=_CustomSafeLoader)
 
 
@@ -41,7 +71,7 @@ def dumps(obj, explicit_start=True, explicit_end=True, noalias=False):
         explicit_start=explicit_start,
         explicit_end=explicit_end,
         default_flow_style=False,
-        Dumper=(NoAliasSafeDumper if noalias else yaml.dumper.Dumper),
+        Dumper=(NoAliasSafeDumper if noalias else _Dumper),
     )
 
 
@@ -266,6 +266,7 @@ BUILTIN_CLOUD_EPHEMERAL_DISK_CONFIG = {
 
 DS_CFG_PATH = ["datasource", DS_NAME]
 DS_CFG_KEY_PRESERVE_NTFS = "never_destroy_ntfs"
+DS_CFG_KEY_KVP_LOG_BUDGET = "kvp_log_budget"
 DEF_EPHEMERAL_LABEL = "Temporary Storage"
 
 # The redacted password fails to meet password complexity requirements
@@ -1560,7 +1561,10 @@ class DataSourceAzure(sources.DataSource):
                 preserve_ntfs=self.ds_cfg.get(DS_CFG_KEY_PRESERVE_NTFS, False),
             )
         finally:
-            push_log_to_kvp(self.sys_cfg["def_log_file"])
+            push_log_to_kvp(
+                self.sys_cfg["def_log_file"],
+                budget=self.ds_cfg.get(DS_CFG_KEY_KVP_LOG_BUDGET),
+            )
         return
 
     @property
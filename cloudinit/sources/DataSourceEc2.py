@@ -10,6 +10,7 @@
 
 import copy
 import os
+import threading
 import time
 
 from cloudinit import dmi
@@ -34,6 +35,9 @@ AWS_TOKEN_PUT_HEADER = "X-aws-ec2-metadata-token"
 AWS_TOKEN_REQ_HEADER = AWS_TOKEN_PUT_HEADER + "-ttl-seconds"
 AWS_TOKEN_REDACT = [AWS_TOKEN_PUT_HEADER, AWS_TOKEN_REQ_HEADER]
 
+# Serializes API token refreshes requested by concurrent metadata crawls
+_API_TOKEN_LOCK = threading.Lock()
+
 
 class CloudNames(object):
     ALIYUN = "aliyun"
@@ -252,6 +256,7 @@ class DataSourceEc2(sources.DataSource):
                 exception_cb=self._imds_exception_cb,
                 request_method=request_method,
                 headers_redact=AWS_TOKEN_REDACT,
+                connect_synchronously=not self._race_metadata_urls,
             )
         except uhelp.UrlError:
             # We use the raised exception to interupt the retry loop.
@@ -266,6 +271,12 @@ class DataSourceEc2(sources.DataSource):
         # or the IMDS HTTP endpoint is disabled
         return None
 
+    @property
+    def _race_metadata_urls(self):
+        return util.get_cfg_option_bool(
+            self.ds_cfg, "race_metadata_urls", False
+        )
+
     def wait_for_metadata_service(self):
         mcfg = self.ds_cfg
 
@@ -317,6 +328,7 @@ class DataSourceEc2(sources.DataSource):
                 headers_redact=AWS_TOKEN_REDACT,
                 headers_cb=self._get_headers,
                 request_method=request_method,
+                connect_synchronously=not self._race_metadata_urls,
             )
 
             if url:
@@ -519,6 +531,9 @@ class DataSourceEc2(sources.DataSource):
             exc_cb_ud = self._skip_or_refresh_stale_aws_token_cb
         else:
             exc_cb = exc_cb_ud = None
+        max_workers = util.get_cfg_option_int(
+            self.ds_cfg, "max_crawl_workers", 1
+        )
         try:
             crawled_metadata["user-data"] = ec2.get_instance_userdata(
                 api_version,
@@ -533,6 +548,7 @@ class DataSourceEc2(sources.DataSource):
                 headers_cb=self._get_headers,
                 headers_redact=redact,
                 exception_cb=exc_cb,
+                max_workers=max_workers,
             )
             if self.cloud_name == CloudNames.AWS:
                 identity = ec2.get_instance_identity(
@@ -541,6 +557,7 @@ class DataSourceEc2(sources.DataSource):
                     headers_cb=self._get_headers,
                     headers_redact=redact,
                     exception_cb=exc_cb,
+                    max_workers=max_workers,
                 )
                 crawled_metadata["dynamic"] = {"instance-identity": identity}
         except Exception:
@@ -635,14 +652,16 @@ class DataSourceEc2(sources.DataSource):
         request_token_header = {AWS_TOKEN_REQ_HEADER: AWS_TOKEN_TTL_SECONDS}
         if API_TOKEN_ROUTE in url:
             return request_token_header
-        if not self._api_token:
-            # If we don't yet have an API token, get one via a PUT against
-            # API_TOKEN_ROUTE. This _api_token may get unset by a 403 due
-            # to an invalid or expired token
-            self._api_token = self._refresh_api_token()
+        with _API_TOKEN_LOCK:
             if not self._api_token:
-                return {}
-        return {AWS_TOKEN_PUT_HEADER: self._api_token}
+                # If we don't yet have an API token, get one via a PUT against
+                # API_TOKEN_ROUTE. This _api_token may get unset by a 403 due
+                # to an invalid or expired token
+                self._api_token = self._refresh_api_token()
+            api_token = self._api_token
+        if not api_token:
+            return {}
+        return {AWS_TOKEN_PUT_HEADER: api_token}
 
 
 class DataSourceEc2Local(DataSourceEc2):
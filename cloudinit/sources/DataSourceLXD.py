@@ -31,7 +31,7 @@ from requests.packages.urllib3.connection import HTTPConnection
 from requests.packages.urllib3.connectionpool import HTTPConnectionPool
 
 from cloudinit import log as logging
-from cloudinit import sources, subp, util
+from cloudinit import sources, util
 
 LOG = logging.getLogger(__name__)
 
@@ -61,24 +61,14 @@ def generate_fallback_network_config() -> dict:
             }
         ],
     }
-    if subp.which("systemd-detect-virt"):
-        try:
-            virt_type, _ = subp.subp(["systemd-detect-virt"])
-        except subp.ProcessExecutionError as err:
-            LOG.warning(
-                "Unable to run systemd-detect-virt: %s."
-                " Rendering default network config.",
-                err,
-            )
-            return network_v1
-        if virt_type.strip() == "kvm":  # instance.type VIRTUAL-MACHINE
-            arch = util.system_info()["uname"][4]
-            if arch == "ppc64le":
-                network_v1["config"][0]["name"] = "enp0s5"
-            elif arch == "s390x":
-                network_v1["config"][0]["name"] = "enc9"
-            else:
-                network_v1["config"][0]["name"] = "enp5s0"
+    if util.get_virt_type() == "kvm":  # instance.type VIRTUAL-MACHINE
+        arch = util.system_info()["uname"][4]
+        if arch == "ppc64le":
+            network_v1["config"][0]["name"] = "enp0s5"
+        elif arch == "s390x":
+            network_v1["config"][0]["name"] = "enc9"
+        else:
+            network_v1["config"][0]["name"] = "enp5s0"
     return network_v1
 
 
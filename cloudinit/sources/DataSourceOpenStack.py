@@ -94,6 +94,9 @@ class DataSourceOpenStack(openstack.SourceMixin, sources.DataSource):
             urls=md_urls,
             max_wait=url_params.max_wait_seconds,
             timeout=url_params.timeout_seconds,
+            connect_synchronously=not util.get_cfg_option_bool(
+                self.ds_cfg, "race_metadata_urls", False
+            ),
         )
         if avail_url:
             LOG.debug("Using metadata source: '%s'", url2base[avail_url])
@@ -13,20 +13,27 @@ import copy
 import json
 import os
 from collections import namedtuple
-from typing import Dict, List  # noqa: F401
+from concurrent import futures
+from typing import TYPE_CHECKING, Dict, List, Optional  # noqa: F401
 
 from cloudinit import dmi, importer
 from cloudinit import log as logging
-from cloudinit import net, type_utils
-from cloudinit import user_data as ud
-from cloudinit import util
+from cloudinit import type_utils, util
 from cloudinit.atomic_helper import write_json
-from cloudinit.distros import Distro
 from cloudinit.event import EventScope, EventType
-from cloudinit.filters import launch_index
 from cloudinit.persistence import CloudInitPickleMixin
 from cloudinit.reporting import events
 
+if TYPE_CHECKING:
+    from cloudinit.distros import Distro
+
+# Only needed once a datasource is instantiated, not by the CLI tools which
+# merely read constants and instance-data from this module.
+launch_index = importer.lazy_import("cloudinit.filters.launch_index")
+jinja_template = importer.lazy_import("cloudinit.handlers.jinja_template")
+net = importer.lazy_import("cloudinit.net")
+ud = importer.lazy_import("cloudinit.user_data")
+
 DSMODE_DISABLED = "disabled"
 DSMODE_LOCAL = "local"
 DSMODE_NETWORK = "net"
@@ -38,6 +45,10 @@ DEP_FILESYSTEM = "FILESYSTEM"
 DEP_NETWORK = "NETWORK"
 DS_PREFIX = "DataSource"
 
+# Values for the datasource_search_mode system config key
+DS_SEARCH_SERIAL = "serial"
+DS_SEARCH_PARALLEL = "parallel"
+
 EXPERIMENTAL_TEXT = (
     "EXPERIMENTAL: The structure and format of content scoped under the 'ds'"
     " key may change in subsequent releases of cloud-init."
@@ -50,6 +61,9 @@ INSTANCE_JSON_FILE = "instance-data.json"
 # security-sensitive key values are present in this root-readable file
 INSTANCE_JSON_SENSITIVE_FILE = "instance-data-sensitive.json"
 REDACT_SENSITIVE_VALUE = "redacted for non-root user"
+# Flat index of the query keys of an instance-data file, written next to it
+INSTANCE_JSON_INDEX_SUFFIX = "-index.json"
+INSTANCE_JSON_INDEX_VERSION = 2
 
 # Key which can be provide a cloud's official product name to cloud-init
 METADATA_CLOUD_NAME_KEY = "cloud-name"
@@ -138,6 +152,61 @@ def redact_sensitive_keys(metadata, redact_value=REDACT_SENSITIVE_VALUE):
     return md_copy
 
 
+def get_instance_data_index_path(instance_data_fn):
+    """Return the path of the flat key index of instance_data_fn."""
+    return os.path.splitext(instance_data_fn)[0] + INSTANCE_JSON_INDEX_SUFFIX
+
+
+def _instance_data_source_state(instance_data_fn):
+    stat = os.stat(instance_data_fn)
+    return [stat.st_mtime_ns, stat.st_size, stat.st_ino]
+
+
+def write_instance_data_index(instance_data_fn, instance_data, mode=0o644):
+    """Write the flat key index of instance_data written to instance_data_fn.
+
+    The index lists each leaf of the converted instance_data once, as
+    returned by flatten_jinja_instance_data, so queries need not load and
+    convert the whole file. The mtime, size and inode of instance_data_fn are
+    recorded to tell when the index no longer describes it, so failing to
+    write it is only logged.
+    """
+    index_fn = get_instance_data_index_path(instance_data_fn)
+    try:
+        index = {
+            "version": INSTANCE_JSON_INDEX_VERSION,
+            "source": _instance_data_source_state(instance_data_fn),
+            "keys": jinja_template.flatten_jinja_instance_data(instance_data),
+        }
+        write_json(index_fn, index, mode=mode)
+    except (IOError, OSError) as e:
+        LOG.warning("Failed writing instance-data index %s: %s", index_fn, e)
+
+
+def read_instance_data_index(instance_data_fn):
+    """Return the flat key index of instance_data_fn.
+
+    @return: Dict of leaves to look varnames up in with
+        get_flattened_jinja_variable, or None when the index is absent,
+        unreadable or was not written for the current content of
+        instance_data_fn.
+    """
+    try:
+        index = util.load_json(
+            util.load_file(get_instance_data_index_path(instance_data_fn))
+        )
+        source = _instance_data_source_state(instance_data_fn)
+    except (IOError, OSError, TypeError, ValueError):
+        return None
+    if (
+        index.get("version") != INSTANCE_JSON_INDEX_VERSION
+        or index.get("source") != source
+        or not isinstance(index.get("keys"), dict)
+    ):
+        return None
+    return index["keys"]
+
+
 URLParams = namedtuple(
     "URLParms",
     [
@@ -240,8 +309,18 @@ class DataSource(CloudInitPickleMixin, metaclass=abc.ABCMeta):
     )
 
     _ci_pkl_version = 1
+    # Large attributes restored from obj.pkl on first access only. They are
+    # pickled apart, so no other attribute may reference their values.
+    _ci_pkl_lazy_attrs = (
+        "userdata",
+        "userdata_raw",
+        "vendordata",
+        "vendordata_raw",
+        "vendordata2",
+        "vendordata2_raw",
+    )
 
-    def __init__(self, sys_cfg, distro: Distro, paths, ud_proc=None):
+    def __init__(self, sys_cfg, distro: "Distro", paths, ud_proc=None):
         self.sys_cfg = sys_cfg
         self.distro = distro
         self.paths = paths
@@ -409,9 +488,14 @@ class DataSource(CloudInitPickleMixin, metaclass=abc.ABCMeta):
             self.paths.run_dir, INSTANCE_JSON_SENSITIVE_FILE
         )
         write_json(json_sensitive_file, processed_data, mode=0o600)
+        write_instance_data_index(
+            json_sensitive_file, processed_data, mode=0o600
+        )
         json_file = os.path.join(self.paths.run_dir, INSTANCE_JSON_FILE)
         # World readable
-        write_json(json_file, redact_sensitive_keys(processed_data))
+        redacted_data = redact_sensitive_keys(processed_data)
+        write_json(json_file, redacted_data)
+        write_instance_data_index(json_file, redacted_data)
         return True
 
     def _get_data(self):
@@ -794,6 +878,21 @@ class DataSource(CloudInitPickleMixin, metaclass=abc.ABCMeta):
         # quickly (local check only) if self.instance_id is still
         return False
 
+    def ds_detect(self) -> Optional[bool]:
+        """Cheaply check whether this datasource's platform is present.
+
+        Called concurrently for all candidates during a parallel datasource
+        search, so it must only perform local checks and must not alter
+        system state.
+
+        @return: True if the platform is detected, False if it is not, and
+            None when the datasource offers no cheap check.
+        """
+        platform_check = getattr(self, "_is_platform_viable", None)
+        if platform_check is None:
+            return None
+        return bool(platform_check())
+
     @staticmethod
     def _determine_dsmode(candidates, default=None, valid=None):
         # return the first candidate that is non None, warn if not valid
@@ -879,30 +978,72 @@ def normalize_pubkey_data(pubkey_data):
     return keys
 
 
+def _detect_source(cls, sys_cfg, distro, paths):
+    """Instantiate datasource cls and run its cheap platform check."""
+    s = cls(sys_cfg, distro, paths)
+    return (s, s.ds_detect())
+
+
 def find_source(sys_cfg, distro, paths, ds_deps, cfg_list, pkg_list, reporter):
     ds_list = list_sources(cfg_list, ds_deps, pkg_list)
     ds_names = [type_utils.obj_name(f) for f in ds_list]
     mode = "network" if DEP_NETWORK in ds_deps else "local"
     LOG.debug("Searching for %s data source in: %s", mode, ds_names)
 
-    for name, cls in zip(ds_names, ds_list):
-        myrep = events.ReportEventStack(
-            name="search-%s" % name.replace("DataSource", ""),
-            description="searching for %s data from %s" % (mode, name),
-            message="no %s data found from %s" % (mode, name),
-            parent=reporter,
+    search_mode = util.get_cfg_option_str(
+        sys_cfg, "datasource_search_mode", DS_SEARCH_SERIAL
+    )
+    executor = None
+    detections = []
+    if search_mode == DS_SEARCH_PARALLEL and ds_list:
+        # Run every candidate's cheap platform check at once. Candidates
+        # are still committed to in configured order below, so a slow
+        # check only delays the search if a higher-priority datasource
+        # has not already been found.
+        executor = futures.ThreadPoolExecutor(max_workers=len(ds_list))
+        detections = [
+            executor.submit(_detect_source, cls, sys_cfg, distro, paths)
+            for cls in ds_list
+        ]
+    elif search_mode not in (DS_SEARCH_SERIAL, DS_SEARCH_PARALLEL):
+        LOG.warning(
+            "Invalid datasource_search_mode '%s', using '%s'",
+            search_mode,
+            DS_SEARCH_SERIAL,
         )
-        try:
-            with myrep:
-                LOG.debug("Seeing if we can get any data from %s", cls)
-                s = cls(sys_cfg, distro, paths)
-                if s.update_metadata_if_supported(
-                    [EventType.BOOT_NEW_INSTANCE]
-                ):
-                    myrep.message = "found %s data from %s" % (mode, name)
-                    return (s, type_utils.obj_name(cls))
-        except Exception:
-            util.logexc(LOG, "Getting data from %s failed", cls)
+
+    try:
+        for idx, (name, cls) in enumerate(zip(ds_names, ds_list)):
+            myrep = events.ReportEventStack(
+                name="search-%s" % name.replace("DataSource", ""),
+                description="searching for %s data from %s" % (mode, name),
+                message="no %s data found from %s" % (mode, name),
+                parent=reporter,
+            )
+            try:
+                with myrep:
+                    LOG.debug("Seeing if we can get any data from %s", cls)
+                    if detections:
+                        (s, detected) = detections[idx].result()
+                        if detected is False:
+                            LOG.debug("Platform not detected for %s", name)
+                            continue
+                    else:
+                        s = cls(sys_cfg, distro, paths)
+                    if s.update_metadata_if_supported(
+                        [EventType.BOOT_NEW_INSTANCE]
+                    ):
+                        myrep.message = "found %s data from %s" % (mode, name)
+                        return (s, type_utils.obj_name(cls))
+            except Exception:
+                util.logexc(LOG, "Getting data from %s failed", cls)
+    finally:
+        if executor:
+            # Lower-priority candidates are no longer needed: drop the
+            # checks which have not started and do not wait on the rest.
+            for detection in detections:
+                detection.cancel()
+            executor.shutdown(wait=False)
 
     msg = "Did not find any data source, searched classes: (%s)" % ", ".join(
         ds_names
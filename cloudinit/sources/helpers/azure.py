@@ -44,9 +44,17 @@ COMPRESSED_EVENT_TYPE = "compressed"
 # cloud-init.log files where the P95 of the file sizes was 537KB and the time
 # consumed to dump 500KB file was (P95:76, P99:233, P99.9:1170) in ms
 MAX_LOG_TO_KVP_LENGTH = 512000
-# File to store the last byte of cloud-init.log that was pushed to KVP. This
-# file will be deleted with every VM reboot.
+# Maximum number of bytes of cloud-init.log and kernel messages that can be
+# dumped to KVP in a boot, across all calls to push_log_to_kvp
+MAX_LOG_TO_KVP_PER_BOOT = 4 * MAX_LOG_TO_KVP_LENGTH
+# Logs are read and compressed for KVP in chunks of this many bytes
+LOG_TO_KVP_CHUNK_SIZE = 65536
+# File to store the last byte of cloud-init.log and the sequence number of the
+# last kernel message that were pushed to KVP, with the bytes pushed so far.
+# This file will be deleted with every VM reboot.
 LOG_PUSHED_TO_KVP_INDEX_FILE = "/run/cloud-init/log_pushed_to_kvp_index"
+# Kernel messages are read from here, by sequence number, when readable
+KMSG_DEVICE = "/dev/kmsg"
 azure_ds_reporter = events.ReportEventStack(
     name="azure-ds",
     description="initialize reporter for azure ds",
@@ -229,9 +237,14 @@ def report_diagnostic_event(
     return evt
 
 
-def report_compressed_event(event_name, event_content):
-    """Report a compressed event"""
-    compressed_data = base64.encodebytes(zlib.compress(event_content))
+def report_compressed_event(event_name, event_content, compressed=False):
+    """Report a compressed event
+
+    event_content is compressed with zlib, unless compressed is True which
+    means it already is."""
+    if not compressed:
+        event_content = zlib.compress(event_content)
+    compressed_data = base64.encodebytes(event_content)
     event_data = {
         "encoding": "gz+b64",
         "data": compressed_data.decode("ascii"),
@@ -250,30 +263,111 @@ def report_compressed_event(event_name, event_content):
     return evt
 
 
+class _ChunkCompressor(object):
+    """Compress data fed in chunks, keeping at most budget bytes of it."""
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.size = 0
+        self._compressor = zlib.compressobj()
+        self._parts = []
+
+    def fits(self, data):
+        return self.size + len(data) <= self.budget
+
+    def feed(self, data):
+        """Compress data up to the budget and return the bytes taken."""
+        data = data[: max(self.budget - self.size, 0)]
+        if data:
+            self._parts.append(self._compressor.compress(data))
+            self.size += len(data)
+        return len(data)
+
+    def finish(self):
+        """Return the zlib stream of all the data fed."""
+        self._parts.append(self._compressor.flush())
+        return b"".join(self._parts)
+
+
+def _read_kmsg(fd, after_seq):
+    """Yield the sequence number and dmesg style line of each kernel message
+    in the /dev/kmsg fd logged after after_seq."""
+    while True:
+        try:
+            record = os.read(fd, 8192)
+        except BlockingIOError:
+            return
+        except BrokenPipeError:
+            # overwritten in the ring buffer before it could be read
+            continue
+        if not record:
+            return
+        header, _, text = record.partition(b";")
+        fields = header.split(b",")
+        try:
+            seq = int(fields[1])
+            usec = int(fields[2])
+        except (IndexError, ValueError):
+            continue
+        if seq <= after_seq:
+            continue
+        # continuation lines hold the device dictionary, dmesg skips them
+        message = text.split(b"\n", 1)[0]
+        yield seq, b"[%5d.%06d] %s\n" % (
+            usec // 1000000,
+            usec % 1000000,
+            message,
+        )
+
+
 @azure_ds_telemetry_reporter
-def push_log_to_kvp(file_name=CFG_BUILTIN["def_log_file"]):
+def push_log_to_kvp(file_name=CFG_BUILTIN["def_log_file"], budget=None):
     """Push a portion of cloud-init.log file or the whole file to KVP
     based on the file size.
     The first time this function is called after VM boot, It will push the last
     n bytes of the log file such that n < MAX_LOG_TO_KVP_LENGTH
     If called again on the same boot, it continues from where it left off.
-    In addition to cloud-init.log, dmesg log will also be collected."""
-
-    start_index = get_last_log_byte_pushed_to_kvp_index()
+    In addition to cloud-init.log, the kernel messages logged since the last
+    call will also be collected, from /dev/kmsg or else from dmesg.
+    Logs are compressed as they are read, and no more than budget bytes of
+    them are pushed in a boot. budget defaults to the one of the first call
+    this boot, or MAX_LOG_TO_KVP_PER_BOOT, which is also used when budget
+    is not a number of bytes."""
+
+    state = _get_log_pushed_to_kvp_state()
+    if budget is None:
+        budget = state["budget"]
+    budget = _valid_kvp_log_budget(budget)
+    state["budget"] = budget
 
     LOG.debug("Dumping cloud-init.log file to KVP")
     try:
         with open(file_name, "rb") as f:
             f.seek(0, os.SEEK_END)
-            seek_index = max(f.tell() - MAX_LOG_TO_KVP_LENGTH, start_index)
+            end_index = f.tell()
+            start_index = state["log"]
+            if start_index > end_index:
+                # the log was rotated or truncated since
+                start_index = 0
+            length = min(MAX_LOG_TO_KVP_LENGTH, budget - state["pushed"])
+            seek_index = max(end_index - max(length, 0), start_index)
             report_diagnostic_event(
                 "Dumping last {0} bytes of cloud-init.log file to KVP starting"
-                " from index: {1}".format(f.tell() - seek_index, seek_index),
+                " from index: {1}".format(end_index - seek_index, seek_index),
                 logger_func=LOG.debug,
             )
             f.seek(seek_index, os.SEEK_SET)
-            report_compressed_event("cloud-init.log", f.read())
-            util.write_file(LOG_PUSHED_TO_KVP_INDEX_FILE, str(f.tell()))
+            compressor = _ChunkCompressor(end_index - seek_index)
+            chunk = f.read(LOG_TO_KVP_CHUNK_SIZE)
+            while chunk and compressor.feed(chunk):
+                chunk = f.read(LOG_TO_KVP_CHUNK_SIZE)
+            if compressor.size:
+                report_compressed_event(
+                    "cloud-init.log", compressor.finish(), compressed=True
+                )
+            state["log"] = seek_index + compressor.size
+            state["pushed"] += compressor.size
+            _write_log_pushed_to_kvp_state(state)
     except Exception as ex:
         report_diagnostic_event(
             "Exception when dumping log file: %s" % repr(ex),
@@ -282,31 +376,92 @@ def push_log_to_kvp(file_name=CFG_BUILTIN["def_log_file"]):
 
     LOG.debug("Dumping dmesg log to KVP")
     try:
-        out, _ = subp.subp(["dmesg"], decode=False, capture=True)
-        report_compressed_event("dmesg", out)
+        kmsg = os.open(KMSG_DEVICE, os.O_RDONLY | os.O_NONBLOCK)
+    except OSError as e:
+        LOG.debug("Reading dmesg, %s is not readable: %s", KMSG_DEVICE, e)
+        kmsg = None
+    try:
+        compressor = _ChunkCompressor(max(budget - state["pushed"], 0))
+        if kmsg is None:
+            out, _ = subp.subp(["dmesg"], decode=False, capture=True)
+            compressor.feed(out[max(len(out) - compressor.budget, 0) :])
+        else:
+            for seq, line in _read_kmsg(kmsg, state["kmsg"]):
+                if not compressor.fits(line):
+                    LOG.debug("Kernel messages exceed the KVP log budget")
+                    break
+                compressor.feed(line)
+                state["kmsg"] = seq
+        if compressor.size:
+            report_compressed_event(
+                "dmesg", compressor.finish(), compressed=True
+            )
+        state["pushed"] += compressor.size
+        _write_log_pushed_to_kvp_state(state)
     except Exception as ex:
         report_diagnostic_event(
             "Exception when dumping dmesg log: %s" % repr(ex),
             logger_func=LOG.warning,
         )
+    finally:
+        if kmsg is not None:
+            os.close(kmsg)
 
 
-@azure_ds_telemetry_reporter
-def get_last_log_byte_pushed_to_kvp_index():
+def _valid_kvp_log_budget(budget):
+    """Return budget as a number of bytes, or MAX_LOG_TO_KVP_PER_BOOT."""
+    if budget is None:
+        return MAX_LOG_TO_KVP_PER_BOOT
+    valid_budget = util.safe_int(budget)
+    if isinstance(budget, bool) or valid_budget is None or valid_budget < 0:
+        LOG.warning(
+            "Invalid KVP log budget %r, using %d bytes",
+            budget,
+            MAX_LOG_TO_KVP_PER_BOOT,
+        )
+        return MAX_LOG_TO_KVP_PER_BOOT
+    return valid_budget
+
+
+def _get_log_pushed_to_kvp_state():
+    """Return what push_log_to_kvp pushed to KVP so far this boot."""
+    state = {"log": 0, "kmsg": -1, "pushed": 0, "budget": None}
     try:
         with open(LOG_PUSHED_TO_KVP_INDEX_FILE, "r") as f:
-            return int(f.read())
+            # older versions stored only the log index
+            content = json.loads(f.read())
     except IOError as e:
         if e.errno != ENOENT:
             report_diagnostic_event(
                 "Reading LOG_PUSHED_TO_KVP_INDEX_FILE failed: %s." % repr(e),
                 logger_func=LOG.warning,
             )
+        return state
     except ValueError as e:
         report_diagnostic_event(
             "Invalid value in LOG_PUSHED_TO_KVP_INDEX_FILE: %s." % repr(e),
             logger_func=LOG.warning,
         )
+        return state
+    if isinstance(content, dict):
+        state.update(
+            (k, v)
+            for k, v in content.items()
+            if k in state and isinstance(v, int)
+        )
+    elif isinstance(content, int):
+        state["log"] = content
+    return state
+
+
+def _write_log_pushed_to_kvp_state(state):
+    util.write_file(LOG_PUSHED_TO_KVP_INDEX_FILE, json.dumps(state))
+
+
+@azure_ds_telemetry_reporter
+def get_last_log_byte_pushed_to_kvp_index():
+    try:
+        return _get_log_pushed_to_kvp_state()["log"]
     except Exception as e:
         report_diagnostic_event(
             "Failed to get the last log byte pushed to KVP: %s." % repr(e),
@@ -2,6 +2,7 @@
 #
 # This file is part of cloud-init. See LICENSE file for license information.
 
+import contextlib
 import os
 import select
 import socket
@@ -22,21 +23,56 @@ RTM_NEWLINK = 16
 RTM_DELLINK = 17
 RTM_GETLINK = 18
 RTM_SETLINK = 19
+RTM_NEWADDR = 20
+RTM_GETADDR = 22
+RTM_NEWROUTE = 24
+RTM_GETROUTE = 26
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
 MAX_SIZE = 65535
 RTA_DATA_OFFSET = 32
 MSG_TYPE_OFFSET = 16
 SELECT_TIMEOUT = 60
+DUMP_TIMEOUT = 5
 
 NLMSGHDR_FMT = "IHHII"
 IFINFOMSG_FMT = "BHiII"
+IFADDRMSG_FMT = "BBBBI"
+RTMSG_FMT = "BBBBBBBBI"
+RTA_CACHEINFO_FMT = "IIi"
+NLMSGERR_FMT = "i"
 NLMSGHDR_SIZE = struct.calcsize(NLMSGHDR_FMT)
 IFINFOMSG_SIZE = struct.calcsize(IFINFOMSG_FMT)
+IFADDRMSG_SIZE = struct.calcsize(IFADDRMSG_FMT)
+RTMSG_SIZE = struct.calcsize(RTMSG_FMT)
 RTATTR_START_OFFSET = NLMSGHDR_SIZE + IFINFOMSG_SIZE
 RTA_DATA_START_OFFSET = 4
 PAD_ALIGNMENT = 4
 
+IFLA_ADDRESS = 1
 IFLA_IFNAME = 3
 IFLA_OPERSTATE = 16
+# Nested and byte-order flags carried in the rta_type of some attributes
+NLA_TYPE_MASK = 0x3FFF
+
+# http://man7.org/linux/man-pages/man7/rtnetlink.7.html
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+IFA_BROADCAST = 4
+RTA_DST = 1
+RTA_OIF = 4
+RTA_GATEWAY = 5
+RTA_PRIORITY = 6
+RTA_CACHEINFO = 12
+RTA_TABLE = 15
+RTN_UNICAST = 1
+RT_TABLE_MAIN = 254
+IFF_UP = 0x1
+IFF_LOWER_UP = 0x10000
+ARPHRD_ETHER = 1
+
+# Names used by iproute2 for the scopes of addresses and routes
+RT_SCOPE_NAMES = {0: "global", 200: "site", 253: "link", 254: "host"}
 
 # https://www.kernel.org/doc/Documentation/networking/operstates.txt
 OPER_UNKNOWN = 0
@@ -52,12 +88,35 @@ InterfaceOperstate = namedtuple("InterfaceOperstate", ["ifname", "operstate"])
 NetlinkHeader = namedtuple(
     "NetlinkHeader", ["length", "type", "flags", "seq", "pid"]
 )
+Link = namedtuple("Link", ["index", "ifname", "link_type", "flags", "hwaddr"])
+Address = namedtuple(
+    "Address",
+    ["index", "family", "prefixlen", "scope", "address", "broadcast"],
+)
+Route = namedtuple(
+    "Route",
+    [
+        "family",
+        "table",
+        "type",
+        "dst",
+        "dst_len",
+        "gateway",
+        "oif",
+        "priority",
+        "expires",
+    ],
+)
 
 
 class NetlinkCreateSocketError(RuntimeError):
     """Raised if netlink socket fails during create or bind."""
 
 
+class NetlinkDumpError(RuntimeError):
+    """Raised if the kernel rejects or truncates a netlink dump request."""
+
+
 def create_bound_netlink_socket():
     """Creates netlink socket and bind on netlink group to catch interface
     down/up events. The socket will bound only on RTMGRP_LINK (which only
@@ -80,6 +139,215 @@ def create_bound_netlink_socket():
     return netlink_socket
 
 
+def create_dump_netlink_socket():
+    """Creates a blocking netlink socket to send dump requests on.
+
+    The socket is bound to a kernel assigned port id, without subscribing to
+    any group, so it only receives the replies to its own requests.
+
+    :returns: netlink socket with a DUMP_TIMEOUT timeout
+    :raises: NetlinkCreateSocketError
+    """
+    try:
+        netlink_socket = socket.socket(
+            socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE
+        )
+    except (AttributeError, socket.error) as e:
+        # AttributeError: AF_NETLINK is only defined on Linux
+        msg = "Exception during netlink socket create: %s" % e
+        raise NetlinkCreateSocketError(msg) from e
+    try:
+        netlink_socket.bind((0, 0))
+        netlink_socket.settimeout(DUMP_TIMEOUT)
+    except socket.error as e:
+        netlink_socket.close()
+        msg = "Exception during netlink socket create: %s" % e
+        raise NetlinkCreateSocketError(msg) from e
+    return netlink_socket
+
+
+def _align(length):
+    return (length + PAD_ALIGNMENT - 1) & ~(PAD_ALIGNMENT - 1)
+
+
+def parse_rta_attrs(data, offset):
+    """Parse all rta attributes in data starting at offset.
+
+    :param: data: a single netlink message payload
+    :param: offset: offset of the first attribute, after the family header
+    :returns: dict of attribute data keyed by attribute type. For repeated
+              attributes the last one wins.
+    """
+    attrs = {}
+    while offset + RTA_DATA_START_OFFSET <= len(data):
+        length, rta_type = struct.unpack_from("HH", data, offset)
+        if length < RTA_DATA_START_OFFSET:
+            break
+        attrs[rta_type & NLA_TYPE_MASK] = data[
+            offset + RTA_DATA_START_OFFSET : offset + length
+        ]
+        offset += _align(length)
+    return attrs
+
+
+def rtnl_dump(msg_type, family_header):
+    """Send a RTNETLINK dump request and yield each message of the reply.
+
+    :param: msg_type: the RTM_GET* request type
+    :param: family_header: packed ifinfomsg, ifaddrmsg or rtmsg request
+    :returns: generator of (NetlinkHeader, payload) for each message, where
+              payload excludes the netlink message header.
+    :raises: NetlinkCreateSocketError if the socket cannot be created,
+             NetlinkDumpError if the kernel rejects or interrupts the dump
+             and OSError on socket errors or timeouts.
+    """
+    netlink_socket = create_dump_netlink_socket()
+    seq = 1
+    request = (
+        struct.pack(
+            NLMSGHDR_FMT,
+            NLMSGHDR_SIZE + len(family_header),
+            msg_type,
+            NLM_F_REQUEST | NLM_F_DUMP,
+            seq,
+            0,
+        )
+        + family_header
+    )
+    with contextlib.closing(netlink_socket):
+        netlink_socket.send(request)
+        while True:
+            data = netlink_socket.recv(MAX_SIZE)
+            if not data:
+                raise NetlinkDumpError("Netlink dump ended unexpectedly")
+            offset = 0
+            while offset + NLMSGHDR_SIZE <= len(data):
+                header = NetlinkHeader(
+                    *struct.unpack_from(NLMSGHDR_FMT, data, offset)
+                )
+                if header.length < NLMSGHDR_SIZE:
+                    raise NetlinkDumpError(
+                        "Malformed netlink message of length %d"
+                        % header.length
+                    )
+                payload = data[offset + NLMSGHDR_SIZE : offset + header.length]
+                offset += _align(header.length)
+                if header.seq != seq:
+                    continue
+                if header.type == NLMSG_DONE:
+                    return
+                if header.type == NLMSG_ERROR:
+                    errno = struct.unpack_from(NLMSGERR_FMT, payload)[0]
+                    raise NetlinkDumpError(
+                        "Netlink dump of type %d failed: %s"
+                        % (msg_type, os.strerror(-errno))
+                    )
+                yield header, payload
+
+
+def get_links():
+    """Return a Link for each network device known to the kernel."""
+    links = []
+    request = struct.pack(IFINFOMSG_FMT, socket.AF_UNSPEC, 0, 0, 0, 0)
+    for header, payload in rtnl_dump(RTM_GETLINK, request):
+        if header.type != RTM_NEWLINK:
+            continue
+        _family, link_type, index, flags, _change = struct.unpack_from(
+            IFINFOMSG_FMT, payload
+        )
+        attrs = parse_rta_attrs(payload, IFINFOMSG_SIZE)
+        ifname = util.decode_binary(attrs.get(IFLA_IFNAME, b"")).strip("\0")
+        hwaddr = ":".join("%02x" % b for b in attrs.get(IFLA_ADDRESS, b""))
+        links.append(Link(index, ifname, link_type, flags, hwaddr))
+    return links
+
+
+def get_addresses(family=socket.AF_UNSPEC):
+    """Return an Address for each IPv4 and IPv6 address of every device."""
+    addresses = []
+    request = struct.pack(IFADDRMSG_FMT, family, 0, 0, 0, 0)
+    for header, payload in rtnl_dump(RTM_GETADDR, request):
+        if header.type != RTM_NEWADDR:
+            continue
+        addr_family, prefixlen, _flags, scope, index = struct.unpack_from(
+            IFADDRMSG_FMT, payload
+        )
+        if addr_family not in (socket.AF_INET, socket.AF_INET6):
+            continue
+        attrs = parse_rta_attrs(payload, IFADDRMSG_SIZE)
+        # IFA_LOCAL is the address of the interface itself, IFA_ADDRESS the
+        # peer on point-to-point links. IPv6 only sets IFA_ADDRESS.
+        address = attrs.get(IFA_LOCAL, attrs.get(IFA_ADDRESS))
+        if address is None:
+            continue
+        broadcast = attrs.get(IFA_BROADCAST)
+        addresses.append(
+            Address(
+                index,
+                addr_family,
+                prefixlen,
+                scope,
+                socket.inet_ntop(addr_family, address),
+                socket.inet_ntop(addr_family, broadcast) if broadcast else "",
+            )
+        )
+    return addresses
+
+
+def get_routes(family):
+    """Return a Route for each route of family in all routing tables."""
+    routes = []
+    request = struct.pack(RTMSG_FMT, family, 0, 0, 0, 0, 0, 0, 0, 0)
+    for header, payload in rtnl_dump(RTM_GETROUTE, request):
+        if header.type != RTM_NEWROUTE:
+            continue
+        (
+            rtm_family,
+            dst_len,
+            _src_len,
+            _tos,
+            table,
+            _protocol,
+            _scope,
+            rtm_type,
+            _flags,
+        ) = struct.unpack_from(RTMSG_FMT, payload)
+        if rtm_family != family:
+            continue
+        attrs = parse_rta_attrs(payload, RTMSG_SIZE)
+        if RTA_TABLE in attrs:
+            table = struct.unpack("I", attrs[RTA_TABLE])[0]
+        dst = gateway = ""
+        if RTA_DST in attrs:
+            dst = socket.inet_ntop(family, attrs[RTA_DST])
+        if RTA_GATEWAY in attrs:
+            gateway = socket.inet_ntop(family, attrs[RTA_GATEWAY])
+        oif = priority = None
+        if RTA_OIF in attrs:
+            oif = struct.unpack("i", attrs[RTA_OIF])[0]
+        if RTA_PRIORITY in attrs:
+            priority = struct.unpack("I", attrs[RTA_PRIORITY])[0]
+        expires = False
+        if RTA_CACHEINFO in attrs:
+            expires = bool(
+                struct.unpack_from(RTA_CACHEINFO_FMT, attrs[RTA_CACHEINFO])[2]
+            )
+        routes.append(
+            Route(
+                rtm_family,
+                table,
+                rtm_type,
+                dst,
+                dst_len,
+                gateway,
+                oif,
+                priority,
+                expires,
+            )
+        )
+    return routes
+
+
 def get_netlink_msg_header(data):
     """Gets netlink message type and length
 
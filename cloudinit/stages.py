@@ -9,11 +9,20 @@ import os
 import pickle
 import sys
 from collections import namedtuple
+from concurrent import futures
 from typing import Dict, Set  # noqa: F401
 
-from cloudinit import cloud, config, distros, handlers, helpers, importer
+from cloudinit import (
+    atomic_helper,
+    cloud,
+    config,
+    distros,
+    handlers,
+    helpers,
+    importer,
+)
 from cloudinit import log as logging
-from cloudinit import net, sources, type_utils, util
+from cloudinit import net, persistence, sources, type_utils, util
 from cloudinit.event import EventScope, EventType, userdata_to_events
 
 # Default handlers (used if not overridden)
@@ -38,6 +47,11 @@ LOG = logging.getLogger(__name__)
 NULL_DATA_SOURCE = None
 NO_PREVIOUS_INSTANCE_ID = "NO_PREVIOUS_INSTANCE_ID"
 
+# Values of the modules_run_mode system config key
+MODULES_RUN_SERIAL = "serial"
+MODULES_RUN_PARALLEL = "parallel"
+MODULES_MAX_WORKERS = 4
+
 
 def update_event_enabled(
     datasource: sources.DataSource,
@@ -237,7 +251,9 @@ class Init(object):
             paths=no_cfg_paths,
             datasource=self.datasource,
             additional_fns=extra_fns,
-            base_cfg=fetch_base_config(),
+            base_cfg=fetch_base_config,
+            base_cfg_fns=base_config_files(),
+            cache_file=helpers.CONFIG_CACHE_FILE,
         )
         return merger.cfg
 
@@ -787,6 +803,9 @@ class Init(object):
         # Run the handlers
         self._do_handlers(user_data_msg, c_handlers_list, frequency)
 
+    # Datasources may enumerate devices several times to generate their
+    # config, so answer all of those from one read of sysfs.
+    @net.sysfs_snapshot()
     def _find_networking_config(self):
         disable_file = os.path.join(
             self.paths.get_cpath("data"), "upgraded-network"
@@ -956,6 +975,7 @@ class Modules(object):
                 datasource=self.init.datasource,
                 additional_fns=self.cfg_files,
                 base_cfg=self.init.cfg,
+                cache_file=helpers.CONFIG_CACHE_FILE,
             )
             self._cached_cfg = merger.cfg
             # LOG.debug("Loading 'module' config %s", self._cached_cfg)
@@ -1043,50 +1063,114 @@ class Modules(object):
             mostly_mods.append([mod, raw_name, freq, run_args])
         return mostly_mods
 
+    def _run_module(self, cc, mod, name, freq, args):
+        """Run a single module, returning the exception it raised if any."""
+        try:
+            # Try the modules frequency, otherwise fallback to a known one
+            if not freq:
+                freq = mod.frequency
+            if freq not in FREQUENCIES:
+                freq = PER_INSTANCE
+            LOG.debug(
+                "Running module %s (%s) with frequency %s", name, mod, freq
+            )
+
+            # Use the configs logger and not our own
+            # TODO(harlowja): possibly check the module
+            # for having a LOG attr and just give it back
+            # its own logger?
+            func_args = [name, self.cfg, cc, config.LOG, args]
+            # This name will affect the semaphore name created
+            run_name = "config-%s" % (name)
+
+            desc = "running %s with frequency %s" % (run_name, freq)
+            myrep = events.ReportEventStack(
+                name=run_name, description=desc, parent=self.reporter
+            )
+
+            with myrep:
+                ran, _r = cc.run(run_name, mod.handle, func_args, freq=freq)
+                if ran:
+                    myrep.message = "%s ran successfully" % run_name
+                else:
+                    myrep.message = "%s previously ran" % run_name
+
+        except Exception as e:
+            util.logexc(LOG, "Running module %s (%s) failed", name, mod)
+            return e
+        return None
+
     def _run_modules(self, mostly_mods):
         cc = self.init.cloudify()
+        mode = util.get_cfg_option_str(
+            self.cfg, "modules_run_mode", MODULES_RUN_SERIAL
+        )
+        if mode not in (MODULES_RUN_SERIAL, MODULES_RUN_PARALLEL):
+            LOG.warning(
+                "Unknown modules_run_mode '%s', running modules serially",
+                mode,
+            )
+            mode = MODULES_RUN_SERIAL
+        if mode == MODULES_RUN_PARALLEL and len(mostly_mods) > 1:
+            return self._run_modules_parallel(cc, mostly_mods)
         # Return which ones ran
         # and which ones failed + the exception of why it failed
         failures = []
         which_ran = []
         for (mod, name, freq, args) in mostly_mods:
-            try:
-                # Try the modules frequency, otherwise fallback to a known one
-                if not freq:
-                    freq = mod.frequency
-                if freq not in FREQUENCIES:
-                    freq = PER_INSTANCE
-                LOG.debug(
-                    "Running module %s (%s) with frequency %s", name, mod, freq
-                )
+            # Mark it as having started running
+            which_ran.append(name)
+            error = self._run_module(cc, mod, name, freq, args)
+            if error is not None:
+                failures.append((name, error))
+        return (which_ran, failures)
 
-                # Use the configs logger and not our own
-                # TODO(harlowja): possibly check the module
-                # for having a LOG attr and just give it back
-                # its own logger?
-                func_args = [name, self.cfg, cc, config.LOG, args]
-                # Mark it as having started running
-                which_ran.append(name)
-                # This name will affect the semaphore name created
-                run_name = "config-%s" % (name)
-
-                desc = "running %s with frequency %s" % (run_name, freq)
-                myrep = events.ReportEventStack(
-                    name=run_name, description=desc, parent=self.reporter
-                )
+    def _run_modules_parallel(self, cc, mostly_mods):
+        """Run modules on a worker pool, honoring their declared resources.
 
-                with myrep:
-                    ran, _r = cc.run(
-                        run_name, mod.handle, func_args, freq=freq
-                    )
-                    if ran:
-                        myrep.message = "%s ran successfully" % run_name
-                    else:
-                        myrep.message = "%s previously ran" % run_name
-
-            except Exception as e:
-                util.logexc(LOG, "Running module %s (%s) failed", name, mod)
-                failures.append((name, e))
+        A module only starts once every earlier module it conflicts with has
+        finished, so conflicting modules keep their configured order.
+        """
+        max_workers = util.get_cfg_option_int(
+            self.cfg, "modules_max_workers", MODULES_MAX_WORKERS
+        )
+        blockers = []
+        for idx, (mod, _name, _freq, _args) in enumerate(mostly_mods):
+            blockers.append(
+                set(
+                    prev
+                    for prev in range(idx)
+                    if config.modules_conflict(mostly_mods[prev][0], mod)
+                )
+            )
+        errors = {}
+        pending = list(range(len(mostly_mods)))
+        running = {}
+        finished = set()
+        with futures.ThreadPoolExecutor(
+            max_workers=max(1, max_workers)
+        ) as executor:
+            while pending or running:
+                for idx in [i for i in pending if blockers[i] <= finished]:
+                    pending.remove(idx)
+                    running[
+                        executor.submit(
+                            self._run_module, cc, *mostly_mods[idx]
+                        )
+                    ] = idx
+                done, _ = futures.wait(
+                    running, return_when=futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    idx = running.pop(future)
+                    finished.add(idx)
+                    errors[idx] = future.result()
+        which_ran = [name for (_mod, name, _freq, _args) in mostly_mods]
+        failures = [
+            (mostly_mods[idx][1], errors[idx])
+            for idx in sorted(errors)
+            if errors[idx] is not None
+        ]
         return (which_ran, failures)
 
     def run_single(self, mod_name, args=None, freq=None):
@@ -1148,6 +1232,24 @@ def read_runtime_config():
     return util.read_conf(RUN_CLOUD_CONFIG)
 
 
+def base_config_files():
+    """Return the files and directories fetch_base_config reads.
+
+    The kernel command line is left out, as it can't change during a boot.
+    So is a conf_d directory other than cloud.cfg.d set in cloud.cfg.
+    """
+    confd = "%s.d" % CLOUD_CONFIG
+    try:
+        confd_fns = sorted(
+            os.path.join(confd, fn)
+            for fn in os.listdir(confd)
+            if fn.endswith(".cfg")
+        )
+    except OSError:
+        confd_fns = []
+    return [CLOUD_CONFIG, confd] + confd_fns + [RUN_CLOUD_CONFIG]
+
+
 def fetch_base_config():
     return util.mergemanydict(
         [
@@ -1166,12 +1268,14 @@ def fetch_base_config():
 
 def _pkl_store(obj, fname):
     try:
-        pk_contents = pickle.dumps(obj)
+        pk_contents = persistence.dump_obj_cache(obj)
     except Exception:
         util.logexc(LOG, "Failed pickling datasource %s", obj)
         return False
     try:
-        util.write_file(fname, pk_contents, omode="wb", mode=0o400)
+        # Written atomically as loaded caches keep the old file mapped
+        util.ensure_dir(os.path.dirname(fname))
+        atomic_helper.write_file(fname, pk_contents, mode=0o400)
     except Exception:
         util.logexc(LOG, "Failed pickling datasource to %s", fname)
         return False
@@ -1179,18 +1283,22 @@ def _pkl_store(obj, fname):
 
 
 def _pkl_load(fname):
-    pickle_contents = None
+    magic = None
     try:
-        pickle_contents = util.load_file(fname, decode=False)
+        with open(fname, "rb") as stream:
+            magic = stream.read(len(persistence.OBJ_CACHE_MAGIC))
     except Exception as e:
         if os.path.isfile(fname):
             LOG.warning("failed loading pickle in %s: %s", fname, e)
 
     # This is allowed so just return nothing successfully loaded...
-    if not pickle_contents:
+    if not magic:
         return None
     try:
-        return pickle.loads(pickle_contents)
+        if persistence.is_obj_cache(magic):
+            return persistence.load_obj_cache(fname)
+        # Plain pickle written by an older cloud-init
+        return pickle.loads(util.load_file(fname, decode=False))
     except sources.DatasourceUnpickleUserDataError:
         return None
     except Exception:
@@ -4,10 +4,22 @@
 import logging
 import os
 import subprocess
+import sys
+import threading
+import time
 from errno import ENOEXEC
 
+from cloudinit import features, profiler
+
 LOG = logging.getLogger(__name__)
 
+# Counters of the commands run by this process, see get_command_stats()
+_stats_lock = threading.Lock()
+_command_stats = {}
+
+# Absolute paths of commands spawned by the fast path, keyed by name and PATH
+_spawn_paths = {}
+
 
 def prepend_base_command(base_command, commands):
     """Ensure user-provided commands start with base_command; warn otherwise.
@@ -284,18 +296,34 @@ def subp(
         bytes_args = [
             x if isinstance(x, bytes) else x.encode("utf-8") for x in args
         ]
+    popen_kwargs = {}
+    if (
+        features.SUBP_FAST_SPAWN
+        and capture
+        and not shell
+        and cwd is None
+        and isinstance(bytes_args, list)
+    ):
+        popen_kwargs = _fast_spawn_kwargs(bytes_args, env)
+    profile = {}
+    command = _profile_name(args, shell)
+    started = time.monotonic()
     try:
-        sp = subprocess.Popen(
-            bytes_args,
-            stdout=stdout,
-            stderr=stderr,
-            stdin=stdin,
-            env=env,
-            shell=shell,
-            cwd=cwd,
-        )
-        (out, err) = sp.communicate(data)
+        with profiler.timed(command, profiler.CATEGORY_SUBP, profile):
+            sp = subprocess.Popen(
+                bytes_args,
+                stdout=stdout,
+                stderr=stderr,
+                stdin=stdin,
+                env=env,
+                shell=shell,
+                cwd=cwd,
+                **popen_kwargs,
+            )
+            (out, err) = sp.communicate(data)
+            profile["exit_code"] = sp.returncode
     except OSError as e:
+        _count_command(command, started, None, data, None, None)
         if status_cb:
             status_cb("ERROR: End run command: invalid command provided\n")
         raise ProcessExecutionError(
@@ -309,6 +337,8 @@ def subp(
         if devnull_fp:
             devnull_fp.close()
 
+    _count_command(command, started, sp.returncode, data, out, err)
+
     # Just ensure blank instead of none.
     if capture or combine_capture:
         if not out:
@@ -337,6 +367,100 @@ def subp(
     return (out, err)
 
 
+def _fast_spawn_kwargs(bytes_args, env):
+    """Return the Popen arguments letting python posix_spawn the command.
+
+    posix_spawn is only used for an absolute executable and when the parent's
+    file descriptors are inherited, so this is opt-in: see
+    features.SUBP_FAST_SPAWN.
+    """
+    program = bytes_args[0].decode("utf-8", "replace")
+    if os.path.sep not in program:
+        search_path = (env if env is not None else os.environ).get("PATH", "")
+        key = (program, search_path)
+        if key not in _spawn_paths:
+            _spawn_paths[key] = which(
+                program, search=search_path.split(os.pathsep)
+            )
+        program = _spawn_paths[key]
+        if program is None:
+            # Let Popen raise the usual error
+            return {}
+    return {"executable": os.path.abspath(program), "close_fds": False}
+
+
+def _caller_module():
+    """Name the config module running a command, or else its direct caller."""
+    caller = None
+    frame = sys._getframe(2)
+    while frame is not None:
+        name = frame.f_globals.get("__name__", "")
+        if name.startswith("cloudinit.config.cc_"):
+            return name.rpartition(".")[2]
+        if caller is None and name != __name__:
+            caller = name
+        frame = frame.f_back
+    return caller
+
+
+def _count_command(command, started, exit_code, data, out, err):
+    key = (command, _caller_module())
+    with _stats_lock:
+        stats = _command_stats.get(key)
+        if stats is None:
+            stats = _command_stats[key] = {
+                "command": command,
+                "caller": key[1],
+                "count": 0,
+                "seconds": 0.0,
+                "failures": 0,
+                "exit_codes": {},
+                "bytes_in": 0,
+                "bytes_out": 0,
+            }
+        stats["count"] += 1
+        stats["seconds"] += time.monotonic() - started
+        if exit_code != 0:
+            stats["failures"] += 1
+        if exit_code is not None:
+            code = str(exit_code)
+            stats["exit_codes"][code] = stats["exit_codes"].get(code, 0) + 1
+        stats["bytes_in"] += len(data or b"")
+        stats["bytes_out"] += len(out or b"") + len(err or b"")
+
+
+def get_command_stats():
+    """Return counters of the commands run by subp in this process.
+
+    Commands are counted by the command name (argv[0]) and the config module
+    running them, or else the module calling subp. The most time consuming
+    come first. Each holds the count, total seconds, failures, a count of
+    each exit code, and the bytes written to and read from the commands.
+    Failures include commands which could not be run, without exit code.
+    """
+    with _stats_lock:
+        stats = [
+            dict(s, exit_codes=dict(s["exit_codes"]))
+            for s in _command_stats.values()
+        ]
+    return sorted(stats, key=lambda s: s["seconds"], reverse=True)
+
+
+def reset_command_stats():
+    with _stats_lock:
+        _command_stats.clear()
+
+
+def _profile_name(args, shell):
+    # Only the command is profiled, its arguments may hold secrets
+    if shell or isinstance(args, (str, bytes)):
+        return "sh"
+    command = args[0]
+    if isinstance(command, bytes):
+        command = command.decode("utf-8", "replace")
+    return os.path.basename(command)
+
+
 def target_path(target, path=None):
     # return 'path' inside target, accepting target as None
     if target in (None, ""):
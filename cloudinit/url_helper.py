@@ -9,9 +9,13 @@
 # This file is part of cloud-init. See LICENSE file for license information.
 
 import copy
+import http.cookiejar
 import json
 import os
+import re
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from email.utils import parsedate
 from errno import ENOENT
 from functools import partial
@@ -23,7 +27,7 @@ import requests
 from requests import exceptions
 
 from cloudinit import log as logging
-from cloudinit import version
+from cloudinit import profiler, version
 
 LOG = logging.getLogger(__name__)
 
@@ -33,19 +37,15 @@ SSL_ENABLED = False
 CONFIG_ENABLED = False  # This was added in 0.7 (but taken out in >=1.0)
 _REQ_VER = None
 REDACTED = "REDACTED"
-try:
-    from distutils.version import LooseVersion
-
-    import pkg_resources
-
-    _REQ = pkg_resources.get_distribution("requests")
-    _REQ_VER = LooseVersion(_REQ.version)  # pylint: disable=no-member
-    if _REQ_VER >= LooseVersion("0.8.8"):
+# Parse requests.__version__ directly: importing distutils or pkg_resources
+# to compare versions dominates the import time of every cloud-init command.
+_REQ_VER_MATCH = re.match(r"(\d+)\.(\d+)(?:\.(\d+))?", requests.__version__)
+if _REQ_VER_MATCH:
+    _REQ_VER = tuple(int(part or 0) for part in _REQ_VER_MATCH.groups())
+    if _REQ_VER >= (0, 8, 8):
         SSL_ENABLED = True
-    if LooseVersion("0.7.0") <= _REQ_VER < LooseVersion("1.0.0"):
+    if (0, 7, 0) <= _REQ_VER < (1, 0, 0):
         CONFIG_ENABLED = True
-except ImportError:
-    pass
 
 
 def _cleanurl(url):
@@ -179,7 +179,7 @@ def _get_ssl_args(url, ssl_details):
             LOG.warning(
                 "SSL is not supported in requests v%s, "
                 "cert. verification can not occur!",
-                _REQ_VER,
+                requests.__version__,
             )
         else:
             if "ca_certs" in ssl_details and ssl_details["ca_certs"]:
@@ -196,6 +196,88 @@ def _get_ssl_args(url, ssl_details):
     return ssl_args
 
 
+class SessionPool(object):
+    """Per-process pool of keep-alive requests sessions.
+
+    Sessions are keyed on ssl_details so that each distinct set of client
+    certificates keeps its own connection pools and SSL contexts. Within a
+    session, connections are pooled per host by urllib3 and reused across
+    readurl calls until close() is called, typically at the end of a stage.
+    Cookies are not kept between requests, as with a session per request.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions = {}
+
+    @staticmethod
+    def _key(ssl_details):
+        if not ssl_details:
+            return ()
+        return tuple(sorted((k, str(v)) for k, v in ssl_details.items()))
+
+    def get(self, ssl_details=None):
+        """Return the pooled session for ssl_details, creating it if new."""
+        key = self._key(ssl_details)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = requests.Session()
+                # Connections are reused across unrelated readurl calls,
+                # cookies are not: refuse to keep any in the session jar.
+                session.cookies.set_policy(
+                    http.cookiejar.DefaultCookiePolicy(allowed_domains=[])
+                )
+                self._sessions[key] = session
+            return session
+
+    def stats(self):
+        """Return counters of connections opened and reused by the pool."""
+        opened = requested = 0
+        with self._lock:
+            sessions = list(self._sessions.values())
+        for session in sessions:
+            for adapter in session.adapters.values():
+                managers = [getattr(adapter, "poolmanager", None)]
+                managers.extend(getattr(adapter, "proxy_manager", {}).values())
+                for manager in managers:
+                    if manager is None:
+                        continue
+                    for pool_key in manager.pools.keys():
+                        pool = manager.pools.get(pool_key)
+                        if pool is None:
+                            continue
+                        opened += getattr(pool, "num_connections", 0)
+                        requested += getattr(pool, "num_requests", 0)
+        return {
+            "sessions": len(sessions),
+            "requests": requested,
+            "connections_opened": opened,
+            "connections_reused": max(requested - opened, 0),
+        }
+
+    def close(self):
+        """Log pool counters and close every pooled session."""
+        with self._lock:
+            if not self._sessions:
+                return
+        LOG.debug("Closing HTTP session pool: %s", self.stats())
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
+
+
+SESSION_POOL = SessionPool()
+
+
+def _profile_name(method, url):
+    # Query strings and credentials may hold secrets
+    parsed = urlparse(url)
+    return "%s %s%s" % (method, parsed.hostname or "", parsed.path)
+
+
 def readurl(
     url,
     data=None,
@@ -237,7 +319,10 @@ def readurl(
         as 'allow_redirects'. Default: True.
     :param exception_cb: Optional callable which accepts the params
         msg and exception and returns a boolean True if retries are permitted.
-    :param session: Optional exiting requests.Session instance to reuse.
+    :param session: Optional existing requests.Session instance to reuse.
+        Defaults to the process-wide session from SESSION_POOL for
+        ssl_details. The session is not closed, so that its connections may
+        be reused by later requests.
     :param infinite: Bool, set True to retry indefinitely. Default: False.
     :param log_req_resp: Set False to turn off verbose debug messages.
     :param request_method: String passed as 'method' to Session.request.
@@ -322,10 +407,15 @@ def readurl(
                 )
 
             if session is None:
-                session = requests.Session()
-
-            with session as sess:
-                r = sess.request(**req_args)
+                session = SESSION_POOL.get(ssl_details)
+            profile = {}
+            with profiler.timed(
+                _profile_name(req_args["method"], url),
+                profiler.CATEGORY_URL,
+                profile,
+            ):
+                r = session.request(**req_args)
+                profile["status"] = r.status_code
 
             if check_status:
                 r.raise_for_status()
@@ -382,6 +472,56 @@ def readurl(
     return None  # Should throw before this...
 
 
+def _race_urls(urls, url_reader, failure_cb, async_delay):
+    """Request all urls concurrently, returning on the first good response.
+
+    Requests are started async_delay seconds apart in list order so that
+    earlier urls are preferred, unless the previous request has already
+    failed, in which case the next one starts immediately.
+
+    url_reader is called with a url from a worker thread and returns a
+    tuple of (response, reason, exception). failure_cb is called with
+    (url, response, reason, exception) from the calling thread for each
+    failed request in the order they complete.
+
+    @return: Tuple of (url, response) for the first good response or
+        (None, None) when every url failed.
+    """
+    done = threading.Event()
+    failed = [threading.Event() for _ in urls]
+
+    def read_url_delayed(idx, url):
+        if idx > 0:
+            failed[idx - 1].wait(async_delay)
+        if done.is_set():
+            return None, "cancelled", None
+        try:
+            result = url_reader(url)
+        except Exception as e:
+            result = (None, "unexpected error [%s]" % e, e)
+        if result[2] is not None:
+            failed[idx].set()
+        return result
+
+    executor = ThreadPoolExecutor(max_workers=len(urls))
+    try:
+        future_to_url = {
+            executor.submit(read_url_delayed, idx, url): url
+            for idx, url in enumerate(urls)
+        }
+        for future in as_completed(future_to_url):
+            url = future_to_url[future]
+            (response, reason, url_exc) = future.result()
+            if url_exc is None:
+                return url, response
+            failure_cb(url, response, reason, url_exc)
+    finally:
+        # Do not wait on slower requests once the race is decided
+        done.set()
+        executor.shutdown(wait=False)
+    return None, None
+
+
 def wait_for_url(
     urls,
     max_wait=None,
@@ -393,6 +533,8 @@ def wait_for_url(
     exception_cb=None,
     sleep_time_cb=None,
     request_method=None,
+    connect_synchronously=True,
+    async_delay=0.150,
 ):
     """
     urls:      a list of urls to try
@@ -410,6 +552,12 @@ def wait_for_url(
     sleep_time_cb: call method with 2 arguments (response, loop_n) that
                    generates the next sleep time.
     request_method: indicate the type of HTTP request, GET, PUT, or POST
+    connect_synchronously: when False, race all urls concurrently on each
+                           attempt and use the first good response. The
+                           max time is then roughly timeout per attempt
+                           rather than len(urls)*timeout.
+    async_delay:  seconds to stagger the start of each raced url, so urls
+                  earlier in the list are preferred
     returns: tuple of (url, response contents), on failure, (False, None)
 
     the idea of this routine is to wait for the EC2 metadata service to
@@ -442,6 +590,100 @@ def wait_for_url(
             return False
         return (max_wait <= 0) or (time.time() - start_time > max_wait)
 
+    def read_url(url, headers, timeout):
+        """Return (response, reason, exception) for a request to url."""
+        reason = ""
+        url_exc = None
+        response = None
+        try:
+            response = readurl(
+                url,
+                headers=headers,
+                headers_redact=headers_redact,
+                timeout=timeout,
+                check_status=False,
+                request_method=request_method,
+            )
+            if not response.contents:
+                reason = "empty response [%s]" % (response.code)
+                url_exc = UrlError(
+                    ValueError(reason),
+                    code=response.code,
+                    headers=response.headers,
+                    url=url,
+                )
+            elif not response.ok():
+                reason = "bad status code [%s]" % (response.code)
+                url_exc = UrlError(
+                    ValueError(reason),
+                    code=response.code,
+                    headers=response.headers,
+                    url=url,
+                )
+        except UrlError as e:
+            reason = "request error [%s]" % e
+            url_exc = e
+        except Exception as e:
+            reason = "unexpected error [%s]" % e
+            url_exc = e
+        return response, reason, url_exc
+
+    def handle_failure(url, url_response, reason, url_exc):
+        nonlocal response
+        if url_response is not None:
+            response = url_response
+        time_taken = int(time.time() - start_time)
+        max_wait_str = "%ss" % max_wait if max_wait else "unlimited"
+        status_msg = "Calling '%s' failed [%s/%s]: %s" % (
+            url,
+            time_taken,
+            max_wait_str,
+            reason,
+        )
+        status_cb(status_msg)
+        if exception_cb:
+            # This can be used to alter the headers that will be sent
+            # in the future, for example this is what the MAAS datasource
+            # does.
+            exception_cb(msg=status_msg, exception=url_exc)
+
+    def read_urls(attempt_urls, timeout):
+        """Try attempt_urls, racing them when there is more than one."""
+        url_headers = {}
+        for url in attempt_urls:
+            # Callbacks are always invoked from this thread
+            try:
+                if headers_cb is not None:
+                    url_headers[url] = headers_cb(url)
+                else:
+                    url_headers[url] = {}
+            except UrlError as e:
+                handle_failure(url, None, "request error [%s]" % e, e)
+            except Exception as e:
+                handle_failure(url, None, "unexpected error [%s]" % e, e)
+        attempt_urls = [url for url in attempt_urls if url in url_headers]
+        if len(attempt_urls) == 1:
+            url = attempt_urls[0]
+            (url_response, reason, url_exc) = read_url(
+                url, url_headers[url], timeout
+            )
+            if url_exc is None:
+                return url, url_response
+            handle_failure(url, url_response, reason, url_exc)
+        elif attempt_urls:
+            return _race_urls(
+                attempt_urls,
+                lambda url: read_url(url, url_headers[url], timeout),
+                handle_failure,
+                async_delay,
+            )
+        return None, None
+
+    if connect_synchronously:
+        attempts = [[url] for url in urls]
+    else:
+        attempts = [list(urls)]
+
     loop_n = 0
     response = None
     while True:
@@ -449,7 +691,7 @@ def wait_for_url(
             sleep_time = sleep_time_cb(response, loop_n)
         else:
             sleep_time = int(loop_n / 5) + 1
-        for url in urls:
+        for attempt_urls in attempts:
             now = time.time()
             if loop_n != 0:
                 if timeup(max_wait, start_time):
@@ -462,61 +704,9 @@ def wait_for_url(
                     # shorten timeout to not run way over max_time
                     timeout = int((start_time + max_wait) - now)
 
-            reason = ""
-            url_exc = None
-            try:
-                if headers_cb is not None:
-                    headers = headers_cb(url)
-                else:
-                    headers = {}
-
-                response = readurl(
-                    url,
-                    headers=headers,
-                    headers_redact=headers_redact,
-                    timeout=timeout,
-                    check_status=False,
-                    request_method=request_method,
-                )
-                if not response.contents:
-                    reason = "empty response [%s]" % (response.code)
-                    url_exc = UrlError(
-                        ValueError(reason),
-                        code=response.code,
-                        headers=response.headers,
-                        url=url,
-                    )
-                elif not response.ok():
-                    reason = "bad status code [%s]" % (response.code)
-                    url_exc = UrlError(
-                        ValueError(reason),
-                        code=response.code,
-                        headers=response.headers,
-                        url=url,
-                    )
-                else:
-                    return url, response.contents
-            except UrlError as e:
-                reason = "request error [%s]" % e
-                url_exc = e
-            except Exception as e:
-                reason = "unexpected error [%s]" % e
-                url_exc = e
-
-            time_taken = int(time.time() - start_time)
-            max_wait_str = "%ss" % max_wait if max_wait else "unlimited"
-            status_msg = "Calling '%s' failed [%s/%s]: %s" % (
-                url,
-                time_taken,
-                max_wait_str,
-                reason,
-            )
-            status_cb(status_msg)
-            if exception_cb:
-                # This can be used to alter the headers that will be sent
-                # in the future, for example this is what the MAAS datasource
-                # does.
-                exception_cb(msg=status_msg, exception=url_exc)
+            (url, url_response) = read_urls(attempt_urls, timeout)
+            if url:
+                return url, url_response.contents
 
         if timeup(max_wait, start_time):
             break
@@ -8,7 +8,9 @@
 #
 # This file is part of cloud-init. See LICENSE file for license information.
 
+import json
 import os
+from concurrent import futures
 from email.mime.base import MIMEBase
 from email.mime.multipart import MIMEMultipart
 from email.mime.nonmultipart import MIMENonMultipart
@@ -49,6 +51,15 @@ DECOMP_TYPES = [
     "application/x-gzip-compressed",
 ]
 
+# Maximum number of #include urls fetched at once at each level
+INCLUDE_MAX_WORKERS = 8
+
+# Suffix of the urlcache file holding an include's ETag/Last-Modified
+VALIDATORS_SUFFIX = ".validators"
+
+# Http code returned when a conditional GET finds the cached copy current
+NOT_MODIFIED = 304
+
 # Msg header used to track attachments
 ATTACHMENT_FIELD = "Number-Attachments"
 
@@ -209,6 +220,7 @@ class UserDataProcessor(object):
         # also support '#include <url here>'
         # or #include-once '<url here>'
         include_once_on = False
+        includes = []
         for line in content.splitlines():
             lc_line = line.lower()
             if lc_line.startswith("#include-once"):
@@ -227,51 +239,114 @@ class UserDataProcessor(object):
             include_url = line.strip()
             if not include_url:
                 continue
-
-            include_once_fn = None
-            content = None
-            if include_once_on:
-                include_once_fn = self._get_include_once_filename(include_url)
-            if include_once_on and os.path.isfile(include_once_fn):
-                content = util.load_file(include_once_fn)
-            else:
-                try:
-                    resp = read_file_or_url(
-                        include_url,
-                        timeout=5,
-                        retries=10,
-                        ssl_details=self.ssl_details,
-                    )
-                    if include_once_on and resp.ok():
-                        util.write_file(
-                            include_once_fn, resp.contents, mode=0o600
-                        )
-                    if resp.ok():
-                        content = resp.contents
-                    else:
-                        error_message = (
-                            "Fetching from {} resulted in"
-                            " a invalid http code of {}".format(
-                                include_url, resp.code
-                            )
-                        )
-                        _handle_error(error_message)
-                except UrlError as urle:
-                    message = str(urle)
-                    # Older versions of requests.exceptions.HTTPError may not
-                    # include the errant url. Append it for clarity in logs.
-                    if include_url not in message:
-                        message += " for url: {0}".format(include_url)
-                    _handle_error(message, urle)
-                except IOError as ioe:
-                    error_message = "Fetching from {} resulted in {}".format(
-                        include_url, ioe
-                    )
-                    _handle_error(error_message, ioe)
-
-            if content is not None:
-                new_msg = convert_string(content)
-                self._process_msg(new_msg, append_msg)
+            includes.append((include_url, include_once_on))
+
+        if not includes:
+            return
+        # Fetch every include at this level at once, but process the results
+        # in the order they were listed so that the resulting MIME parts keep
+        # a stable order. Nested includes are fetched as each is processed.
+        executor = futures.ThreadPoolExecutor(
+            max_workers=min(INCLUDE_MAX_WORKERS, len(includes))
+        )
+        fetches = []
+        try:
+            fetches = [
+                executor.submit(self._fetch_include, include_url, include_once)
+                for (include_url, include_once) in includes
+            ]
+            for fetch in fetches:
+                (content, error_message, exc) = fetch.result()
+                if error_message:
+                    _handle_error(error_message, exc)
+                if content is not None:
+                    new_msg = convert_string(content)
+                    self._process_msg(new_msg, append_msg)
+        finally:
+            for fetch in fetches:
+                fetch.cancel()
+            executor.shutdown(wait=False)
+
+    def _fetch_include(self, include_url, include_once):
+        """Fetch an include url, returning (content, error_message, exc).
+
+        Include-once urls are read back from the urlcache once fetched.
+        Other urls are revalidated against their cached copy (if any) with a
+        conditional GET, and the cached copy is used when it is unmodified.
+        """
+        cache_fn = None
+        if include_once or self.paths:
+            cache_fn = self._get_include_once_filename(include_url)
+        if include_once and os.path.isfile(cache_fn):
+            return (util.load_file(cache_fn), None, None)
+        validators = {}
+        if not include_once and cache_fn:
+            validators = self._load_include_validators(cache_fn)
+        headers = {}
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last-modified"):
+            headers["If-Modified-Since"] = validators["last-modified"]
+        try:
+            resp = read_file_or_url(
+                include_url,
+                timeout=5,
+                retries=10,
+                headers=headers,
+                ssl_details=self.ssl_details,
+            )
+            if resp.code == NOT_MODIFIED and headers:
+                LOG.debug("Using cached copy of unmodified %s", include_url)
+                return (util.load_file(cache_fn, decode=False), None, None)
+            if not resp.ok():
+                error_message = (
+                    "Fetching from {} resulted in"
+                    " a invalid http code of {}".format(include_url, resp.code)
+                )
+                return (None, error_message, None)
+            if include_once:
+                util.write_file(cache_fn, resp.contents, mode=0o600)
+            elif cache_fn:
+                self._store_include(cache_fn, resp)
+            return (resp.contents, None, None)
+        except UrlError as urle:
+            message = str(urle)
+            # Older versions of requests.exceptions.HTTPError may not
+            # include the errant url. Append it for clarity in logs.
+            if include_url not in message:
+                message += " for url: {0}".format(include_url)
+            return (None, message, urle)
+        except IOError as ioe:
+            error_message = "Fetching from {} resulted in {}".format(
+                include_url, ioe
+            )
+            return (None, error_message, ioe)
+
+    def _load_include_validators(self, cache_fn):
+        """Return the cache validators stored for a cached include."""
+        if not os.path.isfile(cache_fn):
+            return {}
+        try:
+            return util.load_json(util.load_file(cache_fn + VALIDATORS_SUFFIX))
+        except (IOError, TypeError, ValueError):
+            return {}
+
+    def _store_include(self, cache_fn, resp):
+        """Cache an include response which carries cache validators."""
+        validators = {}
+        for (header, key) in (
+            ("ETag", "etag"),
+            ("Last-Modified", "last-modified"),
+        ):
+            value = resp.headers.get(header)
+            if value:
+                validators[key] = value
+        if not validators:
+            return
+        util.write_file(cache_fn, resp.contents, mode=0o600)
+        util.write_file(
+            cache_fn + VALIDATORS_SUFFIX, json.dumps(validators), mode=0o600
+        )
 
     def _explode_archive(self, archive, append_msg):
         entries = util.load_yaml(archive, default=[], allowed=(list, set))
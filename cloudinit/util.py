@@ -37,19 +37,15 @@ from functools import lru_cache
 from typing import List
 from urllib import parse
 
-from cloudinit import importer
+from cloudinit import facts, importer
 from cloudinit import log as logging
-from cloudinit import (
-    mergers,
-    safeyaml,
-    subp,
-    temp_utils,
-    type_utils,
-    url_helper,
-    version,
-)
+from cloudinit import mergers, subp, temp_utils, type_utils, version
 from cloudinit.settings import CFG_BUILTIN
 
+# Loaded on first use: most callers of util never parse YAML or fetch urls
+safeyaml = importer.lazy_import("cloudinit.safeyaml")
+url_helper = importer.lazy_import("cloudinit.url_helper")
+
 _DNS_REDIRECT_IP = None
 LOG = logging.getLogger(__name__)
 
@@ -1027,7 +1023,11 @@ def read_conf_with_confd(cfgfile):
 
 def read_conf_from_cmdline(cmdline=None):
     # return a dictionary of config on the cmdline or None
-    return load_yaml(read_cc_from_cmdline(cmdline=cmdline))
+    cmdline_cfg = read_cc_from_cmdline(cmdline=cmdline)
+    if not cmdline_cfg:
+        # nothing to parse, spare importing yaml
+        return None
+    return load_yaml(cmdline_cfg)
 
 
 def read_cc_from_cmdline(cmdline=None):
@@ -1462,8 +1462,11 @@ def load_file(fname, read_cb=None, quiet=False, decode=True):
         return contents
 
 
-@lru_cache()
 def _get_cmdline():
+    return facts.get("cmdline", _read_cmdline)
+
+
+def _read_cmdline():
     if is_container():
         try:
             contents = load_file("/proc/1/cmdline")
@@ -1728,8 +1731,9 @@ def json_dumps(data):
 def ensure_dir(path, mode=None):
     if not os.path.isdir(path):
         # Make the dir and adjust the mode
+        # exist_ok: config modules may create the same dir concurrently
         with SeLinuxGuard(os.path.dirname(path), recursive=True):
-            os.makedirs(path)
+            os.makedirs(path, exist_ok=True)
         chmod(path, mode)
     else:
         # Just adjust the mode
@@ -2218,11 +2222,46 @@ def _is_container_freebsd():
     return out.strip() == "1"
 
 
-@lru_cache()
+def get_virt_type():
+    """Return the virtualization type reported by systemd-detect-virt.
+
+    Returns "none" when not virtualized and None if it cannot be determined.
+    The result is a platform fact, so it is only detected once per boot.
+    """
+    return facts.get("virt", _detect_virt_type)
+
+
+def _detect_virt_type():
+    if not subp.which("systemd-detect-virt"):
+        return None
+    try:
+        (virt_type, _err) = subp.subp(["systemd-detect-virt"])
+    except subp.ProcessExecutionError as e:
+        # systemd-detect-virt prints "none" and exits 1 when not virtualized
+        if e.exit_code == 1 and e.stdout.strip() == "none":
+            return "none"
+        LOG.warning("Unable to run systemd-detect-virt: %s", e)
+        return None
+    return virt_type.strip()
+
+
+def uses_systemd():
+    """Report whether the system booted with systemd."""
+    try:
+        res = os.lstat("/run/systemd/system")
+        return stat.S_ISDIR(res.st_mode)
+    except Exception:
+        return False
+
+
 def is_container():
     """
     Checks to see if this code running in a container of some sort
     """
+    return facts.get("is_container", _detect_container)
+
+
+def _detect_container():
     checks = (
         _is_container_systemd,
         _is_container_freebsd,
@@ -12,7 +12,7 @@ from unittest import mock
 
 import pytest
 
-from cloudinit import helpers, subp, util
+from cloudinit import facts, helpers, profiler, subp, util
 
 
 class _FixtureUtils:
@@ -158,6 +158,79 @@ def disable_subp_usage(request, fixture_utils):
         yield
 
 
+@pytest.fixture(autouse=True)
+def reset_session_pool():
+    """Close pooled HTTP sessions so connections aren't shared across tests."""
+    yield
+    from cloudinit import url_helper
+
+    url_helper.SESSION_POOL.close()
+
+
+@pytest.fixture(autouse=True)
+def disable_platform_facts(request, tmp_path_factory):
+    """Keep platform facts from being cached or persisted across tests.
+
+    Unless a test is marked ``platform_facts``, every fact is computed afresh
+    on each lookup. Marked tests start with an empty cache. Either way, facts
+    are never read from or written to the real facts file.
+    """
+    facts_file = str(tmp_path_factory.getbasetemp() / "platform-facts.json")
+    with mock.patch.object(facts, "FACTS_FILE", facts_file):
+        facts.invalidate()
+        if request.node.get_closest_marker("platform_facts"):
+            yield
+        else:
+            with mock.patch.object(facts, "get", lambda _name, f: f()):
+                yield
+        facts.invalidate()
+
+
+@pytest.fixture(autouse=True)
+def disable_config_cache(tmp_path_factory):
+    """Keep merged configs from being cached across tests.
+
+    The cache file is set within a directory which doesn't exist, so nothing
+    is ever stored. Tests of the cache pass their own cache file.
+    """
+    cache_file = tmp_path_factory.getbasetemp() / "absent" / "merged-cfg.json"
+    with mock.patch.object(helpers, "CONFIG_CACHE_FILE", str(cache_file)):
+        yield
+
+
+@pytest.fixture(autouse=True)
+def disable_schema_cache(tmp_path_factory):
+    """Keep the coalesced cloud-config schema from being cached on disk."""
+    from cloudinit.config import schema
+
+    cache_file = tmp_path_factory.getbasetemp() / "absent" / "schema.json"
+    with mock.patch.object(schema, "SCHEMA_CACHE_FILE", str(cache_file)):
+        yield
+
+
+@pytest.fixture(autouse=True)
+def disable_network_render_cache():
+    """Keep distros from skipping or recording network config renders."""
+    from cloudinit import distros
+
+    with mock.patch.object(
+        distros.Distro, "_network_render_file", return_value=None
+    ):
+        yield
+
+
+@pytest.fixture(autouse=True)
+def disable_profiler(tmp_path_factory):
+    """Keep boot stages run by tests from tracing into the real boot trace.
+
+    Events recorded by a test are dropped once it finishes.
+    """
+    trace_file = str(tmp_path_factory.getbasetemp() / "boot-trace.json")
+    with mock.patch.object(profiler, "TRACE_FILE", trace_file):
+        yield
+        profiler.disable()
+
+
 @pytest.fixture(scope="session")
 def fixture_utils():
     """Return a namespace containing fixture utility functions.
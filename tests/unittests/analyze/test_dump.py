@@ -1,10 +1,15 @@
 # This file is part of cloud-init. See LICENSE file for license information.
 
+import os
 from datetime import datetime
 from textwrap import dedent
 
+from cloudinit.analyze import dump
 from cloudinit.analyze.dump import (
     dump_events,
+    get_boot_offsets,
+    last_boot_lines,
+    load_events,
     parse_ci_logline,
     parse_timestamp,
 )
@@ -245,3 +250,94 @@ class TestDumpEvents(CiTestCase):
         m_parse_from_date.assert_has_calls(
             [mock.call("2016-08-30 21:53:25.972325+00:00")]
         )
+
+
+def boot_log(boot, stages=("init-local", "init", "modules:config")):
+    lines = []
+    for (num, stage) in enumerate(stages):
+        lines.append(
+            "2017-05-2%d 18:02:0%d,088 - util.py[DEBUG]: Cloud-init v. 0.7.9"
+            " running '%s' at Mon, 22 May 2017 18:02:01 +0000. Up 2.0"
+            " seconds.\n" % (boot, num, stage)
+        )
+        lines.append(
+            "2017-05-2%d 18:02:0%d,100 - util.py[DEBUG]: Reading config\n"
+            % (boot, num)
+        )
+    return "".join(lines)
+
+
+class TestBootOffsets(CiTestCase):
+    def setUp(self):
+        super(TestBootOffsets, self).setUp()
+        self.logfile = self.tmp_path("cloud-init.log")
+        self.boots = [
+            boot_log(1),
+            boot_log(2),
+            # Platforms without a local stage start boots with init
+            boot_log(3, stages=("init", "modules:config")),
+        ]
+        write_file(self.logfile, "".join(self.boots))
+
+    def expected_offsets(self, boots):
+        return [
+            len("".join(boots[:num]).encode()) for num in range(len(boots))
+        ]
+
+    def test_offsets_of_each_boot(self):
+        """get_boot_offsets finds the first line of every boot."""
+        self.assertEqual(
+            self.expected_offsets(self.boots),
+            get_boot_offsets(self.logfile, use_index=False),
+        )
+        self.assertFalse(os.path.exists(self.logfile + dump.INDEX_SUFFIX))
+
+    def test_manual_stage_runs_belong_to_the_boot(self):
+        """Running a later stage by hand does not start a boot."""
+        write_file(
+            self.logfile,
+            boot_log(1) + boot_log(1, stages=("modules:final", "single")),
+        )
+        self.assertEqual([0], get_boot_offsets(self.logfile))
+
+    def test_index_only_scans_the_log_appended(self):
+        """Later calls only scan what was logged since the index was kept."""
+        get_boot_offsets(self.logfile)
+        self.boots.append(boot_log(4))
+        write_file(self.logfile, self.boots[-1], omode="a")
+        with mock.patch(
+            "cloudinit.analyze.dump._scan_boot_offsets",
+            side_effect=dump._scan_boot_offsets,
+        ) as m_scan:
+            self.assertEqual(
+                self.expected_offsets(self.boots),
+                get_boot_offsets(self.logfile),
+            )
+            get_boot_offsets(self.logfile)
+        start = len("".join(self.boots[:3]).encode())
+        self.assertEqual([start], [c[0][1] for c in m_scan.call_args_list])
+
+    def test_index_of_rotated_log_ignored(self):
+        """The index is rebuilt when the log was replaced."""
+        get_boot_offsets(self.logfile)
+        boots = [boot_log(5), boot_log(6)]
+        write_file(self.logfile, "".join(boots) * 2)
+        self.assertEqual(
+            self.expected_offsets(boots * 2), get_boot_offsets(self.logfile)
+        )
+
+    def test_load_events_of_last_boot(self):
+        """load_events with last_boot only parses the last boot."""
+        events = load_events(self.logfile, last_boot=True)
+        self.assertEqual(
+            ["init-network", "modules-config"], [e["name"] for e in events]
+        )
+        self.assertEqual(8, len(load_events(self.logfile)))
+
+    def test_last_boot_lines(self):
+        """last_boot_lines splits lines read from a stream at the boot."""
+        lines = "".join(self.boots).splitlines()
+        self.assertEqual(self.boots[-1].splitlines(), last_boot_lines(lines))
+
+
+# vi: ts=4 expandtab
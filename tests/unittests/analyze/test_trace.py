@@ -0,0 +1,104 @@
+# This file is part of cloud-init. See LICENSE file for license information.
+
+import io
+import json
+
+import pytest
+
+from cloudinit.analyze.__main__ import analyze_trace, get_parser
+from cloudinit.analyze.trace import format_diff, format_summary, load_trace
+
+
+def event(name, cat, dur, tdur=0, **args):
+    return {
+        "name": name,
+        "cat": cat,
+        "ph": "X",
+        "ts": 0,
+        "dur": int(dur * 1e6),
+        "tdur": int(tdur * 1e6),
+        "args": args,
+    }
+
+
+BASELINE = [
+    {"name": "process_name", "ph": "M", "args": {"name": "init"}},
+    event("init-network", "stage", 4.0, 1.0),
+    event("init-network/config-ssh", "module", 2.5, 0.5),
+    event("ssh-keygen", "subp", 1.0, 0.01, children_cpu_ms=900),
+    event("ssh-keygen", "subp", 1.0, 0.01, children_cpu_ms=900),
+]
+TRACE = [
+    event("init-network", "stage", 3.0, 1.0),
+    event("init-network/config-ssh", "module", 1.5, 0.5),
+    event("init-network/config-mounts", "module", 0.25),
+]
+
+
+class TestLoadTrace:
+    @pytest.mark.parametrize(
+        "content",
+        (
+            "[\n" + "".join(json.dumps(e) + ",\n" for e in TRACE),
+            json.dumps(TRACE),
+            json.dumps({"traceEvents": TRACE}),
+        ),
+    )
+    def test_trace_formats(self, content):
+        assert TRACE == load_trace(io.StringIO(content))
+
+    def test_not_a_trace(self):
+        with pytest.raises(ValueError):
+            load_trace(io.StringIO('{"events": []}'))
+
+
+class TestFormat:
+    def test_summary_totals_events(self):
+        summary = format_summary(BASELINE)
+        assert (
+            "-- subp --\n"
+            "      wall        cpu  count  name\n"
+            "  2.00000s   1.82000s      2  ssh-keygen\n"
+        ) in summary
+        assert summary.index("-- stage --") < summary.index("-- module --")
+
+    def test_summary_top(self):
+        summary = format_summary(TRACE, top=1)
+        assert "config-mounts" not in summary
+        assert "  ... 1 more\n" in summary
+
+    def test_diff(self):
+        diff = format_diff(BASELINE, TRACE)
+        assert (
+            "-- module: 2.50000s -> 1.75000s (-0.75000s) --\n"
+            "  baseline      trace       delta  name\n"
+            "  2.50000s   1.50000s   -1.00000s  init-network/config-ssh\n"
+            "         -   0.25000s   +0.25000s  init-network/config-mounts\n"
+        ) in diff
+        assert "  2.00000s          -   -2.00000s  ssh-keygen\n" in diff
+
+
+class TestAnalyzeTrace:
+    def test_compare_with_baseline(self, tmp_path, capsys):
+        for (name, events) in (("base", BASELINE), ("trace", TRACE)):
+            (tmp_path / name).write_text(json.dumps(events))
+        args = get_parser().parse_args(
+            [
+                "trace",
+                "-i",
+                str(tmp_path / "trace"),
+                "--baseline",
+                str(tmp_path / "base"),
+            ]
+        )
+        analyze_trace("trace", args)
+        assert format_diff(BASELINE, TRACE) == capsys.readouterr().out
+
+    def test_invalid_trace(self, tmp_path, capsys):
+        (tmp_path / "trace").write_text("not a trace")
+        args = get_parser().parse_args(
+            ["trace", "-i", str(tmp_path / "trace")]
+        )
+        with pytest.raises(SystemExit):
+            analyze_trace("trace", args)
+        assert "Cannot parse trace" in capsys.readouterr().err
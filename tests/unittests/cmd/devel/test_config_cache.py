@@ -0,0 +1,36 @@
+# This file is part of cloud-init. See LICENSE file for license information.
+
+from collections import namedtuple
+
+from cloudinit import helpers
+from cloudinit.cmd.devel import config_cache
+
+Args = namedtuple("Args", "cache_file keys")
+
+
+class TestConfigCache:
+    def test_handle_args_error_when_nothing_cached(self, tmpdir, capsys):
+        cache_file = str(tmpdir.join("cache.json"))
+        assert 1 == config_cache.handle_args("anyname", Args(cache_file, None))
+        assert (
+            "No merged config cached in %s\n" % cache_file
+            == capsys.readouterr().err
+        )
+
+    def test_handle_args_shows_inputs_and_provenance(self, tmpdir, capsys):
+        """Each cached config lists its files and where its keys come from."""
+        cfg_file = tmpdir.join("extra.cfg")
+        cfg_file.write("a: extra\nb: extra\n")
+        cache_file = str(tmpdir.join("cache.json"))
+        helpers.ConfigMerger(
+            additional_fns=[str(cfg_file)],
+            base_cfg={"b": "base", "c": "base"},
+            cache_file=cache_file,
+        ).cfg
+        args = Args(cache_file, ["b", "c"])
+        assert 0 == config_cache.handle_args("anyname", args)
+        out = capsys.readouterr().out
+        assert "    %s (mtime " % cfg_file in out
+        assert "  sources: %s, base\n" % cfg_file in out
+        assert "    b: %s, base\n    c: base\n" % cfg_file in out
+        assert "    a: " not in out
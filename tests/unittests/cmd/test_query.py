@@ -10,12 +10,14 @@ from textwrap import dedent
 
 import pytest
 
+from cloudinit.atomic_helper import write_json
 from cloudinit.cmd import query
 from cloudinit.helpers import Paths
 from cloudinit.sources import (
     INSTANCE_JSON_FILE,
     INSTANCE_JSON_SENSITIVE_FILE,
     REDACT_SENSITIVE_VALUE,
+    write_instance_data_index,
 )
 from cloudinit.util import b64e, write_file
 from tests.unittests.helpers import mock
@@ -78,7 +80,7 @@ class TestQuery:
             list_keys=False,
             user_data=None,
             vendor_data=None,
-            varname=None,
+            varname=[],
         )
         with mock.patch(
             "cloudinit.cmd.query.addLogHandlerCLI", return_value=""
@@ -122,10 +124,12 @@ class TestQuery:
             list_keys=False,
             user_data=None,
             vendor_data=None,
-            varname=varname,
+            varname=[varname],
         )
         paths, _, _, _ = self._setup_paths(tmpdir)
-        with mock.patch("cloudinit.cmd.query.read_cfg_paths") as m_paths:
+        with mock.patch(
+            "cloudinit.cmd.query.read_system_cfg_paths"
+        ) as m_paths:
             m_paths.return_value = paths
             with mock.patch(
                 "cloudinit.cmd.query.addLogHandlerCLI", return_value=""
@@ -146,7 +150,7 @@ class TestQuery:
             list_keys=False,
             user_data="ud",
             vendor_data="vd",
-            varname=None,
+            varname=[],
         )
         assert 1 == query.handle_args("anyname", args)
 
@@ -167,7 +171,7 @@ class TestQuery:
             list_keys=False,
             user_data="ud",
             vendor_data="vd",
-            varname=None,
+            varname=[],
         )
         with mock.patch("cloudinit.cmd.query.util.load_file") as m_load:
             m_load.side_effect = OSError(errno.EACCES, "Not allowed")
@@ -185,10 +189,12 @@ class TestQuery:
             list_keys=False,
             user_data=None,
             vendor_data=None,
-            varname=None,
+            varname=[],
         )
         paths, run_dir, _, _ = self._setup_paths(tmpdir)
-        with mock.patch("cloudinit.cmd.query.read_cfg_paths") as m_paths:
+        with mock.patch(
+            "cloudinit.cmd.query.read_system_cfg_paths"
+        ) as m_paths:
             m_paths.return_value = paths
             assert 1 == query.handle_args("anyname", args)
         json_file = run_dir.join(INSTANCE_JSON_FILE)
@@ -205,10 +211,12 @@ class TestQuery:
             list_keys=False,
             user_data=None,
             vendor_data=None,
-            varname=None,
+            varname=[],
         )
         paths, run_dir, _, _ = self._setup_paths(tmpdir)
-        with mock.patch("cloudinit.cmd.query.read_cfg_paths") as m_paths:
+        with mock.patch(
+            "cloudinit.cmd.query.read_system_cfg_paths"
+        ) as m_paths:
             m_paths.return_value = paths
             with mock.patch("os.getuid") as m_getuid:
                 m_getuid.return_value = 0
@@ -247,9 +255,11 @@ class TestQuery:
             list_keys=False,
             user_data=user_data.strpath,
             vendor_data=vendor_data.strpath,
-            varname=None,
+            varname=[],
         )
-        with mock.patch("cloudinit.cmd.query.read_cfg_paths") as m_paths:
+        with mock.patch(
+            "cloudinit.cmd.query.read_system_cfg_paths"
+        ) as m_paths:
             m_paths.return_value = paths
             with mock.patch("os.getuid") as m_getuid:
                 m_getuid.return_value = 0
@@ -285,9 +295,11 @@ class TestQuery:
             list_keys=False,
             user_data=None,
             vendor_data=None,
-            varname=None,
+            varname=[],
         )
-        with mock.patch("cloudinit.cmd.query.read_cfg_paths") as m_paths:
+        with mock.patch(
+            "cloudinit.cmd.query.read_system_cfg_paths"
+        ) as m_paths:
             m_paths.return_value = paths
             with mock.patch("os.getuid", return_value=0):
                 assert 0 == query.handle_args("anyname", args)
@@ -316,9 +328,11 @@ class TestQuery:
             list_keys=False,
             user_data=user_data.strpath,
             vendor_data=vendor_data.strpath,
-            varname=None,
+            varname=[],
         )
-        with mock.patch("cloudinit.cmd.query.read_cfg_paths") as m_paths:
+        with mock.patch(
+            "cloudinit.cmd.query.read_system_cfg_paths"
+        ) as m_paths:
             m_paths.return_value = paths
             with mock.patch("os.getuid") as m_getuid:
                 m_getuid.return_value = 0
@@ -342,7 +356,7 @@ class TestQuery:
             list_keys=False,
             user_data="ud",
             vendor_data="vd",
-            varname=None,
+            varname=[],
         )
         with mock.patch("os.getuid") as m_getuid:
             m_getuid.return_value = 100
@@ -367,7 +381,7 @@ class TestQuery:
             list_keys=False,
             user_data="ud",
             vendor_data="vd",
-            varname="my_var",
+            varname=["my_var"],
         )
         with mock.patch("os.getuid") as m_getuid:
             m_getuid.return_value = 100
@@ -406,7 +420,7 @@ class TestQuery:
             user_data="ud",
             vendor_data="vd",
             list_keys=False,
-            varname=varname,
+            varname=[varname],
         )
         with mock.patch("os.getuid") as m_getuid:
             m_getuid.return_value = 100
@@ -448,7 +462,7 @@ class TestQuery:
             user_data="ud",
             vendor_data="vd",
             list_keys=False,
-            varname=None,
+            varname=[],
         )
         with mock.patch("os.getuid") as m_getuid:
             m_getuid.return_value = 100
@@ -474,7 +488,7 @@ class TestQuery:
             list_keys=True,
             user_data="ud",
             vendor_data="vd",
-            varname=None,
+            varname=[],
         )
         with mock.patch("os.getuid") as m_getuid:
             m_getuid.return_value = 100
@@ -500,7 +514,7 @@ class TestQuery:
             list_keys=True,
             user_data="ud",
             vendor_data="vd",
-            varname="v1",
+            varname=["v1"],
         )
         with mock.patch("os.getuid") as m_getuid:
             m_getuid.return_value = 100
@@ -526,12 +540,123 @@ class TestQuery:
             list_keys=True,
             user_data="ud",
             vendor_data="vd",
-            varname="top",
+            varname=["top"],
         )
         with mock.patch("os.getuid") as m_getuid:
             m_getuid.return_value = 100
             assert 1 == query.handle_args("anyname", args)
         assert expected_error in caplog.text
 
+    def test_handle_args_list_keys_errors_on_many_varnames(
+        self, caplog, tmpdir
+    ):
+        """--list-keys lists the keys of at most one varname."""
+        args = self.args(
+            debug=False,
+            dump_all=False,
+            format=None,
+            instance_data=None,
+            list_keys=True,
+            user_data=None,
+            vendor_data=None,
+            varname=["v1", "v2"],
+        )
+        assert 1 == query.handle_args("anyname", args)
+        assert "--list-keys accepts at most one varname" in caplog.text
+
+    def test_handle_args_returns_many_varnames_as_json(self, capsys, tmpdir):
+        """Report a JSON object of each varname when given many."""
+        instance_data = tmpdir.join("instance-data")
+        instance_data.write(
+            '{"v1": {"key-2": "value-2"}, "my-var": "it worked"}'
+        )
+        args = self.args(
+            debug=False,
+            dump_all=False,
+            format=None,
+            instance_data=instance_data.strpath,
+            list_keys=False,
+            user_data="ud",
+            vendor_data="vd",
+            varname=["v1.key_2", "my_var", "v1"],
+        )
+        with mock.patch("os.getuid") as m_getuid:
+            m_getuid.return_value = 100
+            assert 0 == query.handle_args("anyname", args)
+        out, _err = capsys.readouterr()
+        assert {
+            "v1.key_2": "value-2",
+            "my_var": "it worked",
+            "v1": {"key-2": "value-2"},
+        } == json.loads(out)
+
+    @mock.patch("cloudinit.cmd.query.load_userdata")
+    def test_handle_args_varname_does_not_load_user_data(
+        self, m_load_userdata, capsys, tmpdir
+    ):
+        """Only queries of userdata or vendordata read those files."""
+        instance_data = tmpdir.join("instance-data")
+        instance_data.write('{"v1": {"key-2": "value-2"}}')
+        args = self.args(
+            debug=False,
+            dump_all=False,
+            format=None,
+            instance_data=instance_data.strpath,
+            list_keys=False,
+            user_data="ud",
+            vendor_data="vd",
+            varname=["v1"],
+        )
+        with mock.patch("os.getuid") as m_getuid:
+            m_getuid.return_value = 0
+            assert 0 == query.handle_args("anyname", args)
+            assert 0 == m_load_userdata.call_count
+            m_load_userdata.return_value = "ud"
+            args = args._replace(varname=["userdata"])
+            assert 0 == query.handle_args("anyname", args)
+        out, _err = capsys.readouterr()
+        assert out.endswith("\nud\n")
+
+    def test_handle_args_answers_varnames_from_index(self, capsys, tmpdir):
+        """Leaf varnames are read from the key index without instance-data."""
+        paths, run_dir, _, _ = self._setup_paths(tmpdir)
+        json_file = run_dir.join(INSTANCE_JSON_FILE).strpath
+        data = {"v1": {"local-hostname": "myhost"}, "ds": {"key": "val"}}
+        write_json(json_file, data)
+        write_instance_data_index(json_file, data)
+        args = self.args(
+            debug=False,
+            dump_all=False,
+            format=None,
+            instance_data=None,
+            list_keys=False,
+            user_data=None,
+            vendor_data=None,
+            varname=["local_hostname", "v1.local-hostname", "ds.key"],
+        )
+        with mock.patch(
+            "cloudinit.cmd.query.read_system_cfg_paths", return_value=paths
+        ):
+            with mock.patch("os.getuid", return_value=100):
+                with mock.patch(
+                    "cloudinit.cmd.query._read_instance_data"
+                ) as m_read:
+                    assert 0 == query.handle_args("anyname", args)
+                    assert 0 == m_read.call_count
+                # Varnames of dicts need the instance-data
+                args = args._replace(varname=["ds"])
+                assert 0 == query.handle_args("anyname", args)
+                # A stale index is ignored
+                write_json(json_file, {"ds": {"key": "new-val"}})
+                args = args._replace(varname=["ds.key"])
+                assert 0 == query.handle_args("anyname", args)
+        out, _err = capsys.readouterr()
+        assert (
+            '{\n "ds.key": "val",\n "local_hostname": "myhost",\n'
+            ' "v1.local-hostname": "myhost"\n}\n'
+            '{\n "key": "val"\n}\n'
+            "new-val\n"
+        ) == out
+
 
 # vi: ts=4 expandtab
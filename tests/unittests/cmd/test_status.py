@@ -1,13 +1,15 @@
 # This file is part of cloud-init. See LICENSE file for license information.
 
+import json
 import os
+import threading
 from collections import namedtuple
 from io import StringIO
 from textwrap import dedent
 
 from cloudinit.atomic_helper import write_json
 from cloudinit.cmd import status
-from cloudinit.util import ensure_file
+from cloudinit.util import ensure_dir, ensure_file, write_file
 from tests.unittests.helpers import CiTestCase, mock, wrap_and_call
 
 mypaths = namedtuple("MyPaths", "run_dir")
@@ -22,17 +24,6 @@ class TestStatus(CiTestCase):
         self.disable_file = self.tmp_path("cloudinit-disable", self.new_root)
         self.paths = mypaths(run_dir=self.new_root)
 
-        class FakeInit(object):
-            paths = self.paths
-
-            def __init__(self, ds_deps):
-                pass
-
-            def read_cfg(self):
-                pass
-
-        self.init_class = FakeInit
-
     def test__is_cloudinit_disabled_false_on_sysvinit(self):
         """When not in an environment using systemd, return False."""
         ensure_file(self.disable_file)  # Create the ignored disable file
@@ -147,7 +138,7 @@ class TestStatus(CiTestCase):
                 "cloudinit.cmd.status",
                 {
                     "_is_cloudinit_disabled": (False, ""),
-                    "Init": {"side_effect": self.init_class},
+                    "read_system_cfg_paths": self.paths,
                 },
                 status.handle_status_args,
                 "ignored",
@@ -176,7 +167,7 @@ class TestStatus(CiTestCase):
                         True,
                         "disabled for some reason",
                     ),
-                    "Init": {"side_effect": self.init_class},
+                    "read_system_cfg_paths": self.paths,
                 },
                 status.handle_status_args,
                 "ignored",
@@ -208,7 +199,7 @@ class TestStatus(CiTestCase):
                 "cloudinit.cmd.status",
                 {
                     "_is_cloudinit_disabled": (False, ""),
-                    "Init": {"side_effect": self.init_class},
+                    "read_system_cfg_paths": self.paths,
                 },
                 status.handle_status_args,
                 "ignored",
@@ -229,7 +220,7 @@ class TestStatus(CiTestCase):
                 "cloudinit.cmd.status",
                 {
                     "_is_cloudinit_disabled": (False, ""),
-                    "Init": {"side_effect": self.init_class},
+                    "read_system_cfg_paths": self.paths,
                 },
                 status.handle_status_args,
                 "ignored",
@@ -266,7 +257,7 @@ class TestStatus(CiTestCase):
                 "cloudinit.cmd.status",
                 {
                     "_is_cloudinit_disabled": (False, ""),
-                    "Init": {"side_effect": self.init_class},
+                    "read_system_cfg_paths": self.paths,
                 },
                 status.handle_status_args,
                 "ignored",
@@ -298,7 +289,7 @@ class TestStatus(CiTestCase):
                 "cloudinit.cmd.status",
                 {
                     "_is_cloudinit_disabled": (False, ""),
-                    "Init": {"side_effect": self.init_class},
+                    "read_system_cfg_paths": self.paths,
                 },
                 status.handle_status_args,
                 "ignored",
@@ -338,7 +329,7 @@ class TestStatus(CiTestCase):
                 "cloudinit.cmd.status",
                 {
                     "_is_cloudinit_disabled": (False, ""),
-                    "Init": {"side_effect": self.init_class},
+                    "read_system_cfg_paths": self.paths,
                 },
                 status.handle_status_args,
                 "ignored",
@@ -377,7 +368,7 @@ class TestStatus(CiTestCase):
                 "cloudinit.cmd.status",
                 {
                     "_is_cloudinit_disabled": (False, ""),
-                    "Init": {"side_effect": self.init_class},
+                    "read_system_cfg_paths": self.paths,
                 },
                 status.handle_status_args,
                 "ignored",
@@ -414,7 +405,7 @@ class TestStatus(CiTestCase):
                 "cloudinit.cmd.status",
                 {
                     "_is_cloudinit_disabled": (False, ""),
-                    "Init": {"side_effect": self.init_class},
+                    "read_system_cfg_paths": self.paths,
                 },
                 status.handle_status_args,
                 "ignored",
@@ -466,8 +457,9 @@ class TestStatus(CiTestCase):
                 "cloudinit.cmd.status",
                 {
                     "sleep": {"side_effect": fake_sleep},
+                    "_get_status_watch": None,
                     "_is_cloudinit_disabled": (False, ""),
-                    "Init": {"side_effect": self.init_class},
+                    "read_system_cfg_paths": self.paths,
                 },
                 status.handle_status_args,
                 "ignored",
@@ -514,8 +506,9 @@ class TestStatus(CiTestCase):
                 "cloudinit.cmd.status",
                 {
                     "sleep": {"side_effect": fake_sleep},
+                    "_get_status_watch": None,
                     "_is_cloudinit_disabled": (False, ""),
-                    "Init": {"side_effect": self.init_class},
+                    "read_system_cfg_paths": self.paths,
                 },
                 status.handle_status_args,
                 "ignored",
@@ -525,6 +518,109 @@ class TestStatus(CiTestCase):
         self.assertEqual(4, self.sleep_calls)
         self.assertEqual("....\nstatus: error\n", m_stdout.getvalue())
 
+    def test_status_wait_json_lines_on_status_changes(self):
+        """--json-lines writes the status each time the watch sees it
+        change, until done."""
+        running_json = {
+            "v1": {
+                "stage": "init",
+                "init": {"start": 124.456, "finished": None},
+                "init-local": {"start": 123.45, "finished": 123.46},
+            }
+        }
+        done_json = {
+            "v1": {
+                "stage": None,
+                "init": {"start": 124.456, "finished": 125.678},
+                "init-local": {"start": 123.45, "finished": 123.46},
+            }
+        }
+        updates = [running_json, running_json, done_json]
+
+        def fake_wait():
+            write_json(self.status_file, updates.pop(0))
+            if not updates:
+                ensure_file(self.tmp_path("result.json", self.new_root))
+            return True
+
+        watch = mock.Mock(wait=mock.Mock(side_effect=fake_wait))
+        cmdargs = myargs(long=False, wait=True)._asdict()
+        cmdargs["json_lines"] = True
+        with mock.patch("sys.stdout", new_callable=StringIO) as m_stdout:
+            retcode = wrap_and_call(
+                "cloudinit.cmd.status",
+                {
+                    "sleep": {"side_effect": AssertionError("polled")},
+                    "_get_status_watch": watch,
+                    "_is_cloudinit_disabled": (False, ""),
+                    "read_system_cfg_paths": self.paths,
+                },
+                status.handle_status_args,
+                "ignored",
+                namedtuple("MyArgs", cmdargs)(**cmdargs),
+            )
+        self.assertEqual(0, retcode)
+        self.assertEqual(3, watch.wait.call_count)
+        watch.close.assert_called_once_with()
+        lines = [
+            json.loads(line) for line in m_stdout.getvalue().split("\n")[:-1]
+        ]
+        self.assertEqual(
+            ["not run", "running", "done"], [line["status"] for line in lines]
+        )
+        self.assertEqual("init", lines[1]["stage"])
+        self.assertEqual(
+            {"start": 124.456, "finished": 125.678, "errors": []},
+            lines[2]["stages"]["init"],
+        )
+
+    def test_status_watch_wakes_on_linked_status_file(self):
+        """StatusWatch wakes when status.json is replaced where it links."""
+        data_dir = self.tmp_path("data", self.new_root)
+        ensure_dir(data_dir)
+        data_status = os.path.join(data_dir, "status.json")
+        write_json(data_status, {"v1": {}})
+        os.symlink(data_status, self.status_file)
+        watch = status.StatusWatch(self.new_root)
+        self.addCleanup(watch.close)
+
+        write_file(os.path.join(data_dir, "unrelated"), "")
+        self.assertFalse(watch.wait(timeout=0.1))
+        timer = threading.Timer(
+            0.1, write_json, (data_status, {"v1": {"stage": "init"}})
+        )
+        timer.start()
+        self.addCleanup(timer.cancel)
+        self.assertTrue(watch.wait(timeout=10))
+
+    def test_status_watch_watches_directories_once_created(self):
+        """StatusWatch wakes when a linked directory is created later."""
+        data_dir = self.tmp_path("data", self.new_root)
+        data_status = os.path.join(data_dir, "status.json")
+        os.symlink(data_status, self.status_file)
+        watch = status.StatusWatch(self.new_root)
+        self.addCleanup(watch.close)
+        self.assertFalse(watch.wait(timeout=0.1))
+
+        ensure_dir(data_dir)
+        write_json(data_status, {"v1": {}})
+        self.assertTrue(watch.wait(timeout=10))
+        self.assertFalse(watch.wait(timeout=0.1))
+        timer = threading.Timer(
+            0.1, write_json, (data_status, {"v1": {"stage": "init"}})
+        )
+        timer.start()
+        self.addCleanup(timer.cancel)
+        self.assertTrue(watch.wait(timeout=10))
+
+    def test_status_watch_ignores_undecodable_names(self):
+        """StatusWatch skips files whose names are not valid utf-8."""
+        watch = status.StatusWatch(self.new_root)
+        self.addCleanup(watch.close)
+        with open(os.path.join(os.fsencode(self.new_root), b"\xff"), "w"):
+            pass
+        self.assertFalse(watch.wait(timeout=0.1))
+
     def test_status_main(self):
         """status.main can be run as a standalone script."""
         write_json(
@@ -537,7 +633,7 @@ class TestStatus(CiTestCase):
                     {
                         "sys.argv": {"new": ["status"]},
                         "_is_cloudinit_disabled": (False, ""),
-                        "Init": {"side_effect": self.init_class},
+                        "read_system_cfg_paths": self.paths,
                     },
                     status.main,
                 )
@@ -2,9 +2,12 @@
 
 import logging
 import os.path
+import threading
+from io import StringIO
 
-from cloudinit import ssh_util
+from cloudinit import ssh_util, subp
 from cloudinit.config import cc_ssh
+from cloudinit.reporting import events
 from tests.unittests.helpers import CiTestCase, mock
 
 LOG = logging.getLogger(__name__)
@@ -465,3 +468,115 @@ class TestHandleSsh(CiTestCase):
         # Check that all expected output has been done.
         for call_ in expected_calls:
             self.assertIn(call_, m_write_file.call_args_list)
+
+
+@mock.patch(MODPATH + "util.get_group_id", return_value=-1)
+class TestGenerateHostKeys(CiTestCase):
+    """Test concurrent host key generation."""
+
+    with_logs = True
+
+    def setUp(self):
+        super(TestGenerateHostKeys, self).setUp()
+        tmpl = os.path.join(self.tmp_dir(), "ssh_host_%s_key")
+        patcher = mock.patch(MODPATH + "KEY_FILE_TPL", tmpl)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.reporter = events.ReportEventStack(
+            "test", "test", reporting_enabled=False
+        )
+
+    def test_key_types_are_generated_concurrently(self, _m_gid):
+        """Every key type runs ssh-keygen at the same time."""
+        barrier = threading.Barrier(2, timeout=5)
+
+        def fake_keygen(cmd, **_kwargs):
+            barrier.wait()
+            return ("%s out\n" % cmd[2], "")
+
+        with mock.patch(MODPATH + "subp.subp", side_effect=fake_keygen):
+            with mock.patch("sys.stdout", new_callable=StringIO) as m_stdout:
+                cc_ssh.generate_host_keys(
+                    ["rsa", "ed25519"], LOG, reporter=self.reporter
+                )
+        self.assertEqual("rsa out\ned25519 out\n", m_stdout.getvalue())
+        for keytype in ("rsa", "ed25519"):
+            (result, message) = self.reporter.children["ssh-keygen-" + keytype]
+            self.assertEqual(events.status.SUCCESS, result)
+            self.assertRegex(
+                message, r"generated %s host key in \d+\.\d+ seconds" % keytype
+            )
+
+    def test_errors_are_reported_per_key_type(self, _m_gid):
+        """A failing key type does not stop generation of the others."""
+
+        def fake_keygen(cmd, **_kwargs):
+            if cmd[2] == "dsa":
+                raise subp.ProcessExecutionError(
+                    stderr=b"unknown key type dsa", exit_code=1
+                )
+            if cmd[2] == "rsa":
+                raise subp.ProcessExecutionError(stderr=b"boom", exit_code=2)
+            return ("", "")
+
+        with mock.patch(MODPATH + "subp.subp", side_effect=fake_keygen):
+            cc_ssh.generate_host_keys(
+                ["rsa", "dsa", "ecdsa"],
+                LOG,
+                quiet=True,
+                reporter=self.reporter,
+            )
+        self.assertIn(
+            "Failed generating key type rsa to file", self.logs.getvalue()
+        )
+        self.assertIn("unknown key type 'dsa'", self.logs.getvalue())
+        self.assertEqual(
+            {
+                "ssh-keygen-rsa": events.status.FAIL,
+                "ssh-keygen-dsa": events.status.WARN,
+                "ssh-keygen-ecdsa": events.status.SUCCESS,
+            },
+            {
+                name: result
+                for (name, (result, _msg)) in self.reporter.children.items()
+            },
+        )
+
+    def test_existing_keys_are_skipped(self, _m_gid):
+        """Key types whose key file already exists are not regenerated."""
+        open(cc_ssh.KEY_FILE_TPL % "rsa", "w").close()
+        with mock.patch(
+            MODPATH + "subp.subp", return_value=("", "")
+        ) as m_subp:
+            cc_ssh.generate_host_keys(["rsa", "ecdsa"], LOG, quiet=True)
+        self.assertEqual(
+            ["ecdsa"], [c[0][0][2] for c in m_subp.call_args_list]
+        )
+
+    @mock.patch(MODPATH + "ug_util.normalize_users_groups")
+    @mock.patch(MODPATH + "ssh_util.setup_user_keys")
+    @mock.patch(MODPATH + "cc_seed_random.write_seed_data")
+    @mock.patch(MODPATH + "generate_host_keys")
+    def test_handle_seeds_entropy_before_keygen(
+        self, m_genkeys, m_seed, _m_setup_keys, m_nug, _m_gid
+    ):
+        """ssh_seed_random stages seed_random data before generating keys."""
+        m_nug.return_value = ([], {})
+        order = []
+        m_seed.side_effect = lambda *_args: order.append("seed")
+        m_genkeys.side_effect = lambda *_args, **_kwargs: order.append("gen")
+        cloud = self.tmp_cloud(distro="ubuntu", metadata={"random_seed": "x"})
+        cfg = {
+            "ssh_deletekeys": False,
+            "ssh_publish_hostkeys": {"enabled": False},
+            "random_seed": {"data": "abc"},
+        }
+        cc_ssh.handle("ssh", cfg, cloud, LOG, None)
+        self.assertEqual(["gen"], order)
+
+        cfg["ssh_seed_random"] = True
+        cc_ssh.handle("ssh", cfg, cloud, LOG, None)
+        self.assertEqual(["gen", "seed", "gen"], order)
+        m_seed.assert_called_once_with(
+            "ssh", {"data": "abc"}, {"random_seed": "x"}, LOG
+        )
@@ -13,6 +13,7 @@ from textwrap import dedent
 import pytest
 from yaml import safe_load
 
+from cloudinit.config import schema as schema_mod
 from cloudinit.config.schema import (
     CLOUD_CONFIG_HEADER,
     MetaSchema,
@@ -108,6 +109,57 @@ class GetSchemaTest(CiTestCase):
         self.assertCountEqual(["id", "$schema", "allOf"], get_schema().keys())
 
 
+class TestGetSchemaCache:
+    @pytest.fixture
+    def cache_file(self, tmpdir):
+        cache_file = tmpdir.join("schema.json")
+        with mock.patch.object(
+            schema_mod, "SCHEMA_CACHE_FILE", cache_file.strpath
+        ):
+            yield cache_file
+
+    def test_schema_cached(self, cache_file):
+        """The coalesced schema is read back without importing modules."""
+        schema = get_schema()
+        assert cache_file.check()
+        with mock.patch(
+            "cloudinit.config.schema.importer.find_module",
+            side_effect=AssertionError("unexpected import"),
+        ):
+            assert schema == get_schema()
+
+    def test_cache_keyed_on_version(self, cache_file):
+        """A different cloud-init version coalesces the schema again."""
+        get_schema()
+        with mock.patch(
+            "cloudinit.config.schema.version.version_string",
+            return_value="0.0",
+        ):
+            with mock.patch(
+                "cloudinit.config.schema.importer.find_module",
+                return_value=([], []),
+            ) as m_find_module:
+                assert [] == get_schema()["allOf"]
+        assert m_find_module.call_count > 0
+
+    def test_cache_keyed_on_modules(self, cache_file, tmpdir):
+        """Changing a cc_* module coalesces the schema again."""
+        module = tmpdir.join("cc_fake.py")
+        module.write("")
+        with mock.patch(
+            "cloudinit.config.schema.get_modules",
+            return_value={module.strpath: "cc_fake"},
+        ):
+            assert [] == get_schema()["allOf"]
+            module.write("# changed")
+            with mock.patch(
+                "cloudinit.config.schema.importer.find_module",
+                return_value=([], []),
+            ) as m_find_module:
+                get_schema()
+        assert 1 == m_find_module.call_count
+
+
 class SchemaValidationErrorTest(CiTestCase):
     """Test validate_cloudconfig_schema"""
 
@@ -143,6 +195,12 @@ class ValidateCloudConfigSchemaTest(CiTestCase):
             self.logs.getvalue(),
         )
 
+    @skipUnlessJsonSchema()
+    def test_validator_class_created_once(self):
+        """The validator class is reused by later validations."""
+        (validator, _) = get_jsonschema_validator()
+        self.assertIs(validator, get_jsonschema_validator()[0])
+
     @skipUnlessJsonSchema()
     def test_validateconfig_schema_emits_warning_on_missing_jsonschema(self):
         """Warning from validate_cloudconfig_schema when missing jsonschema."""
@@ -677,6 +735,50 @@ class TestMain:
         out, _err = capsys.readouterr()
         assert "Valid cloud-config: {0}\n".format(myyaml) == out
 
+    @skipUnlessJsonSchema()
+    def test_main_invalid_config_file_exit_code(self, tmpdir, capsys):
+        """A single invalid config file exits 1 unless annotated."""
+        invalid = tmpdir.join("invalid.yaml")
+        invalid.write(b"#cloud-config\nntp: 1")
+        myargs = ["mycmd", "--config-file", invalid.strpath]
+        with mock.patch("sys.argv", myargs):
+            with pytest.raises(SystemExit) as context_manager:
+                main()
+        assert 1 == context_manager.value.code
+        _out, err = capsys.readouterr()
+        assert (
+            "Error:\nCloud config schema errors: ntp: 1 is not of type"
+            " 'object', 'null'\n" == err
+        )
+        with mock.patch("sys.argv", myargs + ["--annotate"]):
+            assert 0 == main(), "Expected 0 exit code"
+
+    @skipUnlessJsonSchema()
+    def test_main_validates_many_config_files(self, tmpdir, capsys):
+        """Many config files are validated in one run, reporting each."""
+        valid = tmpdir.join("valid.yaml")
+        valid.write(b"#cloud-config\nntp:")
+        invalid = tmpdir.join("invalid.yaml")
+        invalid.write(b"#cloud-config\nntp: 1")
+        absent = tmpdir.join("absent.yaml")
+        myargs = ["mycmd", "--config-file"] + [
+            f.strpath for f in (valid, invalid, absent)
+        ]
+        with mock.patch("sys.argv", myargs):
+            with pytest.raises(SystemExit) as context_manager:
+                main()
+        assert 1 == context_manager.value.code
+        out, err = capsys.readouterr()
+        assert "Valid cloud-config: {0}\n".format(valid) == out
+        assert (
+            "Error:\n{0}: Cloud config schema errors: ntp: 1 is not of type"
+            " 'object', 'null'\n"
+            "Error:\n{1}: Configfile {1} does not exist\n".format(
+                invalid, absent
+            )
+            == err
+        )
+
     @mock.patch("cloudinit.config.schema.read_cfg_paths")
     @mock.patch("cloudinit.config.schema.os.getuid", return_value=0)
     def test_main_validates_system_userdata(
@@ -1,8 +1,9 @@
 # This file is part of cloud-init. See LICENSE file for license information.
 
+import grp
 import re
 
-from cloudinit import distros, ssh_util
+from cloudinit import distros, ssh_util, subp
 from tests.unittests.helpers import CiTestCase, mock
 from tests.unittests.util import abstract_to_concrete
 
@@ -279,4 +280,187 @@ class TestCreateUser(CiTestCase):
             self.dist.lock_passwd("bob")
 
 
+@mock.patch("cloudinit.distros.util.system_is_snappy", return_value=False)
+@mock.patch("cloudinit.distros.subp.which", side_effect=lambda m: "/bin/" + m)
+@mock.patch("cloudinit.distros.subp.subp")
+class TestBatchUserChanges(CiTestCase):
+
+    with_logs = True
+
+    def setUp(self):
+        super(TestBatchUserChanges, self).setUp()
+        self.dist = abstract_to_concrete(distros.Distro)(
+            name="test", cfg=None, paths=None
+        )
+        self.users = set()
+        self.groups = {"existing": ["olduser"]}
+        self.add_patch(
+            "cloudinit.distros.util.is_user",
+            "m_is_user",
+            side_effect=lambda name: name in self.users,
+        )
+        self.add_patch(
+            "cloudinit.distros.util.is_group",
+            "m_is_group",
+            side_effect=lambda name: name in self.groups,
+        )
+        self.add_patch(
+            "cloudinit.distros.grp.getgrnam",
+            "m_getgrnam",
+            side_effect=self._getgrnam,
+        )
+
+    def _getgrnam(self, name):
+        if name not in self.groups:
+            raise KeyError(name)
+        return grp.struct_group((name, "x", 1000, self.groups[name]))
+
+    def _fake_subp(self, args, data=None, **_kwargs):
+        if args[0] == "useradd":
+            self.users.add(args[1])
+        elif args[0] == "groupadd":
+            self.groups[args[1]] = []
+        return ("", "")
+
+    def test_passwords_set_with_one_chpasswd_per_kind(
+        self, m_subp, m_which, m_is_snappy
+    ):
+        """Passwords are applied once for all users, then accounts locked."""
+        m_subp.side_effect = self._fake_subp
+        with self.dist.batch_user_changes():
+            self.dist.create_user("u1", plain_text_passwd="p1")
+            self.dist.create_user("u2", plain_text_passwd="p2")
+            self.dist.create_user(
+                "u3", hashed_passwd="$6$h3", lock_passwd=False
+            )
+            # Nothing but the users themselves exist inside the batch
+            self.assertEqual(
+                ["useradd"] * 3, [c[0][0][0] for c in m_subp.call_args_list]
+            )
+        self.assertEqual(
+            [
+                mock.call(
+                    ["chpasswd"],
+                    "u1:p1\nu2:p2\n",
+                    logstring="chpasswd for u1, u2",
+                ),
+                mock.call(
+                    ["chpasswd", "-e"],
+                    "u3:$6$h3\n",
+                    logstring="chpasswd for u3",
+                ),
+                mock.call(["passwd", "-l", "u1"]),
+                mock.call(["passwd", "-l", "u2"]),
+            ],
+            m_subp.call_args_list[3:],
+        )
+
+    def test_locks_and_members_applied_when_chpasswd_fails(
+        self, m_subp, m_which, m_is_snappy
+    ):
+        """A chpasswd failure is raised after every other change is made."""
+
+        def fake_subp(args, data=None, **kwargs):
+            if args[0] == "chpasswd":
+                raise subp.ProcessExecutionError(cmd=args, exit_code=1)
+            return self._fake_subp(args, data, **kwargs)
+
+        m_subp.side_effect = fake_subp
+        with self.assertRaises(subp.ProcessExecutionError):
+            with self.dist.batch_user_changes():
+                self.dist.create_user("u1", plain_text_passwd="p1")
+                self.dist.create_user("u2", hashed_passwd="$6$h2")
+                self.dist.create_group("new", ["u1", "u2"])
+        self.assertEqual(
+            [
+                ["chpasswd"],
+                ["chpasswd", "-e"],
+                ["passwd", "-l", "u1"],
+                ["passwd", "-l", "u2"],
+                ["gpasswd", "-M", "u1,u2", "new"],
+            ],
+            [c[0][0] for c in m_subp.call_args_list[3:]],
+        )
+
+    def test_error_within_batch_is_not_replaced(
+        self, m_subp, m_which, m_is_snappy
+    ):
+        """Queued changes are applied but the original error propagates."""
+
+        def fake_subp(args, data=None, **kwargs):
+            if args[0] == "passwd":
+                raise subp.ProcessExecutionError(cmd=args, exit_code=1)
+            return self._fake_subp(args, data, **kwargs)
+
+        m_subp.side_effect = fake_subp
+        with self.assertRaisesRegex(RuntimeError, "within the batch"):
+            with self.dist.batch_user_changes():
+                self.dist.create_user("u1", plain_text_passwd="p1")
+                raise RuntimeError("within the batch")
+        self.assertEqual(
+            [["chpasswd"], ["passwd", "-l", "u1"]],
+            [c[0][0] for c in m_subp.call_args_list[1:]],
+        )
+        self.assertIn(
+            "Failed to apply batched user changes", self.logs.getvalue()
+        )
+
+    def test_group_members_added_once_users_exist(
+        self, m_subp, m_which, m_is_snappy
+    ):
+        """Members are added with one gpasswd per group after user creation."""
+        m_subp.side_effect = self._fake_subp
+        with self.dist.batch_user_changes():
+            self.dist.create_group("existing", ["u1", "olduser", "missing"])
+            self.dist.create_group("new", ["u1", "u2"])
+            self.dist.create_user("u1", lock_passwd=False)
+            self.dist.create_user("u2", lock_passwd=False)
+        self.assertEqual(
+            [
+                mock.call(["groupadd", "new"]),
+                mock.call(["useradd", "u1", "-m"], logstring=mock.ANY),
+                mock.call(["useradd", "u2", "-m"], logstring=mock.ANY),
+                mock.call(["gpasswd", "-M", "olduser,u1", "existing"]),
+                mock.call(["gpasswd", "-M", "u1,u2", "new"]),
+            ],
+            m_subp.call_args_list,
+        )
+        self.assertIn(
+            "Unable to add group member 'missing' to group 'existing'",
+            self.logs.getvalue(),
+        )
+
+    def test_changes_are_immediate_outside_batch(
+        self, m_subp, m_which, m_is_snappy
+    ):
+        """Without a batch each change is applied as it is requested."""
+        self.users.update(["u1", "u2"])
+        self.dist.set_passwd("u1", "p1")
+        self.dist.create_group("existing", ["u1", "u2"])
+        self.assertEqual(
+            [
+                mock.call(
+                    ["chpasswd"], "u1:p1\n", logstring="chpasswd for u1"
+                ),
+                mock.call(["gpasswd", "-M", "olduser,u1,u2", "existing"]),
+            ],
+            m_subp.call_args_list,
+        )
+
+    def test_members_added_with_usermod_without_gpasswd(
+        self, m_subp, m_which, m_is_snappy
+    ):
+        """usermod adds members one by one when gpasswd is unavailable."""
+        m_which.side_effect = lambda m: None
+        self.users.update(["u1", "u2"])
+        self.dist.create_group("existing", ["u1", "u2"])
+        self.assertEqual(
+            [
+                mock.call(["usermod", "-a", "-G", "existing", "u1"]),
+                mock.call(["usermod", "-a", "-G", "existing", "u2"]),
+            ],
+            m_subp.call_args_list,
+        )
+
+
 # vi: ts=4 expandtab
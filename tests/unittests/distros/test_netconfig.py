@@ -487,6 +487,41 @@ class TestNetCfgDistroUbuntuNetplan(TestNetCfgDistroBase):
             expected_cfgs=expected_cfgs.copy(),
         )
 
+    @mock.patch("cloudinit.net.netplan.Renderer._netplan_generate")
+    def test_apply_network_config_skips_unchanged_render(self, m_generate):
+        """An identical config is not rendered again until its output
+        is modified."""
+        tmpd = self.tmp_dir()
+        render_file = os.path.join(tmpd, "network-render.json")
+        netplan_path = os.path.join(tmpd, "50-cloud-init.yaml")
+        netplan_cfg = dict(self.distro.renderer_configs["netplan"])
+        netplan_cfg.update(
+            netplan_path=netplan_path,
+            clean_default=False,
+            features=[],
+            postcmds=False,
+        )
+        self.distro.renderer_configs = {"netplan": netplan_cfg}
+        with mock.patch(
+            "cloudinit.net.netplan.available", return_value=True
+        ), mock.patch(
+            "cloudinit.net.netplan.get_devicelist", return_value=self.devlist
+        ), mock.patch.object(
+            distros.Distro, "_network_render_file", return_value=render_file
+        ):
+            self.distro.apply_network_config(V1_NET_CFG, False)
+            self.assertEqual(1, m_generate.call_count)
+            record = util.load_json(util.load_file(render_file))
+            self.assertEqual([netplan_path], list(record["files"]))
+
+            self.distro.apply_network_config(V1_NET_CFG, False)
+            self.assertEqual(1, m_generate.call_count)
+
+            util.write_file(netplan_path, "network: {}\n")
+            self.distro.apply_network_config(V1_NET_CFG, False)
+            self.assertEqual(2, m_generate.call_count)
+        self.assertEqual(V1_TO_V2_NET_CFG_OUTPUT, util.load_file(netplan_path))
+
 
 class TestNetCfgDistroRedhat(TestNetCfgDistroBase):
     def setUp(self):
@@ -33,6 +33,82 @@ class TestSysDevPath(CiTestCase):
         self.assertEqual(expected, net.sys_dev_path(dev))
 
 
+class TestSysfsSnapshot(CiTestCase):
+    def setUp(self):
+        super(TestSysfsSnapshot, self).setUp()
+        sys_mock = mock.patch("cloudinit.net.get_sys_class_path")
+        self.m_sys_path = sys_mock.start()
+        self.sysdir = self.tmp_dir() + "/"
+        self.m_sys_path.return_value = self.sysdir
+        self.addCleanup(sys_mock.stop)
+        write_file(os.path.join(self.sysdir, "eth0", "address"), "mac0")
+        write_file(os.path.join(self.sysdir, "eth0", "addr_assign_type"), "0")
+
+    def test_sysfs_read_once_while_active(self):
+        """Repeated queries are answered from the snapshot."""
+        with mock.patch(
+            "cloudinit.net.util.load_file", wraps=net.util.load_file
+        ) as m_load_file:
+            with net.sysfs_snapshot():
+                for _ in range(3):
+                    self.assertEqual("mac0", net.get_interface_mac("eth0"))
+                    self.assertFalse(net.read_sys_net_safe("eth0", "type"))
+            self.assertEqual(2, m_load_file.call_count)
+            net.get_interface_mac("eth0")
+            self.assertEqual(3, m_load_file.call_count)
+
+    def test_snapshot_refresh(self):
+        """Refreshing forgets what was read for one or all devices."""
+        write_file(os.path.join(self.sysdir, "eth1", "address"), "mac1")
+        with net.sysfs_snapshot() as snapshot:
+            self.assertEqual(["eth0", "eth1"], sorted(net.get_devicelist()))
+            self.assertEqual("mac0", net.get_interface_mac("eth0"))
+            self.assertEqual("mac1", net.get_interface_mac("eth1"))
+            write_file(os.path.join(self.sysdir, "eth0", "address"), "new0")
+            write_file(os.path.join(self.sysdir, "eth1", "address"), "new1")
+            write_file(os.path.join(self.sysdir, "eth2", "address"), "mac2")
+            self.assertEqual("mac0", net.get_interface_mac("eth0"))
+            snapshot.refresh("eth0")
+            self.assertEqual("new0", net.get_interface_mac("eth0"))
+            self.assertEqual("mac1", net.get_interface_mac("eth1"))
+            self.assertEqual(
+                ["eth0", "eth1", "eth2"], sorted(net.get_devicelist())
+            )
+            net.refresh_sysfs_snapshot()
+            self.assertEqual("new1", net.get_interface_mac("eth1"))
+
+    def test_snapshot_caches_errors(self):
+        """Missing attributes raise the same error on each query."""
+        with net.sysfs_snapshot():
+            for _ in range(2):
+                with self.assertRaises(OSError) as context_manager:
+                    net.read_sys_net("eth0", "carrier")
+                self.assertEqual(errno.ENOENT, context_manager.exception.errno)
+
+    def test_nested_snapshots_shared(self):
+        """Nested uses share the outermost snapshot."""
+        with net.sysfs_snapshot() as outer:
+            with net.sysfs_snapshot() as inner:
+                self.assertIs(outer, inner)
+        with net.sysfs_snapshot() as another:
+            self.assertIsNot(outer, another)
+
+    def test_get_interfaces_uses_snapshot(self):
+        """get_interfaces reads each device attribute only once."""
+        write_file(os.path.join(self.sysdir, "eth0", "type"), "1")
+        with mock.patch(
+            "cloudinit.net.util.load_file", wraps=net.util.load_file
+        ) as m_load_file, mock.patch(
+            "cloudinit.net.os.path.exists", wraps=os.path.exists
+        ) as m_exists:
+            self.assertEqual(
+                {"mac0": "eth0"}, net.get_interfaces_by_mac_on_linux()
+            )
+        for m_read in (m_load_file, m_exists):
+            paths = [call[0][0] for call in m_read.call_args_list]
+            self.assertEqual(sorted(set(paths)), sorted(paths))
+
+
 class TestReadSysNet(CiTestCase):
     with_logs = True
 
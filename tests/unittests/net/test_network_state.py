@@ -98,6 +98,17 @@ class TestNetworkStateParseConfig(CiTestCase):
         self.assertNotEqual(None, result)
 
 
+class TestNetworkStateDigest:
+    def test_digest_follows_content(self):
+        ncfg = {"version": 2, "ethernets": {"eth0": {"dhcp4": True}}}
+        state = network_state.parse_net_config_data(ncfg)
+        same = network_state.parse_net_config_data(ncfg)
+        ncfg["ethernets"]["eth0"]["dhcp6"] = True
+        other = network_state.parse_net_config_data(ncfg)
+        assert state.digest() == same.digest()
+        assert state.digest() != other.digest()
+
+
 class TestNetworkStateParseConfigV2(CiTestCase):
     def test_version_2_ignores_renderer_key(self):
         ncfg = {"version": 2, "renderer": "networkd", "ethernets": {}}
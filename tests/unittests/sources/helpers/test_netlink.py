@@ -3,11 +3,17 @@
 # This file is part of cloud-init. See LICENSE file for license information.
 
 import codecs
+import errno
 import socket
 import struct
 
 from cloudinit.sources.helpers.netlink import (
+    IFINFOMSG_FMT,
+    IFLA_ADDRESS,
+    IFLA_IFNAME,
     MAX_SIZE,
+    NLMSG_DONE,
+    NLMSG_ERROR,
     OPER_DORMANT,
     OPER_DOWN,
     OPER_LOWERLAYERDOWN,
@@ -21,7 +27,10 @@ from cloudinit.sources.helpers.netlink import (
     RTM_NEWLINK,
     RTM_SETLINK,
     NetlinkCreateSocketError,
+    NetlinkDumpError,
     create_bound_netlink_socket,
+    create_dump_netlink_socket,
+    get_links,
     read_netlink_socket,
     read_rta_oper_state,
     unpack_rta_attr,
@@ -571,3 +580,95 @@ class TestWaitForMediaDisconnectConnect(CiTestCase):
         m_read_netlink_socket.side_effect = [data1, data2]
         wait_for_media_disconnect_connect(m_socket, ifname)
         self.assertEqual(m_read_netlink_socket.call_count, 2)
+
+
+def nlmsg(msg_type, payload, seq=1):
+    length = 16 + len(payload)
+    padding = b"\0" * (-length % 4)
+    return (
+        struct.pack("=LHHLL", length, msg_type, 2, seq, 0) + payload + padding
+    )
+
+
+def link_msg(index, ifname, hwaddr, seq=1):
+    attrs = b""
+    for (rta_type, data) in (
+        (IFLA_IFNAME, ifname.encode() + b"\0"),
+        (IFLA_ADDRESS, hwaddr),
+    ):
+        length = 4 + len(data)
+        attrs += struct.pack("HH", length, rta_type) + data
+        attrs += b"\0" * (-length % 4)
+    return nlmsg(
+        RTM_NEWLINK,
+        struct.pack(IFINFOMSG_FMT, 0, 1, index, 0x1003, 0) + attrs,
+        seq,
+    )
+
+
+class TestRtnlDump(CiTestCase):
+    def setUp(self):
+        super(TestRtnlDump, self).setUp()
+        self.m_socket = mock.Mock()
+        self.add_patch(
+            "cloudinit.sources.helpers.netlink.create_dump_netlink_socket",
+            "m_create",
+            return_value=self.m_socket,
+        )
+
+    @mock.patch("cloudinit.sources.helpers.netlink.socket.socket")
+    def test_dump_socket_error_on_bind(self, m_socket):
+        """NetlinkCreateSocketError is raised and the socket closed."""
+        m_socket.return_value.bind.side_effect = socket.error("No bind")
+        with self.assertRaises(NetlinkCreateSocketError):
+            create_dump_netlink_socket()
+        m_socket.return_value.close.assert_called_once_with()
+
+    def test_get_links_reads_until_done(self):
+        """Messages are gathered across reads until NLMSG_DONE."""
+        self.m_socket.recv.side_effect = [
+            link_msg(1, "eth0", b"\x0a\x00\x00\x00\x00\x01")
+            + link_msg(2, "eth1", b"\x0a\x00\x00\x00\x00\x02"),
+            link_msg(3, "eth2", b"\x0a\x00\x00\x00\x00\x03")
+            + nlmsg(NLMSG_DONE, struct.pack("i", 0)),
+        ]
+        links = get_links()
+        self.assertEqual(
+            [
+                (1, "eth0", "0a:00:00:00:00:01"),
+                (2, "eth1", "0a:00:00:00:00:02"),
+                (3, "eth2", "0a:00:00:00:00:03"),
+            ],
+            [(link.index, link.ifname, link.hwaddr) for link in links],
+        )
+        (request,), _ = self.m_socket.send.call_args
+        self.assertEqual(
+            (RTM_GETLINK, 0x301), struct.unpack_from("HH", request, 4)
+        )
+        self.m_socket.close.assert_called_once_with()
+
+    def test_messages_of_other_requests_ignored(self):
+        """Only replies carrying the request sequence number are used."""
+        self.m_socket.recv.side_effect = [
+            link_msg(1, "eth0", b"\x0a\x00\x00\x00\x00\x01", seq=7)
+            + link_msg(2, "eth1", b"\x0a\x00\x00\x00\x00\x02")
+            + nlmsg(NLMSG_DONE, struct.pack("i", 0), seq=7)
+            + nlmsg(NLMSG_DONE, struct.pack("i", 0)),
+        ]
+        self.assertEqual(["eth1"], [link.ifname for link in get_links()])
+
+    def test_error_reply_raises(self):
+        """NetlinkDumpError is raised when the kernel rejects the dump."""
+        self.m_socket.recv.return_value = nlmsg(
+            NLMSG_ERROR, struct.pack("i", -errno.EPERM) + bytes(16)
+        )
+        with self.assertRaises(NetlinkDumpError) as ctx_mgr:
+            get_links()
+        self.assertIn(
+            "Netlink dump of type %d failed" % RTM_GETLINK,
+            str(ctx_mgr.exception),
+        )
+        self.m_socket.close.assert_called_once_with()
+
+
+# vi: ts=4 expandtab
@@ -4,9 +4,11 @@ import copy
 import inspect
 import os
 import stat
+import threading
 
 from cloudinit import importer, util
 from cloudinit.event import EventScope, EventType
+from cloudinit.handlers.jinja_template import get_flattened_jinja_variable
 from cloudinit.helpers import Paths
 from cloudinit.sources import (
     EXPERIMENTAL_TEXT,
@@ -16,7 +18,11 @@ from cloudinit.sources import (
     REDACT_SENSITIVE_VALUE,
     UNSET,
     DataSource,
+    DataSourceNotFoundException,
     canonical_cloud_id,
+    find_source,
+    get_instance_data_index_path,
+    read_instance_data_index,
     redact_sensitive_keys,
 )
 from cloudinit.user_data import UserDataProcessor
@@ -624,6 +630,63 @@ class TestDataSource(CiTestCase):
         self.assertEqual(0o600, stat.S_IMODE(file_stat.st_mode))
         self.assertEqual(expected, util.load_json(content))
 
+    def test_get_data_writes_instance_data_key_indexes(self):
+        """get_data writes a flat key index next to each instance-data file."""
+        tmp = self.tmp_dir()
+        datasource = DataSourceTestSubclassNet(
+            self.sys_cfg,
+            self.distro,
+            Paths({"run_dir": tmp}),
+            custom_metadata={
+                "local-hostname": "test-subclass-hostname",
+                "some": {"security-credentials": {"cred1": "sekret"}},
+            },
+        )
+        datasource.get_data()
+        json_file = self.tmp_path(INSTANCE_JSON_FILE, tmp)
+        sensitive_json_file = self.tmp_path(INSTANCE_JSON_SENSITIVE_FILE, tmp)
+        self.assertEqual(
+            self.tmp_path("instance-data-sensitive-index.json", tmp),
+            get_instance_data_index_path(sensitive_json_file),
+        )
+        file_stat = os.stat(get_instance_data_index_path(sensitive_json_file))
+        self.assertEqual(0o600, stat.S_IMODE(file_stat.st_mode))
+        keys = read_instance_data_index(sensitive_json_file)
+        for varname in ("v1.local-hostname", "v1.local_hostname"):
+            self.assertEqual(
+                "test-subclass-hostname",
+                get_flattened_jinja_variable(keys, varname),
+            )
+        # Leaves are indexed once, under their aliased varname path
+        self.assertEqual(
+            [
+                [
+                    ["ds", "meta_data", "local-hostname"],
+                    "test-subclass-hostname",
+                ]
+            ],
+            keys["ds.meta_data.local_hostname"],
+        )
+        self.assertEqual([], [k for k in keys if "-" in k])
+        self.assertEqual(
+            "sekret",
+            get_flattened_jinja_variable(
+                keys, "ds.meta_data.some.security-credentials.cred1"
+            ),
+        )
+        self.assertNotIn("ds.meta_data", keys)
+        keys = read_instance_data_index(json_file)
+        self.assertEqual(
+            REDACT_SENSITIVE_VALUE,
+            get_flattened_jinja_variable(
+                keys, "ds.meta_data.some.security_credentials"
+            ),
+        )
+        self.assertNotIn("ds.meta_data.some.security_credentials.cred1", keys)
+        # An index no longer describing its instance-data file is not read
+        util.write_file(json_file, "{}")
+        self.assertIsNone(read_instance_data_index(json_file))
+
     def test_get_data_handles_redacted_unserializable_content(self):
         """get_data warns unserializable content in INSTANCE_JSON_FILE."""
         tmp = self.tmp_dir()
@@ -829,6 +892,122 @@ class TestDataSource(CiTestCase):
         )
 
 
+class DetectableDataSource(DataSource):
+    """Fake datasource with configurable detection and crawl results."""
+
+    dsname = "Detectable"
+    detected = None
+    found = True
+    detect_gate = None  # threading.Event to block on in ds_detect
+    crawled = None  # list of crawled class names
+
+    def ds_detect(self):
+        if self.detect_gate:
+            self.detect_gate.wait(10)
+        return self.detected
+
+    def update_metadata_if_supported(self, source_event_types):
+        self.crawled.append(type(self).__name__)
+        return self.found
+
+
+class TestFindSource(CiTestCase):
+
+    with_logs = True
+
+    def setUp(self):
+        super(TestFindSource, self).setUp()
+        self.crawled = []
+        self.sys_cfg = {"datasource_search_mode": "parallel"}
+
+    def _make_source(self, name, **attrs):
+        attrs.setdefault("crawled", self.crawled)
+        return type(name, (DetectableDataSource,), attrs)
+
+    def _find_source(self, ds_list):
+        with mock.patch(
+            "cloudinit.sources.list_sources", return_value=ds_list
+        ):
+            return find_source(self.sys_cfg, None, Paths({}), [], [], [], None)
+
+    def test_parallel_skips_undetected_sources(self):
+        """Sources whose ds_detect is False are never crawled."""
+        ds_list = [
+            self._make_source("DataSourceAbsent", detected=False),
+            self._make_source("DataSourceUnknown", found=False),
+            self._make_source("DataSourcePresent", detected=True),
+        ]
+        (ds, dsname) = self._find_source(ds_list)
+        self.assertEqual("DataSourcePresent", dsname)
+        self.assertIsInstance(ds, ds_list[2])
+        self.assertEqual(
+            ["DataSourceUnknown", "DataSourcePresent"], self.crawled
+        )
+
+    def test_parallel_honors_configured_order(self):
+        """The first detected source in configured order wins."""
+        ds_list = [
+            self._make_source("DataSourceFirst", detected=True),
+            self._make_source("DataSourceSecond", detected=True),
+        ]
+        (_ds, dsname) = self._find_source(ds_list)
+        self.assertEqual("DataSourceFirst", dsname)
+        self.assertEqual(["DataSourceFirst"], self.crawled)
+
+    def test_parallel_does_not_wait_on_lower_priority_checks(self):
+        """A slow check after the winning source does not delay the search."""
+        gate = threading.Event()
+        ds_list = [
+            self._make_source("DataSourceFast", detected=True),
+            self._make_source("DataSourceSlow", detect_gate=gate),
+        ]
+        try:
+            (_ds, dsname) = self._find_source(ds_list)
+            self.assertFalse(gate.is_set())
+        finally:
+            gate.set()
+        self.assertEqual("DataSourceFast", dsname)
+
+    def test_parallel_raises_when_nothing_detected(self):
+        """DataSourceNotFoundException is raised when no source is found."""
+        ds_list = [self._make_source("DataSourceAbsent", detected=False)]
+        with self.assertRaises(DataSourceNotFoundException):
+            self._find_source(ds_list)
+        self.assertEqual([], self.crawled)
+
+    def test_serial_ignores_ds_detect(self):
+        """The default serial search crawls each source in order."""
+        self.sys_cfg = {}
+        ds_list = [
+            self._make_source("DataSourceAbsent", detected=False, found=False),
+            self._make_source("DataSourcePresent"),
+        ]
+        (_ds, dsname) = self._find_source(ds_list)
+        self.assertEqual("DataSourcePresent", dsname)
+        self.assertEqual(
+            ["DataSourceAbsent", "DataSourcePresent"], self.crawled
+        )
+
+    def test_invalid_search_mode_warns_and_searches_serially(self):
+        """An unknown datasource_search_mode falls back to serial."""
+        self.sys_cfg = {"datasource_search_mode": "bogus"}
+        ds_list = [self._make_source("DataSourcePresent", detected=False)]
+        (_ds, dsname) = self._find_source(ds_list)
+        self.assertEqual("DataSourcePresent", dsname)
+        self.assertIn(
+            "WARNING: Invalid datasource_search_mode 'bogus'",
+            self.logs.getvalue(),
+        )
+
+    def test_ds_detect_uses_is_platform_viable(self):
+        """The default ds_detect reports _is_platform_viable when defined."""
+        paths = Paths({})
+        self.assertIsNone(DataSource({}, None, paths).ds_detect())
+        ds = DataSource({}, None, paths)
+        ds._is_platform_viable = lambda: False
+        self.assertFalse(ds.ds_detect())
+
+
 class TestRedactSensitiveData(CiTestCase):
     def test_redact_sensitive_data_noop_when_no_sensitive_keys_present(self):
         """When sensitive_keys is absent or empty from metadata do nothing."""
@@ -90,8 +90,8 @@ class TestGenerateFallbackNetworkConfig:
         ),
     )
     @mock.patch(DS_PATH + "util.system_info")
-    @mock.patch(DS_PATH + "subp.subp")
-    @mock.patch(DS_PATH + "subp.which")
+    @mock.patch("cloudinit.util.subp.subp")
+    @mock.patch("cloudinit.util.subp.which")
     def test_net_v2_based_on_network_mode_virt_type_and_uname_machine(
         self,
         m_which,
@@ -16,6 +16,8 @@ from cloudinit.handlers.cloud_config import CloudConfigPartHandler
 from cloudinit.handlers.jinja_template import (
     JinjaTemplatePartHandler,
     convert_jinja_instance_data,
+    flatten_jinja_instance_data,
+    get_flattened_jinja_variable,
     render_jinja_payload,
 )
 from cloudinit.handlers.shell_script import ShellScriptPartHandler
@@ -417,6 +419,48 @@ class TestConvertJinjaInstanceData:
         )
         assert expected_data == converted_data
 
+    def test_flatten_instance_data_maps_varname_paths_to_leaves(self):
+        """Each leaf is listed once under its aliased varname path."""
+        data = {
+            "v1": {"local-hostname": "myhost"},
+            "ds": {"meta-data": {"v1.0": {"key": "val"}, "empty": {}}},
+        }
+        assert {
+            "v1.local_hostname": [[["v1", "local-hostname"], "myhost"]],
+            "local_hostname": [[["local-hostname"], "myhost"]],
+            "ds.meta_data.v1_0.key": [
+                [["ds", "meta-data", "v1.0", "key"], "val"]
+            ],
+        } == flatten_jinja_instance_data(data)
+
+    def test_get_flattened_variable_accepts_keys_and_aliases(self):
+        """Varnames resolve to the leaves walking the aliased data finds."""
+        flattened = flatten_jinja_instance_data(
+            {
+                "ds": {"meta-data": {"v1.0": {"key": "val"}}},
+                "a-b": {"x": 1},
+                "a_b": {"y": 2},
+                "c-d": "hyphen",
+                "c.d": "dot",
+                "c_d": "underscore",
+                "e-f": "hyphen",
+                "e.f": "dot",
+            }
+        )
+        for varname in ("ds.meta-data.v1_0.key", "ds.meta_data.v1_0.key"):
+            assert "val" == get_flattened_jinja_variable(flattened, varname)
+        # Not a key in the data, nor the alias of one
+        for varname in ("ds-meta_data.v1_0.key", "ds.meta_data.v1-0.key"):
+            with pytest.raises(KeyError):
+                get_flattened_jinja_variable(flattened, varname)
+        # A key is preferred over the keys it is the alias of
+        assert "hyphen" == get_flattened_jinja_variable(flattened, "c-d")
+        assert "underscore" == get_flattened_jinja_variable(flattened, "c_d")
+        assert "hyphen" == get_flattened_jinja_variable(flattened, "e_f")
+        # Keys sharing an alias with a dict are left to walking the data
+        with pytest.raises(KeyError):
+            get_flattened_jinja_variable(flattened, "a_b.y")
+
 
 class TestRenderJinjaPayload(CiTestCase):
 
@@ -2,9 +2,14 @@
 
 import contextlib
 import io
+import json
 import os
+import subprocess
+import sys
 from collections import namedtuple
 
+import pytest
+
 from cloudinit.cmd import main as cli
 from cloudinit.util import load_file, load_json
 from tests.unittests import helpers as test_helpers
@@ -103,6 +108,42 @@ class TestCLI(test_helpers.FilesystemMockingTestCase):
             "unexpected result.json link found",
         )
 
+    def test_status_wrapper_writes_subp_stats(self):
+        """status_wrapper persists the commands run by each stage."""
+        tmpd = self.tmp_dir()
+        data_d = self.tmp_path("data", tmpd)
+        link_d = self.tmp_path("link", tmpd)
+        FakeArgs = namedtuple(
+            "FakeArgs", ["action", "local", "mode", "reporter"]
+        )
+        reporter = mock.Mock(post_files=[])
+        commands = [{"count": 2, "seconds": 1.5, "failures": 1}]
+
+        def myaction(name, args):
+            return "SomeDatasource", []
+
+        myargs = FakeArgs(("ignored_name", myaction), True, None, reporter)
+        with mock.patch(
+            "cloudinit.cmd.main.subp.get_command_stats", return_value=commands
+        ):
+            cli.status_wrapper("init", myargs, data_d, link_d)
+            myargs = myargs._replace(local=False)
+            cli.status_wrapper("init", myargs, data_d, link_d)
+        stats_path = self.tmp_path("subp-stats.json", data_d)
+        stats_v1 = load_json(
+            load_file(self.tmp_path("subp-stats.json", link_d))
+        )["v1"]
+        self.assertEqual(["init", "init-local"], sorted(stats_v1))
+        self.assertEqual(
+            {"count": 2, "seconds": 1.5, "failures": 1, "commands": commands},
+            stats_v1["init"],
+        )
+        self.assertEqual([stats_path, stats_path], reporter.post_files)
+        self.assertIn(
+            "Stage init ran 2 commands in 1.500 seconds, 1 failed",
+            self.logs.getvalue(),
+        )
+
     def test_no_arguments_shows_usage(self):
         exit_code = self._call_main()
         self.assertIn("usage: cloud-init", self.stderr.getvalue())
@@ -374,4 +415,93 @@ class TestCLI(test_helpers.FilesystemMockingTestCase):
         self.assertFalse(parseargs.force)
 
 
+# Modules which only the boot stages need. Quick subcommands polled by health
+# checks must not pay for importing them.
+HEAVY_MODULES = (
+    "cloudinit.distros",
+    "cloudinit.net",
+    "cloudinit.stages",
+    "cloudinit.url_helper",
+    "jinja2",
+    "jsonschema",
+    "requests",
+    "yaml",
+)
+
+# Run the cloud-init CLI on a run dir and system config of our own:
+# python -c RUN_CLI <run_dir> <cloud.cfg> <subcommand args>...
+RUN_CLI = """\
+import sys
+from cloudinit import settings
+from cloudinit.cmd import devel
+settings.CFG_BUILTIN["system_info"]["paths"]["run_dir"] = sys.argv[1]
+devel.CLOUD_CONFIG = sys.argv[2]
+from cloudinit.cmd import main
+sys.exit(main.main(["cloud-init"] + sys.argv[3:]))
+"""
+
+
+def imported_modules(*python_args):
+    """Return stdout and the modules imported by python -X importtime."""
+    repo_root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime"] + list(python_args),
+        cwd=repo_root,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+        timeout=60,
+    )
+    modules = set()
+    for line in proc.stderr.splitlines():
+        fields = line.split("|")
+        if len(fields) == 3 and fields[1].strip().isdigit():
+            modules.add(fields[2].strip())
+    return proc.stdout, modules
+
+
+class TestCliImportTime:
+    @pytest.fixture
+    def run_dir(self, tmp_path):
+        run_dir = tmp_path / "run"
+        run_dir.mkdir()
+        v1 = {"init": {"start": 1, "finished": 2, "errors": []}}
+        (run_dir / "status.json").write_text(json.dumps({"v1": v1}))
+        (run_dir / "result.json").write_text(json.dumps({"v1": {}}))
+        instance_data = {"v1": {"cloud_name": "mycloud", "region": "r"}}
+        (run_dir / "instance-data.json").write_text(json.dumps(instance_data))
+        return run_dir
+
+    @pytest.mark.parametrize(
+        "args", [["status"], ["status", "--long"], ["status", "--wait"]]
+    )
+    def test_status_avoids_heavy_imports(self, args, run_dir, tmp_path):
+        """Running status imports none of the boot stage modules."""
+        stdout, modules = imported_modules(
+            "-c", RUN_CLI, str(run_dir), str(tmp_path / "cloud.cfg"), *args
+        )
+        assert "status: done" in stdout
+        assert [] == [name for name in HEAVY_MODULES if name in modules]
+
+    def test_cloud_id_avoids_heavy_imports(self, run_dir):
+        """Running cloud-id imports none of the boot stage modules."""
+        stdout, modules = imported_modules(
+            "-m",
+            "cloudinit.cmd.cloud_id",
+            "-i",
+            str(run_dir / "instance-data.json"),
+        )
+        assert "mycloud\n" == stdout
+        assert [] == [name for name in HEAVY_MODULES if name in modules]
+
+    def test_query_import_avoids_heavy_imports(self):
+        """Importing query leaves the heavy modules to the queries needing
+        them."""
+        _stdout, modules = imported_modules(
+            "-c", "import cloudinit.cmd.main, cloudinit.cmd.query"
+        )
+        assert [] == [name for name in HEAVY_MODULES if name in modules]
+
+
 # : ts=4 expandtab
@@ -5,6 +5,7 @@
 import gzip
 import logging
 import os
+import threading
 from email import encoders
 from email.mime.application import MIMEApplication
 from email.mime.base import MIMEBase
@@ -750,6 +751,69 @@ class TestUDProcess(helpers.ResourceUsingTestCase):
         self.assertTrue(count_messages(message) == 1)
 
 
+class TestUDProcessIncludes(helpers.HttprettyTestCase):
+    def setUp(self):
+        super(TestUDProcessIncludes, self).setUp()
+        self.paths = c_helpers.Paths({"cloud_dir": self.tmp_dir()})
+
+    def payloads(self, blob):
+        message = ud.UserDataProcessor(self.paths).process(blob)
+        return [
+            part.get_payload()
+            for part in message.walk()
+            if not ud.is_skippable(part)
+        ]
+
+    def test_includes_fetched_concurrently_in_stable_order(self):
+        """Includes at one level are fetched at once but kept in order."""
+        barrier = threading.Barrier(2, timeout=5)
+
+        def request_cb(request, uri, response_headers):
+            # Both requests must be in flight before either can complete.
+            barrier.wait()
+            body = "#!/bin/sh\necho %s\n" % uri.rsplit("/", 1)[-1]
+            return (200, response_headers, body)
+
+        for name in ("first", "second"):
+            httpretty.register_uri(
+                httpretty.GET, "http://hostname/" + name, body=request_cb
+            )
+        self.assertEqual(
+            ["#!/bin/sh\necho first\n", "#!/bin/sh\necho second\n"],
+            self.payloads(
+                "#include\nhttp://hostname/first\nhttp://hostname/second\n"
+            ),
+        )
+
+    def test_include_revalidated_with_conditional_get(self):
+        """Cached includes are reused when the server reports no change."""
+        url = "http://hostname/path"
+        body = "#cloud-config\nincluded: true\n"
+        requests = []
+
+        def request_cb(request, uri, response_headers):
+            requests.append(dict(request.headers))
+            if request.headers.get("If-None-Match") == '"v1"':
+                return (304, response_headers, "")
+            response_headers["ETag"] = '"v1"'
+            return (200, response_headers, body)
+
+        httpretty.register_uri(httpretty.GET, url, body=request_cb)
+        blob = "#include\n%s\n" % url
+        self.assertEqual([body], self.payloads(blob))
+        self.assertEqual([body], self.payloads(blob))
+        self.assertNotIn("If-None-Match", requests[0])
+        self.assertEqual('"v1"', requests[1]["If-None-Match"])
+
+    def test_include_without_validators_not_cached(self):
+        """Responses without ETag or Last-Modified are not cached."""
+        url = "http://hostname/path"
+        httpretty.register_uri(httpretty.GET, url, "#cloud-config\n")
+        self.payloads("#include\n%s\n" % url)
+        urlcache = os.path.join(self.paths.get_ipath_cur("data"), "urlcache")
+        self.assertFalse(os.path.exists(urlcache))
+
+
 class TestConvertString(helpers.TestCase):
     def test_handles_binary_non_utf8_decodable(self):
         """Printable unicode (not utf8-decodable) is safely converted."""
@@ -1,10 +1,14 @@
 # This file is part of cloud-init. See LICENSE file for license information.
 
+import threading
+import time
+
 import httpretty as hp
 
 from cloudinit import ec2_utils as eu
 from cloudinit import url_helper as uh
 from tests.unittests import helpers
+from tests.unittests.helpers import mock
 
 
 class TestEc2Util(helpers.HttprettyTestCase):
@@ -274,4 +278,93 @@ class TestEc2Util(helpers.HttprettyTestCase):
         self.assertNotIn("security-credentials", iam)
 
 
+class TestMetadataMaterializer(helpers.CiTestCase):
+
+    with_logs = True
+    BASE_URL = "http://169.254.169.254/latest/meta-data/"
+
+    def setUp(self):
+        super(TestMetadataMaterializer, self).setUp()
+        base = self.BASE_URL
+        self.tree = {
+            base: "ami-id\nblock-device-mapping/\nnetwork/\npublic-keys/",
+            base + "ami-id": "ami-123",
+            base + "block-device-mapping/": "ami\nephemeral0",
+            base + "block-device-mapping/ami": "sda1",
+            base + "block-device-mapping/ephemeral0": "sdb",
+            base + "network/": "interfaces/",
+            base + "network/interfaces/": "macs/",
+            base + "network/interfaces/macs/": "06:aa/\n06:bb/",
+            base + "network/interfaces/macs/06:aa/": "device-number\nips",
+            base + "network/interfaces/macs/06:aa/device-number": "0",
+            base + "network/interfaces/macs/06:aa/ips": "10.0.0.1\n10.0.0.2",
+            base + "network/interfaces/macs/06:bb/": "device-number",
+            base + "network/interfaces/macs/06:bb/device-number": "1",
+            base + "public-keys/": "0=my-key",
+            base + "public-keys/0/openssh-key": "ssh-rsa AAAA",
+        }
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def caller(self, url):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(0.01)
+        with self.lock:
+            self.in_flight -= 1
+        return self.tree[url].encode()
+
+    def materialize(self, max_workers):
+        materializer = eu.MetadataMaterializer(
+            self.tree[self.BASE_URL],
+            self.BASE_URL,
+            self.caller,
+            max_workers=max_workers,
+        )
+        return materializer, materializer.materialize()
+
+    def test_concurrent_crawl_matches_serial_crawl(self):
+        """Concurrent crawls produce exactly the serial result."""
+        _, serial_md = self.materialize(max_workers=1)
+        self.assertEqual(1, self.max_in_flight)
+        self.max_in_flight = 0
+        _, concurrent_md = self.materialize(max_workers=4)
+        self.assertEqual(serial_md, concurrent_md)
+        self.assertEqual(list(serial_md.keys()), list(concurrent_md.keys()))
+        self.assertEqual(
+            ["10.0.0.1", "10.0.0.2"],
+            concurrent_md["network"]["interfaces"]["macs"]["06:aa"]["ips"],
+        )
+        self.assertEqual({"my-key": "ssh-rsa AAAA"}, serial_md["public-keys"])
+
+    def test_concurrent_crawl_is_bounded(self):
+        """No more than max_workers requests are in flight at once."""
+        self.materialize(max_workers=2)
+        self.assertEqual(2, self.max_in_flight)
+
+    def test_concurrent_crawl_warns_on_duplicate_keys(self):
+        """Leaves named like a child directory are dropped with a warning."""
+        base = self.BASE_URL
+        self.tree[base] = "network/\nnetwork"
+        self.tree[base + "network"] = "leaf"
+        _, md = self.materialize(max_workers=4)
+        self.assertEqual({"interfaces": {"macs": mock.ANY}}, md["network"])
+        self.assertIn(
+            "WARNING: Duplicate key found in results from %s" % base,
+            self.logs.getvalue(),
+        )
+
+    def test_summary_counts_requests(self):
+        """summary reports the number of requests made while crawling."""
+        materializer, _ = self.materialize(max_workers=3)
+        self.assertEqual(len(self.tree) - 1, materializer.request_count)
+        self.assertIn(
+            "%d requests with 3 workers from %s"
+            % (len(self.tree) - 1, self.BASE_URL),
+            materializer.summary(),
+        )
+
+
 # vi: ts=4 expandtab
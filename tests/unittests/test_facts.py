@@ -0,0 +1,108 @@
+# This file is part of cloud-init. See LICENSE file for license information.
+
+import json
+from unittest import mock
+
+import pytest
+
+from cloudinit import dmi, facts, subp, util
+
+M_PATH = "cloudinit.facts."
+
+
+@pytest.fixture
+def boot_id(tmp_path):
+    boot_id_file = tmp_path / "boot_id"
+    boot_id_file.write_text("boot-1\n")
+    with mock.patch(M_PATH + "BOOT_ID_FILE", str(boot_id_file)):
+        yield boot_id_file
+
+
+def new_process():
+    """Drop the in-memory facts as if a later stage was starting."""
+    facts._facts = None
+
+
+@pytest.mark.platform_facts
+@pytest.mark.usefixtures("boot_id")
+class TestGet:
+    def test_computed_once(self):
+        compute = mock.Mock(return_value="kvm")
+        assert "kvm" == facts.get("virt", compute)
+        assert "kvm" == facts.get("virt", compute)
+        assert 1 == compute.call_count
+
+    def test_persisted_for_later_stages(self):
+        facts.get("virt", lambda: "kvm")
+        with open(facts.FACTS_FILE) as stream:
+            assert {"boot_id": "boot-1", "facts": {"virt": "kvm"}} == (
+                json.load(stream)
+            )
+        new_process()
+        compute = mock.Mock(return_value="xen")
+        assert "kvm" == facts.get("virt", compute)
+        assert 0 == compute.call_count
+
+    def test_facts_from_previous_boot_ignored(self, boot_id):
+        facts.get("virt", lambda: "kvm")
+        boot_id.write_text("boot-2\n")
+        new_process()
+        assert "xen" == facts.get("virt", lambda: "xen")
+
+    def test_corrupt_facts_file_ignored(self):
+        with open(facts.FACTS_FILE, "w") as stream:
+            stream.write("{not json")
+        assert "kvm" == facts.get("virt", lambda: "kvm")
+
+    def test_invalidate_forgets_facts(self):
+        facts.get("virt", lambda: "kvm")
+        facts.invalidate()
+        assert "xen" == facts.get("virt", lambda: "xen")
+        new_process()
+        assert "xen" == facts.get("virt", lambda: "qemu")
+
+    def test_not_persisted_if_run_dir_missing(self, tmp_path):
+        facts_file = str(tmp_path / "missing" / "platform-facts.json")
+        with mock.patch(M_PATH + "FACTS_FILE", facts_file):
+            assert "kvm" == facts.get("virt", lambda: "kvm")
+            assert not (tmp_path / "missing").exists()
+
+
+@pytest.mark.platform_facts
+@pytest.mark.usefixtures("boot_id")
+class TestPlatformFacts:
+    @mock.patch("cloudinit.dmi._read_dmi_data", return_value="Amazon EC2")
+    def test_dmi_keys_read_once(self, m_read_dmi_data):
+        for _ in range(3):
+            assert "Amazon EC2" == dmi.read_dmi_data("system-manufacturer")
+            assert "Amazon EC2" == dmi.read_dmi_data("system-product-name")
+        assert [
+            mock.call("system-manufacturer"),
+            mock.call("system-product-name"),
+        ] == m_read_dmi_data.call_args_list
+
+    @mock.patch("cloudinit.util._detect_container", return_value=True)
+    def test_is_container_detected_once(self, m_detect_container):
+        assert util.is_container()
+        assert util.is_container()
+        assert 1 == m_detect_container.call_count
+
+
+class TestGetVirtType:
+    @mock.patch("cloudinit.util.subp.which", return_value=None)
+    def test_none_without_systemd_detect_virt(self, m_which):
+        assert util.get_virt_type() is None
+
+    @pytest.mark.parametrize(
+        "side_effect,expected",
+        (
+            ([("kvm\n", "")], "kvm"),
+            (subp.ProcessExecutionError(stdout="none\n", exit_code=1), "none"),
+            (subp.ProcessExecutionError(stdout="", exit_code=2), None),
+        ),
+    )
+    @mock.patch("cloudinit.util.subp.subp")
+    @mock.patch("cloudinit.util.subp.which", return_value="/usr/bin/x")
+    def test_virt_type(self, m_which, m_subp, side_effect, expected):
+        m_subp.side_effect = side_effect
+        assert expected == util.get_virt_type()
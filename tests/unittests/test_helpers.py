@@ -5,9 +5,13 @@
 import os
 from pathlib import Path
 
-from cloudinit import sources
+import pytest
+
+from cloudinit import helpers, sources, util
 from tests.unittests import helpers as test_helpers
 
+mock = test_helpers.mock
+
 
 class MyDataSource(sources.DataSource):
     _instance_id = None
@@ -66,4 +70,113 @@ class Testcloud_init_project_dir:
         )
 
 
+class FakeDataSource:
+    def __init__(self, cfg):
+        self.cfg = cfg
+
+    def get_config_obj(self):
+        return self.cfg
+
+
+class TestConfigMergerCache:
+    @pytest.fixture
+    def inputs(self, tmpdir):
+        """Return a config file, the cache file and a base config file."""
+        cfg_file = tmpdir.join("extra.cfg")
+        cfg_file.write("a: extra\nb: extra\n")
+        base_file = tmpdir.join("base.cfg")
+        base_file.write("c: base\n")
+        return (str(cfg_file), str(tmpdir.join("cache.json")), str(base_file))
+
+    def _merger(self, cfg_file, cache_file, base_file, ds_cfg=None):
+        def base_cfg():
+            return util.read_conf(base_file)
+
+        return helpers.ConfigMerger(
+            datasource=FakeDataSource(ds_cfg or {"b": "ds", "d": "ds"}),
+            additional_fns=[cfg_file],
+            base_cfg=base_cfg,
+            base_cfg_fns=[base_file],
+            cache_file=cache_file,
+        )
+
+    def test_merged_config_cached(self, inputs):
+        """Unchanged inputs are neither read nor merged again."""
+        expected = {"a": "extra", "b": "extra", "c": "base", "d": "ds"}
+        assert expected == self._merger(*inputs).cfg
+        with mock.patch(
+            "cloudinit.helpers.util.read_conf", side_effect=util.read_conf
+        ) as m_read_conf, mock.patch(
+            "cloudinit.helpers.util.mergemanydict",
+            side_effect=util.mergemanydict,
+        ) as m_merge:
+            assert expected == self._merger(*inputs).cfg
+        assert 0 == m_read_conf.call_count
+        assert 0 == m_merge.call_count
+
+    @pytest.mark.parametrize("changed", [0, 2])
+    def test_changed_file_invalidates_cache(self, changed, inputs):
+        """A config file or base config file changing is merged again."""
+        self._merger(*inputs).cfg
+        util.write_file(inputs[changed], "c: changed\n")
+        assert "changed" == self._merger(*inputs).cfg["c"]
+
+    def test_removed_file_invalidates_cache(self, inputs):
+        self._merger(*inputs).cfg
+        os.unlink(inputs[0])
+        assert "ds" == self._merger(*inputs).cfg["b"]
+
+    def test_changed_datasource_config_invalidates_cache(self, inputs):
+        self._merger(*inputs).cfg
+        cfg = self._merger(*inputs, ds_cfg={"d": "new"}).cfg
+        assert "new" == cfg["d"]
+
+    def test_changed_base_config_dict_invalidates_cache(self, inputs):
+        """A base config passed as a dict is keyed on its content."""
+        (cfg_file, cache_file, _base_file) = inputs
+        for base in ("one", "two"):
+            merger = helpers.ConfigMerger(
+                additional_fns=[cfg_file],
+                base_cfg={"c": base},
+                cache_file=cache_file,
+            )
+            assert base == merger.cfg["c"]
+
+    def test_provenance_recorded(self, inputs):
+        """The sources defining each key are cached, highest priority first."""
+        (cfg_file, cache_file, _base_file) = inputs
+        self._merger(*inputs).cfg
+        (entry,) = helpers.read_config_cache(cache_file).values()
+        assert [cfg_file, "datasource", "base"] == entry["sources"]
+        assert [cfg_file, "datasource"] == entry["provenance"]["b"]
+        assert ["base"] == entry["provenance"]["c"]
+        assert cfg_file == entry["fingerprint"]["files"][0][0]
+        assert entry["fingerprint"]["files"][0][1] is not None
+
+    def test_config_json_cannot_represent_not_cached(self, inputs):
+        (cfg_file, cache_file, base_file) = inputs
+        util.write_file(cfg_file, "1: int key\n")
+        self._merger(*inputs).cfg
+        assert {} == helpers.read_config_cache(cache_file)
+
+    def test_no_cache_without_base_config_files(self, inputs):
+        """A callable base config can't be cached without its files."""
+        (cfg_file, cache_file, _base_file) = inputs
+        m_base = mock.Mock(return_value={"c": "base"})
+        for _ in range(2):
+            helpers.ConfigMerger(base_cfg=m_base, cache_file=cache_file).cfg
+        assert 2 == m_base.call_count
+        assert not os.path.exists(cache_file)
+
+    @mock.patch.object(helpers, "CONFIG_CACHE_ENTRIES", 2)
+    def test_cache_bounded(self, inputs):
+        (cfg_file, cache_file, _base_file) = inputs
+        for base in ("one", "two", "three"):
+            helpers.ConfigMerger(
+                base_cfg={"c": base}, cache_file=cache_file
+            ).cfg
+        entries = helpers.read_config_cache(cache_file).values()
+        assert ["three", "two"] == sorted(e["cfg"]["c"] for e in entries)
+
+
 # vi: ts=4 expandtab
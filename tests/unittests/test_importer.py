@@ -0,0 +1,35 @@
+# This file is part of cloud-init. See LICENSE file for license information.
+
+import sys
+from unittest import mock
+
+from cloudinit import importer
+
+
+class TestLazyImport:
+    def test_already_imported_module_is_returned(self):
+        """No placeholder is needed for a module which is already loaded."""
+        assert sys.modules["cloudinit.util"] is importer.lazy_import(
+            "cloudinit.util"
+        )
+
+    def test_module_is_imported_on_first_attribute_access(self, tmp_path):
+        """The real module is only imported once an attribute is used."""
+        name = "ci_lazy_import_test_module"
+        tmp_path.joinpath(name + ".py").write_text("NAME = 'lazy'\n")
+        with mock.patch.object(sys, "path", [str(tmp_path)] + sys.path):
+            with mock.patch.dict(sys.modules):
+                lazy = importer.lazy_import(name)
+                assert name not in sys.modules
+                assert "lazy" == lazy.NAME
+                assert name in sys.modules
+
+    def test_patching_placeholder_patches_module(self):
+        """mock.patch through the placeholder applies to the real module."""
+        lazy = importer.LazyModule("cloudinit.version")
+        from cloudinit import version
+
+        with mock.patch.object(lazy, "version_string", return_value="9.9"):
+            assert "9.9" == version.version_string()
+        assert "9.9" != version.version_string()
+        assert version.version_string is lazy.version_string
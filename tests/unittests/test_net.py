@@ -4831,7 +4831,7 @@ class TestNetplanCleanDefault(CiTestCase):
         content.update(self.stub_known)
         tmpd = self.tmp_dir()
         files = sorted(populate_dir(tmpd, content))
-        netplan._clean_default(target=tmpd)
+        self.assertTrue(netplan._clean_default(target=tmpd))
         found = [t for t in files if os.path.exists(t)]
         self.assertEqual([], found)
 
@@ -4843,7 +4843,7 @@ class TestNetplanCleanDefault(CiTestCase):
         content[self.snapd_known_path] += "# user put a comment\n"
         tmpd = self.tmp_dir()
         files = sorted(populate_dir(tmpd, content))
-        netplan._clean_default(target=tmpd)
+        self.assertFalse(netplan._clean_default(target=tmpd))
         found = [t for t in files if os.path.exists(t)]
         self.assertEqual(files, found)
 
@@ -4902,6 +4902,28 @@ class TestNetplanPostcommands(CiTestCase):
         mock_netplan_generate.assert_called_with(run=True)
         mock_net_setup_link.assert_called_with(run=True)
 
+    @mock.patch.object(netplan.Renderer, "_netplan_generate")
+    @mock.patch.object(netplan.Renderer, "_net_setup_link")
+    def test_netplan_render_unchanged_skips_postcmds(
+        self, mock_net_setup_link, mock_netplan_generate
+    ):
+        tmp_dir = self.tmp_dir()
+        ns = network_state.parse_net_config_data(self.mycfg, skip_broken=False)
+        renderer = netplan.Renderer(
+            {"netplan_path": "netplan.yaml", "postcmds": True, "features": []}
+        )
+        renderer.render_network_state(ns, target=tmp_dir)
+        self.assertEqual(1, mock_netplan_generate.call_count)
+
+        renderer = netplan.Renderer(
+            {"netplan_path": "netplan.yaml", "postcmds": True, "features": []}
+        )
+        renderer.render_network_state(ns, target=tmp_dir)
+        self.assertEqual(1, mock_netplan_generate.call_count)
+        self.assertEqual(1, mock_net_setup_link.call_count)
+        path = os.path.join(tmp_dir, "netplan.yaml")
+        self.assertEqual([path], list(renderer.rendered_files))
+
     @mock.patch("cloudinit.util.SeLinuxGuard")
     @mock.patch.object(netplan, "get_devicelist")
     @mock.patch("cloudinit.subp.subp")
@@ -2,9 +2,17 @@
 
 """Tests netinfo module functions and classes."""
 
+import socket
+import struct
 from copy import copy
 
-from cloudinit.netinfo import netdev_info, netdev_pformat, route_pformat
+from cloudinit.netinfo import (
+    _netdev_info_iproute,
+    netdev_info,
+    netdev_pformat,
+    route_pformat,
+)
+from cloudinit.sources.helpers import netlink
 from tests.unittests.helpers import CiTestCase, mock, readResource
 
 # Example ifconfig and route output
@@ -21,11 +29,215 @@ ROUTE_FORMATTED_OUT = readResource("netinfo/route-formatted-output")
 FREEBSD_NETDEV_OUT = readResource("netinfo/freebsd-netdev-formatted-output")
 
 
+def rtattr(rta_type, data):
+    length = 4 + len(data)
+    padding = b"\0" * (-length % 4)
+    return struct.pack("HH", length, rta_type) + data + padding
+
+
+def nlmsg(msg_type, payload, seq=1):
+    length = netlink.NLMSGHDR_SIZE + len(payload)
+    padding = b"\0" * (-length % 4)
+    header = struct.pack(netlink.NLMSGHDR_FMT, length, msg_type, 2, seq, 0)
+    return header + payload + padding
+
+
+def link_msg(index, ifname, link_type, flags, hwaddr):
+    return nlmsg(
+        netlink.RTM_NEWLINK,
+        struct.pack(netlink.IFINFOMSG_FMT, 0, link_type, index, flags, 0)
+        + rtattr(netlink.IFLA_IFNAME, ifname.encode() + b"\0")
+        + rtattr(netlink.IFLA_ADDRESS, bytes.fromhex(hwaddr.replace(":", ""))),
+    )
+
+
+def addr_msg(index, ip, prefixlen, scope, bcast=None):
+    family = socket.AF_INET6 if ":" in ip else socket.AF_INET
+    attrs = rtattr(netlink.IFA_ADDRESS, socket.inet_pton(family, ip))
+    if family == socket.AF_INET:
+        attrs += rtattr(netlink.IFA_LOCAL, socket.inet_pton(family, ip))
+    if bcast:
+        attrs += rtattr(netlink.IFA_BROADCAST, socket.inet_pton(family, bcast))
+    return nlmsg(
+        netlink.RTM_NEWADDR,
+        struct.pack(netlink.IFADDRMSG_FMT, family, prefixlen, 0, scope, index)
+        + attrs,
+    )
+
+
+def route_msg(
+    family,
+    dst,
+    dst_len,
+    oif,
+    gateway=None,
+    metric=None,
+    table=netlink.RT_TABLE_MAIN,
+    rtm_type=netlink.RTN_UNICAST,
+    expires=0,
+):
+    attrs = rtattr(netlink.RTA_OIF, struct.pack("i", oif))
+    if dst_len:
+        attrs += rtattr(netlink.RTA_DST, socket.inet_pton(family, dst))
+    if gateway:
+        attrs += rtattr(netlink.RTA_GATEWAY, socket.inet_pton(family, gateway))
+    if metric is not None:
+        attrs += rtattr(netlink.RTA_PRIORITY, struct.pack("I", metric))
+    attrs += rtattr(
+        netlink.RTA_CACHEINFO,
+        struct.pack("IIiIIIII", 0, 0, expires, 0, 0, 0, 0, 0),
+    )
+    return nlmsg(
+        netlink.RTM_NEWROUTE,
+        struct.pack(
+            netlink.RTMSG_FMT, family, dst_len, 0, 0, table, 0, 0, rtm_type, 0
+        )
+        + attrs,
+    )
+
+
+class FakeDumpSocket:
+    """Answer netlink dump requests with canned messages.
+
+    dumps maps (request type, family) to the messages sent in reply.
+    """
+
+    def __init__(self, dumps):
+        self.dumps = dumps
+        self.replies = []
+
+    def send(self, request):
+        msg_type = struct.unpack_from("H", request, 4)[0]
+        family = request[netlink.NLMSGHDR_SIZE]
+        self.replies = [
+            b"".join(self.dumps.get((msg_type, family), [])),
+            nlmsg(netlink.NLMSG_DONE, struct.pack("i", 0)),
+        ]
+        return len(request)
+
+    def recv(self, bufsize):
+        return self.replies.pop(0)
+
+    def close(self):
+        pass
+
+
+# The links, addresses and routes of the ip command output samples
+NETLINK_DUMPS = {
+    (netlink.RTM_GETLINK, socket.AF_UNSPEC): [
+        link_msg(1, "lo", 772, 0x10049, "00:00:00:00:00:00"),
+        link_msg(2, "enp0s25", 1, 0x11043, "50:7b:9d:2c:af:91"),
+        link_msg(3, "wlp3s0", 1, 0x1003, "50:7b:9d:2c:af:92"),
+    ],
+    (netlink.RTM_GETADDR, socket.AF_UNSPEC): [
+        addr_msg(1, "127.0.0.1", 8, 254),
+        addr_msg(2, "192.168.2.18", 24, 0, "192.168.2.255"),
+        addr_msg(1, "::1", 128, 254),
+        addr_msg(2, "fe80::7777:2222:1111:eeee", 64, 0),
+        addr_msg(2, "fe80::8107:2b92:867e:f8a6", 64, 253),
+    ],
+    (netlink.RTM_GETROUTE, socket.AF_INET): [
+        route_msg(socket.AF_INET, None, 0, 2, "192.168.2.1", 100),
+        route_msg(socket.AF_INET, None, 0, 3, "192.168.2.1", 150),
+        route_msg(socket.AF_INET, "192.168.2.0", 24, 2, metric=100),
+        route_msg(socket.AF_INET, "127.0.0.1", 32, 1, table=255, rtm_type=2),
+    ],
+    (netlink.RTM_GETROUTE, socket.AF_INET6): [
+        route_msg(
+            socket.AF_INET6,
+            "2a00:abcd:82ae:cd33::657",
+            128,
+            2,
+            metric=256,
+            expires=233400,
+        ),
+        route_msg(socket.AF_INET6, "2a00:abcd:82ae:cd33::", 64, 2, metric=100),
+        route_msg(
+            socket.AF_INET6,
+            "2a00:abcd:82ae:cd33::",
+            56,
+            2,
+            "fe80::32ee:54de:cd43:b4e1",
+            100,
+        ),
+        route_msg(socket.AF_INET6, "fd81:123f:654::657", 128, 2, metric=256),
+        route_msg(socket.AF_INET6, "fd81:123f:654::", 64, 2, metric=100),
+        route_msg(
+            socket.AF_INET6,
+            "fd81:123f:654::",
+            48,
+            2,
+            "fe80::32ee:54de:cd43:b4e1",
+            100,
+        ),
+        route_msg(
+            socket.AF_INET6, "fe80::abcd:ef12:bc34:da21", 128, 2, metric=100
+        ),
+        route_msg(socket.AF_INET6, "fe80::", 64, 2, metric=256),
+        route_msg(
+            socket.AF_INET6, None, 0, 2, "fe80::32ee:54de:cd43:b4e1", 100
+        ),
+        route_msg(socket.AF_INET6, "::1", 128, 1, table=255, rtm_type=2),
+        route_msg(socket.AF_INET6, "ff00::", 8, 2, table=255, rtm_type=5),
+    ],
+}
+
+
+class TestNetInfoNetlink(CiTestCase):
+
+    maxDiff = None
+
+    def setUp(self):
+        super(TestNetInfoNetlink, self).setUp()
+        self.add_patch(
+            "cloudinit.sources.helpers.netlink.create_dump_netlink_socket",
+            "m_socket",
+            side_effect=lambda: FakeDumpSocket(NETLINK_DUMPS),
+        )
+        self.add_patch("cloudinit.netinfo.subp.subp", "m_subp")
+
+    def test_netdev_info_netlink(self):
+        """netdev_info reports netlink devices like ip addr output."""
+        expected = _netdev_info_iproute(SAMPLE_IPADDRSHOW_OUT)
+        expected["wlp3s0"] = {
+            "ipv4": [],
+            "ipv6": [],
+            "hwaddr": "50:7b:9d:2c:af:92",
+            "up": False,
+        }
+        self.assertEqual(expected, netdev_info())
+        self.m_subp.assert_not_called()
+
+    def test_route_netlink_pformat(self):
+        """route_pformat renders netlink routes like ip route output."""
+        self.assertEqual(ROUTE_FORMATTED_OUT, route_pformat())
+        self.m_subp.assert_not_called()
+
+    def test_netlink_failure_falls_back_to_ip(self):
+        """netdev_info parses ip addr output when netlink is unavailable."""
+        self.m_socket.side_effect = netlink.NetlinkCreateSocketError("fail")
+        self.m_subp.return_value = (SAMPLE_IPADDRSHOW_OUT, "")
+        with mock.patch(
+            "cloudinit.netinfo.subp.which",
+            side_effect=lambda x: x if x == "ip" else None,
+        ):
+            devs = netdev_info()
+        self.assertEqual(["enp0s25", "lo"], sorted(devs))
+        self.m_subp.assert_called_once_with(["ip", "addr", "show"])
+
+
 class TestNetInfo(CiTestCase):
 
     maxDiff = None
     with_logs = True
 
+    def setUp(self):
+        super(TestNetInfo, self).setUp()
+        # Exercise the command output parsers used where netlink is absent
+        self.add_patch(
+            "cloudinit.netinfo.util.is_Linux", "m_is_linux", return_value=False
+        )
+
     @mock.patch("cloudinit.netinfo.subp.which")
     @mock.patch("cloudinit.netinfo.subp.subp")
     def test_netdev_old_nettools_pformat(self, m_subp, m_which):
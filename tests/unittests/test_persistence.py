@@ -24,12 +24,22 @@ To avoid manually maintaining a list of classes for parametrization we use a
 simple metaclass, ``_Collector``, to gather them up.
 """
 
+import json
 import pickle
 from unittest import mock
 
 import pytest
 
-from cloudinit.persistence import CloudInitPickleMixin
+from cloudinit import distros, persistence
+from cloudinit.helpers import Paths
+from cloudinit.persistence import (
+    OBJ_CACHE_MAGIC,
+    CloudInitPickleMixin,
+    ObjCacheError,
+    dump_obj_cache,
+    load_obj_cache,
+)
+from cloudinit.sources.DataSourceNoCloud import DataSourceNoCloud
 
 
 class _Collector(type):
@@ -125,3 +135,121 @@ class TestPickleMixin:
         part of the pickle load.
         """
         pickle.loads(pickle.dumps(cls()))
+
+
+class CachedObject(CloudInitPickleMixin):
+    """Object cache test class with eager and lazy attributes."""
+
+    _ci_pkl_version = 1
+    _ci_pkl_lazy_attrs = ("payload", "absent")
+
+    def __init__(self):
+        self.name = "cached"
+        self.payload = "x" * 1024
+        self.nested = {"a": [1, 2]}
+        self.shared = self.nested
+
+    def _unpickle(self, ci_pkl_version: int) -> None:
+        self.unpickled_version = ci_pkl_version
+
+
+class TestObjCache:
+    @pytest.fixture
+    def cache_file(self, tmpdir):
+        path = tmpdir.join("obj.pkl")
+        path.write_binary(dump_obj_cache(CachedObject()))
+        return str(path)
+
+    def test_round_trip(self, cache_file):
+        """All attributes are restored and _unpickle is not called."""
+        obj = load_obj_cache(cache_file)
+        assert isinstance(obj, CachedObject)
+        assert "cached" == obj.name
+        assert "x" * 1024 == obj.payload
+        assert {"a": [1, 2]} == obj.nested
+        assert obj.shared is obj.nested
+        assert not hasattr(obj, "unpickled_version")
+        assert not hasattr(obj, "absent")
+
+    def test_lazy_attributes_load_lazily(self, cache_file):
+        """Attributes in _ci_pkl_lazy_attrs are loaded on first access."""
+        with mock.patch.object(
+            persistence.pickle, "loads", wraps=pickle.loads
+        ) as m_loads:
+            obj = load_obj_cache(cache_file)
+            assert 1 == m_loads.call_count  # state only
+            assert "payload" not in obj.__dict__
+            assert "x" * 1024 == obj.payload
+            assert 2 == m_loads.call_count
+            assert "x" * 1024 == obj.payload
+            assert 2 == m_loads.call_count
+
+    def test_lazy_objects_can_be_stored_again(self, cache_file, tmpdir):
+        """Lazy attributes are loaded before the object is serialized."""
+        obj = load_obj_cache(cache_file)
+        assert {"a": [1, 2]} == pickle.loads(pickle.dumps(obj)).nested
+        path = tmpdir.join("obj2.pkl")
+        path.write_binary(dump_obj_cache(obj))
+        assert "x" * 1024 == load_obj_cache(str(path)).payload
+
+    def test_datasource_keeps_shared_references(self, tmpdir):
+        """Objects shared within a datasource are shared once loaded."""
+        paths = Paths({"cloud_dir": str(tmpdir), "run_dir": str(tmpdir)})
+        distro = distros.fetch("ubuntu")("ubuntu", {}, paths)
+        sys_cfg = {"datasource": {"NoCloud": {"fs_label": "cidata"}}}
+        ds = DataSourceNoCloud(sys_cfg, distro, paths)
+        ds.metadata = ds._crawled_metadata = {"instance-id": "iid"}
+        ds.userdata_raw = b"#cloud-config\n{}"
+        path = tmpdir.join("obj.pkl")
+        path.write_binary(dump_obj_cache(ds))
+        obj = load_obj_cache(str(path))
+        assert obj.ud_proc.paths is obj.paths
+        assert obj.distro._paths is obj.paths
+        assert obj.ds_cfg is obj.sys_cfg["datasource"]["NoCloud"]
+        assert obj.metadata is obj._crawled_metadata
+        assert "userdata_raw" not in obj.__dict__
+        assert b"#cloud-config\n{}" == obj.userdata_raw
+
+    def test_unpickle_called_on_version_change(self, cache_file):
+        """_unpickle runs for caches written by another cloud-init."""
+        with mock.patch.object(
+            persistence.version, "version_string", return_value="0.1"
+        ):
+            obj = load_obj_cache(cache_file)
+        assert 1 == obj.unpickled_version
+
+    def test_unsupported_schema_version(self, cache_file):
+        """Caches with an unknown schema version are rejected."""
+        with mock.patch.object(persistence, "OBJ_CACHE_SCHEMA_VERSION", 3):
+            with pytest.raises(ObjCacheError, match="schema version 2"):
+                load_obj_cache(cache_file)
+
+    def test_header_checksum_mismatch(self, cache_file, tmpdir):
+        """A tampered header is rejected."""
+        data = open(cache_file, "rb").read()
+        (header, payload) = data[len(OBJ_CACHE_MAGIC) :].split(b"\n", 1)
+        header = json.loads(header)
+        header["lazy"] = {}
+        path = tmpdir.join("bad.pkl")
+        path.write_binary(
+            OBJ_CACHE_MAGIC + json.dumps(header).encode() + b"\n" + payload
+        )
+        with pytest.raises(ObjCacheError, match="header checksum"):
+            load_obj_cache(str(path))
+
+    def test_field_checksum_mismatch(self, cache_file, tmpdir):
+        """A corrupt attribute is rejected when it is loaded."""
+        data = open(cache_file, "rb").read()
+        data = data.replace(b"x" * 1024, b"y" * 1024)
+        path = tmpdir.join("bad.pkl")
+        path.write_binary(data)
+        obj = load_obj_cache(str(path))
+        with pytest.raises(ObjCacheError, match="mismatch for payload"):
+            obj.payload
+
+    def test_plain_pickle_is_rejected(self, tmpdir):
+        """Plain pickles are not mistaken for object caches."""
+        path = tmpdir.join("obj.pkl")
+        path.write_binary(pickle.dumps(CachedObject()))
+        with pytest.raises(ObjCacheError, match="Not an object cache"):
+            load_obj_cache(str(path))
@@ -0,0 +1,130 @@
+# This file is part of cloud-init. See LICENSE file for license information.
+
+import json
+import os
+import threading
+from unittest import mock
+
+import pytest
+
+from cloudinit import profiler, subp, url_helper
+from cloudinit.analyze.trace import load_trace
+from cloudinit.reporting import events
+
+M_PATH = "cloudinit.profiler."
+
+
+@pytest.fixture
+def trace_file(tmp_path):
+    trace_file = str(tmp_path / "boot-trace.json")
+    with mock.patch(M_PATH + "TRACE_FILE", trace_file):
+        yield trace_file
+
+
+def recorded():
+    return [e for e in profiler._events if e["ph"] == "X"]
+
+
+class TestProfiler:
+    def test_nothing_recorded_unless_enabled(self, trace_file):
+        with events.ReportEventStack("init-local", "searching"):
+            pass
+        assert not profiler.is_enabled()
+        profiler.flush()
+        assert not os.path.exists(trace_file)
+
+    def test_report_event_stacks_recorded(self):
+        profiler.enable("init-local")
+        with events.ReportEventStack("init-local", "searching") as stage:
+            with events.ReportEventStack("search-NoCloud", "", parent=stage):
+                pass
+            with events.ReportEventStack("config-ssh", "", parent=stage):
+                pass
+            with events.ReportEventStack("check-cache", "", parent=stage):
+                pass
+        assert [
+            ("init-local/search-NoCloud", "datasource"),
+            ("init-local/config-ssh", "module"),
+            ("init-local/check-cache", "event"),
+            ("init-local", "stage"),
+        ] == [(e["name"], e["cat"]) for e in recorded()]
+        stage_event = recorded()[-1]
+        assert {"result": "SUCCESS"} == stage_event["args"]
+        assert stage_event["dur"] >= recorded()[0]["dur"]
+
+    @pytest.mark.allow_subp_for("sh")
+    def test_subp_recorded_without_arguments(self):
+        profiler.enable("init")
+        subp.subp(["sh", "-c", "exit 3; secret"], rcs=[3])
+        (event,) = recorded()
+        assert ("sh", "subp") == (event["name"], event["cat"])
+        assert 3 == event["args"]["exit_code"]
+        assert "secret" not in json.dumps(event)
+
+    def test_children_cpu_unattributed_when_threads_overlap(self):
+        """Child CPU time is not charged to spans other threads overlap."""
+        profiler.enable("config")
+        started = threading.Event()
+        finished = threading.Event()
+
+        def sibling():
+            started.wait()
+            with profiler.timed("sibling", profiler.CATEGORY_SUBP):
+                pass
+            finished.set()
+
+        thread = threading.Thread(target=sibling)
+        thread.start()
+        with profiler.timed("overlapped", profiler.CATEGORY_SUBP):
+            started.set()
+            finished.wait()
+        thread.join()
+        with profiler.timed("alone", profiler.CATEGORY_SUBP):
+            with profiler.timed("nested", profiler.CATEGORY_SUBP):
+                pass
+        flags = {
+            e["name"]: e.get("args", {}).get("children_cpu_unattributed")
+            for e in recorded()
+        }
+        assert {
+            "sibling": True,
+            "overlapped": True,
+            "nested": None,
+            "alone": None,
+        } == flags
+
+    @mock.patch("cloudinit.url_helper.SESSION_POOL")
+    def test_url_recorded_without_query(self, m_pool):
+        m_pool.get.return_value.request.return_value = mock.Mock(
+            status_code=200, content=b"data"
+        )
+        profiler.enable("init")
+        url_helper.readurl("http://169.254.169.254/meta-data?token=secret")
+        (event,) = recorded()
+        assert ("GET 169.254.169.254/meta-data", "url") == (
+            event["name"],
+            event["cat"],
+        )
+        assert {"status": 200} == event["args"]
+
+    def test_stages_append_to_one_trace(self, trace_file):
+        for stage in ("init-local", "init-network"):
+            profiler.enable(stage)
+            with events.ReportEventStack(stage, "running"):
+                pass
+            profiler.flush()
+        with open(trace_file) as stream:
+            trace = load_trace(stream)
+        assert [
+            ("process_name", "M"),
+            ("init-local", "X"),
+            ("process_name", "M"),
+            ("init-network", "X"),
+        ] == [(e["name"], e["ph"]) for e in trace]
+
+    def test_not_written_without_run_dir(self, tmp_path):
+        trace_file = str(tmp_path / "missing" / "boot-trace.json")
+        profiler.enable("init")
+        profiler.record("init", "stage", 0, 1, 1)
+        profiler.flush(trace_file)
+        assert not (tmp_path / "missing").exists()
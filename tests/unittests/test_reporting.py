@@ -2,11 +2,15 @@
 #
 # This file is part of cloud-init. See LICENSE file for license information.
 
+import copy
+import json
+import os
+import threading
 from unittest import mock
 
-from cloudinit import reporting
+from cloudinit import reporting, util
 from cloudinit.reporting import events, handlers
-from tests.unittests.helpers import TestCase
+from tests.unittests.helpers import CiTestCase, TestCase
 
 
 def _fake_registry():
@@ -205,6 +209,136 @@ class TestLogHandler(TestCase):
         )
 
 
+@mock.patch("cloudinit.url_helper.readurl")
+class TestWebHookHandler(CiTestCase):
+    with_logs = True
+    endpoint = "http://collector.invalid/events"
+
+    def setUp(self):
+        super(TestWebHookHandler, self).setUp()
+        self.spool_dir = self.tmp_path("spool")
+        patcher = mock.patch.object(
+            handlers, "WEBHOOK_SPOOL_DIR", self.spool_dir
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _event(self, name):
+        return events.ReportingEvent("start", name, "description")
+
+    def _posted(self, m_readurl):
+        return [json.loads(c[1]["data"]) for c in m_readurl.call_args_list]
+
+    def test_publish_does_not_wait_on_the_endpoint(self, m_readurl):
+        """Events are posted one at a time from the sender thread."""
+        release = threading.Event()
+        m_readurl.side_effect = lambda *args, **kwargs: release.wait(5)
+        handler = handlers.WebHookHandler(self.endpoint)
+        handler.publish_event(self._event("one"))
+        handler.publish_event(self._event("two"))
+        self.assertFalse(release.is_set())
+        release.set()
+        handler.flush(timeout=5)
+        self.assertEqual(
+            ["one", "two"], [e["name"] for e in self._posted(m_readurl)]
+        )
+        self.assertEqual(self.endpoint, m_readurl.call_args[0][0])
+
+    def test_events_are_posted_in_batches(self, m_readurl):
+        handler = handlers.WebHookHandler(
+            self.endpoint, batch_size=2, flush_interval=60
+        )
+        for name in ("one", "two", "three"):
+            handler.publish_event(self._event(name))
+        handler.flush(timeout=5)
+        self.assertEqual(
+            [["one", "two"], ["three"]],
+            [[e["name"] for e in batch] for batch in self._posted(m_readurl)],
+        )
+
+    def test_full_queue_drops_oldest_events(self, m_readurl):
+        release = threading.Event()
+        started = threading.Event()
+
+        def post(*args, **kwargs):
+            started.set()
+            release.wait(5)
+
+        m_readurl.side_effect = post
+        handler = handlers.WebHookHandler(self.endpoint, queue_size=2)
+        handler.publish_event(self._event("one"))
+        self.assertTrue(started.wait(5))
+        for name in ("two", "three", "four"):
+            handler.publish_event(self._event(name))
+        release.set()
+        handler.flush(timeout=5)
+        self.assertEqual(1, handler.dropped)
+        self.assertEqual(
+            ["one", "three", "four"],
+            [e["name"] for e in self._posted(m_readurl)],
+        )
+
+    def test_flush_returns_at_the_deadline(self, m_readurl):
+        release = threading.Event()
+        m_readurl.side_effect = lambda *args, **kwargs: release.wait(5)
+        handler = handlers.WebHookHandler(self.endpoint)
+        handler.publish_event(self._event("one"))
+        handler.publish_event(self._event("two"))
+        handler.flush(timeout=0.1)
+        self.assertIn("2 events not posted", self.logs.getvalue())
+        release.set()
+
+    def test_events_in_flight_are_spooled_at_the_deadline(self, m_readurl):
+        """A batch stuck posting is spooled along with the queued events."""
+        release = threading.Event()
+        started = threading.Event()
+
+        def post(*args, **kwargs):
+            started.set()
+            release.wait(5)
+
+        m_readurl.side_effect = post
+        handler = handlers.WebHookHandler(self.endpoint, spool=True)
+        handler.publish_event(self._event("one"))
+        self.assertTrue(started.wait(5))
+        handler.publish_event(self._event("two"))
+        handler.flush(timeout=0.1)
+        spooled = json.loads(util.load_file(handler.spool_file))
+        self.assertEqual(["one", "two"], [e["name"] for e in spooled])
+        # Once posted after all, the batch is no longer spooled
+        release.set()
+        handler.flush(timeout=5)
+        spooled = json.loads(util.load_file(handler.spool_file))
+        self.assertEqual(["two"], [e["name"] for e in spooled])
+
+    def test_close_stops_the_sender(self, m_readurl):
+        handler = handlers.WebHookHandler(self.endpoint)
+        handler.publish_event(self._event("one"))
+        sender = handler._sender
+        handler.close()
+        sender.join(5)
+        self.assertFalse(sender.is_alive())
+        self.assertEqual(["one"], [e["name"] for e in self._posted(m_readurl)])
+
+    def test_unposted_events_are_spooled_and_resent(self, m_readurl):
+        m_readurl.side_effect = IOError("collector unreachable")
+        handler = handlers.WebHookHandler(self.endpoint, spool=True)
+        handler.publish_event(self._event("one"))
+        handler.flush(timeout=5)
+        spooled = json.loads(util.load_file(handler.spool_file))
+        self.assertEqual(["one"], [e["name"] for e in spooled])
+
+        m_readurl.reset_mock()
+        m_readurl.side_effect = None
+        handler = handlers.WebHookHandler(self.endpoint, spool=True)
+        handler.publish_event(self._event("two"))
+        handler.flush(timeout=5)
+        self.assertEqual(
+            ["one", "two"], [e["name"] for e in self._posted(m_readurl)]
+        )
+        self.assertFalse(os.path.exists(handler.spool_file))
+
+
 class TestDefaultRegisteredHandler(TestCase):
     def test_log_handler_registered_by_default(self):
         registered_items = (
@@ -282,6 +416,54 @@ class TestReportingConfiguration(TestCase):
         reporting.update_configuration({"my_test_handler": handler_config})
         self.assertEqual(expected_handler_config, handler_config)
 
+    @mock.patch.object(reporting, "_replaced_handlers", [])
+    @mock.patch.object(
+        reporting, "instantiated_handler_registry", reporting.DictRegistry()
+    )
+    @mock.patch.object(reporting, "available_handlers")
+    def test_replaced_handlers_are_closed_and_flushed_at_exit(
+        self, available_handlers
+    ):
+        handler_cls = mock.Mock()
+        available_handlers.registered_items = {"test_handler": handler_cls}
+        replaced = mock.Mock()
+        reporting.instantiated_handler_registry.register_item(
+            "my_test_handler", replaced
+        )
+        reporting.update_configuration(
+            {"my_test_handler": {"type": "test_handler"}}
+        )
+        # Closing does not wait for the queued events to be published
+        self.assertEqual([mock.call.close()], replaced.method_calls)
+        reporting.flush_events()
+        self.assertEqual(
+            [mock.call.close(), mock.call.flush()], replaced.method_calls
+        )
+        handler_cls.return_value.flush.assert_called_once_with()
+        reporting.flush_events()
+        self.assertEqual(1, replaced.flush.call_count)
+
+    @mock.patch.object(reporting, "_replaced_handlers", [])
+    @mock.patch.object(
+        reporting, "instantiated_handler_registry", reporting.DictRegistry()
+    )
+    @mock.patch.object(reporting, "available_handlers")
+    def test_handlers_with_unchanged_config_are_kept(self, available_handlers):
+        handler_cls = mock.Mock(side_effect=lambda **kwargs: mock.Mock())
+        available_handlers.registered_items = {"test_handler": handler_cls}
+        config = {"my_test_handler": {"type": "test_handler", "foo": "bar"}}
+        reporting.update_configuration(config)
+        handler = reporting.instantiated_handler_registry.registered_items[
+            "my_test_handler"
+        ]
+        reporting.update_configuration(copy.deepcopy(config))
+        self.assertEqual(1, handler_cls.call_count)
+        self.assertEqual([], handler.method_calls)
+        config["my_test_handler"]["foo"] = "baz"
+        reporting.update_configuration(config)
+        self.assertEqual(2, handler_cls.call_count)
+        self.assertEqual([mock.call.close()], handler.method_calls)
+
     @mock.patch.object(
         reporting, "instantiated_handler_registry", reporting.DictRegistry()
     )
@@ -10,7 +10,11 @@ from unittest import mock
 
 from cloudinit import util
 from cloudinit.reporting import events, instantiated_handler_registry
-from cloudinit.reporting.handlers import HyperVKvpReportingHandler, LogHandler
+from cloudinit.reporting.handlers import (
+    HyperVKvpReportingHandler,
+    KvpPool,
+    LogHandler,
+)
 from cloudinit.sources.helpers import azure
 from tests.unittests.helpers import CiTestCase
 
@@ -25,11 +29,135 @@ class TestKvpEncoding(CiTestCase):
         self.assertEqual(kvp, decoded_kvp)
 
 
+class TestKvpPool(CiTestCase):
+    def setUp(self):
+        super(TestKvpPool, self).setUp()
+        self.tmp_file_path = self.tmp_path("kvp_pool_file")
+        self.encoder = HyperVKvpReportingHandler()
+
+    def _pool(self, is_stale=None):
+        return KvpPool(
+            self.tmp_file_path,
+            HyperVKvpReportingHandler.HV_KVP_EXCHANGE_MAX_KEY_SIZE,
+            HyperVKvpReportingHandler.HV_KVP_EXCHANGE_MAX_VALUE_SIZE,
+            is_stale=is_stale,
+        )
+
+    def _keys(self, pool):
+        return [
+            self.encoder._decode_kvp_item(r)["key"] for r in pool.records()
+        ]
+
+    def test_records_from_other_writers_are_kept(self):
+        pool = self._pool()
+        pool.write([self.encoder._encode_kvp_item("key1", "value1")])
+        with open(self.tmp_file_path, "ab") as f:
+            f.write(self.encoder._encode_kvp_item("key2", "value2"))
+        pool.write([self.encoder._encode_kvp_item("key3", "value3")])
+        self.assertEqual(["key1", "key2", "key3"], self._keys(pool))
+
+    def test_records_are_rewritten_in_place(self):
+        pool = self._pool()
+        pool.write(
+            [
+                self.encoder._encode_kvp_item("key1", "value1"),
+                self.encoder._encode_kvp_item("key2", "value2"),
+            ]
+        )
+        pool.write([self.encoder._encode_kvp_item("key1", "new")])
+        self.assertEqual(
+            [
+                {"key": "key1", "value": "new"},
+                {"key": "key2", "value": "value2"},
+            ],
+            [self.encoder._decode_kvp_item(r) for r in pool.records()],
+        )
+
+    def test_stale_slots_are_reused(self):
+        with open(self.tmp_file_path, "wb") as f:
+            f.write(self.encoder._encode_kvp_item("old1", "value"))
+            f.write(self.encoder._encode_kvp_item("keep", "value"))
+            f.write(self.encoder._encode_kvp_item("old2", "value"))
+        pool = self._pool(is_stale=lambda key: key.startswith("old"))
+        pool.write(
+            [
+                self.encoder._encode_kvp_item("new1", "value"),
+                self.encoder._encode_kvp_item("new2", "value"),
+                self.encoder._encode_kvp_item("new3", "value"),
+            ]
+        )
+        self.assertEqual(["new1", "keep", "new2", "new3"], self._keys(pool))
+        self.assertEqual(
+            4 * HyperVKvpReportingHandler.HV_KVP_RECORD_SIZE,
+            os.path.getsize(self.tmp_file_path),
+        )
+
+    def test_stale_slot_reused_by_another_writer_is_kept(self):
+        with open(self.tmp_file_path, "wb") as f:
+            f.write(self.encoder._encode_kvp_item("old1", "value"))
+        is_stale = lambda key: key.startswith("old")  # noqa: E731
+        pool = self._pool(is_stale=is_stale)
+        self.assertEqual(["old1"], self._keys(pool))
+        other = self._pool(is_stale=is_stale)
+        other.write([self.encoder._encode_kvp_item("other", "value")])
+        pool.write([self.encoder._encode_kvp_item("mine", "value")])
+        self.assertEqual(["other", "mine"], self._keys(pool))
+
+    def test_slot_rewritten_by_another_writer_is_kept(self):
+        pool = self._pool()
+        pool.write([self.encoder._encode_kvp_item("old1", "value")])
+        other = self._pool(is_stale=lambda key: key.startswith("old"))
+        other.write([self.encoder._encode_kvp_item("other", "value")])
+        pool.write([self.encoder._encode_kvp_item("old1", "new")])
+        self.assertEqual(
+            [
+                {"key": "other", "value": "value"},
+                {"key": "old1", "value": "new"},
+            ],
+            [self.encoder._decode_kvp_item(r) for r in pool.records()],
+        )
+        pool.write([self.encoder._encode_kvp_item("old1", "newer")])
+        self.assertEqual(2, len(pool.records()))
+
+    def test_pool_truncated_while_written(self):
+        """The pool is truncated by hv_kvp_daemon without taking flock."""
+        with open(self.tmp_file_path, "wb") as f:
+            f.write(self.encoder._encode_kvp_item("old1", "value"))
+            f.write(self.encoder._encode_kvp_item("old2", "value"))
+        truncate = []
+
+        def is_stale(key):
+            if truncate:
+                truncate.pop()
+                os.truncate(self.tmp_file_path, 0)
+            return key.startswith("old")
+
+        pool = self._pool(is_stale=is_stale)
+        self.assertEqual(["old1", "old2"], self._keys(pool))
+        truncate.append(True)
+        pool.write(
+            [
+                self.encoder._encode_kvp_item("new1", "value"),
+                self.encoder._encode_kvp_item("new2", "value"),
+            ]
+        )
+        self.assertEqual(["new1", "new2"], self._keys(pool))
+
+
 class TextKvpReporter(CiTestCase):
+
+    with_logs = True
+
     def setUp(self):
         super(TextKvpReporter, self).setUp()
         self.tmp_file_path = self.tmp_path("kvp_pool_file")
         util.ensure_file(self.tmp_file_path)
+        # read the kernel messages of the test with dmesg
+        patcher = mock.patch.object(
+            azure, "KMSG_DEVICE", self.tmp_path("kmsg")
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
 
     def test_events_with_higher_incarnation_not_over_written(self):
         reporter = HyperVKvpReportingHandler(kvp_file_path=self.tmp_file_path)
@@ -52,6 +180,26 @@ class TextKvpReporter(CiTestCase):
         reporter3.q.join()
         self.assertEqual(3, len(list(reporter3._iterate_kvps(0))))
 
+    def test_events_of_earlier_incarnations_are_overwritten(self):
+        reporter = HyperVKvpReportingHandler(kvp_file_path=self.tmp_file_path)
+        reporter.publish_event(
+            events.ReportingEvent("foo", "name1", "description")
+        )
+        reporter.q.join()
+
+        reporter2 = HyperVKvpReportingHandler(kvp_file_path=self.tmp_file_path)
+        reporter2.incarnation_no = reporter.incarnation_no + 1
+        reporter2.event_key_prefix = "{0}|{1}".format(
+            reporter2.EVENT_PREFIX, reporter2.incarnation_no
+        )
+        reporter2.publish_event(
+            events.ReportingEvent("foo", "name2", "description")
+        )
+        reporter2.q.join()
+        kvps = list(reporter2._iterate_kvps(0))
+        self.assertEqual(1, len(kvps))
+        self.assertIn("|name2|", kvps[0]["key"])
+
     def test_finish_event_result_is_logged(self):
         reporter = HyperVKvpReportingHandler(kvp_file_path=self.tmp_file_path)
         reporter.publish_event(
@@ -302,6 +450,87 @@ class TextKvpReporter(CiTestCase):
                 "telemetry", force=False
             )
 
+    @mock.patch("cloudinit.sources.helpers.azure.report_compressed_event")
+    @mock.patch("cloudinit.sources.helpers.azure._read_kmsg")
+    def test_push_log_to_kvp_budget(self, m_read_kmsg, m_compressed):
+        """Logs pushed in a boot stop at the budget of its first call and
+        kernel messages resume after the last one pushed."""
+        kmsg = [(seq, b"kernel message %03d\n" % seq) for seq in range(5)]
+        m_read_kmsg.side_effect = lambda fd, after: [
+            m for m in kmsg if m[0] > after
+        ]
+        util.write_file(azure.KMSG_DEVICE, "")
+        log_file = self.tmp_path("cloud-init.log")
+        util.write_file(log_file, "A" * 150)
+        index_file = self.tmp_path("log_pushed_to_kvp")
+        with mock.patch.object(
+            azure, "LOG_PUSHED_TO_KVP_INDEX_FILE", index_file
+        ), mock.patch.object(azure, "MAX_LOG_TO_KVP_LENGTH", 1000):
+            azure.push_log_to_kvp(log_file, budget=200)
+            self.assertEqual(-1, m_read_kmsg.call_args[0][1])
+            with open(log_file, "a") as f:
+                f.write("B" * 20)
+            azure.push_log_to_kvp(log_file)
+            self.assertEqual(1, m_read_kmsg.call_args[0][1])
+            self.assertEqual(
+                170, azure.get_last_log_byte_pushed_to_kvp_index()
+            )
+        pushed = [
+            (c[0][0], zlib.decompress(c[0][1]))
+            for c in m_compressed.call_args_list
+        ]
+        self.assertEqual(
+            [
+                ("cloud-init.log", b"A" * 150),
+                ("dmesg", kmsg[0][1] + kmsg[1][1]),
+                ("cloud-init.log", b"B" * 12),
+            ],
+            pushed,
+        )
+
+    @mock.patch("cloudinit.sources.helpers.azure.report_compressed_event")
+    @mock.patch("cloudinit.sources.helpers.azure._read_kmsg", return_value=[])
+    def test_push_log_to_kvp_budget_from_config(self, m_read_kmsg, m_com):
+        """Budgets from config are coerced to int, else the default used."""
+        util.write_file(azure.KMSG_DEVICE, "")
+        log_file = self.tmp_path("cloud-init.log")
+        util.write_file(log_file, "A" * 150)
+        index_file = self.tmp_path("log_pushed_to_kvp")
+        with mock.patch.object(
+            azure, "LOG_PUSHED_TO_KVP_INDEX_FILE", index_file
+        ), mock.patch.object(azure, "MAX_LOG_TO_KVP_LENGTH", 1000):
+            azure.push_log_to_kvp(log_file, budget="100")
+            self.assertEqual(
+                b"A" * 100, zlib.decompress(m_com.call_args[0][1])
+            )
+            util.del_file(index_file)
+            azure.push_log_to_kvp(log_file, budget="lots")
+            self.assertEqual(
+                b"A" * 150, zlib.decompress(m_com.call_args[0][1])
+            )
+        self.assertIn(
+            "Invalid KVP log budget 'lots', using %d bytes"
+            % azure.MAX_LOG_TO_KVP_PER_BOOT,
+            self.logs.getvalue(),
+        )
+
+    @mock.patch("cloudinit.sources.helpers.azure.os.read")
+    def test_read_kmsg(self, m_read):
+        m_read.side_effect = [
+            b"6,1,1500000,-;old message\n",
+            b"6,2,2000001,-;new message\n SUBSYSTEM=pci\n",
+            BrokenPipeError(),
+            b"4,4,13000000,-;later message\n",
+            BlockingIOError(),
+        ]
+        self.assertEqual(
+            [
+                (2, b"[    2.000001] new message\n"),
+                (4, b"[   13.000000] later message\n"),
+            ],
+            list(azure._read_kmsg(3, 1)),
+        )
+
     def validate_compressed_kvps(self, reporter, count, values):
         reporter.q.join()
         kvps = list(reporter._iterate_kvps(0))
@@ -0,0 +1,94 @@
+# This file is part of cloud-init. See LICENSE file for license information.
+
+"""Tests for cloudinit.safeyaml"""
+
+from unittest import mock
+
+import pytest
+import yaml
+
+from cloudinit import safeyaml
+
+skip_unless_libyaml = pytest.mark.skipif(
+    not safeyaml.HAS_LIBYAML, reason="PyYAML built without libyaml"
+)
+
+CLOUD_CONFIG = """\
+#cloud-config
+write_files:
+- path: /etc/motd
+  content: !!python/unicode |
+    hello
+runcmd:
+- [echo, &word hi]
+- [echo, *word]
+"""
+
+EXPECTED = {
+    "write_files": [{"path": "/etc/motd", "content": "hello\n"}],
+    "runcmd": [["echo", "hi"], ["echo", "hi"]],
+}
+
+
+class TestLoad:
+    def test_load(self):
+        assert EXPECTED == safeyaml.load(CLOUD_CONFIG)
+
+    def test_load_without_libyaml(self):
+        with mock.patch.object(safeyaml, "_CustomCSafeLoader", None):
+            assert EXPECTED == safeyaml.load(CLOUD_CONFIG)
+
+    @skip_unless_libyaml
+    def test_load_uses_libyaml(self):
+        with mock.patch.object(
+            safeyaml, "_CustomSafeLoader", side_effect=AssertionError
+        ):
+            assert EXPECTED == safeyaml.load(CLOUD_CONFIG)
+
+    @pytest.mark.parametrize(
+        "blob", ["a: [1, 2", "a: b: c", "a: !!python/object:os.system x"]
+    )
+    def test_errors_match_pure_python(self, blob):
+        """Errors are raised by the python loader, keeping their marks."""
+        with pytest.raises(safeyaml.YAMLError) as expected:
+            yaml.load(blob, Loader=safeyaml._CustomSafeLoader)
+        with pytest.raises(safeyaml.YAMLError) as raised:
+            safeyaml.load(blob)
+        assert str(expected.value) == str(raised.value)
+        assert (
+            expected.value.problem_mark.line == raised.value.problem_mark.line
+        )
+
+
+class PythonNoAliasDumper(yaml.dumper.SafeDumper):
+    def ignore_aliases(self, data):
+        return True
+
+
+class TestDumps:
+    @pytest.mark.parametrize("noalias", [False, True])
+    @skip_unless_libyaml
+    def test_dumps_matches_pure_python(self, noalias):
+        """libyaml's emitter writes the same yaml as the python one."""
+        data = {
+            "a": "x" * 200,
+            "b": "line1\nline2\n",
+            "c": "\xe9☃",
+            "d": [1, 2.5, None, True, "yes", "0x10", ""],
+            "e": {"k": "v: w"},
+        }
+        python_dumper = PythonNoAliasDumper if noalias else yaml.dumper.Dumper
+        with mock.patch.object(safeyaml, "_Dumper", python_dumper):
+            with mock.patch.object(
+                safeyaml, "NoAliasSafeDumper", python_dumper
+            ):
+                expected = safeyaml.dumps(data, noalias=noalias)
+        assert expected == safeyaml.dumps(data, noalias=noalias)
+
+    def test_dumps_noalias(self):
+        item = ["echo", "hi"]
+        assert "&" not in safeyaml.dumps([item, item], noalias=True)
+        assert "&" in safeyaml.dumps([item, item])
+
+
+# vi: ts=4 expandtab
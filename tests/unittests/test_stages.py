@@ -3,10 +3,13 @@
 """Tests related to cloudinit.stages module."""
 import os
 import stat
+import threading
+import time
+import types
 
 import pytest
 
-from cloudinit import sources, stages
+from cloudinit import config, helpers, sources, stages
 from cloudinit.event import EventScope, EventType
 from cloudinit.sources import NetworkConfigSource
 from cloudinit.util import write_file
@@ -565,4 +568,157 @@ class TestInit_InitializeFilesystem:
         assert mode == stat.S_IMODE(log_file.stat().mode)
 
 
+class TestInitReadCfg:
+    @pytest.fixture
+    def cloud_cfg(self, tmpdir):
+        """Point the base config of Init at tmpdir, caching merged configs."""
+        cloud_cfg = tmpdir.join("cloud.cfg")
+        cloud_cfg.write("a: cloud.cfg\n")
+        tmpdir.mkdir("cloud.cfg.d").join("90.cfg").write("b: 90.cfg\n")
+        with mock.patch(
+            "cloudinit.stages.util.read_conf_from_cmdline", return_value={}
+        ), mock.patch.multiple(
+            stages,
+            CLOUD_CONFIG=str(cloud_cfg),
+            RUN_CLOUD_CONFIG=str(tmpdir.join("run.cfg")),
+        ), mock.patch.object(
+            helpers, "CONFIG_CACHE_FILE", str(tmpdir.join("cache.json"))
+        ):
+            yield tmpdir
+
+    def test_base_config_files(self, cloud_cfg):
+        """The base config depends on cloud.cfg, its .cfg parts and run.cfg"""
+        cloud_cfg.join("cloud.cfg.d", "README").write("")
+        assert [
+            str(cloud_cfg.join("cloud.cfg")),
+            str(cloud_cfg.join("cloud.cfg.d")),
+            str(cloud_cfg.join("cloud.cfg.d", "90.cfg")),
+            str(cloud_cfg.join("run.cfg")),
+        ] == stages.base_config_files()
+
+    def test_base_config_read_once_while_unchanged(self, cloud_cfg):
+        """Later stages reuse the merged config until a part is added."""
+        with mock.patch(
+            "cloudinit.stages.fetch_base_config",
+            side_effect=stages.fetch_base_config,
+        ) as m_fetch:
+            for _ in range(2):
+                init = stages.Init(ds_deps=[])
+                init.read_cfg()
+                assert "cloud.cfg" == init.cfg["a"]
+                assert "90.cfg" == init.cfg["b"]
+            assert 1 == m_fetch.call_count
+            cloud_cfg.join("cloud.cfg.d", "91.cfg").write("b: 91.cfg\n")
+            init = stages.Init(ds_deps=[])
+            init.read_cfg()
+            assert "91.cfg" == init.cfg["b"]
+            assert 2 == m_fetch.call_count
+
+
+class FakeCloud:
+    def run(self, name, functor, args, freq=None):
+        return (True, functor(*args))
+
+
+def fake_module(name, handle, **attrs):
+    mod = types.ModuleType("cc_%s" % name)
+    mod.handle = handle
+    for attr, value in attrs.items():
+        setattr(mod, attr, value)
+    return [config.fixup_module(mod), name, None, []]
+
+
+class TestModulesRun:
+    @pytest.fixture
+    def modules(self):
+        init = mock.Mock()
+        init.cloudify.return_value = FakeCloud()
+        mods = stages.Modules(init)
+        mods._cached_cfg = {"modules_run_mode": "parallel"}
+        return mods
+
+    @pytest.mark.parametrize(
+        "attrs_a,attrs_b,conflict",
+        [
+            ({}, {"writes": ["/etc/a"]}, True),
+            ({"writes": ["/etc/a"]}, {"writes": ["/etc/b"]}, False),
+            ({"writes": ["/etc/a"]}, {"reads": ["/etc/a/b.conf"]}, True),
+            ({"reads": ["/etc/a"]}, {"reads": ["/etc/a"]}, False),
+            ({"writes": ["packages"]}, {"reads": ["packages"]}, True),
+            ({"writes": ["/etc/ab"]}, {"writes": ["/etc/a"]}, False),
+        ],
+    )
+    def test_modules_conflict(self, attrs_a, attrs_b, conflict):
+        """Modules conflict on overlapping writes or undeclared resources."""
+        noop = mock.Mock()
+        mod_a = fake_module("a", noop, **attrs_a)[0]
+        mod_b = fake_module("b", noop, **attrs_b)[0]
+        assert conflict is config.modules_conflict(mod_a, mod_b)
+        assert conflict is config.modules_conflict(mod_b, mod_a)
+
+    def test_independent_modules_run_concurrently(self, modules):
+        """Modules without conflicting resources run at the same time."""
+        barrier = threading.Barrier(2, timeout=5)
+
+        def handle(*_args):
+            barrier.wait()
+
+        mods = [
+            fake_module("a", handle, writes=["/etc/a"]),
+            fake_module("b", handle, writes=["/etc/b"]),
+        ]
+        assert (["a", "b"], []) == modules._run_modules(mods)
+
+    @pytest.mark.parametrize(
+        "attrs", [{}, {"reads": ["/etc/a/a.conf"]}, {"writes": ["/etc"]}]
+    )
+    def test_conflicting_modules_keep_configured_order(self, modules, attrs):
+        """Modules waiting on a conflicting module start after it finishes."""
+        calls = []
+
+        def slow(*_args):
+            time.sleep(0.1)
+            calls.append("a")
+
+        mods = [
+            fake_module("a", slow, writes=["/etc/a"]),
+            fake_module("b", lambda *_args: calls.append("b"), **attrs),
+        ]
+        modules._run_modules(mods)
+        assert ["a", "b"] == calls
+
+    def test_failures_are_reported_in_configured_order(self, modules):
+        """Module failures are collected without stopping other modules."""
+
+        def fail(name, *_args):
+            raise RuntimeError(name)
+
+        mods = [
+            fake_module("a", fail, writes=["/etc/a"]),
+            fake_module("b", mock.Mock(), writes=["/etc/b"]),
+            fake_module("c", fail, writes=["/etc/c"]),
+        ]
+        (which_ran, failures) = modules._run_modules(mods)
+        assert ["a", "b", "c"] == which_ran
+        assert ["a", "c"] == [name for (name, _error) in failures]
+        assert ["a", "c"] == [str(error) for (_name, error) in failures]
+
+    def test_unknown_mode_runs_serially(self, modules, caplog):
+        """An invalid modules_run_mode warns and falls back to serial."""
+        modules._cached_cfg = {"modules_run_mode": "bogus"}
+        calls = []
+
+        def handle(name, *_args):
+            calls.append((name, threading.current_thread()))
+
+        mods = [
+            fake_module("a", handle, writes=["/etc/a"]),
+            fake_module("b", handle, writes=["/etc/b"]),
+        ]
+        assert (["a", "b"], []) == modules._run_modules(mods)
+        main_thread = threading.current_thread()
+        assert [("a", main_thread), ("b", main_thread)] == calls
+        assert "Unknown modules_run_mode 'bogus'" in caplog.text
+
+
 # vi: ts=4 expandtab
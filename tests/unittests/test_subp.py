@@ -8,7 +8,7 @@ import stat
 import sys
 from unittest import mock
 
-from cloudinit import subp, util
+from cloudinit import features, subp, util
 from tests.unittests.helpers import CiTestCase, get_top_level_dir
 
 BASH = subp.which("bash")
@@ -350,4 +350,108 @@ class TestSubp(CiTestCase):
         self.assertEqual(expected, logs)
 
 
+class TestCommandStats(CiTestCase):
+    allowed_subp = [BASH, "cat", BOGUS_COMMAND]
+
+    def setUp(self):
+        super(TestCommandStats, self).setUp()
+        subp.reset_command_stats()
+        self.addCleanup(subp.reset_command_stats)
+
+    def test_commands_counted_by_name_and_caller(self):
+        """Each command is counted with its bytes in and out and duration."""
+        subp.subp(["cat"], data=b"abc")
+        subp.subp(["cat"], data="de")
+        (stats,) = subp.get_command_stats()
+        self.assertEqual("cat", stats["command"])
+        # CiTestCase wraps subp, so the caller is within the tests
+        self.assertTrue(stats["caller"].startswith("tests.unittests."))
+        self.assertEqual(2, stats["count"])
+        self.assertEqual(0, stats["failures"])
+        self.assertEqual({"0": 2}, stats["exit_codes"])
+        self.assertEqual(5, stats["bytes_in"])
+        self.assertEqual(5, stats["bytes_out"])
+        self.assertGreater(stats["seconds"], 0)
+
+    def test_failures_counted(self):
+        """Non-zero exit codes and commands failing to run are failures."""
+        with self.assertRaises(subp.ProcessExecutionError):
+            subp.subp([BASH, "-c", "exit 3"])
+        with self.assertRaises(subp.ProcessExecutionError):
+            subp.subp([BOGUS_COMMAND])
+        stats = dict((s["command"], s) for s in subp.get_command_stats())
+        self.assertEqual(1, stats["bash"]["failures"])
+        self.assertEqual({"3": 1}, stats["bash"]["exit_codes"])
+        self.assertEqual(1, stats[BOGUS_COMMAND]["failures"])
+        self.assertEqual({}, stats[BOGUS_COMMAND]["exit_codes"])
+
+    def test_commands_attributed_to_config_module(self):
+        """Commands run within a config module are counted against it."""
+        code = compile(
+            "from cloudinit import subp\nsubp.subp(['cat'], data=b'')\n",
+            "cc_fake.py",
+            "exec",
+        )
+        exec(code, {"__name__": "cloudinit.config.cc_fake"})
+        (stats,) = subp.get_command_stats()
+        self.assertEqual("cc_fake", stats["caller"])
+
+    def test_reset_command_stats(self):
+        subp.subp(["cat"], data=b"")
+        subp.reset_command_stats()
+        self.assertEqual([], subp.get_command_stats())
+
+
+class TestFastSpawn(CiTestCase):
+    allowed_subp = ["cat", BOGUS_COMMAND]
+
+    def setUp(self):
+        super(TestFastSpawn, self).setUp()
+        subp._spawn_paths.clear()
+        self.addCleanup(subp._spawn_paths.clear)
+
+    def _popen_kwargs(self, args, **kwargs):
+        with mock.patch("cloudinit.subp.subprocess.Popen") as m_popen:
+            m_popen.return_value.communicate.return_value = (b"", b"")
+            m_popen.return_value.returncode = 0
+            subp.subp(args, **kwargs)
+        return m_popen.call_args[1]
+
+    @mock.patch.object(features, "SUBP_FAST_SPAWN", False)
+    def test_disabled_by_default(self):
+        """Without the feature, Popen closes fds and searches PATH."""
+        kwargs = self._popen_kwargs(["cat"])
+        self.assertNotIn("executable", kwargs)
+        self.assertNotIn("close_fds", kwargs)
+
+    @mock.patch.object(features, "SUBP_FAST_SPAWN", True)
+    def test_enabled_resolves_absolute_executable(self):
+        """With the feature, commands run from their absolute path."""
+        kwargs = self._popen_kwargs(["cat"])
+        self.assertEqual(subp.which("cat"), kwargs["executable"])
+        self.assertFalse(kwargs["close_fds"])
+
+    @mock.patch.object(features, "SUBP_FAST_SPAWN", True)
+    def test_enabled_skipped_for_shell_and_cwd(self):
+        """Shell commands and those run in another directory use fork."""
+        self.assertNotIn("executable", self._popen_kwargs("cat", shell=True))
+        kwargs = self._popen_kwargs(["cat"], cwd=self.tmp_dir())
+        self.assertNotIn("executable", kwargs)
+
+    @mock.patch.object(features, "SUBP_FAST_SPAWN", True)
+    def test_enabled_skipped_for_str_and_bytes_args(self):
+        """A single program name or path as args uses fork."""
+        self.allowed_subp = True
+        for args in ("cat", b"cat", subp.which("cat")):
+            self.assertNotIn("executable", self._popen_kwargs(args))
+        out, _err = subp.subp("cat", data="hi", shell=False)
+        self.assertEqual("hi", out)
+
+    @mock.patch.object(features, "SUBP_FAST_SPAWN", True)
+    def test_enabled_unknown_command_still_raises(self):
+        """Commands not found on PATH fail as usual."""
+        with self.assertRaises(subp.ProcessExecutionError):
+            subp.subp([BOGUS_COMMAND])
+
+
 # vi: ts=4 expandtab
@@ -18,7 +18,7 @@ import pathlib
 
 import pytest
 
-from cloudinit.stages import _pkl_load
+from cloudinit.stages import _pkl_load, _pkl_store
 from tests.unittests.helpers import resourceLocation
 
 
@@ -28,13 +28,26 @@ class TestUpgrade:
         scope="class",
         ids=operator.attrgetter("name"),
     )
-    def previous_obj_pkl(self, request):
-        """Load each pickle to memory once, then run all tests against it.
+    def loaded_obj_pkl(self, request):
+        """Load each pickle to memory once."""
+        return _pkl_load(str(request.param))
+
+    @pytest.fixture(params=["pickle", "obj_cache"], scope="class")
+    def previous_obj_pkl(self, request, loaded_obj_pkl, tmp_path_factory):
+        """Run all tests against each loaded pickle.
+
+        For the ``obj_cache`` variant, the loaded pickle is rewritten in the
+        current cache format and loaded back, so the invariants also hold
+        after that upgrade.
 
         Test implementations _must not_ modify the ``previous_obj_pkl`` which
         they are passed, as that will affect tests that run after them.
         """
-        return _pkl_load(str(request.param))
+        if request.param == "pickle":
+            return loaded_obj_pkl
+        cache_file = tmp_path_factory.mktemp("cache") / "obj.pkl"
+        assert _pkl_store(loaded_obj_pkl, str(cache_file))
+        return _pkl_load(str(cache_file))
 
     def test_networking_set_on_distro(self, previous_obj_pkl):
         """We always expect to have ``.networking`` on ``Distro`` objects."""
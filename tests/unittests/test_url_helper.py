@@ -1,18 +1,29 @@
 # This file is part of cloud-init. See LICENSE file for license information.
 
 import logging
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
 
 import httpretty
+import pytest
 import requests
 
 from cloudinit import util, version
 from cloudinit.url_helper import (
     NOT_FOUND,
     REDACTED,
+    SESSION_POOL,
+    OauthUrlHelper,
+    SessionPool,
     UrlError,
     oauth_headers,
     read_file_or_url,
+    readurl,
     retry_on_url_exc,
+    wait_for_url,
 )
 from tests.unittests.helpers import CiTestCase, mock, skipIf
 
@@ -197,4 +208,233 @@ class TestRetryOnUrlExc(CiTestCase):
         self.assertTrue(retry_on_url_exc(msg="", exc=myerror))
 
 
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    block_on_close = False
+
+
+class _MetadataStandIn(BaseHTTPRequestHandler):
+    """Serve /good immediately, /slow after SLOW_DELAY and /missing as 404.
+
+    /cookie sets a cookie and any cookie sent is echoed after the path.
+    """
+
+    SLOW_DELAY = 0.5
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/missing":
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if path == "/slow":
+            time.sleep(self.SLOW_DELAY)
+        body = self.path.encode()
+        if self.headers.get("Cookie"):
+            body += b" " + self.headers["Cookie"].encode()
+        self.send_response(200)
+        if path == "/cookie":
+            self.send_header("Set-Cookie", "session=secret; Path=/")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def metadata_stand_in():
+    """Yield a base url for a local metadata stand-in and a dead url.
+
+    The dead url accepts connections but never responds, just like a
+    firewalled metadata address.
+    """
+    server = _ThreadingHTTPServer(("127.0.0.1", 0), _MetadataStandIn)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    dead = socket.socket()
+    dead.bind(("127.0.0.1", 0))
+    dead.listen(16)
+    yield (
+        "http://127.0.0.1:%s" % server.server_address[1],
+        "http://127.0.0.1:%s/dead" % dead.getsockname()[1],
+    )
+    server.shutdown()
+    server.server_close()
+    dead.close()
+
+
+class TestWaitForUrl:
+    def test_serial_tries_urls_in_order(self, metadata_stand_in):
+        """Each url waits out its full timeout before the next is tried."""
+        base, dead = metadata_stand_in
+        status = []
+        start = time.time()
+        url, contents = wait_for_url(
+            urls=[dead, base + "/good"],
+            max_wait=0,
+            timeout=1,
+            status_cb=status.append,
+        )
+        assert time.time() - start >= 1
+        assert (base + "/good", b"/good") == (url, contents)
+        assert 1 == len(status)
+        assert "Calling '%s' failed" % dead in status[0]
+
+    def test_race_returns_first_good_response(self, metadata_stand_in):
+        """Racing does not wait on dead or slow urls."""
+        base, dead = metadata_stand_in
+        start = time.time()
+        url, contents = wait_for_url(
+            urls=[dead, base + "/slow", base + "/good"],
+            max_wait=0,
+            timeout=1,
+            connect_synchronously=False,
+        )
+        assert time.time() - start < _MetadataStandIn.SLOW_DELAY
+        assert (base + "/good", b"/good") == (url, contents)
+
+    def test_race_prefers_earlier_urls(self, metadata_stand_in):
+        """A url is only started early when the previous one has failed."""
+        base, _dead = metadata_stand_in
+        url, _contents = wait_for_url(
+            urls=[base + "/good", base + "/missing", base + "/good?2"],
+            max_wait=0,
+            timeout=1,
+            connect_synchronously=False,
+            async_delay=1,
+        )
+        assert base + "/good" == url
+
+    def test_race_invokes_callbacks_on_calling_thread(self, metadata_stand_in):
+        """headers_cb, status_cb and exception_cb run on the caller thread."""
+        base, _dead = metadata_stand_in
+        urls = [base + "/missing", base + "/missing?2"]
+        threads = set()
+        headers_urls = []
+        exceptions = []
+
+        def headers_cb(url):
+            threads.add(threading.current_thread())
+            headers_urls.append(url)
+            return {}
+
+        def exception_cb(msg, exception):
+            threads.add(threading.current_thread())
+            exceptions.append(exception)
+
+        url, contents = wait_for_url(
+            urls=urls,
+            max_wait=0,
+            timeout=1,
+            headers_cb=headers_cb,
+            exception_cb=exception_cb,
+            status_cb=lambda msg: threads.add(threading.current_thread()),
+            connect_synchronously=False,
+        )
+        assert (False, None) == (url, contents)
+        assert {threading.current_thread()} == threads
+        assert urls == headers_urls
+        assert [404, 404] == [e.code for e in exceptions]
+
+    def test_race_exception_cb_can_abort(self, metadata_stand_in):
+        """Exceptions raised by exception_cb interrupt the race."""
+        base, dead = metadata_stand_in
+
+        def exception_cb(msg, exception):
+            raise exception
+
+        start = time.time()
+        with pytest.raises(UrlError) as exc_info:
+            wait_for_url(
+                urls=[base + "/missing", dead],
+                max_wait=None,
+                timeout=1,
+                exception_cb=exception_cb,
+                connect_synchronously=False,
+            )
+        assert 404 == exc_info.value.code
+        assert time.time() - start < 1
+
+    def test_race_sleep_time_cb_gets_last_response(self, metadata_stand_in):
+        """sleep_time_cb sees the most recent failed response."""
+        base, _dead = metadata_stand_in
+        calls = []
+
+        def sleep_time_cb(response, loop_n):
+            calls.append((response.code if response else None, loop_n))
+            return 0
+
+        start = time.time()
+        wait_for_url(
+            urls=[base + "/missing"],
+            max_wait=0.1,
+            timeout=1,
+            sleep_time_cb=sleep_time_cb,
+            connect_synchronously=False,
+        )
+        assert time.time() - start < 1
+        assert (None, 0) == calls[0]
+        assert (404, 1) == calls[1]
+
+
+class TestSessionPool:
+    def test_readurl_reuses_pooled_connections(self, metadata_stand_in):
+        """Successive readurl calls to one host share a connection."""
+        base, _dead = metadata_stand_in
+        for path in ("/good", "/missing", "/good?2"):
+            readurl(base + path, check_status=False)
+        assert {
+            "sessions": 1,
+            "requests": 3,
+            "connections_opened": 1,
+            "connections_reused": 2,
+        } == SESSION_POOL.stats()
+
+    def test_oauth_helper_and_wait_for_url_use_pool(self, metadata_stand_in):
+        """OauthUrlHelper and wait_for_url requests go through the pool."""
+        base, _dead = metadata_stand_in
+        helper = OauthUrlHelper(skew_data_file=None)
+        helper.readurl(base + "/good")
+        helper.wait_for_url(urls=[base + "/good"], max_wait=0)
+        wait_for_url(
+            urls=[base + "/good"], max_wait=0, connect_synchronously=False
+        )
+        stats = SESSION_POOL.stats()
+        assert 3 == stats["requests"]
+        assert 1 == stats["connections_opened"]
+
+    def test_pooled_sessions_do_not_keep_cookies(self, metadata_stand_in):
+        """Cookies set by one readurl are not sent by the next."""
+        base, _dead = metadata_stand_in
+        assert b"/cookie" == readurl(base + "/cookie").contents
+        assert b"/good" == readurl(base + "/good").contents
+        assert 0 == len(SESSION_POOL.get().cookies)
+        assert 1 == SESSION_POOL.stats()["connections_opened"]
+
+    def test_sessions_are_keyed_on_ssl_details(self):
+        """Each distinct ssl_details gets its own session."""
+        pool = SessionPool()
+        ssl_details = {"cert_file": "/c.pem", "key_file": "/k.pem"}
+        assert pool.get() is pool.get(None)
+        assert pool.get(ssl_details) is pool.get(dict(ssl_details))
+        assert pool.get() is not pool.get(ssl_details)
+        assert 2 == pool.stats()["sessions"]
+
+    def test_close_tears_down_sessions(self, metadata_stand_in):
+        """close() closes pooled sessions so later requests reconnect."""
+        base, _dead = metadata_stand_in
+        pool = SessionPool()
+        session = pool.get()
+        readurl(base + "/good", session=session)
+        with mock.patch.object(session, "close") as m_close:
+            pool.close()
+        assert 1 == m_close.call_count
+        assert pool.get() is not session
+        assert 0 == pool.stats()["requests"]
+
+
 # vi: ts=4 expandtab